@@ -5,36 +5,490 @@
 # Funções úteis para alunos.
 
 
-from mwebcrawler import Disciplina, Nivel
+from mwebcrawler import (Cursos, Disciplina, Nivel, Oferta, configura_cache,
+                         configura_escalonador, configura_memoria)
+from mwebhorarios import Grade
+import heapq
+import itertools
+
+
+class GrafoPreRequisitos:
+    '''Grafo de pré-requisitos entre disciplinas.
+
+    Para cada disciplina, 'requisitos' guarda a lista de pré-requisitos no
+    formato de Disciplina.pre_requisitos: cada item tem uma relação 'OU' com
+    os demais, e cada item é uma lista de códigos com relação 'E' entre si.
+    Uma vez construído, o grafo pode ser consultado sem acesso à rede.
+    '''
+
+    def __init__(self, requisitos=None):
+        self.requisitos = requisitos or {}
+        self.ciclos = self._detecta_ciclos()
+        self._opcoes = {}
+
+    @staticmethod
+    def constroi(disciplinas, nivel=Nivel.GRADUACAO, verbose=False,
+                 trabalhadores=8):
+        '''Acessa o Matrícula Web e retorna o grafo com os pré-requisitos
+        (diretos e indiretos) das disciplinas dadas.
+
+        A busca é feita em largura: todas as disciplinas de um mesmo nível
+        (fronteira) são buscadas concorrentemente, e cada disciplina é buscada
+        uma única vez, ainda que seja pré-requisito de várias outras.
+
+        Argumentos:
+        disciplinas -- coleção de códigos das disciplinas
+        nivel -- nível acadêmico das disciplinas buscadas
+                 (default Nivel.GRADUACAO)
+        verbose -- indicação dos procedimentos sendo adotados
+                   (default False)
+        trabalhadores -- quantidade máxima de buscas simultâneas
+                         (default 8)
+        '''
+        requisitos = {}
+        fronteira = set(str(codigo) for codigo in disciplinas)
+        while fronteira:
+            proxima = set()
+            for codigo, pre_reqs in Disciplina.pre_requisitos_em_lote(
+                    fronteira, nivel, verbose, trabalhadores):
+                requisitos[codigo] = pre_reqs
+                for opcao in pre_reqs:
+                    proxima.update(opcao)
+            fronteira = proxima.difference(requisitos)
+
+        return GrafoPreRequisitos(requisitos)
+
+    def dependencias(self, codigo):
+        '''Retorna o conjunto de disciplinas que aparecem como pré-requisito
+        (direto) da disciplina dada, em qualquer das opções.'''
+        return set(d for opcao in self.requisitos.get(str(codigo), [])
+                   for d in opcao)
+
+    def satisfeitos(self, codigo, aprovadas):
+        '''Retorna a indicação de que os pré-requisitos da disciplina dada
+        são satisfeitos pelo conjunto (frozenset) das disciplinas aprovadas
+        dado. Disciplinas fora do grafo não têm pré-requisitos.'''
+        codigo = str(codigo)
+        if codigo not in self._opcoes:
+            # As opções são convertidas em conjuntos uma única vez.
+            self._opcoes[codigo] = [frozenset(opcao) for opcao
+                                    in self.requisitos.get(codigo, [])]
+        opcoes = self._opcoes[codigo]
+        return not opcoes or any(opcao <= aprovadas for opcao in opcoes)
+
+    def liberadas(self, aprovadas, disciplinas=None):
+        '''Retorna o conjunto das disciplinas dadas (ou do grafo) ainda não
+        aprovadas cujos pré-requisitos são satisfeitos pelas disciplinas
+        aprovadas dadas.'''
+        aprovadas = frozenset(str(codigo) for codigo in aprovadas)
+        if disciplinas is None:
+            disciplinas = self.requisitos
+        return set(codigo for codigo in (str(d) for d in disciplinas)
+                   if codigo not in aprovadas and
+                   self.satisfeitos(codigo, aprovadas))
+
+    def fecho(self, codigo):
+        '''Retorna o conjunto de todas as disciplinas das quais a disciplina
+        dada depende, direta ou indiretamente.'''
+        visitadas, pilha = set(), list(self.dependencias(codigo))
+        while pilha:
+            disciplina = pilha.pop()
+            if disciplina not in visitadas:
+                visitadas.add(disciplina)
+                pilha.extend(self.dependencias(disciplina))
+        return visitadas
+
+    def profundidade(self, codigo):
+        '''Retorna o tamanho da maior cadeia de pré-requisitos que leva à
+        disciplina dada (0 caso ela não tenha pré-requisitos). Dependências
+        cíclicas são desconsideradas.'''
+        profundidades, caminho = {}, set()
+
+        def calcula(disciplina):
+            if disciplina not in profundidades:
+                caminho.add(disciplina)
+                profundidades[disciplina] = max(
+                    [calcula(d) + 1 for d in self.dependencias(disciplina)
+                     if d not in caminho] or [0])
+                caminho.discard(disciplina)
+            return profundidades[disciplina]
+
+        return calcula(str(codigo))
+
+    def ordem_topologica(self):
+        '''Retorna uma lista com as disciplinas do grafo ordenadas de forma
+        que cada uma aparece depois de todos os seus pré-requisitos.
+
+        Lança ValueError caso haja dependências cíclicas.
+        '''
+        if self.ciclos:
+            raise ValueError('Pré-requisitos cíclicos: %s' % self.ciclos)
+
+        disciplinas = set(self.requisitos)
+        for codigo in self.requisitos:
+            disciplinas.update(self.dependencias(codigo))
+
+        pendentes = {d: len(self.dependencias(d)) for d in disciplinas}
+        dependentes = {d: [] for d in disciplinas}
+        for codigo in disciplinas:
+            for d in self.dependencias(codigo):
+                dependentes[d].append(codigo)
+
+        ordem = sorted(d for d in disciplinas if not pendentes[d])
+        for disciplina in ordem:
+            for d in sorted(dependentes[disciplina]):
+                pendentes[d] -= 1
+                if not pendentes[d]:
+                    ordem.append(d)
+        return ordem
+
+    def arvore(self, codigo):
+        '''Retorna um dicionário aninhado com os pré-requisitos (diretos e
+        indiretos) da disciplina dada, no formato de pre_requisitos().
+        Dependências cíclicas não são expandidas.'''
+        caminho = set()
+
+        def expande(disciplina):
+            caminho.add(disciplina)
+            subarvore = {d: expande(d) if d not in caminho else {}
+                         for opcao in self.requisitos.get(disciplina, [])
+                         for d in opcao}
+            caminho.discard(disciplina)
+            return subarvore
+
+        return expande(str(codigo))
+
+    def _detecta_ciclos(self):
+        '''Retorna a lista de ciclos (listas de códigos) do grafo.'''
+        ciclos, visitadas = [], set()
+        for inicio in sorted(self.requisitos):
+            if inicio in visitadas:
+                continue
+            caminho, pilha = [], [(inicio, iter(sorted(
+                self.dependencias(inicio))))]
+            caminho.append(inicio)
+            visitadas.add(inicio)
+            while pilha:
+                disciplina, proximas = pilha[-1]
+                for d in proximas:
+                    if d in caminho:
+                        ciclos.append(caminho[caminho.index(d):])
+                    elif d not in visitadas:
+                        visitadas.add(d)
+                        caminho.append(d)
+                        pilha.append((d, iter(sorted(self.dependencias(d)))))
+                        break
+                else:
+                    pilha.pop()
+                    caminho.pop()
+        return ciclos
 
 
 def pre_requisitos(codigo, nivel=Nivel.GRADUACAO, profundidade=0,
                    verbose=False):
-    '''Dado o código de uma disciplina, obtém recursivamente a lista de
-    disciplinas que são pré-requisitos para o código dado e as escreve na saída
-    padrão, acrescentando um caractere de tabulação ao prefixo a cada nível de
-    profundidade.
+    '''Dado o código de uma disciplina, obtém a árvore de disciplinas que são
+    pré-requisitos (diretos e indiretos) para o código dado, na forma de um
+    dicionário em que cada disciplina é associada aos seus pré-requisitos.
 
     Argumentos:
     codigo -- o código da disciplina
     nivel -- nível acadêmico das disciplinas buscadas
              (default Nivel.GRADUACAO)
-    profundidade -- profundidade da busca
+    profundidade -- profundidade da busca (mantido por compatibilidade)
                     (default 0)
     verbose -- indicação dos procedimentos sendo adotados
                (default False)
+
+    Cada disciplina é buscada uma única vez (ver GrafoPreRequisitos).
     '''
-    disciplinas = {}
-    for pre_reqs in Disciplina.pre_requisitos(codigo, nivel, verbose):
-        for codigo in pre_reqs:
-            disciplinas[codigo] = pre_requisitos(codigo, nivel,
-                                                 profundidade + 1, verbose)
+    grafo = GrafoPreRequisitos.constroi([codigo], nivel, verbose)
+    return grafo.arvore(codigo)
+
+
+def creditos(oferta):
+    '''Retorna a quantidade de créditos (teoria, prática e extensão) da
+    disciplina da oferta dada (ver Oferta.oferta).'''
+    dados = oferta.get('Créditos', {})
+    return sum(dados.get(tipo, 0) for tipo in ('Teoria', 'Prática',
+                                               'Extensão'))
 
-    return disciplinas
+
+def _em_blocos(grade, disciplinas):
+    '''Retorna, para cada disciplina dada, a lista das triplas (turma,
+    bits, tamanho) de suas turmas com horários distintos (ver
+    mwebhorarios.Grade.opcoes), em que bits é o conjunto dos blocos de
+    horário ocupados pela turma e tamanho é a quantidade desses blocos.
+
+    Os blocos são os trechos da semana delimitados pelos inícios e términos
+    de todas as aulas das turmas dadas, de forma que os conjuntos de bits
+    são bem menores que os de minutos da semana.'''
+    opcoes = [[(turma, grade.horarios(d, turma)) for turma, _
+               in grade.opcoes(d)] for d in disciplinas]
+    pontos = sorted(set(ponto for opcoes_d in opcoes
+                        for _, intervalos in opcoes_d
+                        for intervalo in intervalos for ponto in intervalo))
+    posicao = {ponto: i for i, ponto in enumerate(pontos)}
+
+    def blocos(intervalos):
+        bits = 0
+        for inicio, fim in intervalos:
+            bits |= ((1 << (posicao[fim] - posicao[inicio])) - 1) << \
+                posicao[inicio]
+        return bits
+
+    return [[(turma, blocos(intervalos),
+              sum(posicao[fim] - posicao[inicio]
+                  for inicio, fim in intervalos))
+             for turma, intervalos in opcoes_d] for opcoes_d in opcoes]
+
+
+def _precos(valores, opcoes, iteracoes=100, paciencia=5):
+    '''Retorna a lista dos preços de cada bloco de horário (ver _em_blocos)
+    usados no limite superior dos créditos de um plano com as disciplinas
+    de créditos (valores) e turmas (opcoes) dados.
+
+    O limite é a relaxação lagrangiana da ocupação dos blocos: a soma dos
+    preços dos blocos mais, para cada disciplina, o maior lucro positivo
+    (créditos menos os preços dos blocos ocupados) de suas turmas. Qualquer
+    lista de preços não negativos dá um limite válido; os preços são
+    ajustados por subgradiente, com o total de um plano guloso como alvo.'''
+    blocos = max([bits.bit_length() for opcoes_d in opcoes
+                  for _, bits, _ in opcoes_d] or [0])
+    posicoes = [[[p for p in range(blocos) if bits >> p & 1]
+                 for _, bits, _ in opcoes_d] for opcoes_d in opcoes]
+    ocupados, alvo = 0, 0
+    for valor, opcoes_d in zip(valores, opcoes):
+        for _, bits, _ in opcoes_d:
+            if not ocupados & bits:
+                ocupados |= bits
+                alvo += valor
+                break
+
+    precos, melhores, menor, passo = [0.0] * blocos, None, None, 2.0
+    sem_melhora = 0
+    for _ in range(iteracoes):
+        limite, usos = sum(precos), [0] * blocos
+        for valor, posicoes_d in zip(valores, posicoes):
+            lucro, escolhidas = max((valor - sum(precos[p] for p in turma),
+                                     turma) for turma in posicoes_d)
+            if lucro > 0:
+                limite += lucro
+                for p in escolhidas:
+                    usos[p] += 1
+        if menor is None or limite < menor:
+            melhores, menor, sem_melhora = list(precos), limite, 0
+        else:
+            # O passo é reduzido quando o limite para de diminuir.
+            sem_melhora += 1
+            if sem_melhora == paciencia:
+                passo, sem_melhora = passo / 2, 0
+        excessos = [u - 1 for u in usos]
+        norma = sum(e * e for e in excessos)
+        if not norma or limite <= alvo:
+            break
+        ajuste = passo * (limite - alvo) / norma
+        precos = [max(0.0, preco + ajuste * e)
+                  for preco, e in zip(precos, excessos)]
+    return melhores
+
+
+def melhores_planos(grade, creditos_por_disciplina, k=5,
+                    maximo_de_creditos=32):
+    '''Retorna a lista dos (até) k planos de matrícula com mais créditos,
+    em ordem decrescente de créditos. Cada plano é um dicionário com o total
+    de 'Créditos' e as 'Turmas' escolhidas (disciplina: turma), sem
+    conflitos de horário entre elas; planos com as mesmas disciplinas são
+    considerados uma única vez.
+
+    Argumentos:
+    grade -- mwebhorarios.Grade com os horários das turmas candidatas
+    creditos_por_disciplina -- dicionário com os créditos de cada disciplina
+                               candidata
+    k -- quantidade máxima de planos
+         (default 5)
+    maximo_de_creditos -- quantidade máxima de créditos de um plano
+                          (default 32)
+
+    A busca (branch and bound) escolhe primeiro as disciplinas com mais
+    créditos e descarta os ramos cujo total possível não supera o do
+    k-ésimo melhor plano já encontrado (empates inclusive). O total possível
+    de um ramo é o menor entre o da mochila fracionária dos blocos de
+    horário ainda livres e o da relaxação lagrangiana (ver _precos), ambos
+    considerando apenas as turmas sem conflito das disciplinas restantes.
+    Ele é guardado para cada disciplina e conjunto de blocos ocupados, como
+    em mwebhorarios.Grade.combinacao, e refinado pelos ramos já explorados.
+    Turmas com os mesmos horários são equivalentes, e apenas uma delas é
+    considerada.
+    '''
+    disciplinas = sorted((str(d) for d, c in creditos_por_disciplina.items()
+                          if 0 < c <= maximo_de_creditos and grade.turmas(d)),
+                         key=lambda d: (-creditos_por_disciplina[d], d))
+    valores = [creditos_por_disciplina[d] for d in disciplinas]
+    opcoes = _em_blocos(grade, disciplinas)
+    tamanhos = [min(tamanho for _, _, tamanho in opcoes_d)
+                for opcoes_d in opcoes]
+    # Blocos ocupados por alguma turma das disciplinas a partir da i-ésima:
+    # os demais não influenciam o restante da busca.
+    restantes = [0] * (len(disciplinas) + 1)
+    for i in range(len(disciplinas) - 1, -1, -1):
+        restantes[i] = restantes[i + 1]
+        for _, bits, _ in opcoes[i]:
+            restantes[i] |= bits
+    # Disciplinas em ordem decrescente de créditos por bloco (as sem aulas
+    # primeiro), para a mochila fracionária.
+    razao = sorted(range(len(disciplinas)), key=lambda i: (
+        -valores[i] / float(tamanhos[i]) if tamanhos[i] else
+        -float('inf')))
+    # Turmas de cada disciplina em ordem decrescente de lucro (ver _precos),
+    # a ordem em que são escolhidas.
+    precos = _precos(valores, opcoes)
+    opcoes = [sorted(((valores[j] - sum(preco for p, preco
+                                        in enumerate(precos)
+                                        if bits >> p & 1), turma, bits)
+                      for turma, bits, _ in opcoes_d), reverse=True)
+              for j, opcoes_d in enumerate(opcoes)]
+    # Disciplinas a partir da i-ésima em ordem decrescente de créditos por
+    # bloco, e soma dos preços de cada combinação de 8 blocos consecutivos.
+    seguintes = [[j for j in razao if j >= i]
+                 for i in range(len(disciplinas) + 1)]
+    somas = [[sum(preco for p, preco in enumerate(precos[c:c + 8])
+                  if bits >> p & 1) for bits in range(256)]
+             for c in range(0, len(precos), 8)]
+    # Os totais são múltiplos do máximo divisor comum dos créditos.
+    divisor = 0
+    for valor in valores:
+        while valor:
+            divisor, valor = valor, divisor % valor
+    melhores, planos, ordem, escolhidas = [], set(), itertools.count(), {}
+    limites = {}
+
+    def possivel(i, ocupados):
+        # Limite superior dos créditos que as disciplinas a partir da i-ésima
+        # podem acrescentar a um plano cujas turmas ocupam os blocos dados,
+        # calculado uma única vez por estado.
+        chave = (i, ocupados & restantes[i])
+        if chave in limites:
+            return limites[chave]
+        livres = restantes[i] & ~ocupados
+        lagrange = sum(soma[livres >> 8 * c & 255]
+                       for c, soma in enumerate(somas))
+        mochila, vagos, cheia = 0, bin(livres).count('1'), False
+        for j in seguintes[i]:
+            for lucro, _, bits in opcoes[j]:
+                if not ocupados & bits:
+                    break
+            else:
+                continue
+            if lucro > 0:
+                lagrange += lucro
+            if cheia:
+                continue
+            if tamanhos[j] > vagos:
+                mochila += valores[j] * vagos / float(tamanhos[j])
+                cheia = True
+            else:
+                mochila += valores[j]
+                vagos -= tamanhos[j]
+        # Como os totais são múltiplos do divisor, o resto do limite não
+        # permite superar plano algum.
+        limite = int(min(mochila, lagrange) + 1e-6)
+        limites[chave] = limite - limite % divisor
+        return limites[chave]
+
+    def busca(i, ocupados, total):
+        # Retorna o limite superior (ver possivel) do estado dado, refinado
+        # pelos ramos explorados, de forma que o mesmo estado alcançado por
+        # outras escolhas seja podado sem nova busca.
+        limite = possivel(i, ocupados)
+        if len(melhores) == k and min(maximo_de_creditos, total + limite) \
+                <= melhores[0][0]:
+            return limite
+        if i == len(disciplinas):
+            plano = frozenset(escolhidas)
+            if total and plano not in planos:
+                planos.add(plano)
+                item = (total, -next(ordem), dict(escolhidas))
+                if len(melhores) < k:
+                    heapq.heappush(melhores, item)
+                else:
+                    heapq.heapreplace(melhores, item)
+            return 0
+        # Ramos (cada turma sem conflito e nenhuma turma) em ordem
+        # decrescente de total possível, para encontrar os melhores planos
+        # (e podar os demais) mais cedo.
+        ramos = [(valores[i] + possivel(i + 1, ocupados | bits), valores[i],
+                  turma, bits) for _, turma, bits in opcoes[i]
+                 if not ocupados & bits]
+        ramos.append((possivel(i + 1, ocupados), 0, None, 0))
+        limite = 0
+        for teto, valor, turma, bits in sorted(ramos, key=lambda r: -r[0]):
+            if total + valor > maximo_de_creditos:
+                limite = max(limite, teto)
+                continue
+            if turma is not None:
+                escolhidas[disciplinas[i]] = turma
+            limite = max(limite, valor + busca(i + 1, ocupados | bits,
+                                               total + valor))
+            if turma is not None:
+                del escolhidas[disciplinas[i]]
+        chave = (i, ocupados & restantes[i])
+        limites[chave] = min(limites[chave], limite)
+        return limites[chave]
+
+    if k > 0 and disciplinas:
+        busca(0, 0, 0)
+    return [{'Créditos': total, 'Turmas': turmas}
+            for total, _, turmas in sorted(melhores, reverse=True)]
+
+
+def planos_de_matricula(aprovadas, habilitacao, k=5, maximo_de_creditos=32,
+                        disciplinas=None, nivel=Nivel.GRADUACAO,
+                        verbose=False, trabalhadores=8):
+    '''Acessa o Matrícula Web e retorna a lista dos (até) k planos de
+    matrícula com mais créditos (ver melhores_planos) com as disciplinas do
+    fluxo da habilitação dada cujos pré-requisitos são satisfeitos pelas
+    disciplinas aprovadas dadas.
+
+    Argumentos:
+    aprovadas -- coleção de códigos das disciplinas já aprovadas
+    habilitacao -- o código da habilitação (ver Cursos.fluxo)
+    k -- quantidade máxima de planos
+         (default 5)
+    maximo_de_creditos -- quantidade máxima de créditos de um plano
+                          (default 32)
+    disciplinas -- coleção de códigos de outras disciplinas candidatas (por
+                   exemplo, optativas)
+                   (default None)
+    nivel -- nível acadêmico das disciplinas
+             (default Nivel.GRADUACAO)
+    verbose -- indicação dos procedimentos sendo adotados
+               (default False)
+    trabalhadores -- quantidade máxima de buscas simultâneas
+                     (default 8)
+    '''
+    aprovadas = set(str(codigo) for codigo in aprovadas)
+    candidatas = set(str(codigo) for codigo in disciplinas or ())
+    for periodo in Cursos.fluxo(habilitacao, nivel, verbose).values():
+        candidatas.update(periodo.get('Disciplinas', []))
+    candidatas.difference_update(aprovadas)
+
+    grafo = GrafoPreRequisitos(dict(Disciplina.pre_requisitos_em_lote(
+        candidatas, nivel, verbose, trabalhadores)))
+    ofertas = dict(Oferta.oferta_em_lote(
+        grafo.liberadas(aprovadas, candidatas), nivel=nivel,
+        verbose=verbose, trabalhadores=trabalhadores))
+    return melhores_planos(Grade.de_ofertas(ofertas.items()),
+                           {codigo: creditos(oferta)
+                            for codigo, oferta in ofertas.items()},
+                           k, maximo_de_creditos)
 
 
 if __name__ == '__main__':
+    configura_cache()
+    configura_escalonador()
+    configura_memoria()
+
     cod = 116343  # LINGUAGENS DE PROGRAMACAO
     disciplinas = pre_requisitos(cod)
     for codigo, pre_reqs in disciplinas.items():
-        print codigo, pre_reqs
+        print('%s %s' % (codigo, pre_reqs))
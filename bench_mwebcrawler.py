@@ -0,0 +1,381 @@
+#  -*- coding: utf-8 -*-
+#    @package: bench_mwebcrawler.py
+#
+# Medição do desempenho da análise de cada tipo de página do Matrícula Web,
+# com base nas páginas salvas em paginas/ (uma página por arquivo, cujo nome
+# começa com o tipo da página), para cada analisador de páginas disponível.
+# Inclui páginas de oferta ampliadas, com centenas de turmas. As páginas de
+# paginas/ são sintéticas e pequenas (ver mwebgravacao): os tempos medidos
+# comparam os analisadores, mas não são os de páginas reais.
+#
+# Para cada página e analisador são medidos o tempo de análise, a vazão
+# (páginas/s) e o pico de memória alocada durante a análise. A memória é a
+# contabilizada por tracemalloc, ou seja, a alocada pelo Python: estruturas
+# alocadas por bibliotecas em C (como a árvore do lxml) não são incluídas.
+# O analisador regex é medido também com a página decodificada inteira antes
+# da análise (regex/str), para comparação com a análise direta dos bytes.
+#
+# Também é medida a vazão das buscas completas (mweb() e análise) de todas as
+# páginas salvas, reproduzidas localmente (ver mwebgravacao.Reprodutor).
+#
+# Por fim, é comparada a memória ocupada por uma oferta sintética de 10 mil
+# turmas (1000 disciplinas de 10 turmas) representada por dicionários e pelos
+# registros de mwebregistros, e medido o tempo da análise vetorizada dessa
+# oferta (ver mwebanalise, que requer numpy) e o das consultas de conflitos de
+# horários entre suas turmas (ver mwebhorarios).
+#
+# A vazão da busca de ofertas ampliadas com a análise em um pool de processos
+# (ver mwebcrawler.busca_em_processos) é medida para quantidades crescentes de
+# processos, até a quantidade de CPUs, e comparada à da busca com a análise
+# nas próprias threads de requisição (Oferta.oferta_em_lote).
+#
+# Também são medidos o tamanho e o tempo de reanálise de um arquivo de
+# páginas brutas (ver mwebarquivo) com as páginas de oferta sintéticas.
+#
+# Uso: python bench_mwebcrawler.py [repetições] [analisador ...]
+
+
+from mwebcrawler import ANALISADORES, _analisador_de
+from mwebgravacao import PAGINAS, Reprodutor, Resposta
+from mwebregistros import OfertaDisciplina
+import glob
+import mwebcrawler
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+# Início de cada turma na página de oferta (oferta_dados).
+TURMA = b'<tr><td><div align=center><b>Turma</b>'
+FIM_DAS_TURMAS = b'</table></body></html>'
+
+# Quantidades de turmas das páginas de oferta ampliadas.
+AMPLIACOES = (240, 960)
+
+# Oferta sintética: quantidade de disciplinas e de turmas por disciplina.
+DISCIPLINAS, TURMAS_POR_DISCIPLINA = 1000, 10
+
+
+def paginas():
+    '''Gera as tuplas (nome, tipo, conteúdo) das páginas salvas.'''
+    for arquivo in sorted(glob.glob(os.path.join(PAGINAS, '*.html'))):
+        nome = os.path.basename(arquivo)[:-len('.html')]
+        with open(arquivo, 'rb') as pagina:
+            yield nome, nome.split('-')[0], pagina.read()
+
+
+def amplia_oferta(pagina_html, turmas):
+    '''Retorna uma página de oferta (oferta_dados) com a quantidade de turmas
+    dada, obtida repetindo as turmas da página dada (renomeadas).'''
+    inicio = pagina_html.index(TURMA)
+    fim = pagina_html.rindex(FIM_DAS_TURMAS)
+    blocos = pagina_html[inicio:fim].split(TURMA)[1:]
+
+    ampliada = []
+    for i in range(turmas):
+        bloco = re.sub(br'<font size=4><b>\w+</b>',
+                       b'<font size=4><b>T%d</b>' % i, blocos[i % len(blocos)])
+        ampliada.append(TURMA + bloco)
+    return pagina_html[:inicio] + b''.join(ampliada) + pagina_html[fim:]
+
+
+def casos():
+    '''Retorna a lista de tuplas (nome, tipo, conteúdo) das páginas salvas e
+    das páginas de oferta ampliadas.'''
+    lista = list(paginas())
+    oferta = [pagina_html for _, tipo, pagina_html in lista
+              if tipo == 'oferta_dados'][0]
+    for turmas in AMPLIACOES:
+        lista.append(('oferta_dados-%d-turmas' % turmas, 'oferta_dados',
+                      amplia_oferta(oferta, turmas)))
+    return lista
+
+
+def analisadores_disponiveis():
+    '''Retorna os nomes dos analisadores que podem ser carregados.'''
+    nomes = []
+    for nome in sorted(set(ANALISADORES) | set(['lxml'])):
+        try:
+            _analisador_de(nome)
+        except ImportError:
+            continue
+        nomes.append(nome)
+    return nomes
+
+
+def _analise(tipo, analisador, texto):
+    '''Retorna a função de análise do tipo de página dado, que decodifica a
+    página inteira antes da análise caso texto seja verdadeiro.'''
+    analisa = getattr(_analisador_de(analisador), tipo)
+    if texto:
+        return lambda pagina_html: analisa(pagina_html.decode('utf-8',
+                                                              'replace'))
+    return analisa
+
+
+def tempo_de_analise(tipo, pagina_html, repeticoes, analisador='regex',
+                     texto=False):
+    '''Retorna o tempo (em segundos) de análise da página dada.'''
+    analisa = _analise(tipo, analisador, texto)
+    tempos = timeit.repeat(lambda: analisa(pagina_html), number=repeticoes,
+                           repeat=3)
+    return min(tempos) / repeticoes
+
+
+def memoria_de_analise(tipo, pagina_html, analisador='regex', texto=False):
+    '''Retorna o pico de memória (em bytes) alocada na análise da página
+    dada (ver tracemalloc).'''
+    analisa = _analise(tipo, analisador, texto)
+    tracemalloc.start()
+    try:
+        analisa(pagina_html)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def vazao_de_busca(repeticoes, analisador='regex'):
+    '''Retorna a vazão (páginas/s) das buscas completas (mweb() e análise)
+    das páginas salvas, reproduzidas localmente e sem cache.'''
+    analisador = _analisador_de(analisador)
+    buscas = []
+    for nome, tipo, _ in paginas():
+        variante = nome.partition('-')[2] or '0'
+        buscas.append((tipo, {'cod': variante}, getattr(analisador, tipo)))
+
+    def busca():
+        for tipo, params, analisa in buscas:
+            analisa(mwebcrawler.mweb('graduacao', tipo, params))
+
+    sessao, cache = mwebcrawler.sessao(), mwebcrawler._cache
+    mwebcrawler.configura_sessao(Reprodutor())
+    mwebcrawler._cache = None
+    try:
+        tempo = min(timeit.repeat(busca, number=repeticoes, repeat=3))
+    finally:
+        mwebcrawler.configura_sessao(sessao)
+        mwebcrawler._cache = cache
+    return len(buscas) * repeticoes / tempo
+
+
+def memoria_retida(constroi):
+    '''Retorna a memória (em bytes) ocupada pelo resultado da função dada,
+    ou seja, a alocada durante a sua execução e não liberada ao final.'''
+    tracemalloc.start()
+    try:
+        resultado = constroi()  # mantido até a medição
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def memoria_da_oferta(disciplinas=DISCIPLINAS,
+                      turmas_por_disciplina=TURMAS_POR_DISCIPLINA):
+    '''Retorna a memória (em bytes) ocupada por uma oferta sintética, com a
+    quantidade de disciplinas e turmas dadas, representada por dicionários e
+    pelos registros de mwebregistros.'''
+    oferta = [pagina_html for _, tipo, pagina_html in paginas()
+              if tipo == 'oferta_dados'][0]
+    pagina_html = amplia_oferta(oferta, turmas_por_disciplina)
+    analisa = _analisador_de('regex').oferta_dados
+
+    dicionarios = memoria_retida(lambda: [analisa(pagina_html)
+                                          for _ in range(disciplinas)])
+    registros = memoria_retida(lambda: [
+        OfertaDisciplina.de_dicionario(analisa(pagina_html))
+        for _ in range(disciplinas)])
+    return dicionarios, registros
+
+
+def tempo_da_analise_vetorizada(disciplinas=DISCIPLINAS,
+                                turmas_por_disciplina=TURMAS_POR_DISCIPLINA):
+    '''Retorna o tempo (em segundos) da análise vetorizada (taxas de
+    ocupação, quórum, totais por departamento e por disciplina e demanda não
+    atendida) de uma oferta sintética com a quantidade de disciplinas e
+    turmas dadas.'''
+    from mwebanalise import Turmas
+
+    oferta = [pagina_html for _, tipo, pagina_html in paginas()
+              if tipo == 'oferta_dados'][0]
+    dados = _analisador_de('regex').oferta_dados(
+        amplia_oferta(oferta, turmas_por_disciplina))
+    turmas = Turmas.de_ofertas(
+        [(str(disciplina), dados) for disciplina in range(disciplinas)],
+        {str(disciplina): {'T0': 5} for disciplina in range(disciplinas)})
+
+    def analisa():
+        turmas.ocupacao()
+        turmas.com_quorum(10).por_departamento()
+        turmas.por_disciplina()
+        turmas.demanda_nao_atendida()
+
+    return min(timeit.repeat(analisa, number=1, repeat=3))
+
+
+def tempo_dos_conflitos(disciplinas=DISCIPLINAS,
+                        turmas_por_disciplina=TURMAS_POR_DISCIPLINA,
+                        repeticoes=1000):
+    '''Retorna o tempo (em segundos) de uma consulta de conflito entre duas
+    turmas, de uma consulta de ocupação de um local e de uma combinação sem
+    conflitos das disciplinas de um período (8 disciplinas) na grade de uma
+    oferta sintética com a quantidade de disciplinas e turmas dadas.'''
+    from mwebhorarios import Grade
+
+    oferta = [pagina_html for _, tipo, pagina_html in paginas()
+              if tipo == 'oferta_dados'][0]
+    dados = _analisador_de('regex').oferta_dados(
+        amplia_oferta(oferta, turmas_por_disciplina))
+    grade = Grade.de_ofertas(
+        [(str(disciplina), dados) for disciplina in range(disciplinas)])
+    turma = ('0', grade.turmas(0)[0])
+    outra = (str(disciplinas - 1), grade.turmas(disciplinas - 1)[-1])
+    periodo = [str(disciplina) for disciplina in range(8)]
+
+    def tempo(consulta):
+        return min(timeit.repeat(consulta, number=repeticoes,
+                                 repeat=3)) / repeticoes
+
+    return (tempo(lambda: grade.conflito(turma, outra)),
+            tempo(lambda: grade.ocupantes('PJC BT 073', 'Segunda', '10:00',
+                                          '11:50')),
+            tempo(lambda: grade.combinacao(periodo)))
+
+
+class SessaoAmpliada:
+    '''Sessão HTTP que responde a qualquer requisição com a página dada,
+    após a latência dada (simulando o acesso à rede).'''
+
+    def __init__(self, pagina_html, latencia):
+        self.pagina_html = pagina_html
+        self.latencia = latencia
+
+    def get(self, url, params=None, timeout=None, headers=None):
+        time.sleep(self.latencia)
+        return Resposta(self.pagina_html)
+
+
+def vazao_em_processos(processos, disciplinas=400, turmas=AMPLIACOES[0],
+                       latencia=.005, trabalhadores=8):
+    '''Retorna a vazão (páginas/s) da busca das ofertas de disciplinas com
+    páginas ampliadas (com a quantidade de turmas dada), com a análise em um
+    pool com a quantidade de processos dada, ou nas threads de requisição
+    caso seja 0.'''
+    oferta = [pagina_html for _, tipo, pagina_html in paginas()
+              if tipo == 'oferta_dados'][0]
+    codigos = range(disciplinas)
+    if processos:
+        def busca():
+            for _ in mwebcrawler.Oferta.oferta_em_processos(
+                    codigos, trabalhadores=trabalhadores,
+                    processos=processos):
+                pass
+    else:
+        def busca():
+            for _ in mwebcrawler.Oferta.oferta_em_lote(codigos,
+                                                       trabalhadores=(
+                                                           trabalhadores)):
+                pass
+
+    sessao, cache = mwebcrawler.sessao(), mwebcrawler._cache
+    mwebcrawler.configura_sessao(SessaoAmpliada(amplia_oferta(oferta, turmas),
+                                                latencia))
+    mwebcrawler._cache = None
+    try:
+        tempo = min(timeit.repeat(busca, number=1, repeat=3))
+    finally:
+        mwebcrawler.configura_sessao(sessao)
+        mwebcrawler._cache = cache
+    return disciplinas / tempo
+
+
+def reanalise_do_arquivo(disciplinas=DISCIPLINAS,
+                         turmas_por_disciplina=TURMAS_POR_DISCIPLINA,
+                         processos=0):
+    '''Retorna o tamanho (em bytes) das páginas de oferta sintéticas, o do
+    arquivo (ver mwebarquivo) que as contém e o tempo (em segundos) da
+    reanálise do arquivo, com a quantidade de processos dada.'''
+    from mwebarquivo import Arquivo
+
+    oferta = [pagina_html for _, tipo, pagina_html in paginas()
+              if tipo == 'oferta_dados'][0]
+    pagina_html = amplia_oferta(oferta, turmas_por_disciplina)
+    diretorio = tempfile.mkdtemp()
+    try:
+        with Arquivo(os.path.join(diretorio, 'paginas.mwa')) as arquivo:
+            for disciplina in range(disciplinas):
+                arquivo.guarda('graduacao', 'oferta_dados',
+                               {'cod': disciplina}, pagina_html)
+
+            def reanalisa():
+                for _ in arquivo.reanalisa(processos=processos):
+                    pass
+
+            tempo = min(timeit.repeat(reanalisa, number=1, repeat=3))
+            return disciplinas * len(pagina_html), arquivo.tamanho(), tempo
+    finally:
+        shutil.rmtree(diretorio)
+
+
+if __name__ == '__main__':
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    analisadores = sys.argv[2:] or analisadores_disponiveis()
+
+    lista = casos()
+    tamanho = min(len(pagina_html) for _, _, pagina_html in lista)
+    print('%-24s %-10s %12s %12s %12s' % ('Página', 'Analisador',
+                                          'µs/página', 'páginas/s',
+                                          'memória KiB'))
+    for nome, tipo, pagina_html in lista:
+        vezes = max(1, repeticoes * tamanho // len(pagina_html))
+        for analisador in analisadores:
+            for texto in (False, True) if analisador == 'regex' else (False,):
+                tempo = tempo_de_analise(tipo, pagina_html, vezes, analisador,
+                                         texto)
+                memoria = memoria_de_analise(tipo, pagina_html, analisador,
+                                             texto)
+                print('%-24s %-10s %12.1f %12.0f %12.1f' % (
+                    nome, analisador + ('/str' if texto else ''),
+                    1e6 * tempo, 1 / tempo, memoria / 1024.))
+
+    print('')
+    print('Buscas completas (mweb() e análise), páginas reproduzidas:')
+    for analisador in analisadores:
+        vazao = vazao_de_busca(max(1, repeticoes // 10), analisador)
+        print('%-35s %12.0f páginas/s' % (analisador, vazao))
+
+    print('')
+    print('Memória de uma oferta de %d turmas:' % (DISCIPLINAS *
+                                                  TURMAS_POR_DISCIPLINA))
+    dicionarios, registros = memoria_da_oferta()
+    print('%-35s %12.1f MiB' % ('dicionários', dicionarios / 2.**20))
+    print('%-35s %12.1f MiB' % ('registros (mwebregistros)',
+                                registros / 2.**20))
+    try:
+        tempo = tempo_da_analise_vetorizada()
+        print('%-35s %12.1f ms' % ('análise vetorizada', 1e3 * tempo))
+    except ImportError:
+        print('%-35s %15s' % ('análise vetorizada', 'requer numpy'))
+    conflito, local, combinacao = tempo_dos_conflitos()
+    print('%-35s %12.1f µs' % ('conflito entre turmas', 1e6 * conflito))
+    print('%-35s %12.1f µs' % ('ocupação de um local', 1e6 * local))
+    print('%-35s %12.1f µs' % ('combinação de um período', 1e6 * combinacao))
+
+    print('')
+    print('Busca de %d ofertas de %d turmas (vazão em páginas/s):' % (
+        400, AMPLIACOES[0]))
+    print('%-35s %12.0f' % ('análise nas threads', vazao_em_processos(0)))
+    processos = 1
+    while processos <= (os.cpu_count() or 1):
+        print('%-35s %12.0f' % ('análise em %d processo(s)' % processos,
+                                vazao_em_processos(processos)))
+        processos *= 2
+
+    print('')
+    paginas_brutas, comprimidas, tempo = reanalise_do_arquivo()
+    print('Arquivo de %d páginas de oferta (%.1f MiB, %.1f MiB comprimido):'
+          % (DISCIPLINAS, paginas_brutas / 2.**20, comprimidas / 2.**20))
+    print('%-35s %12.2f s' % ('reanálise', tempo))
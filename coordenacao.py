@@ -3,13 +3,25 @@
 #     @author: Guilherme N. Ramos (gnramos@unb.br)
 #
 # Funções úteis para coordenação.
+#
+# Quando a fonte das informações é um snapshot.Snapshot, as funções são
+# respondidas por consultas às suas tabelas indexadas, sem percorrer os
+# resultados das buscas.
+#
+# Cada função é um trecho rastreado (ver mwebcrawler.trecho): com o registro
+# estruturado habilitado, as buscas que ela dispara são registradas no seu
+# rastro.
 
-from mwebcrawler import (Campus, Cursos, Departamento, Disciplina,
-                         Habilitacoes, Nivel, Oferta)
+from mwebcrawler import (Campus, Departamento, Habilitacoes, Nivel, Oferta,
+                         configura_cache, configura_escalonador,
+                         configura_memoria, rastreado)
+import mwebcrawler
+import mwebindice
 
 
+@rastreado
 def alunos_matriculados(disciplina, depto=Departamento.CIC,
-                        nivel=Nivel.GRADUACAO, verbose=False):
+                        nivel=Nivel.GRADUACAO, verbose=False, fonte=None):
     '''Retorna o total de alunos matriculados em todas as turmas da disciplina
     do código dado.
 
@@ -21,13 +33,43 @@ def alunos_matriculados(disciplina, depto=Departamento.CIC,
              (default Departamento.CIC)
     verbose -- indicação dos procedimentos sendo adotados
                (default False)
+    fonte -- origem das informações: o Matrícula Web (None) ou um
+             snapshot.Snapshot
+             (default None)
     '''
-    disciplinas = Oferta.turmas(disciplina, depto, nivel, verbose)
+    fonte = fonte or mwebcrawler
+    if _indexada(fonte):
+        _confere_nivel(fonte, nivel)
+        return fonte.matriculados(disciplina)
+    return _total_matriculados(fonte.Oferta.oferta(disciplina, depto, nivel,
+                                                   verbose))
+
+
+def _indexada(fonte):
+    '''Indica se a fonte dada responde às consultas indexadas (ver
+    snapshot.Snapshot).'''
+    return getattr(fonte, 'indexado', False)
+
 
-    return sum([disciplinas[t]['Alunos Matriculados'] for t in disciplinas])
+def _confere_nivel(fonte, nivel):
+    '''Lança ValueError caso o snapshot.Snapshot dado seja de um nível
+    acadêmico diferente do dado (as tabelas indexadas têm apenas as
+    informações do nível capturado).'''
+    capturado = fonte.metadados().get('nivel')
+    if capturado is not None and capturado != nivel:
+        raise ValueError('Snapshot do nível %s, e não %s' % (capturado,
+                                                             nivel))
 
 
-def demanda_nao_atendida(disciplina, nivel=Nivel.GRADUACAO, verbose=False):
+def _total_matriculados(oferta):
+    '''Retorna o total de alunos matriculados nas turmas da oferta dada.'''
+    turmas = oferta.get('Turmas', {})
+    return sum([turmas[t]['Alunos Matriculados'] for t in turmas])
+
+
+@rastreado
+def demanda_nao_atendida(disciplina, nivel=Nivel.GRADUACAO, verbose=False,
+                         fonte=None):
     '''Retorna o total de alunos inscritos na lista de espera da disciplina do
     código dado. Considera todas as turmas.
 
@@ -37,12 +79,19 @@ def demanda_nao_atendida(disciplina, nivel=Nivel.GRADUACAO, verbose=False):
              (default Nivel.GRADUACAO)
     verbose -- indicação dos procedimentos sendo adotados
                (default False)
+    fonte -- origem das informações: o Matrícula Web (None) ou um
+             snapshot.Snapshot
+             (default None)
     '''
-    lista = Oferta.lista_de_espera(disciplina, nivel=nivel, verbose=verbose)
+    fonte = fonte or mwebcrawler
+    lista = fonte.Oferta.lista_de_espera(disciplina, nivel=nivel,
+                                         verbose=verbose)
     return sum(lista.values())
 
 
-def ocupacao(oferta, cursos, nivel=Nivel.GRADUACAO, verbose=False):
+@rastreado
+def ocupacao(oferta, cursos, nivel=Nivel.GRADUACAO, verbose=False,
+             fonte=None, indice=None):
     '''Retorna dois dicionários (obrigatórias e optativas) com o total de
     alunos inscritos em cada turma de cada disciplina ofertada por cada curso.
 
@@ -54,34 +103,71 @@ def ocupacao(oferta, cursos, nivel=Nivel.GRADUACAO, verbose=False):
              (default Nivel.GRADUACAO)
     verbose -- indicação dos procedimentos sendo adotados
                (default False)
+    fonte -- origem das informações: o Matrícula Web (None) ou um
+             snapshot.Snapshot
+             (default None)
+    indice -- mwebindice.IndiceDeCurriculos com os currículos dos cursos,
+              usado no lugar da busca dos currículos
+              (default None)
     '''
+    fonte = fonte or mwebcrawler
+    if indice is None and _indexada(fonte):
+        return _ocupacao_indexada(fonte, oferta, cursos, nivel)
+
     obr, opt = set(), set()
-    for codigo in cursos:
-        disciplinas = Cursos.curriculo(codigo, nivel, verbose)
-        if 'obrigatórias' in disciplinas:
-            obr.update(disciplinas['obrigatórias'])
-        if 'optativas' in disciplinas:
-            opt.update(disciplinas['optativas'])
+    if indice is not None:
+        obr, opt = _curriculos_do_indice(indice, oferta, cursos)
+    else:
+        for codigo, disciplinas in fonte.Cursos.curriculo_em_lote(
+                cursos, nivel, verbose):
+            if 'obrigatórias' in disciplinas:
+                obr.update(disciplinas['obrigatórias'])
+            if 'optativas' in disciplinas:
+                opt.update(disciplinas['optativas'])
     opt = opt.difference(obr)
 
     obrigatorias, optativas = {}, {}
-    for cod in obr:
-        if cod in oferta:
-            turmas = Oferta.turmas(cod)
-            for t in turmas:
-                key = cod + ' ' + t
-                obrigatorias[key] = turmas[t]['Alunos Matriculados']
-    for cod in opt:
+    ofertadas = [cod for cod in obr.union(opt) if cod in oferta]
+    for cod, dados in fonte.Oferta.oferta_em_lote(ofertadas, nivel=nivel,
+                                                  verbose=verbose):
+        ocupacao_turmas = obrigatorias if cod in obr else optativas
+        turmas = dados['Turmas']
+        for t in turmas:
+            key = cod + ' ' + t
+            ocupacao_turmas[key] = turmas[t]['Alunos Matriculados']
+    return obrigatorias, optativas
+
+
+def _curriculos_do_indice(indice, oferta, cursos):
+    '''Retorna os conjuntos das disciplinas da oferta que são obrigatórias e
+    optativas nos currículos dos cursos dados, segundo o índice dado.'''
+    cursos = set(str(curso) for curso in cursos)
+    obr, opt = set(), set()
+    for cod in oferta:
+        for papel in indice.papeis(cod):
+            if papel.habilitacao in cursos:
+                if papel.tipo == mwebindice.OBRIGATORIA:
+                    obr.add(cod)
+                elif papel.tipo == mwebindice.OPTATIVA:
+                    opt.add(cod)
+    return obr, opt
+
+
+def _ocupacao_indexada(fonte, oferta, cursos, nivel, quorum=0):
+    '''Ver ocupacao (e ocupacao_minima), a partir das tabelas indexadas da
+    fonte, que deve ser do nível dado.'''
+    _confere_nivel(fonte, nivel)
+    obrigatorias, optativas = {}, {}
+    for cod, t, alunos, obrigatoria in fonte.ocupacao(cursos, quorum):
         if cod in oferta:
-            turmas = Oferta.turmas(cod)
-            for t in turmas:
-                key = cod + ' ' + t
-                optativas[key] = turmas[t]['Alunos Matriculados']
+            ocupacao_turmas = obrigatorias if obrigatoria else optativas
+            ocupacao_turmas[cod + ' ' + t] = alunos
     return obrigatorias, optativas
 
 
+@rastreado
 def ocupacao_minima(oferta, cursos, quorum, nivel=Nivel.GRADUACAO,
-                    verbose=False):
+                    verbose=False, fonte=None, indice=None):
     '''Retorna dois dicionários (obrigatórias e optativas) com o total de
     alunos inscritos em cada turma de cada disciplina ofertada cuja quantidade
     de alunos seja igual ou superior ao limite dado.
@@ -95,8 +181,17 @@ def ocupacao_minima(oferta, cursos, quorum, nivel=Nivel.GRADUACAO,
              (default Nivel.GRADUACAO)
     verbose -- indicação dos procedimentos sendo adotados
                (default False)
+    fonte -- origem das informações: o Matrícula Web (None) ou um
+             snapshot.Snapshot
+             (default None)
+    indice -- mwebindice.IndiceDeCurriculos com os currículos dos cursos,
+              usado no lugar da busca dos currículos
+              (default None)
     '''
-    obr, opt = ocupacao(oferta, cursos, nivel, verbose)
+    if indice is None and _indexada(fonte):
+        return _ocupacao_indexada(fonte, oferta, cursos, nivel, quorum)
+
+    obr, opt = ocupacao(oferta, cursos, nivel, verbose, fonte, indice)
 
     obrigatorias = {k: v for k, v in obr.items() if v >= quorum}
     optativas = {k: v for k, v in opt.items() if v >= quorum}
@@ -104,8 +199,10 @@ def ocupacao_minima(oferta, cursos, quorum, nivel=Nivel.GRADUACAO,
     return obrigatorias, optativas
 
 
+@rastreado
 def lista_obrigatorias(habilitacoes, deptos, nivel=Nivel.GRADUACAO,
-                       campus=Campus.DARCY_RIBEIRO, verbose=False):
+                       campus=Campus.DARCY_RIBEIRO, verbose=False,
+                       fonte=None):
     '''Retorna, para cada curso dado, um dicionário contendo as disciplinas
     consideradas obrigatórias: as listadas como tal no currículo e as listadas
     como cadeias/ciclos).
@@ -121,17 +218,30 @@ def lista_obrigatorias(habilitacoes, deptos, nivel=Nivel.GRADUACAO,
               (default Campus.DARCY_RIBEIRO)
     verbose -- indicação dos procedimentos sendo adotados
                (default False)
+    fonte -- origem das informações: o Matrícula Web (None) ou um
+             snapshot.Snapshot
+             (default None)
     '''
+    fonte = fonte or mwebcrawler
     lista = {}
+    if _indexada(fonte):
+        _confere_nivel(fonte, nivel)
+        for opcao in habilitacoes:
+            lista[opcao] = {}
+            for disciplina, depto, denominacao in fonte.obrigatorias(opcao,
+                                                                     deptos):
+                lista[opcao].setdefault(depto, {})[disciplina] = denominacao
+        return lista
+
     for opcao in habilitacoes:
         lista[opcao] = {}
-        curriculo = Cursos.curriculo(opcao, nivel, verbose)
+        curriculo = fonte.Cursos.curriculo(opcao, nivel, verbose)
         obrigatorias = curriculo.get('obrigatórias')
         for ciclo in curriculo.get('cadeias'):
             for item in curriculo['cadeias'][ciclo]:
                 obrigatorias.update(item)
-        for disciplina in obrigatorias:
-            infos = Disciplina.informacoes(disciplina, nivel, verbose)
+        for disciplina, infos in fonte.Disciplina.informacoes_em_lote(
+                obrigatorias, nivel, verbose):
             depto = infos.get('Sigla do Departamento')
             if depto in deptos:
                 if depto not in lista[opcao]:
@@ -142,7 +252,8 @@ def lista_obrigatorias(habilitacoes, deptos, nivel=Nivel.GRADUACAO,
 
 
 
-def turmas_reservadas_no_fluxo(habilitacao, filtro_reserva=''):
+@rastreado
+def turmas_reservadas_no_fluxo(habilitacao, filtro_reserva='', fonte=None):
     '''Mostra a lista de turmas com reserva de vagas das disciplinas do fluxo
     da habilitação dada.
 
@@ -150,13 +261,28 @@ def turmas_reservadas_no_fluxo(habilitacao, filtro_reserva=''):
     habilitacao -- código da habilitação com disciplinas da oferta
     filtro_reserva -- filtro para reduzir o escopo da busca
                       (default '')
+    fonte -- origem das informações: o Matrícula Web (None) ou um
+             snapshot.Snapshot
+             (default None)
     '''
-    fluxo = Cursos.fluxo(habilitacao)
+    fonte = fonte or mwebcrawler
+    if _indexada(fonte):
+        reservas = fonte.reservas_no_fluxo(habilitacao, filtro_reserva)
+        for periodo in fonte.periodos(habilitacao):
+            print('Período: %d' % periodo)
+            for p, disciplina, turma, reserva, vagas, calouros in reservas:
+                if p == periodo:
+                    print('\t  %s (%s) %s %s' % (disciplina, turma, reserva,
+                                                 {'Vagas': vagas,
+                                                  'Calouros': calouros}))
+        return
+
+    fluxo = fonte.Cursos.fluxo(habilitacao)
 
     for periodo in sorted(fluxo.keys()):
         print('Período: %d' % periodo)
         for disciplina in fluxo[periodo]['Disciplinas']:
-            turmas = Oferta.turmas(disciplina).items()
+            turmas = fonte.Oferta.oferta(disciplina)['Turmas'].items()
             for turma, detalhes in turmas:
                 if 'Turma Reservada' in detalhes:
                     for reserva, vagas in detalhes['Turma Reservada'].items():
@@ -166,6 +292,10 @@ def turmas_reservadas_no_fluxo(habilitacao, filtro_reserva=''):
 
 
 if __name__ == '__main__':
+    configura_cache()
+    configura_escalonador()
+    configura_memoria()
+
     nivel = Nivel.GRADUACAO
     verbose = False
     depto = str(Departamento.CIC)
@@ -174,19 +304,21 @@ if __name__ == '__main__':
 
     oferta = Oferta.disciplinas(depto, nivel, verbose)
 
-    print '\nAlunos matriculados no Departamento %s:' % depto
+    print('\nAlunos matriculados no Departamento %s:' % depto)
+    matriculados = {codigo: _total_matriculados(dados) for codigo, dados
+                    in Oferta.oferta_em_lote(oferta, depto, nivel, verbose)}
     for codigo in sorted(oferta, key=oferta.get):
-        alunos = alunos_matriculados(codigo, depto, nivel, verbose)
+        alunos = matriculados[codigo]
         if alunos > 0:
-            print '%s %s (%d alunos)' % (codigo, oferta[codigo], alunos)
+            print('%s %s (%d alunos)' % (codigo, oferta[codigo], alunos))
 
-    print '\nDemanda não atendida:'
+    print('\nDemanda não atendida:')
     for codigo in sorted(oferta, key=oferta.get):
         demanda = demanda_nao_atendida(codigo, nivel, verbose)
         if demanda > 0:
-            print '%s %s (%d alunos)' % (codigo, oferta[codigo], demanda)
+            print('%s %s (%d alunos)' % (codigo, oferta[codigo], demanda))
 
-    print '\nOcupação de turmas:'
+    print('\nOcupação de turmas:')
     habilitacoes = [Habilitacoes.BCC, Habilitacoes.LIC, Habilitacoes.ENC,
                     Habilitacoes.ENM]
     obr, opt = ocupacao_minima(oferta, habilitacoes, 1, nivel, verbose)
@@ -205,4 +337,4 @@ if __name__ == '__main__':
     campus = Campus.DARCY_RIBEIRO
     lista = lista_obrigatorias([Habilitacoes.ENM], deptos, nivel, campus,
                                verbose)
-    print lista
+    print(lista)
@@ -0,0 +1,184 @@
+#  -*- coding: utf-8 -*-
+#    @package: mwebanalise.py
+#
+# Análise vetorizada (numpy) da ocupação das turmas ofertadas. As turmas são
+# carregadas uma única vez em arrays colunares (disciplina, turma,
+# departamento, vagas, alunos matriculados e lista de espera), sobre os quais
+# taxas de ocupação, filtros por quórum e totais por disciplina e por
+# departamento são calculados sem laços em Python, de forma que a análise de
+# um campus inteiro leva alguns milissegundos. Por exemplo:
+#
+#     turmas = Turmas.de_snapshot(Snapshot('snapshot-....sqlite'))
+#     turmas.com_quorum(10).por_departamento()
+#
+# Requer numpy.
+
+from mwebcrawler import Nivel, _em_lote
+import mwebcrawler
+import numpy
+
+
+class Turmas:
+    '''Turmas ofertadas, em arrays colunares de mesmo tamanho (uma posição
+    por turma):
+
+    disciplina -- código da disciplina
+    turma -- nome da turma
+    departamento -- sigla do departamento que oferece a disciplina
+    vagas -- total de vagas
+    matriculados -- total de alunos matriculados (vagas ocupadas)
+    espera -- total de vagas solicitadas na lista de espera
+    '''
+
+    def __init__(self, disciplina, turma, departamento, vagas, matriculados,
+                 espera=None):
+        self.disciplina = numpy.asarray(disciplina, dtype=str)
+        self.turma = numpy.asarray(turma, dtype=str)
+        self.departamento = numpy.asarray(departamento, dtype=str)
+        self.vagas = numpy.asarray(vagas, dtype=numpy.int64)
+        self.matriculados = numpy.asarray(matriculados, dtype=numpy.int64)
+        if espera is None:
+            espera = numpy.zeros(len(self.vagas), dtype=numpy.int64)
+        self.espera = numpy.asarray(espera, dtype=numpy.int64)
+
+    def __len__(self):
+        return len(self.vagas)
+
+    @staticmethod
+    def de_ofertas(ofertas, listas_de_espera=None):
+        '''Retorna as Turmas das ofertas dadas.
+
+        Argumentos:
+        ofertas -- coleção de pares (disciplina, oferta), por exemplo os
+                   gerados por Oferta.oferta_em_lote
+        listas_de_espera -- dicionário com a lista de espera (ver
+                            Oferta.lista_de_espera) de cada disciplina;
+                            turmas da lista de espera que não são ofertadas
+                            são desconsideradas
+                            (default None)
+        '''
+        listas_de_espera = listas_de_espera or {}
+        colunas = ([], [], [], [], [], [])
+        for disciplina, oferta in ofertas:
+            departamento = oferta.get('Departamento', '').split(' - ')[0]
+            espera = listas_de_espera.get(disciplina, {})
+            for turma, dados in oferta.get('Turmas', {}).items():
+                for coluna, valor in zip(colunas, (
+                        disciplina, turma, departamento, dados['Vagas'],
+                        dados['Alunos Matriculados'], espera.get(turma, 0))):
+                    coluna.append(valor)
+        return Turmas(*colunas)
+
+    @staticmethod
+    def de_snapshot(snapshot):
+        '''Retorna as Turmas guardadas no snapshot.Snapshot dado (ver as
+        tabelas turmas, ofertas e esperas), com as listas de espera.'''
+        linhas = snapshot.turmas_detalhadas()
+        if not linhas:
+            return Turmas([], [], [], [], [], [])
+        return Turmas(*zip(*linhas))
+
+    @staticmethod
+    def busca(disciplinas, depto=None, nivel=Nivel.GRADUACAO,
+              trabalhadores=8, fonte=None):
+        '''Busca (concorrentemente) as ofertas e listas de espera das
+        disciplinas dadas e retorna as Turmas resultantes.
+
+        Argumentos:
+        disciplinas -- coleção de códigos de disciplinas
+        depto -- o código do departamento que oferece as disciplinas
+                 (default None)
+        nivel -- nível acadêmico das disciplinas
+                 (default Nivel.GRADUACAO)
+        trabalhadores -- quantidade máxima de buscas simultâneas
+                         (default 8)
+        fonte -- origem das informações: o Matrícula Web (None) ou um
+                 snapshot.Snapshot
+                 (default None)
+        '''
+        fonte = fonte or mwebcrawler
+        ofertas = dict(fonte.Oferta.oferta_em_lote(
+            disciplinas, depto, nivel, trabalhadores=trabalhadores))
+        listas = dict(_em_lote(lambda disciplina: fonte.Oferta.lista_de_espera(
+            disciplina, nivel=nivel), ofertas, trabalhadores))
+        return Turmas.de_ofertas(sorted(ofertas.items()), listas)
+
+    def filtra(self, mascara):
+        '''Retorna as Turmas selecionadas pela máscara (array de booleanos)
+        dada.'''
+        return Turmas(self.disciplina[mascara], self.turma[mascara],
+                      self.departamento[mascara], self.vagas[mascara],
+                      self.matriculados[mascara], self.espera[mascara])
+
+    def das_disciplinas(self, disciplinas):
+        '''Retorna as Turmas das disciplinas de códigos dados.'''
+        return self.filtra(numpy.isin(self.disciplina,
+                                      [str(d) for d in disciplinas]))
+
+    def do_departamento(self, sigla):
+        '''Retorna as Turmas das disciplinas do departamento de sigla
+        dada.'''
+        return self.filtra(self.departamento == sigla)
+
+    def com_quorum(self, quorum):
+        '''Retorna as Turmas com ao menos a quantidade de alunos
+        matriculados dada.'''
+        return self.filtra(self.matriculados >= quorum)
+
+    def ocupacao(self):
+        '''Retorna o array da taxa de ocupação (alunos matriculados / vagas)
+        de cada turma; turmas sem vagas têm taxa 0.'''
+        taxa = numpy.zeros(len(self), dtype=float)
+        numpy.divide(self.matriculados, self.vagas, out=taxa,
+                     where=self.vagas > 0)
+        return taxa
+
+    def demanda_nao_atendida(self):
+        '''Retorna um dicionário com o total de vagas solicitadas na lista de
+        espera de cada disciplina que tenha lista de espera (ver
+        coordenacao.demanda_nao_atendida).'''
+        turmas = self.filtra(self.espera > 0)
+        return {disciplina: totais['Lista de Espera'] for disciplina, totais
+                in turmas.por_disciplina().items()}
+
+    def chaves(self):
+        '''Retorna o array das chaves 'disciplina turma' (ver
+        coordenacao.ocupacao).'''
+        return numpy.char.add(numpy.char.add(self.disciplina, ' '),
+                              self.turma)
+
+    def para_dicionario(self):
+        '''Retorna um dicionário com o total de alunos matriculados em cada
+        turma, indexado pela chave 'disciplina turma' (ver
+        coordenacao.ocupacao).'''
+        return dict(zip(self.chaves().tolist(), self.matriculados.tolist()))
+
+    def _totais(self, grupos, colunas):
+        '''Retorna um dicionário com a soma das colunas dadas (nome: array)
+        para cada valor do array de grupos dado.'''
+        if not len(self):
+            return {}
+        valores, indices = numpy.unique(grupos, return_inverse=True)
+        somas = {nome: numpy.bincount(indices, weights=coluna,
+                                      minlength=len(valores)).astype(int)
+                 for nome, coluna in colunas.items()}
+        return {valor: {nome: int(somas[nome][i]) for nome in somas}
+                for i, valor in enumerate(valores.tolist())}
+
+    def por_disciplina(self):
+        '''Retorna um dicionário com os totais de turmas, vagas, alunos
+        matriculados e vagas solicitadas na lista de espera de cada
+        disciplina (ver coordenacao.alunos_matriculados e
+        coordenacao.demanda_nao_atendida).'''
+        return self._totais(self.disciplina, self._colunas())
+
+    def por_departamento(self):
+        '''Retorna um dicionário com os totais de turmas, vagas, alunos
+        matriculados e vagas solicitadas na lista de espera de cada
+        departamento (por sigla).'''
+        return self._totais(self.departamento, self._colunas())
+
+    def _colunas(self):
+        return {'Turmas': numpy.ones(len(self)), 'Vagas': self.vagas,
+                'Alunos Matriculados': self.matriculados,
+                'Lista de Espera': self.espera}
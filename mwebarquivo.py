@@ -0,0 +1,267 @@
+#  -*- coding: utf-8 -*-
+#    @package: mwebarquivo.py
+#
+# Arquivo das páginas brutas obtidas do Matrícula Web, para reprodução e
+# reanálise sem acesso à rede (por exemplo, quando a estrutura das páginas
+# muda e os analisadores precisam ser atualizados). Para arquivar todas as
+# páginas obtidas por mwebcrawler.mweb():
+#
+#     configura_arquivo('semestre.mwa')
+#
+# e, depois, para reanalisá-las (em 4 processos):
+#
+#     with Arquivo('semestre.mwa') as arquivo:
+#         for nivel, pagina, params, resultado in arquivo.reanalisa(
+#                 processos=4):
+#             ...
+#
+# ou para responder às buscas de mwebcrawler a partir do arquivo:
+#
+#     configura_sessao(SessaoDoArquivo(Arquivo('semestre.mwa')))
+#
+# O arquivo é só de acréscimo: cada página é um registro com um cabeçalho de
+# tamanho fixo (ver REGISTRO), a identificação da página em JSON e o conteúdo
+# comprimido com zlib. Uma página obtida novamente é acrescentada ao final, e
+# prevalece a versão mais recente. O índice (página -> posição) é montado na
+# abertura, percorrendo apenas os cabeçalhos; um registro incompleto ao final
+# (por exemplo, de uma gravação interrompida) é descartado. A leitura é feita
+# sobre o arquivo mapeado em memória (mmap), sem cópias além da
+# descompressão.
+
+
+from mwebcrawler import (MWEB, Cache, _analisador_de, _em_fluxo,
+                         _nome_do_analisador)
+from mwebgravacao import Resposta
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+# Cabeçalho de cada registro: marca, tamanho da identificação (JSON) e
+# tamanho e CRC-32 do conteúdo comprimido.
+MARCA = b'MWA1'
+REGISTRO = struct.Struct('<4sIII')
+
+
+class Arquivo:
+    '''Arquivo (só de acréscimo, comprimido e indexado) das páginas brutas
+    do Matrícula Web.'''
+
+    def __init__(self, caminho, compressao=6):
+        '''Abre (ou cria) o arquivo dado.
+
+        Argumentos:
+        caminho -- caminho do arquivo
+        compressao -- nível de compressão (zlib) das páginas acrescentadas,
+                      de 1 (mais rápido) a 9 (menor)
+                      (default 6)
+        '''
+        diretorio = os.path.dirname(caminho)
+        if diretorio and not os.path.isdir(diretorio):
+            os.makedirs(diretorio)
+
+        self.caminho = caminho
+        self.compressao = compressao
+        self._trava = threading.Lock()
+        self._indice = {}
+        self._mapa = None
+        self._arquivo = open(caminho, 'a+b')
+        self._fim = self._indexa()
+        if self._fim < os.path.getsize(caminho):
+            self._arquivo.truncate(self._fim)
+            self._mapeia()
+
+    def _indexa(self):
+        '''Monta o índice das páginas e retorna a posição do fim do último
+        registro completo.'''
+        mapa = self._mapeia()
+        if mapa is None:
+            return 0
+
+        visao, posicao = memoryview(mapa), 0
+        try:
+            while posicao + REGISTRO.size <= len(mapa):
+                marca, identificacao, dados, crc = REGISTRO.unpack_from(
+                    mapa, posicao)
+                inicio = posicao + REGISTRO.size + identificacao
+                if marca != MARCA or inicio + dados > len(mapa) or \
+                        zlib.crc32(visao[inicio:inicio + dados]) & \
+                        0xffffffff != crc:
+                    break
+                nivel, pagina, params, _ = json.loads(
+                    mapa[posicao + REGISTRO.size:inicio].decode('utf-8'))
+                self._indice[Cache.chave(nivel, pagina, params)] = (
+                    nivel, pagina, params, inicio, dados)
+                posicao = inicio + dados
+        finally:
+            visao.release()
+        return posicao
+
+    def _mapeia(self):
+        '''Retorna o arquivo mapeado em memória (ou None, caso esteja vazio),
+        mapeando-o novamente caso seu tamanho tenha mudado.'''
+        tamanho = os.fstat(self._arquivo.fileno()).st_size
+        if len(self._mapa or b'') != tamanho:
+            if self._mapa is not None:
+                self._mapa.close()
+            self._mapa = mmap.mmap(self._arquivo.fileno(), 0,
+                                   access=mmap.ACCESS_READ) if tamanho \
+                else None
+        return self._mapa
+
+    def guarda(self, nivel, pagina, params, conteudo, obtida=None):
+        '''Acrescenta a página dada ao arquivo.
+
+        Argumentos:
+        nivel -- nível acadêmico da página
+        pagina -- o tipo de página, por exemplo 'oferta_dados'
+        params -- parâmetros da requisição da página
+        conteudo -- conteúdo (bytes) da página
+        obtida -- momento em que a página foi obtida
+                  (default None) (o atual)
+        '''
+        params = {chave: str(valor) for chave, valor in params.items()}
+        identificacao = json.dumps([nivel, pagina, params,
+                                    obtida or time.time()],
+                                   sort_keys=True).encode('utf-8')
+        dados = zlib.compress(conteudo, self.compressao)
+        registro = REGISTRO.pack(MARCA, len(identificacao), len(dados),
+                                 zlib.crc32(dados) & 0xffffffff)
+        with self._trava:
+            self._arquivo.write(registro + identificacao + dados)
+            self._arquivo.flush()
+            inicio = self._fim + len(registro) + len(identificacao)
+            self._indice[Cache.chave(nivel, pagina, params)] = (
+                nivel, pagina, params, inicio, len(dados))
+            self._fim = inicio + len(dados)
+
+    def busca(self, nivel, pagina, params):
+        '''Retorna o conteúdo (bytes) da versão mais recente da página dada,
+        ou None caso ela não esteja no arquivo.'''
+        with self._trava:
+            indexada = self._indice.get(Cache.chave(nivel, pagina, params))
+            if indexada is None:
+                return None
+            return _descomprime(self._mapeia(), *indexada[3:])
+
+    def paginas(self, pagina=None):
+        '''Retorna a lista das triplas (nível, página, params) das páginas
+        arquivadas, na ordem do arquivo, opcionalmente apenas as do tipo de
+        página dado.'''
+        with self._trava:
+            indexadas = sorted(self._indice.values(),
+                               key=lambda indexada: indexada[3])
+        return [(nivel, tipo, params) for nivel, tipo, params, _, _
+                in indexadas if pagina is None or tipo == pagina]
+
+    def reanalisa(self, pagina=None, analisador=None, processos=0,
+                  pendentes=None):
+        '''Gera as quádruplas (nível, página, params, resultado) da análise
+        de cada página arquivada (ver mwebcrawler.ANALISADORES), sem acesso
+        à rede.
+
+        Argumentos:
+        pagina -- o tipo de página reanalisada, por exemplo 'oferta_dados'
+                  (default None) (todas)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
+        processos -- quantidade de processos de análise; caso seja 0, as
+                     páginas são analisadas em ordem, no próprio processo
+                     (default 0)
+        pendentes -- quantidade máxima de páginas pendentes de análise
+                     (default None) (o dobro de processos)
+        '''
+        analisador = _analisador_de(analisador)
+        with self._trava:
+            indexadas = sorted((indexada for indexada
+                                in self._indice.values()
+                                if pagina is None or indexada[1] == pagina),
+                               key=lambda indexada: indexada[3])
+        if processos:
+            nome = _nome_do_analisador(analisador)
+            tarefas = ((self.caminho, nome) + indexada
+                       for indexada in indexadas)
+            for resultado in _em_fluxo(_reanalisa, tarefas, processos,
+                                       pendentes, True):
+                yield resultado
+            return
+
+        for nivel, tipo, params, inicio, tamanho in indexadas:
+            with self._trava:
+                conteudo = _descomprime(self._mapeia(), inicio, tamanho)
+            yield nivel, tipo, params, getattr(analisador, tipo)(conteudo)
+
+    def tamanho(self):
+        '''Retorna o tamanho (em bytes) do arquivo.'''
+        return self._fim
+
+    def __len__(self):
+        return len(self._indice)
+
+    def fecha(self):
+        '''Fecha o arquivo.'''
+        with self._trava:
+            if self._mapa is not None:
+                self._mapa.close()
+                self._mapa = None
+            self._arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fecha()
+
+
+def _descomprime(mapa, inicio, tamanho):
+    '''Retorna o conteúdo descomprimido do registro na posição dada do
+    arquivo mapeado em memória.'''
+    dados = memoryview(mapa)[inicio:inicio + tamanho]
+    try:
+        return zlib.decompress(dados)
+    finally:
+        dados.release()
+
+
+# Arquivos mapeados em memória pelos processos de reanálise, por caminho.
+_mapas = {}
+
+
+def _reanalisa(tarefa):
+    '''Analisa, em um dos processos de Arquivo.reanalisa, uma página
+    arquivada, lendo-a do arquivo mapeado em memória (uma única vez por
+    processo).'''
+    caminho, nome, nivel, pagina, params, inicio, tamanho = tarefa
+    mapa = _mapas.get(caminho)
+    if mapa is None or len(mapa) < inicio + tamanho:
+        with open(caminho, 'rb') as arquivo:
+            mapa = _mapas[caminho] = mmap.mmap(arquivo.fileno(), 0,
+                                               access=mmap.ACCESS_READ)
+    resultado = getattr(_analisador_de(nome), pagina)(
+        _descomprime(mapa, inicio, tamanho))
+    return nivel, pagina, params, resultado
+
+
+class SessaoDoArquivo:
+    '''Sessão HTTP (compatível com mwebcrawler.configura_sessao) que responde
+    às requisições com as páginas de um Arquivo, sem acessar a rede.
+    Requisições por páginas não arquivadas recebem uma resposta vazia (404).
+    '''
+
+    def __init__(self, arquivo):
+        '''Argumentos:
+        arquivo -- o Arquivo das páginas
+        '''
+        self.arquivo = arquivo
+        self._prefixo = MWEB.split('%s')[0]
+
+    def get(self, url, params=None, timeout=None, headers=None):
+        nivel, pagina = url[len(self._prefixo):].split('/', 1)
+        conteudo = self.arquivo.busca(nivel, pagina.split('.')[0],
+                                      params or {})
+        if conteudo is None:
+            return Resposta(status=404)
+        return Resposta(conteudo)
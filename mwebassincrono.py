@@ -0,0 +1,399 @@
+#  -*- coding: utf-8 -*-
+#    @package: mwebassincrono.py
+#
+# Versão assíncrona (asyncio) das buscas do MWebCrawler. As páginas são obtidas
+# concorrentemente (com aiohttp), respeitando um limite global de requisições
+# simultâneas, um limite por servidor e o escalonador habilitado (ver
+# mwebcrawler.Escalonador), e analisadas (fora do laço de eventos) pelos
+# mesmos analisadores de mwebcrawler (ver ANALISADORES), de forma que os
+# resultados são idênticos aos da API síncrona (que continua disponível em
+# mwebcrawler.Cursos, Disciplina e Oferta). Buscas simultâneas iguais,
+# inclusive entre as APIs síncrona e assíncrona, são feitas uma única vez (ver
+# mwebcrawler.Agrupador).
+#
+# Requer Python 3 e aiohttp.
+
+
+from collections import namedtuple
+import aiohttp
+import asyncio
+import contextlib
+import time
+
+import mwebcrawler
+from mwebcrawler import (Campus, Nivel, _analisador_de, _chave_da_busca,
+                         _copia, log)
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:  # Python 2
+    from urlparse import urlsplit
+
+
+# Exceções de requisições sem resposta.
+_ERROS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+# Intervalo (em segundos) entre as verificações do limite de requisições
+# simultâneas do escalonador.
+_INTERVALO = .01
+
+# Resposta HTTP, com os campos usados por mwebcrawler.Escalonador.
+_Resposta = namedtuple('_Resposta', 'status_code headers content')
+
+
+async def _escalona(escalonador, requisicao):
+    '''Versão assíncrona de mwebcrawler.Escalonador.executa: executa a
+    requisição dada (uma função que retorna um awaitable com a _Resposta)
+    respeitando os limites do escalonador dado, sem bloquear o laço de eventos
+    nas esperas, e retorna sua resposta (ou None, caso não haja).'''
+    resposta = None
+    for tentativa in range(escalonador.tentativas):
+        permite, teste = escalonador._circuito_permite()
+        if not permite:
+            escalonador._conta('rejeitadas')
+            return resposta
+
+        try:
+            espera = escalonador._ficha()
+            while espera:
+                await asyncio.sleep(espera)
+                espera = escalonador._ficha()
+            while not escalonador._tenta_iniciar():
+                await asyncio.sleep(_INTERVALO)
+        except BaseException:
+            escalonador._desiste(teste)
+            raise
+
+        inicio = time.time()
+        try:
+            resposta = await requisicao()
+        except _ERROS:
+            resposta = None
+        except BaseException:
+            escalonador._registra(True, time.time() - inicio, teste)
+            raise
+        finally:
+            escalonador._termina()
+
+        falhou = resposta is None or \
+            resposta.status_code in escalonador.TRANSITORIOS
+        escalonador._registra(falhou, time.time() - inicio, teste)
+        if not falhou or tentativa + 1 == escalonador.tentativas:
+            break
+
+        escalonador._conta('repeticoes')
+        await asyncio.sleep(escalonador._espera(tentativa, resposta))
+
+    return resposta
+
+
+@contextlib.contextmanager
+def _trecho(nome, **atributos):
+    '''Como mwebcrawler.trecho, mas o trecho não se torna o atual da thread
+    enquanto dura, já que a thread do laço de eventos é compartilhada pelas
+    corrotinas. Os trechos das corrotinas fazem parte do trecho atual quando
+    o laço foi iniciado.'''
+    anterior = getattr(mwebcrawler._contexto, 'trecho', None)
+    with mwebcrawler.trecho(nome, **atributos) as atual:
+        mwebcrawler._contexto.trecho = anterior
+        yield atual
+
+
+async def _agrupa(chave, funcao):
+    '''Retorna o resultado de await funcao(), ou o de uma busca simultânea
+    (síncrona ou assíncrona) pela mesma chave (ver mwebcrawler.Agrupador).'''
+    agrupador = mwebcrawler._agrupador
+    futuro, executa = agrupador._entra(chave)
+    if not executa:
+        return _copia(await asyncio.wrap_future(futuro))
+
+    try:
+        resultado = await funcao()
+    except BaseException as erro:
+        agrupador._sai(chave, futuro, erro=erro)
+        raise
+    agrupador._sai(chave, futuro, resultado)
+    return resultado
+
+
+class CrawlerAssincrono:
+    '''Métodos de busca assíncronos de informações do Matrícula Web.
+
+    Deve ser usado como gerenciador de contexto assíncrono, por exemplo:
+
+        async with CrawlerAssincrono(concorrencia=20) as crawler:
+            turmas = await crawler.oferta_do_departamento(116)
+    '''
+
+    def __init__(self, concorrencia=20, por_host=8, timeout=10, sessao=None,
+                 analisador=None):
+        '''Argumentos:
+        concorrencia -- quantidade máxima de requisições simultâneas
+                        (default 20)
+        por_host -- quantidade máxima de requisições simultâneas a um mesmo
+                    servidor
+                    (default 8)
+        timeout -- tempo máximo (em segundos) de espera por uma página
+                   (default 10)
+        sessao -- sessão (aiohttp.ClientSession) a ser usada; caso não seja
+                  dada, uma nova é criada (e fechada ao final)
+                  (default None)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
+        '''
+        self.concorrencia = concorrencia
+        self.por_host = por_host
+        self.timeout = timeout
+        self._sessao = sessao
+        self._sessao_propria = sessao is None
+        self._limite = asyncio.Semaphore(concorrencia)
+        self._hosts = {}
+        self._analisador = _analisador_de(analisador)
+
+    async def __aenter__(self):
+        if self._sessao is None:
+            conector = aiohttp.TCPConnector(limit=self.concorrencia,
+                                            limit_per_host=self.por_host)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            self._sessao = aiohttp.ClientSession(connector=conector,
+                                                 timeout=timeout)
+        return self
+
+    async def __aexit__(self, *args):
+        if self._sessao_propria and self._sessao is not None:
+            await self._sessao.close()
+            self._sessao = None
+
+    async def mweb(self, nivel, pagina, params):
+        '''Retorna a página no Matrícula Web referente às especificações dadas
+        (ver mwebcrawler.mweb).'''
+        return await _agrupa(_chave_da_busca(nivel, pagina, params, 'mweb'),
+                             lambda: self._mweb(nivel, pagina, params))
+
+    async def _busca(self, nivel, pagina, params, *argumentos):
+        '''Busca a página dada e retorna o resultado da sua análise, com os
+        argumentos dados (ver mwebcrawler._busca).'''
+        analisador = self._analisador
+        chave = _chave_da_busca(nivel, pagina, params, analisador.__name__,
+                                *argumentos)
+        memoria, metricas = mwebcrawler._memoria, mwebcrawler._metricas
+        if memoria is not None:
+            guardado = memoria.busca(chave)
+            if metricas is not None:
+                metricas.conta('memoria_acertos' if guardado else
+                               'memoria_faltas', pagina)
+            if guardado:
+                return guardado[0]
+
+        async def busca():
+            pagina_html = await self.mweb(nivel, pagina, params)
+            # A análise é feita fora do laço, que não para enquanto isso.
+            resultado = await asyncio.get_running_loop().run_in_executor(
+                None, mwebcrawler._no_trecho(mwebcrawler._analisa),
+                analisador, pagina, pagina_html, argumentos, metricas)
+            if memoria is not None and pagina_html:
+                memoria.guarda(chave, resultado)
+            return resultado
+
+        return await _agrupa(chave, busca)
+
+    async def _mweb(self, nivel, pagina, params):
+        '''Ver mweb().'''
+        with _trecho('mweb', pagina=pagina, cod=params.get('cod')) as atual:
+            cache = mwebcrawler._cache
+            guardada, cabecalhos = mwebcrawler._consulta_cache(
+                cache, nivel, pagina, params)
+            metricas = mwebcrawler._metricas
+            if metricas is not None and cache:
+                metricas.conta('cache_faltas' if not guardada else
+                               'cache_expiradas' if guardada[1] else
+                               'cache_acertos', pagina)
+            if guardada and not guardada[1]:
+                atual.define(origem='cache')
+                return guardada[0]
+
+            html = await self._requisita(nivel, pagina, params, cabecalhos)
+            if html is not None:
+                atual.define(origem='rede', status=html.status_code,
+                             bytes=len(html.content or b''))
+                mwebcrawler._arquiva(nivel, pagina, params, html.status_code,
+                                     html.content)
+                return mwebcrawler._atualiza_cache(
+                    cache, nivel, pagina, params, guardada, html.status_code,
+                    html.content, html.headers)
+
+            # Na falta de resposta, uma página expirada é melhor que nenhuma.
+            atual.define(origem='cache' if guardada else None, erro=True)
+            return guardada[0] if guardada else ''
+
+    async def _requisita(self, nivel, pagina, params, cabecalhos=None):
+        '''Requisita a página dada ao Matrícula Web, sem passar pelo cache, e
+        retorna a _Resposta (ou None, caso não haja resposta). Caso haja um
+        escalonador habilitado, a requisição é feita por meio dele (ver
+        mwebcrawler._requisita).'''
+        url = mwebcrawler.MWEB % (nivel, pagina)
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.por_host)
+        params = {chave: str(valor) for chave, valor in params.items()}
+        metricas = mwebcrawler._metricas
+
+        async def requisicao():
+            async with self._limite, self._hosts[host]:
+                inicio = time.time()
+                try:
+                    async with self._sessao.get(url, params=params,
+                                                headers=cabecalhos) as html:
+                        resposta = _Resposta(html.status, html.headers,
+                                             await html.read())
+                except _ERROS:
+                    if metricas is not None:
+                        metricas.conta('erros', pagina)
+                    raise
+            if metricas is not None:
+                mwebcrawler._mede_resposta(metricas, pagina,
+                                           time.time() - inicio,
+                                           resposta.status_code,
+                                           resposta.content)
+            return resposta
+
+        escalonador = mwebcrawler._escalonador
+        if escalonador is not None:
+            return await _escalona(escalonador, requisicao)
+
+        try:
+            return await requisicao()
+        except _ERROS:
+            return None
+
+    async def curriculo(self, curso, nivel=Nivel.GRADUACAO, verbose=False):
+        '''Ver mwebcrawler.Cursos.curriculo.'''
+        curso = str(curso)
+        if verbose:
+            log('Buscando currículo do curso ' + curso)
+
+        return await self._busca(nivel, 'curriculo', {'cod': curso})
+
+    async def fluxo(self, habilitacao, nivel=Nivel.GRADUACAO, verbose=False):
+        '''Ver mwebcrawler.Cursos.fluxo.'''
+        habilitacao = str(habilitacao)
+        if verbose:
+            log('Buscando disciplinas no fluxo da habilitação ' +
+                habilitacao)
+
+        return await self._busca(nivel, 'fluxo', {'cod': habilitacao})
+
+    async def habilitacoes(self, curso, nivel=Nivel.GRADUACAO,
+                           campus=Campus.DARCY_RIBEIRO, verbose=False):
+        '''Ver mwebcrawler.Cursos.habilitacoes.'''
+        curso = str(curso)
+        if verbose:
+            log('Buscando informações da habilitação do curso ' + curso)
+
+        return await self._busca(nivel, 'curso_dados', {'cod': curso})
+
+    async def relacao(self, nivel=Nivel.GRADUACAO,
+                      campus=Campus.DARCY_RIBEIRO, verbose=False):
+        '''Ver mwebcrawler.Cursos.relacao.'''
+        campus = str(campus)
+        if verbose:
+            log('Buscando lista de cursos para o campus ' + campus)
+
+        return await self._busca(nivel, 'curso_rel', {'cod': campus})
+
+    async def informacoes(self, disciplina, nivel=Nivel.GRADUACAO,
+                          verbose=False):
+        '''Ver mwebcrawler.Disciplina.informacoes.'''
+        disciplina = str(disciplina)
+        if verbose:
+            log('Buscando informações da disciplina ' + disciplina)
+
+        return await self._busca(nivel, 'disciplina', {'cod': disciplina})
+
+    async def pre_requisitos(self, disciplina, nivel=Nivel.GRADUACAO,
+                             verbose=False):
+        '''Ver mwebcrawler.Disciplina.pre_requisitos.'''
+        disciplina = str(disciplina)
+        if verbose:
+            log('Buscando a lista de pré-requisitos para a disciplina ' +
+                disciplina)
+
+        return await self._busca(nivel, 'disciplina_pop', {'cod': disciplina})
+
+    async def departamentos(self, nivel=Nivel.GRADUACAO,
+                            campus=Campus.DARCY_RIBEIRO, verbose=False):
+        '''Ver mwebcrawler.Oferta.departamentos.'''
+        if verbose:
+            log('Buscando a informações de departamentos com oferta')
+
+        return await self._busca(nivel, 'oferta_dep', {'cod': str(campus)})
+
+    async def disciplinas(self, departamento, nivel=Nivel.GRADUACAO,
+                          verbose=False):
+        '''Ver mwebcrawler.Oferta.disciplinas.'''
+        departamento = str(departamento)
+        if verbose:
+            log('Buscando a informações de disciplinas do departamento ' +
+                departamento)
+
+        return await self._busca(nivel, 'oferta_dis', {'cod': departamento})
+
+    async def lista_de_espera(self, disciplina, turma='\w+',
+                              nivel=Nivel.GRADUACAO, verbose=False):
+        '''Ver mwebcrawler.Oferta.lista_de_espera.'''
+        disciplina = str(disciplina)
+        if verbose:
+            log('Buscando turmas com lista de espera para a disciplina ' +
+                disciplina)
+
+        return await self._busca(nivel, 'faltavaga_rel', {'cod': disciplina},
+                                 turma)
+
+    async def oferta(self, disciplina, depto=None, nivel=Nivel.GRADUACAO,
+                     verbose=False):
+        '''Ver mwebcrawler.Oferta.oferta.'''
+        disciplina = str(disciplina)
+        if verbose:
+            log('Buscando as turmas da disciplina ' + disciplina)
+
+        params = {'cod': disciplina}
+        if depto:
+            params['dep'] = str(depto)
+
+        return await self._busca(nivel, 'oferta_dados', params)
+
+    async def oferta_do_departamento(self, departamento,
+                                     nivel=Nivel.GRADUACAO, verbose=False):
+        '''Retorna um dicionário com a oferta (ver Oferta.oferta) de cada
+        disciplina ofertada pelo departamento dado, buscando-as
+        concorrentemente.'''
+        disciplinas = await self.disciplinas(departamento, nivel, verbose)
+        codigos = sorted(disciplinas)
+        ofertas = await asyncio.gather(*[self.oferta(codigo, departamento,
+                                                     nivel, verbose)
+                                         for codigo in codigos])
+        return dict(zip(codigos, ofertas))
+
+
+def oferta_do_departamento(departamento, nivel=Nivel.GRADUACAO,
+                           concorrencia=20, por_host=8, verbose=False):
+    '''Busca (concorrentemente) e retorna a oferta de todas as disciplinas do
+    departamento dado. Pode ser chamada de código síncrono.
+
+    Argumentos:
+    departamento -- o código do Departamento que oferece as disciplinas
+    nivel -- nível acadêmico das disciplinas buscadas
+             (default Nivel.GRADUACAO)
+    concorrencia -- quantidade máxima de requisições simultâneas
+                    (default 20)
+    por_host -- quantidade máxima de requisições simultâneas ao servidor
+                (default 8)
+    verbose -- indicação dos procedimentos sendo adotados
+               (default False)
+    '''
+    async def busca():
+        async with CrawlerAssincrono(concorrencia, por_host) as crawler:
+            return await crawler.oferta_do_departamento(departamento, nivel,
+                                                        verbose)
+
+    return asyncio.run(busca())
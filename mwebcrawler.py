@@ -7,27 +7,893 @@
 # representam a estrutura de uma página do Matrícula Web. Caso esta estrutura
 # seja alterada, as expressões aqui precisam ser atualizadas de acordo.
 #
-# Erros em requests são ignorados silenciosamente.
+# Erros em requests são ignorados silenciosamente, mas contabilizados nas
+# métricas (ver configura_metricas).
+
+
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import (FIRST_COMPLETED, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor, as_completed, wait)
+from itertools import islice
+from operator import methodcaller
+import codecs
+import copy
+import functools
+import inspect
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import requests
+import sqlite3
+import sys
+import threading
+import time
 
+try:
+    from urllib.parse import urlencode
+except ImportError:  # Python 2
+    from urllib import urlencode
 
-import requests
-import re
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
 
 # Renomeando funções/classes para maior clareza de código.
-busca = re.findall
 RequestException = requests.exceptions.RequestException
 
+# Endereço das páginas do Matrícula Web (nível, página).
+MWEB = 'https://matriculaweb.unb.br/%s/%s.aspx'
+
+# Sessão HTTP compartilhada por todas as buscas, de forma que as conexões
+# (TCP + TLS) com o servidor sejam reaproveitadas entre as requisições.
+_sessao = None
+_sessao_trava = threading.RLock()
+
+
+def configura_sessao(sessao=None, conexoes=10, hosts=2, compressao=True):
+    '''Define a sessão HTTP usada por mweb() e a retorna.
+
+    Argumentos:
+    sessao -- sessão a ser usada (requests.Session ou compatível); caso não
+              seja dada, uma nova é criada com as configurações abaixo
+              (default None)
+    conexoes -- quantidade de conexões persistentes mantidas por host
+                (default 10)
+    hosts -- quantidade de hosts distintos com pools de conexões
+             (default 2)
+    compressao -- indicação de que as respostas podem vir compactadas (gzip)
+                  (default True)
+    '''
+    global _sessao
+
+    if sessao is None:
+        sessao = requests.Session()
+        adaptador = requests.adapters.HTTPAdapter(pool_connections=hosts,
+                                                  pool_maxsize=conexoes)
+        sessao.mount('https://', adaptador)
+        sessao.mount('http://', adaptador)
+        sessao.headers['Connection'] = 'keep-alive'
+        if compressao:
+            sessao.headers['Accept-Encoding'] = 'gzip, deflate'
+        else:
+            sessao.headers['Accept-Encoding'] = 'identity'
+
+    with _sessao_trava:
+        _sessao = sessao
+
+    return sessao
+
+
+def sessao():
+    '''Retorna a sessão HTTP compartilhada, criando-a se necessário.'''
+    with _sessao_trava:
+        if _sessao is None:
+            configura_sessao()
+    return _sessao
+
+
+class Cache:
+    '''Cache em disco (SQLite) das páginas do Matrícula Web.
+
+    Cada página é identificada por (nível, página, parâmetros) e tem validade
+    de acordo com seu tipo (ver VALIDADE). Páginas expiradas são revalidadas
+    com requisições condicionais (ETag/Last-Modified) quando o servidor os
+    informa. Ao ultrapassar o limite de tamanho, as páginas acessadas há mais
+    tempo são descartadas.
+    '''
+    HORA = 60 * 60
+    DIA = 24 * HORA
+
+    # Validade (em segundos) de cada tipo de página. Currículos e informações
+    # de disciplinas raramente mudam, já as vagas ocupadas mudam a toda hora.
+    VALIDADE = {'curriculo': 7 * DIA,
+                'curso_dados': 7 * DIA,
+                'curso_rel': 7 * DIA,
+                'disciplina': 7 * DIA,
+                'disciplina_pop': 7 * DIA,
+                'fluxo': 7 * DIA,
+                'oferta_dep': DIA,
+                'oferta_dis': DIA,
+                'faltavaga_rel': HORA,
+                'oferta_dados': HORA}
+
+    # Quantidade de acessos a páginas guardados em memória antes de serem
+    # gravados de uma vez (ver busca).
+    ACESSOS = 100
+
+    def __init__(self, caminho, limite=256 * 1024 * 1024, validade=None):
+        '''Abre (ou cria) o cache no arquivo dado.
+
+        Argumentos:
+        caminho -- caminho do arquivo SQLite do cache
+        limite -- tamanho máximo (em bytes) das páginas armazenadas
+                  (default 256 MB)
+        validade -- dicionário que sobrescreve a validade (em segundos) de
+                    tipos de página específicos
+                    (default None)
+        '''
+        diretorio = os.path.dirname(caminho)
+        if diretorio and not os.path.isdir(diretorio):
+            os.makedirs(diretorio)
+
+        self.limite = limite
+        self.validade = dict(Cache.VALIDADE, **(validade or {}))
+        self._trava = threading.Lock()
+        self._acessos, self._nao_gravados = {}, 0
+        self._bd = sqlite3.connect(caminho, check_same_thread=False)
+        self._bd.execute('CREATE TABLE IF NOT EXISTS paginas ('
+                         'chave TEXT PRIMARY KEY, tipo TEXT, conteudo BLOB, '
+                         'tamanho INTEGER, obtida REAL, acessada REAL, '
+                         'etag TEXT, modificada TEXT)')
+        self._bd.execute('CREATE INDEX IF NOT EXISTS paginas_acessada '
+                         'ON paginas (acessada)')
+        self._bd.commit()
+
+    @staticmethod
+    def chave(nivel, pagina, params):
+        '''Retorna a chave que identifica a página dada no cache.'''
+        return '%s/%s?%s' % (nivel, pagina, urlencode(sorted(params.items())))
+
+    def busca(self, nivel, pagina, params):
+        '''Retorna uma tupla (conteúdo, expirada, etag, modificada) da página
+        dada, ou None caso ela não esteja no cache.
+
+        O instante do acesso é guardado em memória, e os acessos são gravados
+        de uma vez (a cada ACESSOS acessos, ou antes de descartar páginas).'''
+        chave = Cache.chave(nivel, pagina, params)
+        agora = time.time()
+        with self._trava:
+            pagina_cache = self._bd.execute('SELECT conteudo, obtida, etag, '
+                                            'modificada FROM paginas '
+                                            'WHERE chave = ?',
+                                            (chave,)).fetchone()
+            if pagina_cache is None:
+                return None
+            self._acessos[chave] = agora
+            self._nao_gravados += 1
+            if self._nao_gravados >= Cache.ACESSOS:
+                self._grava_acessos()
+                self._bd.commit()
+
+        conteudo, obtida, etag, modificada = pagina_cache
+        expirada = agora - obtida > self.validade.get(pagina, Cache.HORA)
+        return conteudo, expirada, etag, modificada
+
+    def guarda(self, nivel, pagina, params, conteudo, etag=None,
+               modificada=None):
+        '''Armazena a página dada no cache.'''
+        chave = Cache.chave(nivel, pagina, params)
+        agora = time.time()
+        with self._trava:
+            self._acessos.pop(chave, None)
+            self._bd.execute('INSERT OR REPLACE INTO paginas VALUES '
+                             '(?, ?, ?, ?, ?, ?, ?, ?)',
+                             (chave, pagina, conteudo, len(conteudo), agora,
+                              agora, etag, modificada))
+            self._descarta_excedente()
+            self._bd.commit()
+
+    def renova(self, nivel, pagina, params):
+        '''Reinicia a validade da página dada (que não foi alterada).'''
+        chave = Cache.chave(nivel, pagina, params)
+        with self._trava:
+            self._bd.execute('UPDATE paginas SET obtida = ? WHERE chave = ?',
+                             (time.time(), chave))
+            self._bd.commit()
+
+    def limpa(self):
+        '''Remove todas as páginas do cache.'''
+        with self._trava:
+            self._acessos.clear()
+            self._nao_gravados = 0
+            self._bd.execute('DELETE FROM paginas')
+            self._bd.commit()
+
+    def tamanho(self):
+        '''Retorna o tamanho (em bytes) das páginas armazenadas.'''
+        with self._trava:
+            return self._bd.execute('SELECT COALESCE(SUM(tamanho), 0) '
+                                    'FROM paginas').fetchone()[0]
+
+    def _descarta_excedente(self):
+        '''Descarta as páginas acessadas há mais tempo até que o total
+        armazenado respeite o limite.'''
+        total = self._bd.execute('SELECT COALESCE(SUM(tamanho), 0) '
+                                 'FROM paginas').fetchone()[0]
+        if total <= self.limite:
+            return
+
+        self._grava_acessos()
+        descartar = []
+        for chave, tamanho in self._bd.execute('SELECT chave, tamanho '
+                                               'FROM paginas '
+                                               'ORDER BY acessada'):
+            if total <= self.limite:
+                break
+            descartar.append((chave,))
+            total -= tamanho
+        self._bd.executemany('DELETE FROM paginas WHERE chave = ?', descartar)
+
+    def _grava_acessos(self):
+        '''Grava os instantes dos acessos guardados em memória (sem
+        confirmar a transação).'''
+        self._bd.executemany('UPDATE paginas SET acessada = ? WHERE chave = ?',
+                             ((acessada, chave) for chave, acessada
+                              in self._acessos.items()))
+        self._acessos.clear()
+        self._nao_gravados = 0
+
+
+# Cache de páginas usado por mweb() (desabilitado por padrão).
+_cache = None
+CACHE = os.path.join(os.path.expanduser('~'), '.mwebcrawler', 'cache.sqlite')
+
+
+def configura_cache(caminho=CACHE, limite=256 * 1024 * 1024, validade=None):
+    '''Habilita o cache em disco das páginas buscadas por mweb() e o retorna.
+
+    Argumentos:
+    caminho -- caminho do arquivo do cache; caso seja None, o cache é
+               desabilitado
+               (default ~/.mwebcrawler/cache.sqlite)
+    limite -- tamanho máximo (em bytes) das páginas armazenadas
+              (default 256 MB)
+    validade -- dicionário que sobrescreve a validade (em segundos) de tipos
+                de página específicos (ver Cache.VALIDADE)
+                (default None)
+    '''
+    global _cache
+    _cache = Cache(caminho, limite, validade) if caminho else None
+    return _cache
+
+
+# Arquivo das páginas obtidas por mweb() (desabilitado por padrão).
+_arquivo = None
+
+
+def configura_arquivo(arquivo=None):
+    '''Habilita o arquivamento de todas as páginas obtidas do Matrícula Web
+    por mweb() (ver mwebarquivo), para posterior reprodução ou reanálise, e
+    retorna o arquivo.
+
+    Argumentos:
+    arquivo -- o mwebarquivo.Arquivo, ou o caminho do arquivo; caso seja
+               None, o arquivamento é desabilitado
+               (default None)
+    '''
+    global _arquivo
+    if arquivo is not None and not hasattr(arquivo, 'guarda'):
+        from mwebarquivo import Arquivo
+        arquivo = Arquivo(arquivo)
+    _arquivo = arquivo
+    return _arquivo
+
+
+def _arquiva(nivel, pagina, params, status, conteudo):
+    '''Acrescenta ao arquivo (caso habilitado) a página obtida.'''
+    arquivo = _arquivo
+    if arquivo is not None and status == 200 and conteudo:
+        arquivo.guarda(nivel, pagina, params, conteudo)
+
+
+def _consulta_cache(cache, nivel, pagina, params):
+    '''Retorna a página guardada no cache (ou None) e os cabeçalhos da
+    requisição condicional que a revalida.'''
+    guardada, cabecalhos = None, {}
+    if cache:
+        guardada = cache.busca(nivel, pagina, params)
+        if guardada:
+            conteudo, expirada, etag, modificada = guardada
+            if etag:
+                cabecalhos['If-None-Match'] = etag
+            if modificada:
+                cabecalhos['If-Modified-Since'] = modificada
+
+    return guardada, cabecalhos
+
+
+def _atualiza_cache(cache, nivel, pagina, params, guardada, status, conteudo,
+                    cabecalhos):
+    '''Atualiza o cache de acordo com a resposta dada e retorna o conteúdo
+    da página.'''
+    if cache:
+        if guardada and status == 304:
+            cache.renova(nivel, pagina, params)
+            return guardada[0]
+        if status == 200 and conteudo:
+            cache.guarda(nivel, pagina, params, conteudo,
+                         cabecalhos.get('ETag'),
+                         cabecalhos.get('Last-Modified'))
+
+    return conteudo
+
+
+class Escalonador:
+    '''Controle das requisições ao Matrícula Web, de forma a maximizar a vazão
+    sem sobrecarregar o servidor.
+
+    - a taxa de requisições é limitada por um balde de fichas (token bucket),
+      que define a carga máxima imposta ao servidor;
+    - requisições que falham (sem resposta ou com status transitório, ver
+      TRANSITORIOS) são repetidas, com esperas exponenciais aleatorizadas
+      (jitter) entre as tentativas;
+    - a quantidade de requisições simultâneas é ajustada por AIMD: cresce
+      aditivamente enquanto as respostas chegam em tempo, e cai pela metade
+      (no máximo uma vez por tempo de resposta) quando há falhas ou lentidão;
+    - após muitas falhas seguidas o circuito "abre": as requisições falham
+      imediatamente durante algum tempo, e então uma única requisição de
+      teste decide se o circuito fecha ou continua aberto.
+    '''
+
+    # Status HTTP de falhas transitórias, cujas requisições são repetidas.
+    TRANSITORIOS = (429, 500, 502, 503, 504)
+
+    def __init__(self, taxa=10., rajada=10, concorrencia=8,
+                 concorrencia_minima=1, latencia_alvo=2., tentativas=4,
+                 espera_inicial=.5, espera_maxima=30., falhas_para_abrir=10,
+                 espera_do_circuito=30.):
+        '''Argumentos:
+        taxa -- quantidade máxima de requisições por segundo
+                (default 10)
+        rajada -- quantidade de requisições que podem ser feitas de uma vez
+                  (acima da taxa) após um período ocioso
+                  (default 10)
+        concorrencia -- quantidade máxima de requisições simultâneas
+                        (default 8)
+        concorrencia_minima -- limite inferior do ajuste de requisições
+                               simultâneas
+                               (default 1)
+        latencia_alvo -- tempo (em segundos) de resposta acima do qual o
+                         servidor é considerado sobrecarregado
+                         (default 2)
+        tentativas -- quantidade máxima de tentativas de cada requisição
+                      (default 4)
+        espera_inicial -- espera máxima (em segundos) antes da segunda
+                          tentativa; dobra a cada nova tentativa
+                          (default 0.5)
+        espera_maxima -- limite (em segundos) das esperas entre tentativas
+                         (default 30)
+        falhas_para_abrir -- quantidade de falhas seguidas que abre o
+                             circuito
+                             (default 10)
+        espera_do_circuito -- tempo (em segundos) em que o circuito fica
+                              aberto
+                              (default 30)
+        '''
+        self.taxa, self.rajada = float(taxa), rajada
+        self.concorrencia = concorrencia
+        self.concorrencia_minima = concorrencia_minima
+        self.latencia_alvo = latencia_alvo
+        self.tentativas = tentativas
+        self.espera_inicial, self.espera_maxima = espera_inicial, espera_maxima
+        self.falhas_para_abrir = falhas_para_abrir
+        self.espera_do_circuito = espera_do_circuito
+
+        self.limite = float(concorrencia)
+        self.estatisticas = dict.fromkeys(('requisicoes', 'sucessos',
+                                           'falhas', 'repeticoes',
+                                           'rejeitadas'), 0)
+        self._condicao = threading.Condition()
+        self._fichas, self._reposicao = float(rajada), time.time()
+        self._em_andamento = 0
+        self._falhas_seguidas, self._reducao = 0, 0
+        self._circuito, self._reabertura, self._testando = 'fechado', 0, False
+        self._aleatorio = random.Random()
+
+    def executa(self, requisicao):
+        '''Executa a requisição dada (uma função que retorna a resposta HTTP)
+        respeitando os limites, e retorna sua resposta (ou None, caso não
+        haja).'''
+        resposta = None
+        for tentativa in range(self.tentativas):
+            permite, teste = self._circuito_permite()
+            if not permite:
+                self._conta('rejeitadas')
+                return resposta
+
+            self._aguarda_ficha()
+            self._inicia()
+            inicio = time.time()
+            try:
+                resposta = requisicao()
+            except RequestException:
+                resposta = None
+            except BaseException:
+                self._registra(True, time.time() - inicio, teste)
+                raise
+            finally:
+                self._termina()
+
+            falhou = resposta is None or \
+                resposta.status_code in Escalonador.TRANSITORIOS
+            self._registra(falhou, time.time() - inicio, teste)
+            if not falhou or tentativa + 1 == self.tentativas:
+                break
+
+            self._conta('repeticoes')
+            time.sleep(self._espera(tentativa, resposta))
+
+        return resposta
+
+    def _conta(self, contador):
+        with self._condicao:
+            self.estatisticas[contador] += 1
+
+    def _aguarda_ficha(self):
+        '''Aguarda até que haja uma ficha disponível no balde, e a consome.'''
+        espera = self._ficha()
+        while espera:
+            time.sleep(espera)
+            espera = self._ficha()
+
+    def _ficha(self):
+        '''Consome uma ficha do balde, caso haja, e retorna 0; caso contrário,
+        retorna o tempo (em segundos) até que haja uma.'''
+        with self._condicao:
+            agora = time.time()
+            self._fichas = min(self.rajada, self._fichas + self.taxa *
+                               (agora - self._reposicao))
+            self._reposicao = agora
+            if self._fichas >= 1:
+                self._fichas -= 1
+                return 0
+            return (1 - self._fichas) / self.taxa
+
+    def _inicia(self):
+        '''Aguarda até que o limite de requisições simultâneas permita uma
+        nova requisição.'''
+        with self._condicao:
+            while not self._tenta_iniciar():
+                self._condicao.wait()
+
+    def _tenta_iniciar(self):
+        '''Inicia uma requisição, caso o limite de requisições simultâneas
+        permita, e retorna a indicação de que ela foi iniciada.'''
+        with self._condicao:
+            if self._em_andamento >= max(1, int(self.limite)):
+                return False
+            self._em_andamento += 1
+            self.estatisticas['requisicoes'] += 1
+            return True
+
+    def _termina(self):
+        with self._condicao:
+            self._em_andamento -= 1
+            self._condicao.notify_all()
+
+    def _espera(self, tentativa, resposta):
+        '''Retorna o tempo (em segundos) de espera antes da próxima tentativa:
+        aleatório, até o dobro da espera anterior, respeitando o Retry-After
+        informado pelo servidor.'''
+        espera = self._aleatorio.uniform(0, min(
+            self.espera_maxima, self.espera_inicial * 2 ** tentativa))
+        # Respostas HTTP de erro são "falsas" (ver requests.Response.ok).
+        depois = resposta.headers.get('Retry-After') \
+            if resposta is not None else None
+        if depois and depois.isdigit():
+            espera = max(espera, min(self.espera_maxima, int(depois)))
+        return espera
+
+    def _desiste(self, teste):
+        '''Registra a desistência (por exemplo, por cancelamento) de uma
+        requisição antes do seu início: caso fosse a requisição de teste do
+        circuito, a próxima requisição passa a sê-lo.'''
+        if teste:
+            with self._condicao:
+                self._testando = False
+
+    def _circuito_permite(self):
+        '''Retorna o par (permite, teste): a indicação de que o circuito
+        permite uma requisição e a de que ela é a requisição de teste do
+        circuito.'''
+        with self._condicao:
+            if self._circuito == 'aberto':
+                if time.time() < self._reabertura:
+                    return False, False
+                self._circuito = 'testando'
+            if self._circuito == 'testando':
+                if self._testando:
+                    return False, False
+                self._testando = True
+                return True, True
+            return True, False
+
+    def _registra(self, falhou, latencia, teste=False):
+        '''Ajusta o limite de requisições simultâneas e o circuito de acordo
+        com o resultado de uma requisição. Apenas o resultado da requisição
+        de teste decide se o circuito (em teste) fecha ou volta a abrir; o
+        das requisições já em andamento quando o circuito abriu não o altera.
+        '''
+        with self._condicao:
+            agora = time.time()
+            if teste:
+                self._testando = False
+            if falhou:
+                self.estatisticas['falhas'] += 1
+                self._falhas_seguidas += 1
+                if teste or (self._circuito == 'fechado' and
+                             self._falhas_seguidas >= self.falhas_para_abrir):
+                    self._circuito = 'aberto'
+                    self._reabertura = agora + self.espera_do_circuito
+            else:
+                self.estatisticas['sucessos'] += 1
+                self._falhas_seguidas = 0
+                if teste:
+                    self._circuito = 'fechado'
+
+            if falhou or latencia > self.latencia_alvo:
+                if agora - self._reducao > latencia:
+                    self.limite = max(self.concorrencia_minima,
+                                      self.limite / 2)
+                    self._reducao = agora
+            else:
+                self.limite = min(self.concorrencia,
+                                  self.limite + 1 / self.limite)
+            self._condicao.notify_all()
+
+
+_escalonador = None
+
+
+def configura_escalonador(escalonador=None, **configuracoes):
+    '''Habilita o controle das requisições feitas por mweb() (ver Escalonador)
+    e retorna o escalonador usado.
+
+    Argumentos:
+    escalonador -- escalonador a ser usado; caso não seja dado, um novo é
+                   criado com as configurações dadas (ver Escalonador)
+                   (default None)
+
+    Para desabilitar o controle, use desabilita_escalonador().
+    '''
+    global _escalonador
+    _escalonador = escalonador or Escalonador(**configuracoes)
+    return _escalonador
+
+
+def desabilita_escalonador():
+    '''Desabilita o controle das requisições feitas por mweb().'''
+    global _escalonador
+    _escalonador = None
+
+
+class Agrupador:
+    '''Tabela das buscas em andamento (single-flight): buscas simultâneas
+    pela mesma chave são agrupadas, de forma que apenas a primeira é de fato
+    executada e as demais aguardam e compartilham o seu resultado (ou a sua
+    exceção). Funciona tanto entre threads (executa) quanto entre corrotinas
+    (ver mwebassincrono), inclusive misturadas, pois cada busca em andamento
+    é representada por um concurrent.futures.Future.
+
+    Quem aguarda recebe uma cópia (profunda) do resultado, que pode então ser
+    alterada sem afetar as demais buscas.
+    '''
+
+    def __init__(self):
+        self._em_andamento = {}
+        self._trava = threading.Lock()
+        self.estatisticas = {'buscas': 0, 'agrupadas': 0}
+
+    def _entra(self, chave):
+        '''Retorna o Future da busca em andamento pela chave dada e a
+        indicação de que ela deve ser executada por quem chamou (ou seja,
+        de que não havia uma busca em andamento).'''
+        with self._trava:
+            futuro = self._em_andamento.get(chave)
+            if futuro is not None:
+                self.estatisticas['agrupadas'] += 1
+                metricas = _metricas
+                if metricas is not None:
+                    metricas.conta('agrupadas', chave[1])
+                return futuro, False
+            futuro = self._em_andamento[chave] = Future()
+            self.estatisticas['buscas'] += 1
+            return futuro, True
+
+    def _sai(self, chave, futuro, resultado=None, erro=None):
+        '''Encerra a busca em andamento, repassando o seu desfecho a quem o
+        aguarda.'''
+        with self._trava:
+            del self._em_andamento[chave]
+        if erro is None:
+            futuro.set_result(resultado)
+        else:
+            futuro.set_exception(erro)
+
+    def executa(self, chave, funcao):
+        '''Retorna o resultado de funcao(), ou o de uma busca simultânea pela
+        mesma chave.'''
+        futuro, executa = self._entra(chave)
+        if not executa:
+            return _copia(futuro.result())
+
+        try:
+            resultado = funcao()
+        except BaseException as erro:
+            self._sai(chave, futuro, erro=erro)
+            raise
+        self._sai(chave, futuro, resultado)
+        return resultado
+
+
+# Buscas em andamento, compartilhadas por mweb(), pelos métodos de busca
+# (Cursos, Disciplina e Oferta) e pelo CrawlerAssincrono.
+_agrupador = Agrupador()
+
+
+def _chave_da_busca(nivel, pagina, params, *argumentos):
+    '''Retorna a chave que identifica uma busca (ver Agrupador).'''
+    return (str(nivel), pagina,
+            tuple(sorted((str(k), str(v)) for k, v in params.items()))) + \
+        argumentos
+
+
+def estatisticas_de_agrupamento():
+    '''Retorna um dicionário com a quantidade de buscas executadas e a de
+    buscas agrupadas a outras simultâneas (ver Agrupador).'''
+    with _agrupador._trava:
+        return dict(_agrupador.estatisticas)
+
+
+class Histograma:
+    '''Distribuição dos valores observados, em faixas cumulativas (como os
+    histogramas de Prometheus): a contagem de cada faixa inclui os valores
+    menores ou iguais ao seu limite.'''
+
+    def __init__(self, limites):
+        self.limites = tuple(limites)
+        self.contagens = [0] * (len(self.limites) + 1)
+        self.soma, self.total = 0, 0
+
+    def observa(self, valor):
+        '''Registra o valor dado.'''
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def para_dicionario(self):
+        '''Retorna um dicionário com as contagens cumulativas de cada
+        'faixa' (indexadas pelo limite), a 'soma' e o 'total' dos valores.'''
+        faixas, acumulado = OrderedDict(), 0
+        for limite, contagem in zip(self.limites + ('+Inf',),
+                                    self.contagens):
+            acumulado += contagem
+            faixas[str(limite)] = acumulado
+        return {'faixas': faixas, 'soma': self.soma, 'total': self.total}
+
+
+class Metricas:
+    '''Métricas das buscas, por tipo de página (ver configura_metricas).
+
+    Histogramas:
+    latencia -- tempo (em segundos) de cada requisição ao Matrícula Web
+    bytes -- tamanho (em bytes) de cada resposta
+    analise -- tempo (em segundos) da análise de cada página
+    valores -- quantidade de valores (folhas) extraídos de cada página
+
+    Contadores:
+    requisicoes -- requisições respondidas
+    erros -- requisições sem resposta (RequestException) ou com status de
+             erro (400 ou mais)
+    cache_acertos, cache_expiradas e cache_faltas -- páginas encontradas
+                                                     válidas, expiradas ou
+                                                     não encontradas no
+                                                     cache (ver Cache)
+    memoria_acertos e memoria_faltas -- resultados encontrados ou não na
+                                        memória (ver Memoria)
+    agrupadas -- buscas agrupadas a outras simultâneas (ver Agrupador)
+    '''
+
+    # Limites das faixas de cada histograma.
+    LIMITES = {'latencia': (.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+               'bytes': (1024, 4096, 16384, 65536, 262144, 1048576,
+                         4194304),
+               'analise': (.0001, .00025, .0005, .001, .0025, .005, .01,
+                           .025, .05, .1, .25),
+               'valores': (0, 1, 10, 100, 1000, 10000, 100000)}
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.contadores = {}
+        self.histogramas = {}
+
+    def conta(self, nome, pagina, quantidade=1):
+        '''Incrementa o contador dado do tipo de página dado.'''
+        with self._trava:
+            contadores = self.contadores.setdefault(nome, {})
+            contadores[pagina] = contadores.get(pagina, 0) + quantidade
+
+    def observa(self, nome, pagina, valor):
+        '''Registra o valor dado no histograma dado do tipo de página
+        dado.'''
+        with self._trava:
+            histogramas = self.histogramas.setdefault(nome, {})
+            if pagina not in histogramas:
+                histogramas[pagina] = Histograma(self.LIMITES[nome])
+            histogramas[pagina].observa(valor)
+
+    def limpa(self):
+        '''Descarta todas as métricas.'''
+        with self._trava:
+            self.contadores.clear()
+            self.histogramas.clear()
+
+    def para_dicionario(self):
+        '''Retorna um dicionário com os 'contadores' e os 'histogramas' (ver
+        Histograma.para_dicionario), indexados pelo nome e pelo tipo de
+        página.'''
+        with self._trava:
+            return {'contadores': {nome: dict(contadores) for nome, contadores
+                                   in self.contadores.items()},
+                    'histogramas': {nome: {pagina: histograma.para_dicionario()
+                                           for pagina, histograma
+                                           in histogramas.items()}
+                                    for nome, histogramas
+                                    in self.histogramas.items()}}
+
+    def json(self):
+        '''Retorna as métricas em JSON (ver para_dicionario).'''
+        return json.dumps(self.para_dicionario(), indent=2, sort_keys=True)
+
+    def prometheus(self):
+        '''Retorna as métricas no formato de texto de Prometheus, com o
+        prefixo mweb_ e o rótulo pagina.'''
+        dados, linhas = self.para_dicionario(), []
+        for nome, contadores in sorted(dados['contadores'].items()):
+            linhas.append('# TYPE mweb_%s_total counter' % nome)
+            linhas.extend('mweb_%s_total{pagina="%s"} %d' % (nome, pagina,
+                                                              valor)
+                          for pagina, valor in sorted(contadores.items()))
+        for nome, histogramas in sorted(dados['histogramas'].items()):
+            linhas.append('# TYPE mweb_%s histogram' % nome)
+            for pagina, histograma in sorted(histogramas.items()):
+                linhas.extend('mweb_%s_bucket{pagina="%s",le="%s"} %d' % (
+                    nome, pagina, limite, contagem)
+                    for limite, contagem in histograma['faixas'].items())
+                linhas.append('mweb_%s_sum{pagina="%s"} %r' % (
+                    nome, pagina, histograma['soma']))
+                linhas.append('mweb_%s_count{pagina="%s"} %d' % (
+                    nome, pagina, histograma['total']))
+        return '\n'.join(linhas) + '\n'
+
+    def grava(self, caminho):
+        '''Grava as métricas no arquivo dado: no formato de texto de
+        Prometheus caso sua extensão seja .prom, e em JSON caso
+        contrário.'''
+        with open(caminho, 'w') as arquivo:
+            if caminho.endswith('.prom'):
+                arquivo.write(self.prometheus())
+            else:
+                arquivo.write(self.json())
+
+
+_metricas = None
+
+
+def configura_metricas(habilita=True):
+    '''Habilita (ou desabilita) a coleta de métricas das buscas e retorna
+    as Metricas coletadas (ou None). Desabilitada, a coleta não tem custo.
+
+    Argumentos:
+    habilita -- indicação de que a coleta deve ser habilitada
+                (default True)
+    '''
+    global _metricas
+    _metricas = Metricas() if habilita else None
+    return _metricas
+
+
+def _valores(resultado):
+    '''Retorna a quantidade de valores (folhas) do resultado dado.'''
+    if isinstance(resultado, dict):
+        return sum(_valores(valor) for valor in resultado.values())
+    if isinstance(resultado, (list, tuple, set)):
+        return sum(_valores(valor) for valor in resultado)
+    return 1
+
 
 def mweb(nivel, pagina, params, timeout=1):
-    '''Retorna a página no Matrícula Web referente às especificações dadas.'''
+    '''Retorna a página no Matrícula Web referente às especificações dadas.
+    Requisições simultâneas pela mesma página são feitas uma única vez (ver
+    Agrupador).'''
+    return _agrupador.executa(_chave_da_busca(nivel, pagina, params, 'mweb'),
+                              lambda: _mweb(nivel, pagina, params, timeout))
+
+
+def _mweb(nivel, pagina, params, timeout=1):
+    '''Ver mweb().'''
+    with trecho('mweb', pagina=pagina, cod=params.get('cod')) as atual:
+        cache = _cache
+        guardada, cabecalhos = _consulta_cache(cache, nivel, pagina, params)
+        metricas = _metricas
+        if metricas is not None and cache:
+            metricas.conta('cache_faltas' if not guardada else
+                           'cache_expiradas' if guardada[1] else
+                           'cache_acertos', pagina)
+        if guardada and not guardada[1]:
+            atual.define(origem='cache')
+            return guardada[0]
+
+        html = _requisita(nivel, pagina, params, cabecalhos, timeout)
+        if html is not None:
+            atual.define(origem='rede', status=html.status_code,
+                         bytes=len(html.content or b''))
+            _arquiva(nivel, pagina, params, html.status_code, html.content)
+            return _atualiza_cache(cache, nivel, pagina, params, guardada,
+                                   html.status_code, html.content,
+                                   html.headers)
+
+        # Na falta de resposta, uma página expirada é melhor que nenhuma.
+        atual.define(origem='cache' if guardada else None, erro=True)
+        return guardada[0] if guardada else ''
+
+
+def _requisita(nivel, pagina, params, cabecalhos=None, timeout=1):
+    '''Requisita a página dada ao Matrícula Web, sem passar pelo cache, e
+    retorna a resposta HTTP (ou None, caso não haja resposta). Caso haja um
+    escalonador habilitado, a requisição é feita por meio dele.'''
+    url = MWEB % (nivel, pagina)
+    metricas = _metricas
+
+    def requisicao():
+        if metricas is None:
+            return sessao().get(url, params=params, timeout=timeout,
+                                headers=cabecalhos or {})
+
+        inicio = time.time()
+        try:
+            resposta = sessao().get(url, params=params, timeout=timeout,
+                                    headers=cabecalhos or {})
+        except RequestException:
+            metricas.conta('erros', pagina)
+            raise
+        _mede_resposta(metricas, pagina, time.time() - inicio,
+                       resposta.status_code, resposta.content)
+        return resposta
+
+    escalonador = _escalonador
+    if escalonador is not None:
+        return escalonador.executa(requisicao)
+
     try:
-        pagina = 'https://matriculaweb.unb.br/%s/%s.aspx' % (nivel, pagina)
-        html = requests.get(pagina, params=params, timeout=timeout)
-        return html.content
+        return requisicao()
     except RequestException:  # as e:
-        pass
+        return None
 
-    return ''
+
+def _mede_resposta(metricas, pagina, latencia, status, conteudo):
+    '''Registra nas métricas dadas a latência, o status e o tamanho da
+    resposta dada.'''
+    metricas.conta('requisicoes', pagina)
+    metricas.observa('latencia', pagina, latencia)
+    metricas.observa('bytes', pagina, len(conteudo or b''))
+    if status >= 400:
+        metricas.conta('erros', pagina)
 
 
 class Nivel:
@@ -63,11 +929,958 @@ class Habilitacoes:
     ENM = 6912  # Engenharia de Controle e Automação
 
 
+def _em_lote(funcao, codigos, trabalhadores):
+    '''Aplica a função dada a cada um dos códigos (desconsiderando repetições)
+    em um pool de threads, gerando os pares (código, resultado) à medida que
+    são concluídos.'''
+    # O trecho atual é o de quem chama, e não o de quem itera os pares.
+    return _gera_em_lote(_no_trecho(funcao), codigos, trabalhadores)
+
+
+def _gera_em_lote(funcao, codigos, trabalhadores):
+    '''Ver _em_lote.'''
+    codigos = OrderedDict.fromkeys(str(codigo) for codigo in codigos)
+    executor = ThreadPoolExecutor(max_workers=trabalhadores)
+    tarefas = {executor.submit(funcao, codigo): codigo for codigo in codigos}
+    try:
+        for tarefa in as_completed(tarefas):
+            yield tarefas[tarefa], tarefa.result()
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+        executor.shutdown(wait=False)
+
+
+def _sem_repeticoes(codigos):
+    '''Gera os códigos dados (como str), sob demanda e sem repetições.'''
+    vistos = set()
+    for codigo in codigos:
+        codigo = str(codigo)
+        if codigo not in vistos:
+            vistos.add(codigo)
+            yield codigo
+
+
+def _contexto_de_processos():
+    '''Retorna o contexto (multiprocessing) dos pools de processos. Os
+    processos não são criados por fork, já que o processo atual costuma ter
+    outras threads (por exemplo, as de etapas anteriores de um fluxo), cujas
+    travas seriam copiadas em qualquer estado para o processo criado.'''
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos
+                                       else 'spawn')
+
+
+def _em_fluxo(funcao, entradas, trabalhadores, pendentes=None,
+              processos=False):
+    '''Aplica a função dada a cada uma das entradas em um pool de threads,
+    gerando os resultados à medida que são concluídos (fora de ordem).
+
+    Ao contrário de _em_lote, as entradas (que podem ser um gerador) são
+    consumidas sob demanda: há no máximo a quantidade dada de entradas
+    pendentes (em processamento ou com resultado aguardando consumo), de
+    forma que a memória usada é limitada e, caso quem consome os resultados
+    seja mais lento, novas entradas deixam de ser consumidas (contrapressão).
+    As entradas são consumidas por uma thread própria, que aguarda apenas
+    por vagas: quando elas são geradas por outra etapa (por exemplo, outra
+    chamada de _em_fluxo), as duas etapas avançam independentemente.
+
+    Caso processos seja verdadeiro, o pool é de processos (ver
+    _contexto_de_processos), e a função, as entradas e os resultados
+    precisam ser serializáveis (pickle).
+    '''
+    # O trecho atual é o de quem chama, e não o de quem itera os resultados.
+    if not processos:
+        funcao = _no_trecho(funcao)
+    return _gera_em_fluxo(funcao, entradas, trabalhadores, pendentes,
+                          processos)
+
+
+def _gera_em_fluxo(funcao, entradas, trabalhadores, pendentes, processos):
+    '''Ver _em_fluxo.'''
+    pendentes = pendentes or 2 * trabalhadores
+    if processos:
+        executor = ProcessPoolExecutor(max_workers=trabalhadores,
+                                       mp_context=_contexto_de_processos())
+    else:
+        executor = ThreadPoolExecutor(max_workers=trabalhadores)
+    vagas, concluidas = threading.Semaphore(pendentes), queue.Queue()
+    tarefas, trava, encerrado = set(), threading.Lock(), threading.Event()
+
+    def alimenta():
+        # Submete as entradas à medida que há vagas e, ao final, informa a
+        # quantidade submetida (e o erro ao gerar as entradas, caso haja).
+        submetidas, erro = 0, None
+        try:
+            for entrada in entradas:
+                vagas.acquire()
+                with trava:
+                    if encerrado.is_set():
+                        break
+                    tarefa = executor.submit(funcao, entrada)
+                    tarefas.add(tarefa)
+                tarefa.add_done_callback(concluidas.put)
+                submetidas += 1
+        except Exception as excecao:
+            erro = excecao
+        concluidas.put((submetidas, erro))
+
+    alimentador = threading.Thread(target=alimenta)
+    alimentador.daemon = True
+    alimentador.start()
+    consumidas, submetidas = 0, None
+    try:
+        while submetidas is None or consumidas < submetidas:
+            tarefa = concluidas.get()
+            if not isinstance(tarefa, Future):
+                submetidas, erro = tarefa
+                if erro is not None:
+                    raise erro
+                continue
+            with trava:
+                tarefas.discard(tarefa)
+            consumidas += 1
+            vagas.release()
+            yield tarefa.result()
+    finally:
+        with trava:
+            encerrado.set()
+            for tarefa in tarefas:
+                tarefa.cancel()
+        vagas.release()
+        executor.shutdown(wait=False)
+
+
+def encadeia(entradas, etapas, trabalhadores=8, pendentes=None):
+    '''Gera os itens produzidos pela última de uma sequência de etapas, em
+    que cada etapa é uma função que recebe um item da etapa anterior (ou das
+    entradas) e retorna (ou gera) os itens da etapa seguinte. Cada etapa é
+    executada em seu próprio pool de threads e consome os itens da anterior
+    sob demanda (ver _em_fluxo), de forma que os primeiros itens são gerados
+    antes que as primeiras etapas terminem e a memória usada é limitada.
+
+    Argumentos:
+    entradas -- coleção (ou gerador) dos itens da primeira etapa
+    etapas -- sequência de funções que recebem um item e retornam uma
+              coleção de itens
+    trabalhadores -- quantidade máxima de itens processados simultaneamente
+                     em cada etapa
+                     (default 8)
+    pendentes -- quantidade máxima de itens pendentes em cada etapa
+                 (default None) (o dobro de trabalhadores)
+    '''
+    itens = entradas
+    for etapa in etapas:
+        def lista(item, etapa=etapa):
+            return list(etapa(item))
+
+        itens = (item for itens_do_item in _em_fluxo(lista, itens,
+                                                     trabalhadores, pendentes)
+                 for item in itens_do_item)
+    return itens
+
+
+def _compila(**padroes):
+    '''Retorna um dicionário com as expressões regulares dadas compiladas.'''
+    return {nome: re.compile(padrao) for nome, padrao in padroes.items()}
+
+
+def _ate(marcador):
+    '''Retorna uma expressão equivalente a '(.*?)marcador', mas que não
+    avança além da primeira ocorrência do marcador. Evita que cada caractere
+    do trecho seja um ponto de retrocesso, o que é bem mais rápido em trechos
+    longos.'''
+    return '([^<\\n]*(?:<(?!%s)[^<\\n]*)*)%s' % (re.escape(marcador[1:]),
+                                                 marcador)
+
+
+# Registro das expressões regulares que descrevem a estrutura de cada tipo de
+# página do Matrícula Web, compiladas uma única vez.
+PADROES = {
+    'curriculo': _compila(
+        OBR_OPT='DISCIPLINAS OBRIGATÓRIAS (.*?)</table></td>(.*?)'
+                'DISCIPLINAS OPTATIVAS (.*?)</table></td>',
+        CADEIAS='CADEIA: (\d+)(.*?)</table>',
+        DISCIPLINA='disciplina.aspx\?cod=(\d+)>.*?</b> - (.*?)</a></td>'
+                   '<td><b>(.*?)</b></td><td>(\d+) (\d+) (\d+) (\d+)</td>'
+                   '<td>(.*?)</td></tr>'),
+    'fluxo': _compila(
+        PERIODO='<b>PERÍODO: (\d+).*?CRÉDITOS:</b> (\d+)</td>'
+                '(.*?)</tr></table>',
+        DISCIPLINA='disciplina.aspx\?cod=\d+>(\d+)</a>'),
+    'curso_dados': _compila(
+        OPCAO='<a name=\d+></a><tr .*?><td  colspan=3><b>(\d+) - (.*?)'
+              '</b></td></tr>.*?'
+              'Grau: </td><td .*?>(.*?)</td></tr>.*?'
+              'Limite mínimo de permanência: </td>'
+              '<td align=right>(\d+)</td>.*?'
+              'Limite máximo de permanência: </td>.*?'
+              '<td align=right>(\d+)</td>.*?'
+              'Quantidade de Créditos para Formatura: </td>'
+              '<td align=right>(\d+)</td>.*?'
+              'Quantidade mínima de Créditos Optativos '
+              'na Área de Concentração: </td>'
+              '<td align=right>(\d+)</td>.*?'
+              'Quantidade mínima de Créditos Optativos na Área Conexa: '
+              '</td><td align=right>(\d+)</td>.*?'
+              'Quantidade máxima de Créditos no Módulo Livre: </td>'
+              '<td align=right>(\d+)</td>'),
+    'curso_rel': _compila(
+        CURSOS='<tr CLASS=PadraoMenor bgcolor=.*?>'
+               '<td>(.*?)</td>'
+               '<td>\d+</td>'
+               '.*?aspx\?cod=(\d+)>(.*?)</a></td>'
+               '<td>(.*?)</td></tr>'),
+    # Os campos da página de uma disciplina são buscados em sequência, cada um
+    # a partir do fim do anterior, evitando o retrocesso de uma única
+    # expressão com o campo (opcional) 'Programa'.
+    'disciplina': _compila(
+        ORGAO='Órgão:</b> </td><td>(\w+) - (.*?)</td></tr>',
+        DENOMINACAO='Denominação:</b> </td><td>(.*?)</td></tr>',
+        NIVEL='Nível:</b> </td><td>(.*?)</td></tr>',
+        VIGENCIA='Vigência:</b> </td><td>(.*?)</td></tr>',
+        PRE_REQ='Pré-req:</b> </td><td class=PadraoMenor>(.*?)</td></tr>',
+        EMENTA='Ementa:</b> </td><td class=PadraoMenor>'
+               '<p align=justify>(.*?)</P></td></tr>',
+        PROGRAMA='Programa:</b> </td><td class=PadraoMenor>'
+                 '<p align=justify>(.*?)</P></td></tr>',
+        BIBLIOGRAFIA='Bibliografia:</b> </td><td class=PadraoMenor>'
+                     '<p align=justify>(.*?)</P></td></tr>'),
+    'disciplina_pop': _compila(
+        DISCIPLINAS='<td valign=top><b>Pré-req:</b> </td>'
+                    '<td class=PadraoMenor>(.*?)</td></tr>',
+        CODIGO='(\d{6})'),
+    'oferta_dep': _compila(
+        DEPARTAMENTOS='<tr CLASS=PadraoMenor bgcolor=.*?>'
+                      '<td>\d+</td><td>(\w+)</td>'
+                      '.*?aspx\?cod=(\d+)>(.*?)</a></td></tr>'),
+    'oferta_dis': _compila(
+        DISCIPLINAS='oferta_dados.aspx\?cod=(\d+).*?>(.*?)</a>'),
+    'faltavaga_rel': _compila(
+        TABELA='<td><b>Turma</b></td>    '
+               '<td><b>Vagas<br>Solicitadas</b></td>  </tr>'
+               '<tr CLASS=PadraoMenor bgcolor=.*?>  '
+               '.*?</tr><tr CLASS=PadraoBranco>',
+        TURMAS='<td align=center >(\w+)</td>  '
+               '<td align=center >(\d+)</td></tr>'),
+    'oferta_dados': _compila(
+        INFORMACOES='Departamento: <strong><a href.*?>(.*?)</a></strong>'
+                    '.*?'
+                    'Nome: <a title=.*?>(.*?)<img .*?></a>'
+                    '.*?'
+                    '<b>Créditos</b><br>\(Teor-Prat-Ext-Est\)<br>'
+                    '<font.*?>(\d+)-(\d+)-(\d+)-(\d+)',
+        TURMAS='<b>Turma</b>.*?<font size=4><b>(\w+)</b></font></div>'
+               '.*?'
+               '<td>Total</td><td>Vagas</td><td><b>(\d+)</b>'
+               '.*?'
+               '<td>Ocupadas</td>'
+               '<td><b><font color=(?:red|green)>(\d+)</font></b></td>' +
+               _ate('<center>') +
+               '(.*?)(?:|<br>)</center>' +
+               _ate('<tr><td colspan=6 bgcolor=white height=20></td></tr>'),
+        HORARIO='<b>((?:Segunda|Terça|Quarta|Quinta|Sexta|Sábado|Domingo))'
+                '</b>.*?'
+                '<font size=1 color=black><b>(.*?)</font>.*?'
+                '<font size=1 color=brown>(.*?)</b></font><br><i>'
+                '<img src=/imagens/subseta_dir.gif align=top> (.*?)</i>',
+        INICIO_DA_RESERVA='Reserva para curso',
+        RESERVA='<td align=left>(.*?)</td>'
+                '<td align=center>(\d+)</td>'
+                '<td align=center>(\d+)</td>')}
+
+
+# Codificação declarada no início de uma página (em bytes, minúsculas).
+_CHARSET = re.compile(br'charset=["\']?([-\w]+)')
+
+# Expressões de PADROES codificadas e compiladas para páginas em bytes, por
+# (tipo de página, codificação), compiladas uma única vez (ver _padroes).
+_PADROES_BINARIOS = {}
+
+# Funções de decodificação dos trechos capturados, por codificação.
+_DECODIFICADORES = {}
+
+
+def _codificacao(pagina_html):
+    '''Retorna a codificação declarada no início da página (em bytes) dada,
+    ou 'utf-8' caso não haja uma (conhecida).'''
+    cabecalho = bytes(pagina_html[:1024]).lower()
+    posicao = cabecalho.find(b'charset=')
+    declarada = _CHARSET.match(cabecalho, posicao) if posicao >= 0 else None
+    if declarada is not None:
+        codificacao = declarada.group(1).decode('ascii')
+        if codificacao in _DECODIFICADORES:
+            return codificacao
+        try:
+            codecs.lookup(codificacao)
+            return codificacao
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+def _mesmo(trecho):
+    '''Retorna o trecho (str) dado, que já é texto.'''
+    return trecho
+
+
+def _padroes(tipo, pagina_html):
+    '''Retorna as expressões regulares do tipo de página dado adequadas ao
+    conteúdo dado e a função que converte em texto (str) os trechos
+    capturados por elas.
+
+    Para páginas em bytes (ou em qualquer objeto com a interface de buffer,
+    como memoryview ou mmap), as expressões são as de PADROES codificadas na
+    codificação declarada pela página, de forma que a busca é feita
+    diretamente sobre o conteúdo e apenas os trechos capturados são
+    decodificados, sem cópia (decodificada) da página inteira.
+    '''
+    if isinstance(pagina_html, str):
+        return PADROES[tipo], _mesmo
+
+    codificacao = _codificacao(pagina_html)
+    padroes = _PADROES_BINARIOS.get((tipo, codificacao))
+    if padroes is None:
+        padroes = {nome: re.compile(padrao.pattern.encode(codificacao),
+                                    padrao.flags & ~re.UNICODE)
+                   for nome, padrao in PADROES[tipo].items()}
+        _PADROES_BINARIOS[(tipo, codificacao)] = padroes
+        _DECODIFICADORES[codificacao] = bytes.decode \
+            if codificacao in ('utf-8', 'utf8') \
+            else methodcaller('decode', codificacao)
+    return padroes, _DECODIFICADORES[codificacao]
+
+
+def _decodifica_se_invalida(metodo):
+    '''Decora um método de análise de forma que, caso algum trecho capturado
+    de uma página em bytes seja inválido em sua codificação, a página seja
+    decodificada inteira (substituindo os bytes inválidos) e analisada como
+    texto. Assim, os trechos podem ser decodificados sem tratamento de
+    erros, que é bem mais lento.
+
+    Nos métodos geradores (itera_<página>), a análise da página decodificada
+    prossegue a partir do primeiro item ainda não gerado.'''
+    if inspect.isgeneratorfunction(metodo):
+        @functools.wraps(metodo)
+        def itera(pagina_html, *argumentos):
+            gerados = 0
+            try:
+                for item in metodo(pagina_html, *argumentos):
+                    yield item
+                    gerados += 1
+            except UnicodeDecodeError:
+                texto = bytes(pagina_html).decode(_codificacao(pagina_html),
+                                                  'replace')
+                for item in islice(metodo(texto, *argumentos), gerados,
+                                   None):
+                    yield item
+        return itera
+
+    @functools.wraps(metodo)
+    def analisa(pagina_html, *argumentos):
+        try:
+            return metodo(pagina_html, *argumentos)
+        except UnicodeDecodeError:
+            return metodo(bytes(pagina_html).decode(
+                _codificacao(pagina_html), 'replace'), *argumentos)
+    return analisa
+
+
+def _turmas_ofertadas(pagina_html, padroes, texto, inicio):
+    '''Gera os pares (turma, informações) das turmas da página de oferta
+    dada (ver Analisador.oferta_dados) a partir da posição dada, à medida
+    que são encontradas.'''
+    for dados in padroes['TURMAS'].finditer(pagina_html, inicio):
+        t, vagas, ocupadas, professores = dados.group(1, 2, 3, 5)
+        turma = {'Vagas': int(vagas),
+                 'Alunos Matriculados': int(ocupadas),
+                 'Professores': texto(professores).split('<br>')}
+
+        turma['Aulas'] = {}
+        horarios = padroes['HORARIO'].findall(pagina_html, *dados.span(4))
+        for dia, inicio_aula, fim_aula, local in horarios:
+            dia = texto(dia)
+            if dia not in turma['Aulas']:
+                turma['Aulas'][dia] = []
+            turma['Aulas'][dia].append({'Início': texto(inicio_aula),
+                                        'Fim': texto(fim_aula),
+                                        'Local': texto(local)})
+
+        reserva = padroes['INICIO_DA_RESERVA'].search(pagina_html,
+                                                       *dados.span(6))
+        if reserva is not None and reserva.end() < dados.end(6):
+            reservas = padroes['RESERVA'].findall(
+                pagina_html, reserva.end(), dados.end(6))
+            turma['Turma Reservada'] = {
+                texto(curso): {'Vagas': int(vagas),
+                               'Calouros': int(calouros)}
+                for curso, vagas, calouros in reservas}
+
+        yield texto(t), turma
+
+
+class Analisador:
+    '''Métodos de extração das informações de cada tipo de página do
+    Matrícula Web.
+
+    Cada método recebe o conteúdo (HTML) da página de mesmo nome e retorna as
+    informações nela contidas, sem qualquer acesso à rede. Desta forma, as
+    páginas podem ser obtidas de qualquer fonte (síncrona ou assíncrona).
+
+    As páginas são percorridas uma única vez: as buscas aninhadas (por
+    exemplo, os horários de uma turma) são restritas ao trecho (início, fim)
+    do resultado da busca externa, sem cópias do conteúdo. O conteúdo pode
+    ser dado como texto (str) ou, como obtido por mweb(), em bytes, caso em
+    que apenas os trechos extraídos são decodificados (ver _padroes).
+
+    Para as páginas de listas (cursos, departamentos, disciplinas e turmas),
+    há também métodos geradores (itera_<página>), que geram os itens à
+    medida que são encontrados na página, sem montar o resultado completo.
+    '''
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def curriculo(pagina_html):
+        '''Retorna um dicionário com a lista de disciplinas definidas no
+        currículo (ver Cursos.curriculo).'''
+        padroes, texto = _padroes('curriculo', pagina_html)
+
+        def disciplinas_do_trecho(inicio, fim):
+            return [(texto(cod), texto(e_ou),
+                     {'Nome': texto(nome).strip(),
+                      'Créditos': {'Teoria': int(teor),
+                                   'Prática': int(prat),
+                                   'Extensão': int(ext),
+                                   'Estudo': int(est)},
+                      'Área': texto(area).strip()})
+                    for (cod, nome, e_ou, teor, prat, ext, est, area)
+                    in padroes['DISCIPLINA'].findall(pagina_html, inicio, fim)]
+
+        disciplinas = {'obrigatórias': {}, 'cadeias': {}, 'optativas': {}}
+        for obr_e_opts in padroes['OBR_OPT'].finditer(pagina_html):
+            disciplinas['obrigatórias'] = {}
+            for cod, e_ou, dados in disciplinas_do_trecho(*obr_e_opts.span(1)):
+                disciplinas['obrigatórias'][cod] = dados
+
+            cadeias = padroes['CADEIAS'].finditer(pagina_html,
+                                                  *obr_e_opts.span(2))
+            for cadeia in cadeias:
+                ciclo = texto(cadeia.group(1))
+                disciplinas['cadeias'][ciclo] = []
+                current = {}
+                for cod, e_ou, dados in disciplinas_do_trecho(*cadeia.span(2)):
+                    current[cod] = dados
+                    if e_ou.strip() != 'E':
+                        disciplinas['cadeias'][ciclo].append(current)
+                        current = {}
+
+            for cod, e_ou, dados in disciplinas_do_trecho(*obr_e_opts.span(3)):
+                disciplinas['optativas'][cod] = dados
+
+        return disciplinas
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def fluxo(pagina_html):
+        '''Retorna um dicionário com a lista de disciplinas por período
+        definidas no fluxo (ver Cursos.fluxo).'''
+        padroes, texto = _padroes('fluxo', pagina_html)
+
+        disciplinas = {}
+        for oferta in padroes['PERIODO'].finditer(pagina_html):
+            periodo = int(oferta.group(1))
+            inicio, fim = oferta.span(3)
+            disciplinas[periodo] = {}
+            disciplinas[periodo]['Créditos'] = texto(oferta.group(2))
+            disciplinas[periodo]['Disciplinas'] = [
+                texto(codigo) for codigo in
+                padroes['DISCIPLINA'].findall(pagina_html, inicio, fim)]
+
+        return disciplinas
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def curso_dados(pagina_html):
+        '''Retorna um dicionário com a lista de informações referentes a cada
+        habilitação do curso (ver Cursos.habilitacoes).'''
+        padroes, texto = _padroes('curso_dados', pagina_html)
+        habilitacoes = padroes['OPCAO'].findall(pagina_html)
+
+        dados = {}
+        for campos in habilitacoes:
+            (habilitacao, nome, grau, l_min, l_max,
+             formatura, obr, opt, livre) = [texto(campo) for campo in campos]
+            dados[habilitacao] = {}
+            dados[habilitacao]['Nome'] = nome
+            dados[habilitacao]['Grau'] = grau
+            dados[habilitacao]['Limite mínimo de permanência'] = l_min
+            dados[habilitacao]['Limite máximo de permanência'] = l_max
+            dados[habilitacao]['Créditos para Formatura'] = formatura
+            dados[habilitacao]['Mínimo de Créditos Optativos na '
+                               'Área de Concentração'] = obr
+            dados[habilitacao]['Quantidade mínima de Créditos Optativos '
+                               'na Área Conexa'] = opt
+            dados[habilitacao]['Quantidade máxima de Créditos no '
+                               'Módulo Livre'] = livre
+        return dados
+
+    @staticmethod
+    def curso_rel(pagina_html):
+        '''Retorna um dicionário com a relação de cursos existentes (ver
+        Cursos.relacao).'''
+        return dict(Analisador.itera_curso_rel(pagina_html))
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def itera_curso_rel(pagina_html):
+        '''Gera os pares (código, informações) dos cursos existentes, à
+        medida que são encontrados na página (ver Cursos.itera_relacao).'''
+        padroes, texto = _padroes('curso_rel', pagina_html)
+        for curso in padroes['CURSOS'].finditer(pagina_html):
+            modalidade, codigo, denominacao, turno = curso.groups()
+            yield texto(codigo), {'Modalidade': texto(modalidade),
+                                  'Denominação': texto(denominacao),
+                                  'Turno': texto(turno)}
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def disciplina(pagina_html):
+        '''Retorna um dicionário com as informações da disciplina (ver
+        Disciplina.informacoes).'''
+        padroes, texto = _padroes('disciplina', pagina_html)
+
+        campos, inicio = [], 0
+        for campo in ('ORGAO', 'DENOMINACAO', 'NIVEL', 'VIGENCIA', 'PRE_REQ',
+                      'EMENTA', 'BIBLIOGRAFIA'):
+            encontrado = padroes[campo].search(pagina_html, inicio)
+            if encontrado is None:
+                return {}
+            campos.append(encontrado)
+            inicio = encontrado.end()
+
+        (orgao, denominacao, nivel, vigencia,
+         pre_req, ementa, bibliografia) = campos
+        programa = padroes['PROGRAMA'].search(pagina_html, ementa.end(),
+                                              bibliografia.start())
+
+        infos = {}
+        infos['Sigla do Departamento'] = texto(orgao.group(1))
+        infos['Nome do Departamento'] = texto(orgao.group(2))
+        infos['Denominação'] = texto(denominacao.group(1))
+        infos['Nível'] = texto(nivel.group(1))
+        infos['Vigência'] = texto(vigencia.group(1))
+        infos['Pré-requisitos'] = texto(pre_req.group(1)).replace('<br>', ' ')
+        infos['Ementa'] = texto(ementa.group(1)).replace('<br />', '\n')
+        if programa and programa.group(1):
+            infos['Programa'] = texto(programa.group(1)).replace('<br />',
+                                                                 '\n')
+        infos['Bibliografia'] = texto(bibliografia.group(1)).replace(
+            '<br />', '\n')
+
+        return infos
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def disciplina_pop(pagina_html):
+        '''Retorna uma lista com os códigos das disciplinas que são
+        pré-requisitos (ver Disciplina.pre_requisitos).'''
+        padroes, texto = _padroes('disciplina_pop', pagina_html)
+        codigo = PADROES['disciplina_pop']['CODIGO']
+
+        pre_reqs = []
+        for req in padroes['DISCIPLINAS'].findall(pagina_html):
+            for disciplina in texto(req).split(' OU<br>'):
+                pre_reqs.append(codigo.findall(disciplina))
+
+        return [codigo for codigo in pre_reqs if codigo]
+
+    @staticmethod
+    def oferta_dep(pagina_html):
+        '''Retorna um dicionário com a lista de departamentos com oferta (ver
+        Oferta.departamentos).'''
+        return dict(Analisador.itera_oferta_dep(pagina_html))
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def itera_oferta_dep(pagina_html):
+        '''Gera os pares (código, informações) dos departamentos com oferta,
+        à medida que são encontrados na página (ver
+        Oferta.itera_departamentos).'''
+        padroes, texto = _padroes('oferta_dep', pagina_html)
+        for departamento in padroes['DEPARTAMENTOS'].finditer(pagina_html):
+            sigla, codigo, denominacao = departamento.groups()
+            yield texto(codigo), {'Sigla': texto(sigla),
+                                  'Denominação': texto(denominacao)}
+
+    @staticmethod
+    def oferta_dis(pagina_html):
+        '''Retorna um dicionário com a lista de disciplinas ofertadas por um
+        departamento (ver Oferta.disciplinas).'''
+        return dict(Analisador.itera_oferta_dis(pagina_html))
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def itera_oferta_dis(pagina_html):
+        '''Gera os pares (código, denominação) das disciplinas ofertadas por
+        um departamento, à medida que são encontradas na página (ver
+        Oferta.itera_disciplinas).'''
+        padroes, texto = _padroes('oferta_dis', pagina_html)
+        for disciplina in padroes['DISCIPLINAS'].finditer(pagina_html):
+            codigo, nome = disciplina.groups()
+            yield texto(codigo), texto(nome)
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def faltavaga_rel(pagina_html, turma='\w+'):
+        '''Retorna um dicionário com a lista de espera das turmas dadas (ver
+        Oferta.lista_de_espera).'''
+        padroes, texto = _padroes('faltavaga_rel', pagina_html)
+        filtro = re.compile('(?:%s)\Z' % turma)
+
+        demanda = {}
+        for tabela in padroes['TABELA'].finditer(pagina_html):
+            inicio, fim = tabela.span()
+            for turma, vagas_desejadas in padroes['TURMAS'].findall(
+                    pagina_html, inicio, fim):
+                vagas, turma = int(vagas_desejadas), texto(turma)
+                if vagas > 0 and filtro.match(turma):
+                    demanda[turma] = vagas
+
+        return demanda
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def oferta_dados(pagina_html):
+        '''Retorna um dicionário com a lista de turmas ofertadas para uma
+        disciplina (ver Oferta.oferta).'''
+        padroes, texto = _padroes('oferta_dados', pagina_html)
+
+        oferta, inicio = {}, 0
+        informacoes = padroes['INFORMACOES'].search(pagina_html)
+        if informacoes:
+            departamento, nome, teor, prat, ext, est = informacoes.groups()
+            oferta['Departamento'] = texto(departamento)
+            oferta['Nome'] = texto(nome)
+            oferta['Créditos'] = {'Teoria': int(teor), 'Prática': int(prat),
+                                  'Extensão': int(ext), 'Estudo': int(est)}
+            inicio = informacoes.end()
+
+        oferta['Turmas'] = dict(_turmas_ofertadas(pagina_html, padroes, texto,
+                                                  inicio))
+
+        return oferta
+
+    @staticmethod
+    @_decodifica_se_invalida
+    def itera_oferta_dados(pagina_html):
+        '''Gera os pares (turma, informações) das turmas ofertadas para uma
+        disciplina, à medida que são encontradas na página (ver
+        Oferta.itera_turmas).'''
+        padroes, texto = _padroes('oferta_dados', pagina_html)
+        informacoes = padroes['INFORMACOES'].search(pagina_html)
+        inicio = informacoes.end() if informacoes else 0
+        for turma in _turmas_ofertadas(pagina_html, padroes, texto, inicio):
+            yield turma
+
+
+# Analisadores de páginas disponíveis, por nome. Todos produzem os mesmos
+# resultados; os que dependem de pacotes opcionais ficam em módulos próprios
+# (mweb<nome>.py, por exemplo mweblxml.py), carregados sob demanda.
+ANALISADORES = {'regex': Analisador}
+_analisador = Analisador
+
+
+def _analisador_de(nome):
+    '''Retorna o analisador de páginas de nome dado, ou o padrão caso o nome
+    seja None.'''
+    if nome is None:
+        return _analisador
+    if nome not in ANALISADORES:
+        __import__('mweb' + nome)  # o módulo se registra em ANALISADORES
+    return ANALISADORES[nome]
+
+
+def _nome_do_analisador(analisador):
+    '''Retorna o nome (ver ANALISADORES) do analisador de páginas dado.'''
+    for nome, registrado in ANALISADORES.items():
+        if registrado is analisador:
+            return nome
+    raise ValueError('Analisador não registrado: %r' % analisador)
+
+
+class Memoria:
+    '''Memória (LRU) dos resultados das análises das páginas, de forma que
+    buscas repetidas não precisem analisá-las novamente.
+
+    Cada resultado é identificado pela busca que o produziu (ver
+    _chave_da_busca) e tem validade de acordo com o tipo da página (ver
+    Cache.VALIDADE). Ao ultrapassar o limite de resultados, os acessados há
+    mais tempo são descartados. Os resultados são guardados e devolvidos como
+    cópias, de forma que alterações feitas por quem os recebe não afetam a
+    memória.
+    '''
+
+    def __init__(self, limite=1024, validade=None):
+        '''Argumentos:
+        limite -- quantidade máxima de resultados guardados
+                  (default 1024)
+        validade -- dicionário que sobrescreve a validade (em segundos) de
+                    tipos de página específicos (ver Cache.VALIDADE)
+                    (default None)
+        '''
+        self.limite = limite
+        self.validade = dict(Cache.VALIDADE, **(validade or {}))
+        self._resultados = OrderedDict()
+        self._trava = threading.Lock()
+        self.estatisticas = {'acertos': 0, 'faltas': 0}
+
+    def busca(self, chave):
+        '''Retorna uma tupla (resultado,) com uma cópia do resultado da busca
+        dada, ou None caso ele não esteja na memória (ou tenha expirado).'''
+        with self._trava:
+            guardado = self._resultados.get(chave)
+            if guardado is None or guardado[1] <= time.time():
+                self.estatisticas['faltas'] += 1
+                return None
+            self._resultados.pop(chave)
+            self._resultados[chave] = guardado
+            self.estatisticas['acertos'] += 1
+        return (_copia(guardado[0]),)
+
+    def guarda(self, chave, resultado):
+        '''Guarda uma cópia do resultado da busca dada.'''
+        validade = self.validade.get(chave[1], Cache.HORA)
+        guardado = (_copia(resultado), time.time() + validade)
+        with self._trava:
+            self._resultados.pop(chave, None)
+            self._resultados[chave] = guardado
+            while len(self._resultados) > self.limite:
+                self._resultados.popitem(last=False)
+
+    def invalida(self, pagina=None, codigo=None):
+        '''Descarta os resultados das buscas da página (ver Cache.VALIDADE)
+        e do código dados, ou de todas as buscas caso não sejam dados.
+
+        Argumentos:
+        pagina -- o tipo de página, por exemplo 'oferta_dados'
+                  (default None)
+        codigo -- o código (curso, disciplina etc.) buscado
+                  (default None)
+        '''
+        codigo = None if codigo is None else ('cod', str(codigo))
+        with self._trava:
+            for chave in list(self._resultados):
+                if (pagina is None or chave[1] == pagina) and \
+                        (codigo is None or codigo in chave[2]):
+                    del self._resultados[chave]
+
+    def limpa(self):
+        '''Descarta todos os resultados.'''
+        self.invalida()
+
+    def __len__(self):
+        return len(self._resultados)
+
+
+def _copia(valor):
+    '''Retorna uma cópia (profunda) do resultado de uma análise, composto de
+    dicionários, listas, strings e números. Bem mais rápida que
+    copy.deepcopy para esses tipos.'''
+    tipo = type(valor)
+    if tipo is dict:
+        return {chave: _copia(item) for chave, item in valor.items()}
+    if tipo is list:
+        return [_copia(item) for item in valor]
+    if tipo in (str, bytes, int, float, bool) or valor is None:
+        return valor
+    return copy.deepcopy(valor)
+
+
+# Memória dos resultados das análises (desabilitada por padrão).
+_memoria = None
+
+
+def configura_memoria(limite=1024, validade=None):
+    '''Habilita a memória dos resultados das buscas feitas pelos métodos de
+    Cursos, Disciplina e Oferta e a retorna.
+
+    Argumentos:
+    limite -- quantidade máxima de resultados guardados; caso seja 0 (ou
+              None), a memória é desabilitada
+              (default 1024)
+    validade -- dicionário que sobrescreve a validade (em segundos) de tipos
+                de página específicos (ver Cache.VALIDADE)
+                (default None)
+    '''
+    global _memoria
+    _memoria = Memoria(limite, validade) if limite else None
+    return _memoria
+
+
+def _busca(nivel, pagina, params, analisador=None, *argumentos):
+    '''Busca a página dada e retorna o resultado da sua análise (ver
+    ANALISADORES), com os argumentos dados. Resultados na memória (ver
+    Memoria) são reaproveitados, e buscas simultâneas iguais compartilham a
+    requisição e a análise (ver Agrupador).'''
+    analisador = _analisador_de(analisador)
+    chave = _chave_da_busca(nivel, pagina, params, analisador.__name__,
+                           *argumentos)
+    memoria, metricas = _memoria, _metricas
+    if memoria is not None:
+        guardado = memoria.busca(chave)
+        if metricas is not None:
+            metricas.conta('memoria_acertos' if guardado else
+                           'memoria_faltas', pagina)
+        if guardado:
+            return guardado[0]
+
+    def busca():
+        pagina_html = mweb(nivel, pagina, params)
+        resultado = _analisa(analisador, pagina, pagina_html, argumentos,
+                             metricas)
+        if memoria is not None and pagina_html:
+            memoria.guarda(chave, resultado)
+        return resultado
+
+    return _agrupador.executa(chave, busca)
+
+
+def _analisa(analisador, pagina, pagina_html, argumentos, metricas=None):
+    '''Retorna o resultado da análise da página dada, registrando o tempo de
+    análise e a quantidade de valores extraídos nas métricas dadas.'''
+    with trecho('analise', pagina=pagina):
+        if metricas is None:
+            return getattr(analisador, pagina)(pagina_html, *argumentos)
+
+        inicio = time.time()
+        resultado = getattr(analisador, pagina)(pagina_html, *argumentos)
+        metricas.observa('analise', pagina, time.time() - inicio)
+        metricas.observa('valores', pagina, _valores(resultado))
+        return resultado
+
+
+def _itera_busca(nivel, pagina, params, analisador=None):
+    '''Busca a página dada e gera os itens da sua análise à medida que são
+    encontrados na página (ver os métodos itera_<página> dos ANALISADORES),
+    sem montar o resultado completo: o primeiro item não aguarda a análise
+    da página inteira, e quem consome os itens pode liberá-los antes do fim.
+    Ao contrário de _busca, os resultados não são guardados na memória (ver
+    Memoria), nem buscas simultâneas iguais são agrupadas.'''
+    analisador = _analisador_de(analisador)
+    metricas = _metricas
+    itens = getattr(analisador, 'itera_' + pagina)(mweb(nivel, pagina,
+                                                        params))
+    analise = 0  # sem o tempo de quem consome os itens
+    try:
+        while True:
+            inicio = time.time()
+            try:
+                item = next(itens)
+            except StopIteration:
+                break
+            finally:
+                analise += time.time() - inicio
+            yield item
+    finally:
+        # Registrada também quando quem consome os itens para antes do fim.
+        if metricas is not None:
+            metricas.observa('analise', pagina, analise)
+
+
+def _analisa_em_processo(tarefa):
+    '''Analisa, em um dos processos de busca_em_processos, o conteúdo de uma
+    página e retorna a tripla (busca, resultado, tempo de análise), sendo o
+    resultado compactado pela função dada (caso haja).'''
+    busca, pagina_html, nome, compacta = tarefa
+    inicio = time.time()
+    resultado = getattr(_analisador_de(nome), busca[0])(pagina_html)
+    if compacta is not None:
+        resultado = compacta(resultado)
+    return busca, resultado, time.time() - inicio
+
+
+def busca_em_processos(buscas, nivel=Nivel.GRADUACAO, trabalhadores=8,
+                       processos=None, pendentes=None, analisador=None,
+                       compacta=None):
+    '''Busca e analisa as páginas dadas em duas etapas encadeadas: um pool de
+    threads apenas obtém o conteúdo (bytes) das páginas (ver mweb) e um pool
+    de processos as analisa, de forma que a análise, limitada pela CPU, não
+    disputa o GIL com as requisições. Cada etapa tem no máximo a quantidade
+    dada de páginas pendentes (ver _em_fluxo), de forma que a memória usada é
+    limitada mesmo que a análise seja mais lenta que as requisições. Gera as
+    triplas (página, params, resultado) à medida que são concluídas (fora de
+    ordem).
+
+    Os resultados (não compactados) são guardados na memória (ver
+    configura_memoria), mas não são buscados nela: a intenção é uma busca
+    completa, em que cada página é buscada uma única vez.
+
+    Argumentos:
+    buscas -- coleção (ou gerador) de pares (página, params), por exemplo
+              ('oferta_dados', {'cod': '116319'})
+    nivel -- nível acadêmico das páginas buscadas
+             (default Nivel.GRADUACAO)
+    trabalhadores -- quantidade máxima de requisições simultâneas
+                     (default 8)
+    processos -- quantidade de processos de análise
+                 (default None) (a quantidade de CPUs)
+    pendentes -- quantidade máxima de páginas pendentes em cada etapa
+                 (default None) (o dobro de trabalhadores/processos)
+    analisador -- nome do analisador de páginas (ver ANALISADORES)
+                  (default None) (o definido em configura_analisador)
+    compacta -- função aplicada ao resultado de cada análise no próprio
+                processo de análise, por exemplo para convertê-lo em um
+                registro compacto (ver mwebregistros); precisa ser
+                serializável (pickle), ou seja, definida no nível de um
+                módulo
+                (default None)
+    '''
+    analisador = _analisador_de(analisador)
+    nome = _nome_do_analisador(analisador)
+    processos = processos or os.cpu_count() or 1
+    memoria, metricas = _memoria, _metricas
+
+    def baixa(busca):
+        pagina, params = busca
+        return (pagina, params), mweb(nivel, pagina, params)
+
+    baixadas = _em_fluxo(baixa, buscas, trabalhadores, pendentes)
+    tarefas = ((busca, pagina_html, nome, compacta)
+               for busca, pagina_html in baixadas)
+    for busca, resultado, tempo in _em_fluxo(_analisa_em_processo, tarefas,
+                                             processos, pendentes, True):
+        pagina, params = busca
+        if metricas is not None:
+            metricas.observa('analise', pagina, tempo)
+        if compacta is None:
+            if metricas is not None:
+                metricas.observa('valores', pagina, _valores(resultado))
+            if memoria is not None:
+                memoria.guarda(_chave_da_busca(nivel, pagina, params,
+                                               analisador.__name__),
+                               resultado)
+        yield pagina, params, resultado
+
+
+def configura_analisador(nome='regex'):
+    '''Define o analisador de páginas usado pelos métodos de busca quando
+    nenhum é especificado, e o retorna.
+
+    Argumentos:
+    nome -- nome do analisador (ver ANALISADORES)
+            (default 'regex')
+    '''
+    global _analisador
+    _analisador = _analisador_de(nome)
+    return _analisador
+
+
 class Cursos:
     '''Métodos de busca associados a informações de cursos.'''
 
     @staticmethod
-    def curriculo(curso, nivel=Nivel.GRADUACAO, verbose=False):
+    def curriculo(curso, nivel=Nivel.GRADUACAO, verbose=False,
+                  analisador=None):
         '''Acessa o Matrícula Web e retorna um dicionário com a lista de
         disciplinas definidas no currículo do curso.
 
@@ -77,6 +1890,8 @@ class Cursos:
                  (default Nivel.GRADUACAO)
         verbose -- indicação dos procedimentos sendo adotados
                    (default False)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
 
         No caso de disciplinas de cadeias seletivas, o resultado é uma lista em
         que cada item tem uma relação 'OU' com os demais, e cada item é um
@@ -93,58 +1908,77 @@ class Cursos:
         aprovado na disciplina QUIMICA GERAL ou ter sido aprovado em ambas as
         disciplinas QUI GERAL EXPERIMENTAL e QUIMICA GERAL TEORICA.
         '''
-
-        OBR_OPT = 'DISCIPLINAS OBRIGATÓRIAS (.*?)</table></td>(.*?)' \
-                  'DISCIPLINAS OPTATIVAS (.*?)</table></td>'
-        CADEIAS = 'CADEIA: (\d+)(.*?)</table>'
-        DISCIPLINA = 'disciplina.aspx\?cod=(\d+)>.*?</b> - (.*?)</a></td>' \
-                     '<td><b>(.*?)</b></td><td>(\d+) (\d+) (\d+) (\d+)</td>' \
-                     '<td>(.*?)</td></tr>'
-
         curso = str(curso)
         if verbose:
             log('Buscando currículo do curso ' + curso)
 
-        pagina_html = mweb(nivel, 'curriculo', {'cod': curso})
-        obr_e_opts = busca(OBR_OPT, pagina_html)
+        return _busca(nivel, 'curriculo', {'cod': curso}, analisador)
 
-        disciplinas = {'obrigatórias': {}, 'cadeias': {}, 'optativas': {}}
-        for obrigatorias, cadeias, optativas in obr_e_opts:
-            disciplinas['obrigatórias'] = {}
-            for (cod, nome, e_ou, teor,
-                 prat, ext, est, area) in busca(DISCIPLINA, obrigatorias):
-                creditos = {'Teoria': int(teor), 'Prática': int(prat),
-                            'Extensão': int(ext), 'Estudo': int(est)}
-                disciplinas['obrigatórias'][cod] = {'Nome': nome.strip(),
-                                                    'Créditos': creditos,
-                                                    'Área': area.strip()}
-
-            for ciclo, discs in busca(CADEIAS, cadeias):
-                disciplinas['cadeias'][ciclo] = []
-                current = {}
-                for (cod, nome, e_ou, teor,
-                     prat, ext, est, area) in busca(DISCIPLINA, discs):
-                    creditos = {'Teoria': int(teor), 'Prática': int(prat),
-                                'Extensão': int(ext), 'Estudo': int(est)}
-                    current[cod] = {'Nome': nome.strip(),
-                                    'Créditos': creditos,
-                                    'Área': area.strip()}
-                    if e_ou.strip() != 'E':
-                        disciplinas['cadeias'][ciclo].append(current)
-                        current = {}
+    @staticmethod
+    def curriculo_em_lote(cursos, nivel=Nivel.GRADUACAO, verbose=False,
+                          trabalhadores=8, analisador=None):
+        '''Acessa o Matrícula Web concorrentemente e gera os pares (curso,
+        currículo) dos cursos dados, à medida que são obtidos (ver
+        Cursos.curriculo).
 
-            for (cod, nome, e_ou, teor,
-                 prat, ext, est, area) in busca(DISCIPLINA, optativas):
-                creditos = {'Teoria': int(teor), 'Prática': int(prat),
-                            'Extensão': int(ext), 'Estudo': int(est)}
-                disciplinas['optativas'][cod] = {'Nome': nome.strip(),
-                                                 'Créditos': creditos,
-                                                 'Área': area.strip()}
+        Argumentos:
+        cursos -- coleção de códigos de cursos (repetições são ignoradas)
+        nivel -- nível acadêmico dos cursos
+                 (default Nivel.GRADUACAO)
+        verbose -- indicação dos procedimentos sendo adotados
+                   (default False)
+        trabalhadores -- quantidade máxima de buscas simultâneas
+                         (default 8)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
+        '''
+        def curriculo(curso):
+            return Cursos.curriculo(curso, nivel, verbose, analisador)
 
-        return disciplinas
+        return _em_lote(curriculo, cursos, trabalhadores)
 
     @staticmethod
-    def fluxo(habilitacao, nivel=Nivel.GRADUACAO, verbose=False):
+    def curriculo_em_processos(cursos, nivel=Nivel.GRADUACAO, verbose=False,
+                               trabalhadores=8, processos=None,
+                               pendentes=None, analisador=None,
+                               compacta=None):
+        '''Como Cursos.curriculo_em_lote, mas com as páginas analisadas em
+        um pool de processos, separado das requisições (ver
+        busca_em_processos).
+
+        Argumentos:
+        cursos -- coleção (ou gerador) de códigos de cursos (repetições são
+                  ignoradas)
+        nivel -- nível acadêmico dos cursos
+                 (default Nivel.GRADUACAO)
+        verbose -- indicação dos procedimentos sendo adotados
+                   (default False)
+        trabalhadores -- quantidade máxima de requisições simultâneas
+                         (default 8)
+        processos -- quantidade de processos de análise
+                     (default None) (a quantidade de CPUs)
+        pendentes -- quantidade máxima de páginas pendentes em cada etapa
+                     (default None) (o dobro de trabalhadores/processos)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
+        compacta -- função aplicada a cada currículo no processo de
+                    análise (ver busca_em_processos)
+                    (default None)
+        '''
+        def buscas():
+            for curso in _sem_repeticoes(cursos):
+                if verbose:
+                    log('Buscando currículo do curso ' + curso)
+                yield 'curriculo', {'cod': curso}
+
+        for _, params, curriculo in busca_em_processos(
+                buscas(), nivel, trabalhadores, processos, pendentes,
+                analisador, compacta):
+            yield params['cod'], curriculo
+
+    @staticmethod
+    def fluxo(habilitacao, nivel=Nivel.GRADUACAO, verbose=False,
+              analisador=None):
         '''Acessa o Matrícula Web e retorna um dicionário com a lista de
         disciplinas por período definidas no fluxo da habilitação.
 
@@ -154,31 +1988,21 @@ class Cursos:
                  (default Nivel.GRADUACAO)
         verbose -- indicação dos procedimentos sendo adotados
                    (default False)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
         '''
-        PERIODO = '<b>PERÍODO: (\d+).*?CRÉDITOS:</b> (\d+)</td>' \
-                  '(.*?)</tr></table>'
-        DISCIPLINA = 'disciplina.aspx\?cod=\d+>(\d+)</a>'
-
         habilitacao = str(habilitacao)
         if verbose:
             log('Buscando disciplinas no fluxo da habilitação ' +
                 habilitacao)
 
-        pagina_html = mweb(nivel, 'fluxo', {'cod': habilitacao})
-        oferta = busca(PERIODO, pagina_html)
-
-        disciplinas = {}
-        for periodo, creditos, dados in oferta:
-            periodo = int(periodo)
-            disciplinas[periodo] = {}
-            disciplinas[periodo]['Créditos'] = creditos
-            disciplinas[periodo]['Disciplinas'] = busca(DISCIPLINA, dados)
-
-        return disciplinas
+        return _busca(nivel, 'fluxo', {'cod': habilitacao}, analisador)
 
     @staticmethod
-    def habilitacoes(curso, nivel=Nivel.GRADUACAO,
-                     campus=Campus.DARCY_RIBEIRO, verbose=False):
+    def habilitacoes(curso,
+                     nivel=Nivel.GRADUACAO,
+                     campus=Campus.DARCY_RIBEIRO, verbose=False,
+                     analisador=None):
         '''Acessa o Matrícula Web e retorna um dicionário com a lista de
         informações referentes a cada habilitação no curso.
 
@@ -190,51 +2014,19 @@ class Cursos:
                   (default DARCY_RIBEIRO)
         verbose -- indicação dos procedimentos sendo adotados
                    (default False)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
         '''
-        OPCAO = '<a name=\d+></a><tr .*?><td  colspan=3><b>(\d+) - (.*?)' \
-                '</b></td></tr>.*?' \
-                'Grau: </td><td .*?>(.*?)</td></tr>.*?' \
-                'Limite mínimo de permanência: </td>' \
-                '<td align=right>(\d+)</td>.*?' \
-                'Limite máximo de permanência: </td>.*?' \
-                '<td align=right>(\d+)</td>.*?' \
-                'Quantidade de Créditos para Formatura: </td>' \
-                '<td align=right>(\d+)</td>.*?' \
-                'Quantidade mínima de Créditos Optativos ' \
-                'na Área de Concentração: </td>' \
-                '<td align=right>(\d+)</td>.*?' \
-                'Quantidade mínima de Créditos Optativos na Área Conexa: ' \
-                '</td><td align=right>(\d+)</td>.*?' \
-                'Quantidade máxima de Créditos no Módulo Livre: </td>' \
-                '<td align=right>(\d+)</td>'
-
         curso = str(curso)
         if verbose:
             log('Buscando informações da habilitação do curso ' + curso)
 
-        pagina_html = mweb(nivel, 'curso_dados', {'cod': curso})
-        habilitacoes = busca(OPCAO, pagina_html)
-
-        dados = {}
-        for (habilitacao, nome, grau, l_min, l_max,
-             formatura, obr, opt, livre) in habilitacoes:
-            dados[habilitacao] = {}
-            dados[habilitacao]['Nome'] = nome
-            dados[habilitacao]['Grau'] = grau
-            dados[habilitacao]['Limite mínimo de permanência'] = l_min
-            dados[habilitacao]['Limite máximo de permanência'] = l_max
-            dados[habilitacao]['Créditos para Formatura'] = formatura
-            dados[habilitacao]['Mínimo de Créditos Optativos na '
-                               'Área de Concentração'] = obr
-            dados[habilitacao]['Quantidade mínima de Créditos Optativos '
-                               'na Área Conexa'] = opt
-            dados[habilitacao]['Quantidade máxima de Créditos no '
-                               'Módulo Livre'] = livre
-        return dados
+        return _busca(nivel, 'curso_dados', {'cod': curso}, analisador)
 
     @staticmethod
-    def relacao(nivel=Nivel.GRADUACAO, campus=Campus.DARCY_RIBEIRO,
-                verbose=False):
+    def relacao(nivel=Nivel.GRADUACAO,
+                campus=Campus.DARCY_RIBEIRO,
+                verbose=False, analisador=None):
         '''Acessa o Matrícula Web e retorna um dicionário com a relação de
         cursos existentes.
 
@@ -245,35 +2037,33 @@ class Cursos:
                   (default DARCY_RIBEIRO)
         verbose -- indicação dos procedimentos sendo adotados
                    (default False)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
         '''
-        CURSOS = '<tr CLASS=PadraoMenor bgcolor=.*?>'\
-                 '<td>(.*?)</td>' \
-                 '<td>\d+</td>' \
-                 '.*?aspx\?cod=(\d+)>(.*?)</a></td>' \
-                 '<td>(.*?)</td></tr>'
-
         campus = str(campus)
         if verbose:
             log('Buscando lista de cursos para o campus ' + campus)
 
-        pagina_html = mweb(nivel, 'curso_rel', {'cod': campus})
-        cursos_existentes = busca(CURSOS, pagina_html)
+        return _busca(nivel, 'curso_rel', {'cod': campus}, analisador)
 
-        lista = {}
-        for modalidade, codigo, denominacao, turno in cursos_existentes:
-            lista[codigo] = {}
-            lista[codigo]['Modalidade'] = modalidade
-            lista[codigo]['Denominação'] = denominacao
-            lista[codigo]['Turno'] = turno
+    @staticmethod
+    def itera_relacao(nivel=Nivel.GRADUACAO, campus=Campus.DARCY_RIBEIRO,
+                      verbose=False, analisador=None):
+        '''Gera os pares (código, informações) dos cursos existentes, à
+        medida que são encontrados na página (ver Cursos.relacao).'''
+        campus = str(campus)
+        if verbose:
+            log('Buscando lista de cursos para o campus ' + campus)
 
-        return lista
+        return _itera_busca(nivel, 'curso_rel', {'cod': campus}, analisador)
 
 
 class Disciplina:
     '''Métodos de busca associados a informações de disciplinas.'''
 
     @staticmethod
-    def informacoes(disciplina, nivel=Nivel.GRADUACAO, verbose=False):
+    def informacoes(disciplina, nivel=Nivel.GRADUACAO, verbose=False,
+                    analisador=None):
         '''Acessa o Matrícula Web e retorna um dicionário com as informações da
         disciplina.
 
@@ -283,45 +2073,43 @@ class Disciplina:
                  (default Nivel.GRADUACAO)
         verbose -- indicação dos procedimentos sendo adotados
                    (default False)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
         '''
-        DISCIPLINAS = 'Órgão:</b> </td><td>(\w+) - (.*?)</td></tr>.*?' \
-                      'Denominação:</b> </td><td>(.*?)</td></tr>.*?' \
-                      'Nível:</b> </td><td>(.*?)</td></tr>.*?' \
-                      'Vigência:</b> </td><td>(.*?)</td></tr>.*?' \
-                      'Pré-req:</b> </td><td class=PadraoMenor>(.*?)' \
-                      '</td></tr>.*?' \
-                      'Ementa:</b> </td><td class=PadraoMenor>' \
-                      '<p align=justify>(.*?)</P></td></tr>.*?' \
-                      '(?:.*Programa:</b> </td><td class=PadraoMenor>' \
-                      '<p align=justify>(.*?)</P></td></tr>)?.*?' \
-                      'Bibliografia:</b> </td><td class=PadraoMenor>' \
-                      '<p align=justify>(.*?)</P></td></tr>'
-
         disciplina = str(disciplina)
         if verbose:
             log('Buscando informações da disciplina ' + disciplina)
 
-        pagina_html = mweb(nivel, 'disciplina', {'cod': disciplina})
-        informacoes = busca(DISCIPLINAS, pagina_html)
+        return _busca(nivel, 'disciplina', {'cod': disciplina}, analisador)
 
-        infos = {}
-        for (sigla, nome, denominacao, nivel, vigencia,
-             pre_req, ementa, programa, bibliografia) in informacoes:
-            infos['Sigla do Departamento'] = sigla
-            infos['Nome do Departamento'] = nome
-            infos['Denominação'] = denominacao
-            infos['Nível'] = nivel  # sobrescreve o argumento da função
-            infos['Vigência'] = vigencia
-            infos['Pré-requisitos'] = pre_req.replace('<br>', ' ')
-            infos['Ementa'] = ementa.replace('<br />', '\n')
-            if programa:
-                infos['Programa'] = programa.replace('<br />', '\n')
-            infos['Bibliografia'] = bibliografia.replace('<br />', '\n')
+    @staticmethod
+    def informacoes_em_lote(disciplinas, nivel=Nivel.GRADUACAO, verbose=False,
+                            trabalhadores=8, analisador=None):
+        '''Acessa o Matrícula Web concorrentemente e gera os pares
+        (disciplina, informações) das disciplinas dadas, à medida que são
+        obtidos (ver Disciplina.informacoes).
 
-        return infos
+        Argumentos:
+        disciplinas -- coleção de códigos de disciplinas (repetições são
+                       ignoradas)
+        nivel -- nível acadêmico das disciplinas
+                 (default Nivel.GRADUACAO)
+        verbose -- indicação dos procedimentos sendo adotados
+                   (default False)
+        trabalhadores -- quantidade máxima de buscas simultâneas
+                         (default 8)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
+        '''
+        def informacoes(disciplina):
+            return Disciplina.informacoes(disciplina, nivel, verbose,
+                                          analisador)
+
+        return _em_lote(informacoes, disciplinas, trabalhadores)
 
     @staticmethod
-    def pre_requisitos(disciplina, nivel=Nivel.GRADUACAO, verbose=False):
+    def pre_requisitos(disciplina, nivel=Nivel.GRADUACAO, verbose=False,
+                       analisador=None):
         '''Dado o código de uma disciplina, acessa o Matrícula Web e retorna
         uma lista com os códigos das disciplinas que são pré-requisitos para a
         dada.
@@ -332,6 +2120,8 @@ class Disciplina:
                  (default Nivel.GRADUACAO)
         verbose -- indicação dos procedimentos sendo adotados
                    (default False)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
 
         Cada item da lista tem uma relação 'OU' com os demais, e cada item é
         uma outra lista cujos itens têm uma relação 'E' entre si. Por exemplo:
@@ -345,31 +2135,46 @@ class Disciplina:
         aprovado nas disciplinas 116394 (ORG ARQ DE COMPUTADORES) e 113042
         (Cálculo 2).
         '''
-        DISCIPLINAS = '<td valign=top><b>Pré-req:</b> </td>' \
-                      '<td class=PadraoMenor>(.*?)</td></tr>'
-        CODIGO = '(\d{6})'
-
         disciplina = str(disciplina)
         if verbose:
             log('Buscando a lista de pré-requisitos para a disciplina ' +
                 disciplina)
 
-        pagina_html = mweb(nivel, 'disciplina_pop', {'cod': disciplina})
-        requisitos = busca(DISCIPLINAS, pagina_html)
+        return _busca(nivel, 'disciplina_pop', {'cod': disciplina}, analisador)
 
-        pre_reqs = []
-        for req in requisitos:
-            for disciplina in req.split(' OU<br>'):
-                pre_reqs.append(busca(CODIGO, disciplina))
+    @staticmethod
+    def pre_requisitos_em_lote(disciplinas, nivel=Nivel.GRADUACAO,
+                               verbose=False, trabalhadores=8,
+                               analisador=None):
+        '''Acessa o Matrícula Web concorrentemente e gera os pares
+        (disciplina, pré-requisitos) das disciplinas dadas, à medida que são
+        obtidos (ver Disciplina.pre_requisitos).
 
-        return [codigo for codigo in pre_reqs if codigo]
+        Argumentos:
+        disciplinas -- coleção de códigos de disciplinas (repetições são
+                       ignoradas)
+        nivel -- nível acadêmico das disciplinas
+                 (default Nivel.GRADUACAO)
+        verbose -- indicação dos procedimentos sendo adotados
+                   (default False)
+        trabalhadores -- quantidade máxima de buscas simultâneas
+                         (default 8)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
+        '''
+        def pre_requisitos(disciplina):
+            return Disciplina.pre_requisitos(disciplina, nivel, verbose,
+                                             analisador)
+
+        return _em_lote(pre_requisitos, disciplinas, trabalhadores)
 
 
 class Oferta:
     '''Métodos de busca associados a informações da oferta de disciplinas.'''
     @staticmethod
-    def departamentos(nivel=Nivel.GRADUACAO, campus=Campus.DARCY_RIBEIRO,
-                      verbose=False):
+    def departamentos(nivel=Nivel.GRADUACAO,
+                      campus=Campus.DARCY_RIBEIRO,
+                      verbose=False, analisador=None):
         '''Acessa o Matrícula Web e retorna um dicionário com a lista de
         departamentos com ofertas do semestre atual.
 
@@ -380,27 +2185,29 @@ class Oferta:
                   (default Campus.DARCY_RIBEIRO)
         verbose -- indicação dos procedimentos sendo adotados
                    (default False)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
         '''
-        DEPARTAMENTOS = '<tr CLASS=PadraoMenor bgcolor=.*?>'\
-                        '<td>\d+</td><td>(\w+)</td>' \
-                        '.*?aspx\?cod=(\d+)>(.*?)</a></td></tr>'
-
         if verbose:
             log('Buscando a informações de departamentos com oferta')
 
-        pagina_html = mweb(nivel, 'oferta_dep', {'cod': str(campus)})
-        deptos_existentes = busca(DEPARTAMENTOS, pagina_html)
+        return _busca(nivel, 'oferta_dep', {'cod': str(campus)}, analisador)
 
-        deptos = {}
-        for sigla, codigo, denominacao in deptos_existentes:
-            deptos[codigo] = {}
-            deptos[codigo]['Sigla'] = sigla
-            deptos[codigo]['Denominação'] = denominacao
+    @staticmethod
+    def itera_departamentos(nivel=Nivel.GRADUACAO,
+                            campus=Campus.DARCY_RIBEIRO, verbose=False,
+                            analisador=None):
+        '''Gera os pares (código, informações) dos departamentos com oferta, à
+        medida que são encontrados na página (ver Oferta.departamentos).'''
+        if verbose:
+            log('Buscando a informações de departamentos com oferta')
 
-        return deptos
+        return _itera_busca(nivel, 'oferta_dep', {'cod': str(campus)},
+                            analisador)
 
     @staticmethod
-    def disciplinas(departamento, nivel=Nivel.GRADUACAO, verbose=False):
+    def disciplinas(departamento, nivel=Nivel.GRADUACAO, verbose=False,
+                    analisador=None):
         '''Acessa o Matrícula Web e retorna um dicionário com a lista de
         disciplinas ofertadas por um departamento.
 
@@ -410,29 +2217,37 @@ class Oferta:
                  (default Nivel.GRADUACAO)
         verbose -- indicação dos procedimentos sendo adotados
                    (default False)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
 
         Lista completa dos Departamentos da UnB:
         matriculaweb.unb.br/matriculaweb/graduacao/oferta_dep.aspx?cod=1
         '''
-        DISCIPLINAS = 'oferta_dados.aspx\?cod=(\d+).*?>(.*?)</a>'
-
         departamento = str(departamento)
         if verbose:
             log('Buscando a informações de disciplinas do departamento ' +
                 departamento)
 
-        pagina_html = mweb(nivel, 'oferta_dis', {'cod': departamento})
-        ofertadas = busca(DISCIPLINAS, pagina_html)
+        return _busca(nivel, 'oferta_dis', {'cod': departamento}, analisador)
 
-        oferta = {}
-        for codigo, nome in ofertadas:
-            oferta[codigo] = nome
+    @staticmethod
+    def itera_disciplinas(departamento, nivel=Nivel.GRADUACAO, verbose=False,
+                          analisador=None):
+        '''Gera os pares (código, denominação) das disciplinas ofertadas pelo
+        departamento, à medida que são encontradas na página (ver
+        Oferta.disciplinas).'''
+        departamento = str(departamento)
+        if verbose:
+            log('Buscando a informações de disciplinas do departamento ' +
+                departamento)
 
-        return oferta
+        return _itera_busca(nivel, 'oferta_dis', {'cod': departamento},
+                            analisador)
 
     @staticmethod
-    def lista_de_espera(disciplina, turma='\w+', nivel=Nivel.GRADUACAO,
-                        verbose=False):
+    def lista_de_espera(disciplina, turma='\w+',
+                        nivel=Nivel.GRADUACAO,
+                        verbose=False, analisador=None):
         '''Dado o código de uma disciplina, acessa o Matrícula Web e retorna um
         dicionário com a lista de espera para turmas ofertadas da disciplina.
 
@@ -444,36 +2259,23 @@ class Oferta:
                  (default Nivel.GRADUACAO)
         verbose -- indicação dos procedimentos sendo adotados
                    (default False)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
 
         O argumento 'turma' deve ser uma expressão regular.
         '''
-        TABELA = '<td><b>Turma</b></td>    ' \
-                 '<td><b>Vagas<br>Solicitadas</b></td>  </tr>' \
-                 '<tr CLASS=PadraoMenor bgcolor=.*?>  ' \
-                 '.*?</tr><tr CLASS=PadraoBranco>'
-        TURMAS = '<td align=center >(%s)</td>  ' \
-                 '<td align=center >(\d+)</td></tr>' % turma
-
         disciplina = str(disciplina)
         if verbose:
             log('Buscando turmas com lista de espera para a disciplina ' +
                 disciplina)
 
-        pagina_html = mweb(nivel, 'faltavaga_rel', {'cod': disciplina})
-        turmas_com_demanda = busca(TABELA, pagina_html)
-
-        demanda = {}
-        for tabela in turmas_com_demanda:
-            for turma, vagas_desejadas in busca(TURMAS, tabela):
-                vagas = int(vagas_desejadas)
-                if vagas > 0:
-                    demanda[turma] = vagas
-
-        return demanda
+        return _busca(nivel, 'faltavaga_rel', {'cod': disciplina}, analisador,
+                      turma)
 
     @staticmethod
-    def oferta(disciplina, depto=None, nivel=Nivel.GRADUACAO,
-               verbose=False):
+    def oferta(disciplina, depto=None,
+               nivel=Nivel.GRADUACAO,
+               verbose=False, analisador=None):
         '''Dado o código de uma disciplina, e o do Departamento que a oferece,
         acessa o Matrícula Web e retorna um dicionário com a lista de turmas
         ofertadas para uma disciplina.
@@ -486,36 +2288,25 @@ class Oferta:
                  (default Nivel.GRADUACAO)
         verbose -- indicação dos procedimentos sendo adotados
                    (default False)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
         '''
-        INFORMACOES = 'Departamento: <strong><a href.*?>(.*?)</a></strong>' \
-                      '.*?' \
-                      'Nome: <a title=.*?>(.*?)<img .*?></a>' \
-                      '.*?' \
-                      '<b>Créditos</b><br>\(Teor-Prat-Ext-Est\)<br>' \
-                      '<font.*?>(\d+)-(\d+)-(\d+)-(\d+)'
-
-        TURMAS = '<b>Turma</b>.*?<font size=4><b>(\w+)</b></font></div>' \
-                 '.*?' \
-                 '<td>Total</td><td>Vagas</td><td><b>(\d+)</b>' \
-                 '.*?' \
-                 '<td>Ocupadas</td>' \
-                 '<td><b><font color=(?:red|green)>(\d+)</font></b></td>' \
-                 '(.*?)' \
-                 '<center>(.*?)(?:|<br>)</center>' \
-                 '.*?' \
-                 '(Reserva para curso(.*?))?' \
-                 '<tr><td colspan=6 bgcolor=white height=20></td></tr>'
-
-        HORARIO = '<b>((?:Segunda|Terça|Quarta|Quinta|Sexta|Sábado|Domingo))' \
-                  '</b>.*?' \
-                  '<font size=1 color=black><b>(.*?)</font>.*?' \
-                  '<font size=1 color=brown>(.*?)</b></font><br><i>' \
-                  '<img src=/imagens/subseta_dir.gif align=top> (.*?)</i>'
-
-        RESERVA = '<td align=left>(.*?)</td>' \
-                  '<td align=center>(\d+)</td>' \
-                  '<td align=center>(\d+)</td>'
+        disciplina = str(disciplina)
+        if verbose:
+            log('Buscando as turmas da disciplina ' + disciplina)
+
+        params = {'cod': disciplina}
+        if depto:
+            params['dep'] = str(depto)
+
+        return _busca(nivel, 'oferta_dados', params, analisador)
 
+    @staticmethod
+    def itera_turmas(disciplina, depto=None, nivel=Nivel.GRADUACAO,
+                     verbose=False, analisador=None):
+        '''Gera os pares (turma, informações) das turmas ofertadas para a
+        disciplina, à medida que são encontradas na página (ver
+        Oferta.oferta).'''
         disciplina = str(disciplina)
         if verbose:
             log('Buscando as turmas da disciplina ' + disciplina)
@@ -524,43 +2315,335 @@ class Oferta:
         if depto:
             params['dep'] = str(depto)
 
-        pagina_html = mweb(nivel, 'oferta_dados', params)
-        informacoes = busca(INFORMACOES, pagina_html)
+        return _itera_busca(nivel, 'oferta_dados', params, analisador)
 
-        oferta = {}
-        for (departamento, nome, teor, prat, ext, est) in informacoes:
-            oferta['Departamento'] = departamento
-            oferta['Nome'] = nome
-            oferta['Créditos'] = {'Teoria': int(teor), 'Prática': int(prat),
-                                  'Extensão': int(ext), 'Estudo': int(est)}
+    @staticmethod
+    def oferta_em_lote(disciplinas, depto=None, nivel=Nivel.GRADUACAO,
+                       verbose=False, trabalhadores=8, analisador=None):
+        '''Acessa o Matrícula Web concorrentemente e gera os pares
+        (disciplina, oferta) das disciplinas dadas, à medida que são obtidos
+        (ver Oferta.oferta).
 
-        turmas = busca(TURMAS, pagina_html)
-        turmas_ofertadas = {}
-        for (t, vagas, ocupadas, horarios, docentes, aux, reservas) in turmas:
-            turma = {'Vagas': int(vagas),
-                     'Alunos Matriculados': int(ocupadas),
-                     'Professores': docentes.split('<br>')}
-
-            turma['Aulas'] = {}
-            for dia, inicio, fim, local in busca(HORARIO, horarios):
-                if dia not in turma['Aulas']:
-                    turma['Aulas'][dia] = []
-                turma['Aulas'][dia].append({'Início': inicio,
-                                            'Fim': fim,
-                                            'Local': local})
-            if reservas:
-                turma['Turma Reservada'] = {curso: {'Vagas': int(vagas),
-                                                    'Calouros': int(calouros)}
-                                            for curso, vagas, calouros
-                                            in busca(RESERVA, reservas)}
-
-            turmas_ofertadas[t] = turma
-
-        oferta['Turmas'] = turmas_ofertadas
+        Argumentos:
+        disciplinas -- coleção de códigos de disciplinas (repetições são
+                       ignoradas)
+        depto -- o código do departamento que oferece as disciplinas
+                 (default None)
+        nivel -- nível acadêmico das disciplinas
+                 (default Nivel.GRADUACAO)
+        verbose -- indicação dos procedimentos sendo adotados
+                   (default False)
+        trabalhadores -- quantidade máxima de buscas simultâneas
+                         (default 8)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
+        '''
+        def oferta(disciplina):
+            return Oferta.oferta(disciplina, depto, nivel, verbose,
+                                 analisador)
 
-        return oferta
+        return _em_lote(oferta, disciplinas, trabalhadores)
+
+    @staticmethod
+    def oferta_em_processos(disciplinas, depto=None, nivel=Nivel.GRADUACAO,
+                            verbose=False, trabalhadores=8, processos=None,
+                            pendentes=None, analisador=None, compacta=None):
+        '''Como Oferta.oferta_em_lote, mas com as páginas analisadas em um
+        pool de processos, separado das requisições (ver busca_em_processos).
+        Indicado para buscas de muitas disciplinas, em que a análise das
+        páginas passa a limitar a vazão.
+
+        Argumentos:
+        disciplinas -- coleção (ou gerador) de códigos de disciplinas
+                       (repetições são ignoradas)
+        depto -- o código do departamento que oferece as disciplinas
+                 (default None)
+        nivel -- nível acadêmico das disciplinas
+                 (default Nivel.GRADUACAO)
+        verbose -- indicação dos procedimentos sendo adotados
+                   (default False)
+        trabalhadores -- quantidade máxima de requisições simultâneas
+                         (default 8)
+        processos -- quantidade de processos de análise
+                     (default None) (a quantidade de CPUs)
+        pendentes -- quantidade máxima de páginas pendentes em cada etapa
+                     (default None) (o dobro de trabalhadores/processos)
+        analisador -- nome do analisador de páginas (ver ANALISADORES)
+                      (default None) (o definido em configura_analisador)
+        compacta -- função aplicada a cada oferta no processo de análise,
+                    por exemplo OfertaDisciplina.de_dicionario (ver
+                    mwebregistros e busca_em_processos)
+                    (default None)
+        '''
+        def buscas():
+            for disciplina in _sem_repeticoes(disciplinas):
+                if verbose:
+                    log('Buscando as turmas da disciplina ' + disciplina)
+                params = {'cod': disciplina}
+                if depto:
+                    params['dep'] = str(depto)
+                yield 'oferta_dados', params
+
+        for _, params, oferta in busca_em_processos(
+                buscas(), nivel, trabalhadores, processos, pendentes,
+                analisador, compacta):
+            yield params['cod'], oferta
+
+    @staticmethod
+    def itera_oferta(nivel=Nivel.GRADUACAO, campus=Campus.DARCY_RIBEIRO,
+                     verbose=False, trabalhadores=8, pendentes=None):
+        '''Gera as tuplas (departamento, disciplina, turma, informações) de
+        todas as turmas ofertadas no campus, à medida que são obtidas. As
+        buscas de departamentos, disciplinas e turmas são encadeadas (ver
+        encadeia), de forma que as primeiras turmas são geradas logo e a
+        memória usada é limitada, mesmo para o campus todo.
+
+        Argumentos:
+        nivel -- nível acadêmico das disciplinas
+                 (default Nivel.GRADUACAO)
+        campus -- o campus onde as disciplinas são ofertadas
+                  (default Campus.DARCY_RIBEIRO)
+        verbose -- indicação dos procedimentos sendo adotados
+                   (default False)
+        trabalhadores -- quantidade máxima de buscas simultâneas em cada
+                         etapa
+                         (default 8)
+        pendentes -- quantidade máxima de buscas pendentes em cada etapa
+                     (default None) (o dobro de trabalhadores)
+        '''
+        def disciplinas(departamento):
+            for disciplina, _ in Oferta.itera_disciplinas(departamento, nivel,
+                                                          verbose):
+                yield departamento, disciplina
+
+        def turmas(item):
+            departamento, disciplina = item
+            for turma, dados in Oferta.itera_turmas(disciplina, departamento,
+                                                    nivel, verbose):
+                yield departamento, disciplina, turma, dados
+
+        departamentos = (departamento for departamento, _
+                         in Oferta.itera_departamentos(nivel, campus, verbose))
+        return encadeia(departamentos, [disciplinas, turmas], trabalhadores,
+                        pendentes)
+
+
+class FormatoJSON(logging.Formatter):
+    '''Formata cada evento do registro como um objeto JSON (uma linha), com
+    o 'tempo', o 'nivel', a 'mensagem' e os campos estruturados do evento
+    (ver Registro).'''
+
+    def format(self, evento):
+        dados = {'tempo': evento.created, 'nivel': evento.levelname,
+                 'mensagem': evento.getMessage()}
+        dados.update(getattr(evento, 'mweb', {}))
+        return json.dumps(dados, ensure_ascii=False, sort_keys=True,
+                          default=str)
+
+
+class Registro:
+    '''Registro estruturado das mensagens de log() e dos trechos (ver
+    trecho), em JSON (ver FormatoJSON), por meio do logger 'mwebcrawler'.
+
+    Os eventos são postos em uma fila e gravados por uma thread própria
+    (logging.handlers.QueueListener), de forma que quem registra não espera
+    pela escrita. Requer Python 3.
+    '''
+
+    def __init__(self, destino=None, amostragem=1., rastreia=True):
+        '''Inicia o registro.
+
+        Argumentos:
+        destino -- caminho do arquivo ou stream onde os eventos são gravados
+                   (default None) (sys.stderr)
+        amostragem -- fração dos rastros (ver trecho) registrados
+                      (default 1.)
+        rastreia -- indicação de que os trechos devem ser registrados
+                    (default True)
+        '''
+        from logging.handlers import QueueHandler, QueueListener
+
+        self.amostragem, self.rastreia = amostragem, rastreia
+        if isinstance(destino, str):
+            saida = logging.FileHandler(destino, encoding='utf-8')
+        else:
+            saida = logging.StreamHandler(destino or sys.stderr)
+        saida.setFormatter(FormatoJSON())
+
+        fila = queue.Queue()
+        self._entrada = QueueHandler(fila)
+        self._ouvinte = QueueListener(fila, saida)
+        self.registrador = logging.getLogger('mwebcrawler')
+        self.registrador.setLevel(logging.INFO)
+        self.registrador.propagate = False
+        self.registrador.addHandler(self._entrada)
+        self._ouvinte.start()
+
+    def mensagem(self, msg):
+        '''Registra a mensagem dada, no trecho atual.'''
+        atual = getattr(_contexto, 'trecho', None)
+        campos = {}
+        if isinstance(atual, Trecho):
+            campos = {'rastro': atual.rastro, 'trecho': atual.id}
+        self.registrador.info(msg, extra={'mweb': campos})
+
+    def emite(self, trecho):
+        '''Registra o trecho (encerrado) dado.'''
+        self.registrador.info(trecho.nome,
+                              extra={'mweb': trecho.para_dicionario()})
+
+    def fecha(self):
+        '''Grava os eventos pendentes e encerra o registro.'''
+        self.registrador.removeHandler(self._entrada)
+        self._ouvinte.stop()
+
+
+class Trecho:
+    '''Trecho (span) de um rastro: uma operação medida, com nome, atributos,
+    início, duração e o trecho do qual faz parte. Os trechos iniciados dentro
+    de outro, inclusive nas threads de _em_lote e _em_fluxo, fazem parte do
+    mesmo rastro, de forma que todas as buscas disparadas por uma chamada
+    (por exemplo, a coordenacao.ocupacao) podem ser identificadas.'''
+
+    def __init__(self, registro, nome, pai, atributos):
+        self.registro, self.nome, self.atributos = registro, nome, atributos
+        self.id = '%016x' % random.getrandbits(64)
+        self.rastro = pai.rastro if pai is not None else self.id
+        self.pai = pai.id if pai is not None else None
+        self.inicio = self.duracao = None
+
+    def define(self, **atributos):
+        '''Define atributos do trecho.'''
+        self.atributos.update(atributos)
+
+    def __enter__(self):
+        self._anterior = getattr(_contexto, 'trecho', None)
+        _contexto.trecho = self
+        self.inicio = time.time()
+        return self
+
+    def __exit__(self, tipo, erro, rastreamento):
+        self.duracao = time.time() - self.inicio
+        _contexto.trecho = self._anterior
+        if tipo is not None:
+            self.atributos['excecao'] = tipo.__name__
+        self.registro.emite(self)
+        return False
+
+    def para_dicionario(self):
+        '''Retorna um dicionário com os campos e atributos do trecho.'''
+        dados = dict(self.atributos)
+        dados.update({'rastro': self.rastro, 'trecho': self.id,
+                      'pai': self.pai, 'nome': self.nome,
+                      'inicio': self.inicio, 'duracao': self.duracao})
+        return dados
+
+
+class _TrechoNulo:
+    '''Trecho que não é registrado (registro desabilitado ou rastro não
+    amostrado). Quando é a raiz de um rastro não amostrado, os trechos
+    iniciados dentro dele também não são registrados.'''
+
+    def __init__(self, raiz=False):
+        self._raiz = raiz
+
+    def define(self, **atributos):
+        pass
+
+    def __enter__(self):
+        if self._raiz:
+            self._anterior = getattr(_contexto, 'trecho', None)
+            _contexto.trecho = _NULO
+        return self
+
+    def __exit__(self, tipo, erro, rastreamento):
+        if self._raiz:
+            _contexto.trecho = self._anterior
+        return False
+
+
+_NULO = _TrechoNulo()
+_contexto = threading.local()
+_registro = None
+
+
+def configura_registro(destino=None, amostragem=1., rastreia=True):
+    '''Habilita o registro estruturado (ver Registro) das mensagens de
+    log() e dos trechos das buscas e o retorna. O registro anterior, caso
+    haja, é encerrado.
+
+    Argumentos:
+    destino -- caminho do arquivo ou stream onde os eventos são gravados
+               (default None) (sys.stderr)
+    amostragem -- fração dos rastros registrados
+                  (default 1.)
+    rastreia -- indicação de que os trechos devem ser registrados
+                (default True)
+    '''
+    global _registro
+    desabilita_registro()
+    _registro = Registro(destino, amostragem, rastreia)
+    return _registro
+
+
+def desabilita_registro():
+    '''Encerra o registro estruturado: log() volta a imprimir as mensagens,
+    e os trechos deixam de ser registrados.'''
+    global _registro
+    registro, _registro = _registro, None
+    if registro is not None:
+        registro.fecha()
+
+
+def trecho(nome, **atributos):
+    '''Retorna um gerenciador de contexto que mede a operação executada
+    dentro dele como um trecho (ver Trecho) com o nome e os atributos dados.
+    Sem registro (ou com o rastro não amostrado), o trecho não tem custo.
+
+    Um trecho iniciado fora de outro inicia um rastro, que é registrado com
+    a probabilidade dada pela amostragem do registro.'''
+    registro = _registro
+    if registro is None or not registro.rastreia:
+        return _NULO
+    pai = getattr(_contexto, 'trecho', None)
+    if pai is _NULO:
+        return _NULO
+    if pai is None and random.random() >= registro.amostragem:
+        return _TrechoNulo(raiz=True)
+    return Trecho(registro, nome, pai, atributos)
+
+
+def rastreado(funcao):
+    '''Decorador que executa a função dada em um trecho com o seu nome.'''
+    @functools.wraps(funcao)
+    def executa(*argumentos, **nomeados):
+        with trecho(funcao.__name__):
+            return funcao(*argumentos, **nomeados)
+    return executa
+
+
+def _no_trecho(funcao):
+    '''Retorna a função dada, que é executada (em outra thread) dentro do
+    trecho atual.'''
+    atual = getattr(_contexto, 'trecho', None)
+    if atual is None:
+        return funcao
+
+    def executa(*argumentos):
+        anterior = getattr(_contexto, 'trecho', None)
+        _contexto.trecho = atual
+        try:
+            return funcao(*argumentos)
+        finally:
+            _contexto.trecho = anterior
+    return executa
 
 
 def log(msg):
-    '''Log de mensagens.'''
-    print(msg)
+    '''Log de mensagens: impressas ou, caso haja um registro estruturado
+    (ver configura_registro), registradas no trecho atual.'''
+    registro = _registro
+    if registro is None:
+        print(msg)
+    else:
+        registro.mensagem(msg)
@@ -0,0 +1,118 @@
+#  -*- coding: utf-8 -*-
+#    @package: mwebgravacao.py
+#
+# Gravação e reprodução de páginas do Matrícula Web, para testes e medições
+# sem acesso à rede. Ambas as classes são sessões HTTP compatíveis com
+# mwebcrawler.configura_sessao. Por exemplo, para gravar as páginas acessadas:
+#
+#     configura_sessao(Gravador(configura_sessao(), diretorio))
+#
+# e, depois, para reproduzi-las:
+#
+#     configura_sessao(Reprodutor(diretorio))
+#
+# Cada página é guardada no arquivo <página>-<parâmetros>.html, por exemplo
+# oferta_dados-116319-116.html para oferta_dados.aspx?cod=116319&dep=116.
+#
+# As páginas que acompanham o código (ver PAGINAS) não foram gravadas: são
+# páginas sintéticas, escritas à mão com a marcação do Matrícula Web que os
+# analisadores leem (e com poucos dados), já que o Matrícula Web não é
+# acessível de onde os testes são executados. Testes e medições com páginas
+# reais devem usar um diretório gravado com o Gravador.
+
+
+import os
+import threading
+import time
+
+# Diretório das páginas sintéticas que acompanham o código.
+PAGINAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'paginas')
+
+
+class Resposta:
+    '''Resposta HTTP mínima, com os atributos usados por mwebcrawler.mweb.'''
+
+    def __init__(self, conteudo=b'', status=200, cabecalhos=None):
+        self.content = conteudo
+        self.status_code = status
+        self.headers = cabecalhos or {}
+
+
+def nomes_do_arquivo(url, params=None):
+    '''Retorna os nomes de arquivo (do mais ao menos específico) que podem
+    conter a página dada: <página>-<parâmetros>, ..., <página>.'''
+    pagina = url.rsplit('/', 1)[-1].split('.')[0]
+    valores = [str(params[chave]) for chave in sorted(params or {})]
+    return ['-'.join([pagina] + valores[:i]) + '.html'
+            for i in range(len(valores), -1, -1)]
+
+
+class Reprodutor:
+    '''Sessão HTTP que responde às requisições com as páginas salvas em um
+    diretório, sem acessar a rede.
+
+    A página de uma requisição é a do arquivo mais específico existente (ver
+    nomes_do_arquivo), de forma que, por exemplo, 'disciplina.html' responde
+    a qualquer disciplina sem página própria. Requisições sem página
+    correspondente recebem uma resposta vazia (404).
+    '''
+
+    def __init__(self, diretorio=PAGINAS, latencia=0):
+        '''Argumentos:
+        diretorio -- diretório das páginas salvas
+                     (default PAGINAS)
+        latencia -- tempo (em segundos) de espera antes de cada resposta, para
+                    simular o acesso à rede
+                    (default 0)
+        '''
+        self.diretorio = diretorio
+        self.latencia = latencia
+        self.requisicoes = []
+        self._paginas = {}
+        self._trava = threading.Lock()
+
+    def get(self, url, params=None, timeout=None, headers=None):
+        if self.latencia:
+            time.sleep(self.latencia)
+
+        with self._trava:
+            self.requisicoes.append((url, params))
+            for nome in nomes_do_arquivo(url, params):
+                if nome not in self._paginas:
+                    caminho = os.path.join(self.diretorio, nome)
+                    if not os.path.exists(caminho):
+                        self._paginas[nome] = None
+                        continue
+                    with open(caminho, 'rb') as arquivo:
+                        self._paginas[nome] = arquivo.read()
+                if self._paginas[nome] is not None:
+                    return Resposta(self._paginas[nome])
+
+        return Resposta(status=404)
+
+
+class Gravador:
+    '''Sessão HTTP que repassa as requisições a outra sessão e salva cada
+    página obtida em um diretório, para posterior reprodução (ver
+    Reprodutor).'''
+
+    def __init__(self, sessao, diretorio=PAGINAS):
+        '''Argumentos:
+        sessao -- sessão que efetivamente acessa o Matrícula Web
+        diretorio -- diretório onde as páginas são salvas
+                     (default PAGINAS)
+        '''
+        self.sessao = sessao
+        self.diretorio = diretorio
+        if not os.path.isdir(diretorio):
+            os.makedirs(diretorio)
+
+    def get(self, url, params=None, timeout=None, headers=None):
+        resposta = self.sessao.get(url, params=params, timeout=timeout,
+                                   headers=headers)
+        if resposta.status_code == 200 and resposta.content:
+            caminho = os.path.join(self.diretorio,
+                                   nomes_do_arquivo(url, params)[0])
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(resposta.content)
+        return resposta
@@ -0,0 +1,338 @@
+#  -*- coding: utf-8 -*-
+#    @package: mwebhorarios.py
+#
+# Conflitos de horários das turmas ofertadas. Os horários das aulas (ver
+# Oferta.oferta, 'Aulas') são convertidos uma única vez em intervalos de
+# minutos da semana, e cada turma é representada por um conjunto de bits (um
+# bit por minuto da semana), de forma que verificar o conflito entre duas
+# turmas é uma única operação E. As turmas também são indexadas pelos blocos
+# (de uma hora) da semana em que têm aulas, de forma que os conflitos de uma
+# turma são procurados apenas entre as que têm aulas nos mesmos blocos. Os
+# intervalos de cada local ficam ordenados pelo início, permitindo consultar
+# sua ocupação por busca binária. Por exemplo:
+#
+#     grade = Grade.busca(Oferta.disciplinas(116))
+#     grade.conflito(('116319', 'A'), ('113042', 'B'))
+#     grade.fluxo(Cursos.fluxo(6912))
+
+from bisect import bisect_left
+from mwebcrawler import Nivel
+import mwebcrawler
+
+# Dias da semana, na ordem em que aparecem na semana da grade.
+DIAS = ('Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado',
+        'Domingo')
+MINUTOS_POR_DIA = 24 * 60
+
+# Duração (em minutos) dos blocos da semana pelos quais as turmas são
+# indexadas (ver Grade.conflitos).
+BLOCO = 60
+
+
+def minutos(hora):
+    '''Retorna a quantidade de minutos desde o início do dia da hora dada
+    ('HH:MM'), ou None se a hora for inválida.'''
+    try:
+        horas, minutos_ = hora.strip().split(':')
+        return int(horas) * 60 + int(minutos_)
+    except (AttributeError, ValueError):
+        return None
+
+
+def hora(minutos_da_semana):
+    '''Retorna o par (dia, 'HH:MM') correspondente à quantidade de minutos
+    desde o início da semana dada (inverso de intervalo).'''
+    dia, resto = divmod(minutos_da_semana, MINUTOS_POR_DIA)
+    return DIAS[dia], '%02d:%02d' % divmod(resto, 60)
+
+
+def intervalo(dia, inicio, fim):
+    '''Retorna o intervalo [início, fim), em minutos desde o início da
+    semana, da aula no dia e horários ('HH:MM') dados, ou None se algum deles
+    for inválido.'''
+    inicio, fim = minutos(inicio), minutos(fim)
+    if dia not in DIAS or inicio is None or fim is None or fim <= inicio:
+        return None
+    deslocamento = DIAS.index(dia) * MINUTOS_POR_DIA
+    return deslocamento + inicio, deslocamento + fim
+
+
+def mascara(intervalos):
+    '''Retorna o conjunto de bits (um por minuto da semana) ocupado pelos
+    intervalos dados.'''
+    bits = 0
+    for inicio, fim in intervalos:
+        bits |= ((1 << (fim - inicio)) - 1) << inicio
+    return bits
+
+
+class Grade:
+    '''Horários das turmas ofertadas. As turmas são identificadas pelo par
+    (disciplina, turma).'''
+
+    def __init__(self):
+        self._mascaras = {}
+        self._turmas = {}
+        # Turmas com aulas em cada bloco da semana, e blocos de cada turma.
+        self._por_bloco = {}
+        self._blocos = {}
+        self._locais = {}
+        self._inicios = {}
+        self._duracao = {}
+
+    def __len__(self):
+        return len(self._mascaras)
+
+    def __contains__(self, turma):
+        return turma in self._mascaras
+
+    def adiciona(self, disciplina, turma, aulas):
+        '''Adiciona (ou substitui) os horários da turma dada.
+
+        Argumentos:
+        disciplina -- o código da disciplina
+        turma -- o nome da turma
+        aulas -- dicionário com a lista de aulas (dicionários com 'Início',
+                 'Fim' e 'Local') de cada dia, como em Oferta.oferta;
+                 aulas com horários inválidos são desconsideradas
+        '''
+        chave = (str(disciplina), turma)
+        if chave in self._mascaras:
+            self.remove(*chave)
+
+        intervalos = []
+        for dia, aulas_do_dia in aulas.items():
+            for aula in aulas_do_dia:
+                periodo = intervalo(dia, aula.get('Início'), aula.get('Fim'))
+                if periodo is None:
+                    continue
+                intervalos.append(periodo)
+                if aula.get('Local'):
+                    self._ocupa(aula['Local'], periodo, chave)
+
+        self._mascaras[chave] = mascara(intervalos)
+        self._turmas.setdefault(chave[0], []).append(turma)
+        self._blocos[chave] = set(bloco for inicio, fim in intervalos
+                                  for bloco in range(inicio // BLOCO,
+                                                     (fim - 1) // BLOCO + 1))
+        for bloco in self._blocos[chave]:
+            self._por_bloco.setdefault(bloco, set()).add(chave)
+
+    def remove(self, disciplina, turma):
+        '''Remove os horários da turma dada.'''
+        chave = (str(disciplina), turma)
+        del self._mascaras[chave]
+        self._turmas[chave[0]].remove(turma)
+        for bloco in self._blocos.pop(chave):
+            self._por_bloco[bloco].discard(chave)
+            if not self._por_bloco[bloco]:
+                del self._por_bloco[bloco]
+        if not self._turmas[chave[0]]:
+            del self._turmas[chave[0]]
+        for local in list(self._locais):
+            ocupacao = [item for item in self._locais[local]
+                        if item[2] != chave]
+            if ocupacao:
+                self._locais[local] = ocupacao
+                self._inicios[local] = [item[0] for item in ocupacao]
+            else:
+                del self._locais[local], self._inicios[local]
+                del self._duracao[local]
+
+    def _ocupa(self, local, periodo, chave):
+        '''Registra a ocupação do local dado pela turma dada no intervalo
+        dado, mantendo a ordem dos intervalos do local.'''
+        ocupacao = self._locais.setdefault(local, [])
+        inicios = self._inicios.setdefault(local, [])
+        item = (periodo[0], periodo[1], chave)
+        i = bisect_left(ocupacao, item)
+        ocupacao.insert(i, item)
+        inicios.insert(i, periodo[0])
+        self._duracao[local] = max(self._duracao.get(local, 0),
+                                   periodo[1] - periodo[0])
+
+    @staticmethod
+    def de_ofertas(ofertas):
+        '''Retorna a Grade das ofertas dadas (coleção de pares (disciplina,
+        oferta), por exemplo os gerados por Oferta.oferta_em_lote).'''
+        grade = Grade()
+        for disciplina, oferta in ofertas:
+            for turma, dados in oferta.get('Turmas', {}).items():
+                grade.adiciona(disciplina, turma, dados.get('Aulas', {}))
+        return grade
+
+    @staticmethod
+    def de_snapshot(snapshot):
+        '''Retorna a Grade das turmas guardadas no snapshot.Snapshot dado
+        (ver as tabelas turmas e aulas).'''
+        aulas = {}
+        for disciplina, turma, dia, inicio, fim, local in snapshot.aulas():
+            dados = aulas.setdefault((disciplina, turma), {})
+            if dia is not None:
+                dados.setdefault(dia, []).append({'Início': inicio,
+                                                  'Fim': fim,
+                                                  'Local': local})
+        grade = Grade()
+        for (disciplina, turma), dados in aulas.items():
+            grade.adiciona(disciplina, turma, dados)
+        return grade
+
+    @staticmethod
+    def busca(disciplinas, depto=None, nivel=Nivel.GRADUACAO,
+              trabalhadores=8, fonte=None):
+        '''Busca (concorrentemente) as ofertas das disciplinas dadas e
+        retorna a Grade resultante.
+
+        Argumentos:
+        disciplinas -- coleção de códigos de disciplinas
+        depto -- o código do departamento que oferece as disciplinas
+                 (default None)
+        nivel -- nível acadêmico das disciplinas
+                 (default Nivel.GRADUACAO)
+        trabalhadores -- quantidade máxima de buscas simultâneas
+                         (default 8)
+        fonte -- origem das informações: o Matrícula Web (None) ou um
+                 snapshot.Snapshot
+                 (default None)
+        '''
+        fonte = fonte or mwebcrawler
+        return Grade.de_ofertas(sorted(fonte.Oferta.oferta_em_lote(
+            disciplinas, depto, nivel, trabalhadores=trabalhadores)))
+
+    def turmas(self, disciplina):
+        '''Retorna a lista dos nomes das turmas da disciplina dada.'''
+        return list(self._turmas.get(str(disciplina), ()))
+
+    def horarios(self, disciplina, turma):
+        '''Retorna a lista dos intervalos [início, fim) (em minutos desde o
+        início da semana) ocupados pela turma dada.'''
+        bits = self._mascaras[str(disciplina), turma]
+        intervalos, posicao = [], 0
+        while bits:
+            zeros = (bits & -bits).bit_length() - 1
+            bits >>= zeros
+            uns = (~bits & (bits + 1)).bit_length() - 1
+            intervalos.append((posicao + zeros, posicao + zeros + uns))
+            bits >>= uns
+            posicao += zeros + uns
+        return intervalos
+
+    def conflito(self, turma, outra):
+        '''Retorna a indicação de que as turmas ((disciplina, turma)) dadas
+        têm aulas em horários sobrepostos.'''
+        return bool(self._mascaras[str(turma[0]), turma[1]] &
+                    self._mascaras[str(outra[0]), outra[1]])
+
+    def conflitos(self, disciplina, turma):
+        '''Retorna a lista ordenada das turmas ((disciplina, turma)) de
+        outras disciplinas que têm aulas em horários sobrepostos aos da turma
+        dada. Apenas as turmas com aulas nos mesmos blocos da semana (ver
+        BLOCO) são comparadas.'''
+        disciplina = str(disciplina)
+        bits = self._mascaras[disciplina, turma]
+        candidatas = set()
+        for bloco in self._blocos[disciplina, turma]:
+            candidatas.update(self._por_bloco[bloco])
+        return sorted(chave for chave in candidatas
+                      if chave[0] != disciplina and
+                      bits & self._mascaras[chave])
+
+    def ocupantes(self, local, dia, inicio, fim):
+        '''Retorna a lista das turmas ((disciplina, turma)) com aulas no
+        local dado sobrepostas ao horário dado.
+
+        Argumentos:
+        local -- o local das aulas (ver Oferta.oferta)
+        dia -- o dia da semana (ver DIAS)
+        inicio -- o horário de início ('HH:MM')
+        fim -- o horário de término ('HH:MM')
+        '''
+        periodo = intervalo(dia, inicio, fim)
+        if periodo is None or local not in self._locais:
+            return []
+        ocupacao, inicios = self._locais[local], self._inicios[local]
+        # Os intervalos que começam antes do fim do período e terminam
+        # depois de seu início: como nenhum dura mais do que a duração
+        # máxima do local, basta percorrer os que começam a partir de
+        # início - duração.
+        primeiro = bisect_left(inicios, periodo[0] - self._duracao[local])
+        ultimo = bisect_left(inicios, periodo[1])
+        return [chave for a, b, chave in ocupacao[primeiro:ultimo]
+                if b > periodo[0]]
+
+    def livre(self, local, dia, inicio, fim):
+        '''Retorna a indicação de que o local dado está livre no horário
+        dado (ver ocupantes).'''
+        return not self.ocupantes(local, dia, inicio, fim)
+
+    def locais_em_conflito(self):
+        '''Retorna a lista das triplas (local, turma, outra) de turmas
+        ((disciplina, turma)) com aulas sobrepostas no mesmo local.'''
+        conflitos = []
+        for local, ocupacao in sorted(self._locais.items()):
+            abertos = []
+            for inicio, fim, chave in ocupacao:
+                abertos = [item for item in abertos if item[0] > inicio]
+                conflitos.extend((local, outra, chave)
+                                 for _, outra in abertos if outra != chave)
+                abertos.append((fim, chave))
+        return conflitos
+
+    def combinacao(self, disciplinas, fixas=None):
+        '''Retorna um dicionário com uma turma de cada disciplina dada, de
+        forma que não haja conflitos de horário entre elas, ou None se não
+        houver combinação possível. Disciplinas sem turmas na grade são
+        desconsideradas.
+
+        Argumentos:
+        disciplinas -- coleção de códigos de disciplinas
+        fixas -- dicionário com as turmas já escolhidas de algumas
+                 disciplinas, que devem fazer parte da combinação
+                 (default None)
+        '''
+        escolhidas, ocupados = {}, 0
+        for disciplina, turma in (fixas or {}).items():
+            bits = self._mascaras[str(disciplina), turma]
+            if ocupados & bits:
+                return None
+            escolhidas[str(disciplina)] = turma
+            ocupados |= bits
+
+        # Disciplinas com menos opções primeiro, para podar a busca cedo.
+        pendentes = sorted(set(str(d) for d in disciplinas
+                               if str(d) in self._turmas) -
+                           set(escolhidas),
+                           key=lambda d: (len(self._turmas[d]), d))
+        opcoes = [self.opcoes(disciplina) for disciplina in pendentes]
+        falhas = set()
+
+        def escolhe(i, ocupados):
+            if i == len(pendentes):
+                return True
+            if (i, ocupados) in falhas:
+                return False
+            for turma, bits in opcoes[i]:
+                if not ocupados & bits:
+                    escolhidas[pendentes[i]] = turma
+                    if escolhe(i + 1, ocupados | bits):
+                        return True
+            falhas.add((i, ocupados))
+            return False
+
+        return escolhidas if escolhe(0, ocupados) else None
+
+    def opcoes(self, disciplina):
+        '''Retorna a lista dos pares (turma, bits) das turmas da disciplina
+        dada com horários distintos (turmas com os mesmos horários são
+        equivalentes para a combinação).'''
+        disciplina, opcoes = str(disciplina), {}
+        for turma in self._turmas.get(disciplina, ()):
+            opcoes.setdefault(self._mascaras[disciplina, turma], turma)
+        return [(turma, bits) for bits, turma in opcoes.items()]
+
+    def fluxo(self, fluxo):
+        '''Retorna um dicionário com uma combinação (ver combinacao) das
+        disciplinas de cada período do fluxo dado (ver Cursos.fluxo), ou None
+        para os períodos sem combinação possível.'''
+        return {periodo: self.combinacao(dados['Disciplinas'])
+                for periodo, dados in fluxo.items()}
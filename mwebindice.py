@@ -0,0 +1,306 @@
+#  -*- coding: utf-8 -*-
+#    @package: mwebindice.py
+#
+# Índice reverso dos currículos: para cada disciplina, as habilitações em
+# cujos currículos ela aparece e o papel que desempenha em cada um
+# (obrigatória, optativa ou parte de uma cadeia). O índice é construído a
+# partir de Cursos.relacao, Cursos.habilitacoes e Cursos.curriculo (do
+# Matrícula Web ou de um snapshot), guardado em um arquivo SQLite e mantido
+# em memória, de forma que as consultas são feitas em tempo constante e sem
+# acesso à rede. Por exemplo:
+#
+#     indice = IndiceDeCurriculos('indice.sqlite')
+#     indice.constroi()
+#     indice.habilitacoes('116319')
+#
+# As cadeias têm estrutura E/OU: cada cadeia é uma lista de opções, das quais
+# o aluno cursa uma, e cada opção é um conjunto de disciplinas que devem ser
+# cursadas juntas. O papel de uma disciplina em uma cadeia informa a cadeia,
+# a opção e as demais disciplinas da opção.
+
+from collections import namedtuple
+from mwebcrawler import Campus, Nivel, _em_lote, log
+import hashlib
+import json
+import mwebcrawler
+import sqlite3
+import threading
+
+# Tipos de papel de uma disciplina em um currículo.
+OBRIGATORIA, OPTATIVA, CADEIA = 'obrigatória', 'optativa', 'cadeia'
+
+# Papel de uma disciplina no currículo de uma habilitação. Para disciplinas
+# de cadeias, cadeia é o número da cadeia, opcao é a posição (a partir de 0)
+# da opção na cadeia e junto_com é a tupla das demais disciplinas da opção;
+# para as demais, esses campos são None, None e ().
+Papel = namedtuple('Papel', 'habilitacao tipo cadeia opcao junto_com')
+
+
+def papeis_do_curriculo(habilitacao, curriculo):
+    '''Gera os pares (disciplina, Papel) das disciplinas do currículo dado
+    (ver Cursos.curriculo) da habilitação dada.'''
+    habilitacao = str(habilitacao)
+    for tipo, chave in ((OBRIGATORIA, 'obrigatórias'),
+                        (OPTATIVA, 'optativas')):
+        for disciplina in sorted(curriculo.get(chave, {})):
+            yield disciplina, Papel(habilitacao, tipo, None, None, ())
+
+    cadeias = curriculo.get('cadeias', {})
+    for cadeia in sorted(cadeias, key=int):
+        for opcao, disciplinas in enumerate(cadeias[cadeia]):
+            for disciplina in sorted(disciplinas):
+                junto_com = tuple(sorted(d for d in disciplinas
+                                         if d != disciplina))
+                yield disciplina, Papel(habilitacao, CADEIA, cadeia, opcao,
+                                        junto_com)
+
+
+def _resumo(curriculo):
+    '''Retorna o resumo (hash) do currículo dado, usado para identificar
+    currículos alterados.'''
+    return hashlib.sha1(json.dumps(curriculo, sort_keys=True).encode(
+        'utf-8')).hexdigest()
+
+
+class IndiceDeCurriculos:
+    '''Índice reverso dos currículos (disciplina -> papéis), mantido em
+    memória e, opcionalmente, em um arquivo SQLite.'''
+
+    def __init__(self, caminho=None):
+        '''Abre (ou cria) o índice no arquivo dado.
+
+        Argumentos:
+        caminho -- caminho do arquivo SQLite do índice, ou None para um
+                   índice apenas em memória
+                   (default None)
+        '''
+        self.caminho = caminho
+        self._papeis = {}
+        # Disciplinas com papéis no currículo de cada habilitação.
+        self._disciplinas = {}
+        self._resumos = {}
+        # Cursos a que pertence cada habilitação (ver constroi).
+        self._cursos = {}
+        self._trava = threading.Lock()
+        self._conexao = None
+        if caminho:
+            self._conexao = sqlite3.connect(caminho,
+                                            check_same_thread=False)
+            with self._conexao:
+                self._conexao.execute(
+                    'CREATE TABLE IF NOT EXISTS curriculos '
+                    '(habilitacao TEXT PRIMARY KEY, resumo TEXT)')
+                self._conexao.execute(
+                    'CREATE TABLE IF NOT EXISTS papeis (disciplina TEXT, '
+                    'habilitacao TEXT, tipo TEXT, cadeia TEXT, '
+                    'opcao INTEGER, junto_com TEXT)')
+                self._conexao.execute(
+                    'CREATE INDEX IF NOT EXISTS papeis_habilitacao '
+                    'ON papeis (habilitacao)')
+                self._conexao.execute(
+                    'CREATE TABLE IF NOT EXISTS habilitacoes (curso TEXT, '
+                    'habilitacao TEXT, PRIMARY KEY (curso, habilitacao))')
+            self._carrega()
+
+    def _carrega(self):
+        '''Carrega em memória o índice guardado no arquivo.'''
+        self._resumos = dict(self._conexao.execute(
+            'SELECT habilitacao, resumo FROM curriculos'))
+        for (disciplina, habilitacao, tipo, cadeia, opcao,
+             junto_com) in self._conexao.execute(
+                 'SELECT * FROM papeis ORDER BY rowid'):
+            junto_com = tuple(junto_com.split()) if junto_com else ()
+            self._papeis.setdefault(disciplina, []).append(
+                Papel(habilitacao, tipo, cadeia, opcao, junto_com))
+            self._disciplinas.setdefault(habilitacao, set()).add(disciplina)
+        for curso, habilitacao in self._conexao.execute(
+                'SELECT curso, habilitacao FROM habilitacoes'):
+            self._cursos.setdefault(habilitacao, set()).add(curso)
+
+    def _descarta(self, habilitacao):
+        '''Descarta da memória os papéis das disciplinas do currículo da
+        habilitação dada (com a trava adquirida).'''
+        for disciplina in self._disciplinas.pop(habilitacao, ()):
+            restantes = [papel for papel in self._papeis[disciplina]
+                         if papel.habilitacao != habilitacao]
+            if restantes:
+                self._papeis[disciplina] = restantes
+            else:
+                del self._papeis[disciplina]
+
+    def atualiza(self, habilitacao, curriculo):
+        '''Substitui os papéis das disciplinas do currículo da habilitação
+        dada pelos do currículo dado (ver Cursos.curriculo). Retorna a
+        indicação de que o currículo mudou desde a última atualização.'''
+        habilitacao = str(habilitacao)
+        resumo = _resumo(curriculo)
+        papeis = list(papeis_do_curriculo(habilitacao, curriculo))
+        with self._trava:
+            if self._resumos.get(habilitacao) == resumo:
+                return False
+
+            self._descarta(habilitacao)
+            for disciplina, papel in papeis:
+                self._papeis.setdefault(disciplina, []).append(papel)
+                self._disciplinas.setdefault(habilitacao, set()).add(
+                    disciplina)
+            self._resumos[habilitacao] = resumo
+
+            if self._conexao is not None:
+                with self._conexao:
+                    self._conexao.execute(
+                        'DELETE FROM papeis WHERE habilitacao = ?',
+                        (habilitacao,))
+                    self._conexao.executemany(
+                        'INSERT INTO papeis VALUES (?, ?, ?, ?, ?, ?)',
+                        ((disciplina, papel.habilitacao, papel.tipo,
+                          papel.cadeia, papel.opcao,
+                          ' '.join(papel.junto_com))
+                         for disciplina, papel in papeis))
+                    self._conexao.execute(
+                        'INSERT OR REPLACE INTO curriculos VALUES (?, ?)',
+                        (habilitacao, resumo))
+        return True
+
+    def remove(self, habilitacao):
+        '''Remove do índice os papéis das disciplinas do currículo da
+        habilitação dada. Retorna a indicação de que ela estava indexada.'''
+        habilitacao = str(habilitacao)
+        with self._trava:
+            if habilitacao not in self._resumos:
+                return False
+
+            self._descarta(habilitacao)
+            del self._resumos[habilitacao]
+            self._cursos.pop(habilitacao, None)
+            if self._conexao is not None:
+                with self._conexao:
+                    self._conexao.execute(
+                        'DELETE FROM papeis WHERE habilitacao = ?',
+                        (habilitacao,))
+                    self._conexao.execute(
+                        'DELETE FROM habilitacoes WHERE habilitacao = ?',
+                        (habilitacao,))
+                    self._conexao.execute(
+                        'DELETE FROM curriculos WHERE habilitacao = ?',
+                        (habilitacao,))
+        return True
+
+    def _associa(self, habilitacoes):
+        '''Substitui as habilitações de cada curso pelas dadas (dicionário
+        curso -> coleção de habilitações).'''
+        habilitacoes = {str(curso): [str(h) for h in codigos]
+                        for curso, codigos in habilitacoes.items()}
+        with self._trava:
+            for cursos in self._cursos.values():
+                cursos.difference_update(habilitacoes)
+            for curso, codigos in habilitacoes.items():
+                for habilitacao in codigos:
+                    self._cursos.setdefault(habilitacao, set()).add(curso)
+
+            if self._conexao is not None:
+                with self._conexao:
+                    self._conexao.executemany(
+                        'DELETE FROM habilitacoes WHERE curso = ?',
+                        ((curso,) for curso in habilitacoes))
+                    self._conexao.executemany(
+                        'INSERT INTO habilitacoes VALUES (?, ?)',
+                        ((curso, habilitacao)
+                         for curso, codigos in habilitacoes.items()
+                         for habilitacao in codigos))
+
+    def constroi(self, nivel=Nivel.GRADUACAO, campus=Campus.DARCY_RIBEIRO,
+                 trabalhadores=8, verbose=False, fonte=None):
+        '''Busca os currículos de todas as habilitações de todos os cursos do
+        campus dado e atualiza o índice com os que mudaram, removendo as
+        habilitações indexadas que deixaram de existir. Como uma busca vazia
+        indica uma falha, as habilitações de um curso cuja busca falhou são
+        mantidas (bem como, nesse caso, as de curso desconhecido). Retorna a
+        lista das habilitações atualizadas ou removidas.
+
+        Argumentos:
+        nivel -- nível acadêmico dos cursos
+                 (default Nivel.GRADUACAO)
+        campus -- o campus onde os cursos são oferecidos
+                  (default Campus.DARCY_RIBEIRO)
+        trabalhadores -- quantidade máxima de buscas simultâneas
+                         (default 8)
+        verbose -- indicação dos procedimentos sendo adotados
+                   (default False)
+        fonte -- origem das informações: o Matrícula Web (None) ou um
+                 snapshot.Snapshot
+                 (default None)
+        '''
+        fonte = fonte or mwebcrawler
+        cursos = fonte.Cursos.relacao(nivel, campus, verbose)
+
+        def habilitacoes(curso):
+            return fonte.Cursos.habilitacoes(curso, nivel, campus, verbose)
+
+        por_curso = dict(_em_lote(habilitacoes, cursos, trabalhadores))
+        codigos = [habilitacao for dados in por_curso.values()
+                   for habilitacao in dados]
+        atualizadas = [habilitacao for habilitacao, curriculo
+                       in fonte.Cursos.curriculo_em_lote(
+                           codigos, nivel, verbose,
+                           trabalhadores=trabalhadores)
+                       if curriculo and self.atualiza(habilitacao,
+                                                      curriculo)]
+        removidas = []
+        if codigos:  # uma relação vazia indica uma falha na busca
+            falhas = set(curso for curso, dados in por_curso.items()
+                         if not dados)
+            with self._trava:
+                anteriores = {habilitacao: set(cursos) for habilitacao, cursos
+                              in self._cursos.items()}
+            self._associa({curso: dados for curso, dados in por_curso.items()
+                           if dados})
+
+            def removivel(habilitacao):
+                cursos = anteriores.get(habilitacao)
+                return cursos.isdisjoint(falhas) if cursos else not falhas
+
+            existentes = set(str(codigo) for codigo in codigos)
+            removidas = [habilitacao for habilitacao in self.indexadas()
+                         if habilitacao not in existentes and
+                         removivel(habilitacao) and self.remove(habilitacao)]
+        if verbose:
+            log('%d de %d currículos atualizados e %d removidos do índice'
+                % (len(atualizadas), len(codigos), len(removidas)))
+        return sorted(atualizadas + removidas)
+
+    def papeis(self, disciplina):
+        '''Retorna a lista dos papéis (ver Papel) da disciplina dada nos
+        currículos indexados.'''
+        return list(self._papeis.get(str(disciplina), ()))
+
+    def habilitacoes(self, disciplina, tipos=(OBRIGATORIA, OPTATIVA, CADEIA)):
+        '''Retorna o conjunto das habilitações em cujos currículos a
+        disciplina dada tem um papel dos tipos dados.
+
+        Argumentos:
+        disciplina -- o código da disciplina
+        tipos -- coleção de tipos de papel (OBRIGATORIA, OPTATIVA e CADEIA)
+                 (default todos)
+        '''
+        return set(papel.habilitacao
+                   for papel in self._papeis.get(str(disciplina), ())
+                   if papel.tipo in tipos)
+
+    def indexadas(self):
+        '''Retorna a lista ordenada das habilitações indexadas.'''
+        return sorted(self._resumos)
+
+    def __contains__(self, disciplina):
+        return str(disciplina) in self._papeis
+
+    def fecha(self):
+        '''Fecha o arquivo do índice.'''
+        if self._conexao is not None:
+            self._conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fecha()
@@ -0,0 +1,556 @@
+#  -*- coding: utf-8 -*-
+#    @package: mweblxml.py
+#
+# Analisador alternativo das páginas do Matrícula Web, baseado na árvore HTML
+# (lxml) em vez de expressões regulares. Produz os mesmos dicionários que
+# mwebcrawler.Analisador e é selecionado pelo nome 'lxml' (ver
+# mwebcrawler.configura_analisador ou o argumento 'analisador' dos métodos de
+# busca).
+#
+# Requer lxml.
+
+
+from lxml.etree import HTML, HTMLParser, XPath, iterparse
+import re
+
+import mwebcrawler
+
+# Dias da semana, como apresentados nos horários das turmas.
+DIAS = ('Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo')
+
+# Rótulos da página de dados de um curso, e as chaves correspondentes nas
+# informações de cada habilitação (ver Cursos.habilitacoes).
+HABILITACAO = {'Grau:': 'Grau',
+               'Limite mínimo de permanência:':
+               'Limite mínimo de permanência',
+               'Limite máximo de permanência:':
+               'Limite máximo de permanência',
+               'Quantidade de Créditos para Formatura:':
+               'Créditos para Formatura',
+               'Quantidade mínima de Créditos Optativos na Área de '
+               'Concentração:':
+               'Mínimo de Créditos Optativos na Área de Concentração',
+               'Quantidade mínima de Créditos Optativos na Área Conexa:':
+               'Quantidade mínima de Créditos Optativos na Área Conexa',
+               'Quantidade máxima de Créditos no Módulo Livre:':
+               'Quantidade máxima de Créditos no Módulo Livre'}
+
+# Consultas (XPath) compiladas de cada tipo de página. As comparações usam o
+# primeiro nó de texto (text()) dos elementos, e não seu conteúdo completo,
+# para não percorrer os elementos aninhados.
+XPATHS = {
+    'curso_dados': {'HABILITACAO': XPath('td[@colspan="3"]/b')},
+    'curso_rel': {'LINHAS': XPath('//tr[@class="PadraoMenor"]')},
+    'oferta_dep': {'LINHAS': XPath('//tr[@class="PadraoMenor"]')},
+    'faltavaga_rel': {'CABECALHOS': XPath('//tr[td[1]="Turma"]')},
+    'oferta_dados': {
+        'DEPARTAMENTO': XPath('//td[starts-with(text(), "Departamento:")]'
+                              '/strong/a'),
+        'NOME': XPath('//td[starts-with(text(), "Nome:")]/a[@title]'),
+        'CREDITOS': XPath('//b[text()="Créditos"]/following-sibling::font'),
+        'TURMAS': XPath('//b[text()="Turma"]'),
+        'TURMAS_DA_LINHA': XPath('.//b[text()="Turma"]'),
+        'TURMA': XPath('../font[@size="4"]'),
+        'VAGAS': XPath('.//td[text()="Vagas"]/following-sibling::td[1]'),
+        'OCUPADAS': XPath('.//td[text()="Ocupadas"]'
+                          '/following-sibling::td[1]'),
+        'RESERVA': XPath('.//b[text()="Reserva para curso"]'),
+        'CURSOS': XPath('.//td[@align="left"]'),
+        'VAGAS_DO_CURSO': XPath('following-sibling::td[@align="center"]')}
+}
+
+_HTML = HTMLParser()
+
+# Analisadores (lxml) de páginas em bytes, por codificação; None para as
+# codificações desconhecidas pela libxml2 (ver _documento).
+_PARSERS = {'utf-8': HTMLParser(encoding='utf-8')}
+
+
+def _parser(codificacao):
+    '''Retorna o analisador (lxml) de páginas na codificação dada, ou None
+    caso a libxml2 não a conheça.'''
+    if codificacao not in _PARSERS:
+        try:
+            _PARSERS[codificacao] = HTMLParser(encoding=codificacao)
+        except LookupError:
+            _PARSERS[codificacao] = None
+    return _PARSERS[codificacao]
+
+
+def _documento(pagina_html):
+    '''Retorna a árvore HTML da página dada, ou None caso ela seja vazia.
+
+    Páginas em bytes (ou em qualquer objeto com a interface de buffer, como
+    memoryview ou mmap) são lidas na codificação que declaram, como em
+    mwebcrawler.Analisador (ver mwebcrawler._codificacao).
+    '''
+    if isinstance(pagina_html, str):
+        if not pagina_html.strip():
+            return None
+        return HTML(pagina_html, parser=_HTML)
+
+    pagina_html = bytes(pagina_html)
+    if not pagina_html or pagina_html.isspace():
+        return None
+    codificacao = mwebcrawler._codificacao(pagina_html)
+    parser = _parser(codificacao)
+    if parser is None:
+        return HTML(pagina_html.decode(codificacao, 'replace'), parser=_HTML)
+    return HTML(pagina_html, parser=parser)
+
+
+# Caracteres que não são espaços em branco, para identificar páginas vazias
+# sem cópias do conteúdo.
+_NAO_BRANCO = re.compile(br'\S')
+
+
+class _Leitor:
+    '''Leitura (como a de um arquivo) do conteúdo dado, em partes e sob
+    demanda, sem cópia do conteúdo inteiro.'''
+
+    def __init__(self, conteudo):
+        self._conteudo, self._posicao = memoryview(conteudo), 0
+
+    def read(self, tamanho=-1):
+        fim = len(self._conteudo) if tamanho < 0 else self._posicao + tamanho
+        parte = self._conteudo[self._posicao:fim].tobytes()
+        self._posicao += len(parte)
+        return parte
+
+
+def _elementos(pagina_html, tag):
+    '''Gera os elementos de tag dada da página dada assim que terminam de
+    ser lidos (iterparse), sem aguardar a leitura da página inteira. Os
+    elementos consumidos podem ser descartados (ver _descarta).'''
+    if isinstance(pagina_html, str):
+        if not pagina_html.strip():
+            return
+        pagina_html, codificacao = pagina_html.encode('utf-8'), 'utf-8'
+    else:
+        if not _NAO_BRANCO.search(pagina_html):
+            return
+        codificacao = mwebcrawler._codificacao(pagina_html)
+        if _parser(codificacao) is None:
+            pagina_html = bytes(pagina_html).decode(
+                codificacao, 'replace').encode('utf-8')
+            codificacao = 'utf-8'
+
+    for _, elemento in iterparse(_Leitor(pagina_html), events=('end',),
+                                 tag=tag, html=True, encoding=codificacao):
+        yield elemento
+
+
+def _descarta(elemento):
+    '''Descarta o conteúdo do elemento dado (já consumido) e os irmãos que o
+    antecedem, liberando a memória usada por eles.'''
+    elemento.clear()
+    while elemento.getprevious() is not None:
+        del elemento.getparent()[0]
+
+
+def _texto(elemento):
+    '''Retorna o texto do elemento dado (incluindo o de seus descendentes).'''
+    return ''.join(elemento.itertext())
+
+
+def _conteudo(elemento, quebra):
+    '''Retorna o texto do elemento dado, com cada quebra de linha (<br>)
+    substituída pelo texto dado.'''
+    partes = [elemento.text or '']
+    for filho in elemento:
+        if filho.tag == 'br':
+            partes.append(quebra)
+        elif isinstance(filho.tag, str):  # ignora comentários
+            partes.append(_conteudo(filho, quebra))
+        partes.append(filho.tail or '')
+    return ''.join(partes)
+
+
+def _codigo(link):
+    '''Retorna o código (parâmetro 'cod') do link dado, ou None.'''
+    codigo = re.search('cod=(\d+)', link.get('href', ''))
+    return codigo.group(1) if codigo else None
+
+
+def _curso(linha):
+    '''Retorna o par (código, informações) do curso da linha dada da
+    relação de cursos, ou None caso ela não seja de um curso.'''
+    celulas = linha.findall('td')
+    link = celulas[2].find('.//a') if len(celulas) >= 4 else None
+    if link is None or not _texto(celulas[1]).isdigit():
+        return None
+    return _codigo(link), {'Modalidade': _texto(celulas[0]),
+                           'Denominação': _texto(link),
+                           'Turno': _texto(celulas[3])}
+
+
+def _departamento(linha):
+    '''Retorna o par (código, informações) do departamento da linha dada da
+    lista de departamentos com oferta, ou None caso ela não seja de um
+    departamento.'''
+    celulas = linha.findall('td')
+    link = linha.find('.//a')
+    if len(celulas) < 3 or link is None or \
+       not _texto(celulas[0]).isdigit():
+        return None
+    return _codigo(link), {'Sigla': _texto(celulas[1]),
+                           'Denominação': _texto(link)}
+
+
+def _turma(rotulo, linha):
+    '''Retorna o par (turma, informações) da turma de rótulo ('Turma') e
+    linha dados da página de oferta de uma disciplina.'''
+    xpaths = XPATHS['oferta_dados']
+    vagas = xpaths['VAGAS'](linha)
+    ocupadas = xpaths['OCUPADAS'](linha)
+    docentes = _conteudo(linha.find('.//center'), '<br>')
+    if docentes.endswith('<br>'):
+        docentes = docentes[:-len('<br>')]
+
+    turma = {'Vagas': int(_texto(vagas[0])),
+             'Alunos Matriculados': int(_texto(ocupadas[0])),
+             'Professores': docentes.split('<br>')}
+
+    turma['Aulas'], aula = {}, None
+    for elemento in linha.iter('b', 'font', 'i'):
+        if elemento.tag == 'b' and elemento.text in DIAS:
+            aula = {}
+            turma['Aulas'].setdefault(elemento.text, []).append(aula)
+        elif aula is None:
+            continue
+        elif elemento.tag == 'font' and elemento.get('color') == 'black':
+            aula['Início'] = _texto(elemento)
+        elif elemento.tag == 'font' and elemento.get('color') == 'brown':
+            aula['Fim'] = _texto(elemento)
+        elif elemento.tag == 'i':
+            local = _texto(elemento)
+            aula['Local'] = local[1:] if local.startswith(' ') else local
+            aula = None
+
+    if xpaths['RESERVA'](linha):
+        turma['Turma Reservada'] = {}
+        for curso in xpaths['CURSOS'](linha):
+            vagas, calouros = xpaths['VAGAS_DO_CURSO'](curso)[:2]
+            turma['Turma Reservada'][_texto(curso)] = {
+                'Vagas': int(_texto(vagas)),
+                'Calouros': int(_texto(calouros))}
+
+    return _texto(xpaths['TURMA'](rotulo)[0]), turma
+
+
+def _rotulos(documento):
+    '''Retorna um dicionário que associa o texto da primeira célula de cada
+    linha de tabela (rótulo) à segunda célula (valor).'''
+    campos = {}
+    for linha in documento.iter('tr'):
+        celulas = linha.findall('td')
+        if len(celulas) >= 2:
+            campos.setdefault(_texto(celulas[0]).strip(), celulas[1])
+    return campos
+
+
+class AnalisadorLXML:
+    '''Métodos de extração das informações de cada tipo de página do
+    Matrícula Web, a partir da árvore HTML (ver mwebcrawler.Analisador).
+
+    Os métodos geradores (itera_<página>) leem a página incrementalmente
+    (iterparse), gerando cada item assim que o seu trecho é lido, e
+    descartam os elementos já consumidos.'''
+
+    @staticmethod
+    def curriculo(pagina_html):
+        '''Retorna um dicionário com a lista de disciplinas definidas no
+        currículo (ver Cursos.curriculo).'''
+        disciplinas = {'obrigatórias': {}, 'cadeias': {}, 'optativas': {}}
+        documento = _documento(pagina_html)
+        if documento is None:
+            return disciplinas
+
+        secao, ciclo, current = None, None, {}
+        for elemento in documento.iter('b', 'tr'):
+            if elemento.tag == 'b':
+                titulo = _texto(elemento).strip()
+                if titulo.startswith('DISCIPLINAS OBRIGATÓRIAS'):
+                    secao = 'obrigatórias'
+                elif titulo.startswith('CADEIA:'):
+                    secao, ciclo = 'cadeias', titulo.split(':')[1].strip()
+                    disciplinas['cadeias'][ciclo], current = [], {}
+                elif titulo.startswith('DISCIPLINAS OPTATIVAS'):
+                    secao = 'optativas'
+                continue
+
+            celulas = elemento.findall('td')
+            link = celulas[0].find('.//a') if len(celulas) >= 4 else None
+            if secao is None or link is None or \
+               'disciplina.aspx?cod=' not in link.get('href', ''):
+                continue
+
+            teor, prat, ext, est = _texto(celulas[2]).split()
+            dados = {'Nome': _texto(link).partition(' - ')[2].strip(),
+                     'Créditos': {'Teoria': int(teor), 'Prática': int(prat),
+                                  'Extensão': int(ext), 'Estudo': int(est)},
+                     'Área': _texto(celulas[3]).strip()}
+            if secao == 'cadeias':
+                current[_codigo(link)] = dados
+                if _texto(celulas[1]).strip() != 'E':
+                    disciplinas['cadeias'][ciclo].append(current)
+                    current = {}
+            else:
+                disciplinas[secao][_codigo(link)] = dados
+
+        return disciplinas
+
+    @staticmethod
+    def fluxo(pagina_html):
+        '''Retorna um dicionário com a lista de disciplinas por período
+        definidas no fluxo (ver Cursos.fluxo).'''
+        disciplinas = {}
+        documento = _documento(pagina_html)
+        if documento is None:
+            return disciplinas
+
+        for titulo in documento.iter('b'):
+            periodo = re.match('PERÍODO: (\d+)', _texto(titulo))
+            if not periodo:
+                continue
+
+            tabela = next(titulo.iterancestors('table'))
+            creditos = [(b.tail or '').strip() for b in tabela.iter('b')
+                        if _texto(b) == 'CRÉDITOS:']
+            periodo = int(periodo.group(1))
+            disciplinas[periodo] = {}
+            disciplinas[periodo]['Créditos'] = creditos[0]
+            disciplinas[periodo]['Disciplinas'] = [
+                _texto(link) for link in tabela.iter('a')
+                if 'disciplina.aspx?cod=' in link.get('href', '')]
+
+        return disciplinas
+
+    @staticmethod
+    def curso_dados(pagina_html):
+        '''Retorna um dicionário com a lista de informações referentes a cada
+        habilitação do curso (ver Cursos.habilitacoes).'''
+        xpaths = XPATHS['curso_dados']
+        dados = {}
+        documento = _documento(pagina_html)
+        if documento is None:
+            return dados
+
+        habilitacao = None
+        for linha in documento.iter('tr'):
+            titulo = xpaths['HABILITACAO'](linha)
+            celulas = linha.findall('td')
+            if titulo:
+                codigo, _, nome = _texto(titulo[0]).partition(' - ')
+                habilitacao = dados[codigo] = {'Nome': nome}
+            elif habilitacao is not None and len(celulas) >= 2:
+                rotulo = _texto(celulas[0]).strip()
+                if rotulo in HABILITACAO:
+                    habilitacao[HABILITACAO[rotulo]] = \
+                        _texto(celulas[1])
+
+        return {codigo: habilitacao for codigo, habilitacao in dados.items()
+                if len(habilitacao) == len(HABILITACAO) + 1}
+
+    @staticmethod
+    def curso_rel(pagina_html):
+        '''Retorna um dicionário com a relação de cursos existentes (ver
+        Cursos.relacao).'''
+        xpaths = XPATHS['curso_rel']
+        lista = {}
+        documento = _documento(pagina_html)
+        if documento is None:
+            return lista
+
+        for linha in xpaths['LINHAS'](documento):
+            curso = _curso(linha)
+            if curso is not None:
+                lista[curso[0]] = curso[1]
+
+        return lista
+
+    @staticmethod
+    def itera_curso_rel(pagina_html):
+        '''Gera os pares (código, informações) dos cursos existentes, à
+        medida que são lidos da página (ver Cursos.itera_relacao).'''
+        for linha in _elementos(pagina_html, 'tr'):
+            if linha.get('class') == 'PadraoMenor':
+                curso = _curso(linha)
+                if curso is not None:
+                    yield curso
+                _descarta(linha)
+
+    @staticmethod
+    def disciplina(pagina_html):
+        '''Retorna um dicionário com as informações da disciplina (ver
+        Disciplina.informacoes).'''
+        documento = _documento(pagina_html)
+        if documento is None:
+            return {}
+
+        campos = _rotulos(documento)
+        for rotulo in ('Órgão:', 'Denominação:', 'Nível:', 'Vigência:',
+                       'Pré-req:', 'Ementa:', 'Bibliografia:'):
+            if rotulo not in campos:
+                return {}
+
+        def paragrafo(rotulo):
+            return _conteudo(campos[rotulo].find('p'), '\n')
+
+        sigla, _, nome = _texto(campos['Órgão:']).partition(' - ')
+        infos = {}
+        infos['Sigla do Departamento'] = sigla
+        infos['Nome do Departamento'] = nome
+        infos['Denominação'] = _texto(campos['Denominação:'])
+        infos['Nível'] = _texto(campos['Nível:'])
+        infos['Vigência'] = _texto(campos['Vigência:'])
+        infos['Pré-requisitos'] = _conteudo(campos['Pré-req:'], ' ')
+        infos['Ementa'] = paragrafo('Ementa:')
+        if 'Programa:' in campos and paragrafo('Programa:'):
+            infos['Programa'] = paragrafo('Programa:')
+        infos['Bibliografia'] = paragrafo('Bibliografia:')
+
+        return infos
+
+    @staticmethod
+    def disciplina_pop(pagina_html):
+        '''Retorna uma lista com os códigos das disciplinas que são
+        pré-requisitos (ver Disciplina.pre_requisitos).'''
+        documento = _documento(pagina_html)
+        if documento is None:
+            return []
+
+        campos = _rotulos(documento)
+        if 'Pré-req:' not in campos:
+            return []
+
+        requisitos = _conteudo(campos['Pré-req:'], '<br>')
+        pre_reqs = [re.findall('(\d{6})', disciplina)
+                    for disciplina in requisitos.split(' OU<br>')]
+        return [codigo for codigo in pre_reqs if codigo]
+
+    @staticmethod
+    def oferta_dep(pagina_html):
+        '''Retorna um dicionário com a lista de departamentos com oferta (ver
+        Oferta.departamentos).'''
+        xpaths = XPATHS['oferta_dep']
+        deptos = {}
+        documento = _documento(pagina_html)
+        if documento is None:
+            return deptos
+
+        for linha in xpaths['LINHAS'](documento):
+            departamento = _departamento(linha)
+            if departamento is not None:
+                deptos[departamento[0]] = departamento[1]
+
+        return deptos
+
+    @staticmethod
+    def itera_oferta_dep(pagina_html):
+        '''Gera os pares (código, informações) dos departamentos com oferta,
+        à medida que são lidos da página (ver Oferta.itera_departamentos).'''
+        for linha in _elementos(pagina_html, 'tr'):
+            if linha.get('class') == 'PadraoMenor':
+                departamento = _departamento(linha)
+                if departamento is not None:
+                    yield departamento
+                _descarta(linha)
+
+    @staticmethod
+    def oferta_dis(pagina_html):
+        '''Retorna um dicionário com a lista de disciplinas ofertadas por um
+        departamento (ver Oferta.disciplinas).'''
+        oferta = {}
+        documento = _documento(pagina_html)
+        if documento is None:
+            return oferta
+
+        for link in documento.iter('a'):
+            if 'oferta_dados.aspx?cod=' in link.get('href', ''):
+                oferta[_codigo(link)] = _texto(link)
+
+        return oferta
+
+    @staticmethod
+    def itera_oferta_dis(pagina_html):
+        '''Gera os pares (código, denominação) das disciplinas ofertadas por
+        um departamento, à medida que são lidas da página (ver
+        Oferta.itera_disciplinas).'''
+        for link in _elementos(pagina_html, 'a'):
+            if 'oferta_dados.aspx?cod=' in link.get('href', ''):
+                yield _codigo(link), _texto(link)
+                _descarta(link)
+
+    @staticmethod
+    def faltavaga_rel(pagina_html, turma='\w+'):
+        '''Retorna um dicionário com a lista de espera das turmas dadas (ver
+        Oferta.lista_de_espera).'''
+        xpaths = XPATHS['faltavaga_rel']
+        demanda = {}
+        documento = _documento(pagina_html)
+        if documento is None:
+            return demanda
+
+        filtro = re.compile('(?:%s)\Z' % turma)
+        for cabecalho in xpaths['CABECALHOS'](documento):
+            for linha in cabecalho.itersiblings('tr'):
+                if linha.get('class') == 'PadraoBranco':
+                    break
+                celulas = linha.findall('td')
+                if linha.get('class') != 'PadraoMenor' or len(celulas) < 2:
+                    continue
+
+                turma = _texto(celulas[0])
+                vagas = int(_texto(celulas[1]))
+                if vagas > 0 and filtro.match(turma):
+                    demanda[turma] = vagas
+
+        return demanda
+
+    @staticmethod
+    def oferta_dados(pagina_html):
+        '''Retorna um dicionário com a lista de turmas ofertadas para uma
+        disciplina (ver Oferta.oferta).'''
+        xpaths = XPATHS['oferta_dados']
+        oferta = {}
+        documento = _documento(pagina_html)
+        if documento is None:
+            oferta['Turmas'] = {}
+            return oferta
+
+        departamento = xpaths['DEPARTAMENTO'](documento)
+        nome = xpaths['NOME'](documento)
+        creditos = xpaths['CREDITOS'](documento)
+        if departamento and nome and creditos:
+            teor, prat, ext, est = _texto(creditos[0]).split('-')
+            oferta['Departamento'] = _texto(departamento[0])
+            oferta['Nome'] = nome[0].text
+            oferta['Créditos'] = {'Teoria': int(teor), 'Prática': int(prat),
+                                  'Extensão': int(ext), 'Estudo': int(est)}
+
+        turmas_ofertadas = {}
+        for rotulo in xpaths['TURMAS'](documento):
+            turma, dados = _turma(rotulo, next(rotulo.iterancestors('tr')))
+            turmas_ofertadas[turma] = dados
+
+        oferta['Turmas'] = turmas_ofertadas
+
+        return oferta
+
+    @staticmethod
+    def itera_oferta_dados(pagina_html):
+        '''Gera os pares (turma, informações) das turmas ofertadas para uma
+        disciplina, à medida que são lidas da página (ver
+        Oferta.itera_turmas).'''
+        xpaths = XPATHS['oferta_dados']
+        for linha in _elementos(pagina_html, 'tr'):
+            rotulos = [rotulo for rotulo in xpaths['TURMAS_DA_LINHA'](linha)
+                       if next(rotulo.iterancestors('tr')) is linha]
+            for rotulo in rotulos:
+                yield _turma(rotulo, linha)
+            if rotulos:
+                _descarta(linha)
+
+
+mwebcrawler.ANALISADORES['lxml'] = AnalisadorLXML
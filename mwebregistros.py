@@ -0,0 +1,413 @@
+#  -*- coding: utf-8 -*-
+#    @package: mwebregistros.py
+#
+# Registros tipados e compactos das informações do Matrícula Web, alternativos
+# aos dicionários retornados pelos métodos de busca de mwebcrawler. Cada
+# registro guarda seus campos em __slots__ (sem um dicionário por objeto, nem
+# as chaves repetidas em cada turma), e as strings que se repetem entre os
+# registros (dias, horários, locais, professores, cursos etc.) são
+# internalizadas, de forma que há uma única cópia de cada uma em memória.
+#
+# As funções de busca (oferta, informacoes e habilitacoes) aceitam os mesmos
+# argumentos dos métodos equivalentes de mwebcrawler, inclusive a fonte das
+# informações (ver coordenacao), e retornam os registros. Para compatibilidade
+# com o código que usa os dicionários, cada registro pode ser convertido de
+# volta com para_dicionario().
+
+from mwebcrawler import Campus, Nivel, _em_lote
+import mwebcrawler
+
+try:
+    from sys import intern
+except ImportError:  # Python 2
+    pass
+
+
+def _interna(texto):
+    '''Retorna a cópia única (internalizada) do texto dado.'''
+    return None if texto is None else intern(texto)
+
+
+class Registro(object):
+    '''Base dos registros: comparação e representação com base nos campos
+    (__slots__) de cada classe.'''
+    __slots__ = ()
+
+    def _valores(self):
+        return tuple(getattr(self, campo) for campo in self.__slots__)
+
+    def __eq__(self, outro):
+        return type(self) is type(outro) and \
+            self._valores() == outro._valores()
+
+    def __ne__(self, outro):
+        return not self == outro
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__,
+                           ', '.join('%s=%r' % (campo, getattr(self, campo))
+                                     for campo in self.__slots__))
+
+
+class Creditos(Registro):
+    '''Créditos de uma disciplina.'''
+    __slots__ = ('teoria', 'pratica', 'extensao', 'estudo')
+
+    def __init__(self, teoria, pratica, extensao, estudo):
+        self.teoria = teoria
+        self.pratica = pratica
+        self.extensao = extensao
+        self.estudo = estudo
+
+    def para_dicionario(self):
+        '''Retorna o dicionário equivalente (ver Oferta.oferta).'''
+        return {'Teoria': self.teoria, 'Prática': self.pratica,
+                'Extensão': self.extensao, 'Estudo': self.estudo}
+
+    @staticmethod
+    def de_dicionario(dados):
+        '''Retorna o registro equivalente ao dicionário dado.'''
+        return Creditos(dados['Teoria'], dados['Prática'],
+                        dados['Extensão'], dados['Estudo'])
+
+
+class Aula(Registro):
+    '''Horário e local de uma aula semanal de uma turma.'''
+    __slots__ = ('dia', 'inicio', 'fim', 'local')
+
+    def __init__(self, dia, inicio, fim, local):
+        self.dia = _interna(dia)
+        self.inicio = _interna(inicio)
+        self.fim = _interna(fim)
+        self.local = _interna(local)
+
+    def para_dicionario(self):
+        '''Retorna o dicionário equivalente (sem o dia, que é a chave das
+        aulas de cada turma, ver Oferta.oferta).'''
+        return {'Início': self.inicio, 'Fim': self.fim, 'Local': self.local}
+
+
+class Reserva(Registro):
+    '''Reserva de vagas de uma turma para um curso.'''
+    __slots__ = ('curso', 'vagas', 'calouros')
+
+    def __init__(self, curso, vagas, calouros):
+        self.curso = _interna(curso)
+        self.vagas = vagas
+        self.calouros = calouros
+
+    def para_dicionario(self):
+        '''Retorna o dicionário equivalente (sem o curso, que é a chave das
+        reservas de cada turma, ver Oferta.oferta).'''
+        return {'Vagas': self.vagas, 'Calouros': self.calouros}
+
+
+class Turma(Registro):
+    '''Turma ofertada de uma disciplina.
+
+    O campo reservas é None caso a turma não tenha reserva de vagas.
+    '''
+    __slots__ = ('nome', 'vagas', 'alunos_matriculados', 'professores',
+                 'aulas', 'reservas')
+
+    def __init__(self, nome, vagas, alunos_matriculados, professores=(),
+                 aulas=(), reservas=None):
+        '''Argumentos:
+        nome -- o nome da turma (por exemplo, 'A')
+        vagas -- total de vagas
+        alunos_matriculados -- total de vagas ocupadas
+        professores -- coleção com os nomes dos professores
+                       (default ())
+        aulas -- coleção de Aula
+                 (default ())
+        reservas -- coleção de Reserva, ou None caso não haja reservas
+                    (default None)
+        '''
+        self.nome = _interna(nome)
+        self.vagas = vagas
+        self.alunos_matriculados = alunos_matriculados
+        self.professores = tuple(_interna(p) for p in professores)
+        self.aulas = tuple(aulas)
+        self.reservas = None if reservas is None else tuple(reservas)
+
+    def para_dicionario(self):
+        '''Retorna o dicionário equivalente (ver Oferta.oferta).'''
+        aulas = {}
+        for aula in self.aulas:
+            aulas.setdefault(aula.dia, []).append(aula.para_dicionario())
+
+        turma = {'Vagas': self.vagas,
+                 'Alunos Matriculados': self.alunos_matriculados,
+                 'Professores': list(self.professores),
+                 'Aulas': aulas}
+        if self.reservas is not None:
+            turma['Turma Reservada'] = {reserva.curso:
+                                        reserva.para_dicionario()
+                                        for reserva in self.reservas}
+        return turma
+
+    @staticmethod
+    def de_dicionario(nome, dados):
+        '''Retorna o registro equivalente ao dicionário dado, da turma de
+        nome dado.'''
+        aulas = [Aula(dia, aula['Início'], aula['Fim'], aula['Local'])
+                 for dia, lista in dados['Aulas'].items() for aula in lista]
+        reservas = dados.get('Turma Reservada')
+        if reservas is not None:
+            reservas = [Reserva(curso, reserva['Vagas'], reserva['Calouros'])
+                        for curso, reserva in reservas.items()]
+        return Turma(nome, dados['Vagas'], dados['Alunos Matriculados'],
+                     dados['Professores'], aulas, reservas)
+
+
+class OfertaDisciplina(Registro):
+    '''Oferta de uma disciplina: suas informações e turmas.
+
+    Os campos nome, departamento e creditos são None caso a disciplina não
+    seja ofertada.
+    '''
+    __slots__ = ('nome', 'departamento', 'creditos', 'turmas')
+
+    def __init__(self, nome=None, departamento=None, creditos=None,
+                 turmas=()):
+        self.nome = nome
+        self.departamento = _interna(departamento)
+        self.creditos = creditos
+        self.turmas = tuple(turmas)
+
+    def turma(self, nome):
+        '''Retorna a turma de nome dado (ou None).'''
+        for turma in self.turmas:
+            if turma.nome == nome:
+                return turma
+        return None
+
+    def para_dicionario(self):
+        '''Retorna o dicionário equivalente (ver Oferta.oferta).'''
+        oferta = {}
+        if self.nome is not None:
+            oferta['Departamento'] = self.departamento
+            oferta['Nome'] = self.nome
+            oferta['Créditos'] = self.creditos.para_dicionario()
+        oferta['Turmas'] = {turma.nome: turma.para_dicionario()
+                            for turma in self.turmas}
+        return oferta
+
+    @staticmethod
+    def de_dicionario(dados):
+        '''Retorna o registro equivalente ao dicionário dado.'''
+        creditos = dados.get('Créditos')
+        if creditos is not None:
+            creditos = Creditos.de_dicionario(creditos)
+        return OfertaDisciplina(dados.get('Nome'), dados.get('Departamento'),
+                                creditos,
+                                [Turma.de_dicionario(nome, turma)
+                                 for nome, turma in dados['Turmas'].items()])
+
+
+class DisciplinaInfo(Registro):
+    '''Informações de uma disciplina.
+
+    O campo programa é None caso a página da disciplina não o informe.
+    '''
+    __slots__ = ('sigla_do_departamento', 'nome_do_departamento',
+                 'denominacao', 'nivel', 'vigencia', 'pre_requisitos',
+                 'ementa', 'programa', 'bibliografia')
+
+    # Chave no dicionário equivalente de cada campo (ver
+    # Disciplina.informacoes).
+    CHAVES = ('Sigla do Departamento', 'Nome do Departamento', 'Denominação',
+              'Nível', 'Vigência', 'Pré-requisitos', 'Ementa', 'Programa',
+              'Bibliografia')
+
+    def __init__(self, sigla_do_departamento, nome_do_departamento,
+                 denominacao, nivel, vigencia, pre_requisitos, ementa,
+                 programa, bibliografia):
+        self.sigla_do_departamento = _interna(sigla_do_departamento)
+        self.nome_do_departamento = _interna(nome_do_departamento)
+        self.denominacao = denominacao
+        self.nivel = _interna(nivel)
+        self.vigencia = _interna(vigencia)
+        self.pre_requisitos = pre_requisitos
+        self.ementa = ementa
+        self.programa = programa
+        self.bibliografia = bibliografia
+
+    def para_dicionario(self):
+        '''Retorna o dicionário equivalente (ver Disciplina.informacoes).'''
+        return {chave: getattr(self, campo) for campo, chave
+                in zip(self.__slots__, DisciplinaInfo.CHAVES)
+                if getattr(self, campo) is not None}
+
+    @staticmethod
+    def de_dicionario(dados):
+        '''Retorna o registro equivalente ao dicionário dado, ou None caso
+        ele esteja vazio (disciplina não encontrada).'''
+        if not dados:
+            return None
+        return DisciplinaInfo(*[dados.get(chave)
+                                for chave in DisciplinaInfo.CHAVES])
+
+
+class Habilitacao(Registro):
+    '''Informações de uma habilitação (opção) de um curso.'''
+    __slots__ = ('codigo', 'nome', 'grau', 'limite_minimo', 'limite_maximo',
+                 'creditos_para_formatura', 'optativos_area_de_concentracao',
+                 'optativos_area_conexa', 'modulo_livre')
+
+    # Chave no dicionário equivalente de cada campo numérico (ver
+    # Cursos.habilitacoes).
+    CHAVES = ('Limite mínimo de permanência', 'Limite máximo de permanência',
+              'Créditos para Formatura',
+              'Mínimo de Créditos Optativos na Área de Concentração',
+              'Quantidade mínima de Créditos Optativos na Área Conexa',
+              'Quantidade máxima de Créditos no Módulo Livre')
+
+    def __init__(self, codigo, nome, grau, limite_minimo, limite_maximo,
+                 creditos_para_formatura, optativos_area_de_concentracao,
+                 optativos_area_conexa, modulo_livre):
+        self.codigo = _interna(str(codigo))
+        self.nome = nome
+        self.grau = _interna(grau)
+        self.limite_minimo = limite_minimo
+        self.limite_maximo = limite_maximo
+        self.creditos_para_formatura = creditos_para_formatura
+        self.optativos_area_de_concentracao = optativos_area_de_concentracao
+        self.optativos_area_conexa = optativos_area_conexa
+        self.modulo_livre = modulo_livre
+
+    def para_dicionario(self):
+        '''Retorna o dicionário equivalente (sem o código, que é a chave das
+        habilitações do curso, ver Cursos.habilitacoes).'''
+        dados = {'Nome': self.nome, 'Grau': self.grau}
+        for campo, chave in zip(self.__slots__[3:], Habilitacao.CHAVES):
+            dados[chave] = str(getattr(self, campo))
+        return dados
+
+    @staticmethod
+    def de_dicionario(codigo, dados):
+        '''Retorna o registro equivalente ao dicionário dado, da habilitação
+        de código dado.'''
+        return Habilitacao(codigo, dados['Nome'], dados['Grau'],
+                           *[int(dados[chave])
+                             for chave in Habilitacao.CHAVES])
+
+
+def oferta(disciplina, depto=None, nivel=Nivel.GRADUACAO, verbose=False,
+           fonte=None):
+    '''Retorna a OfertaDisciplina da disciplina dada (ver Oferta.oferta).
+
+    Argumentos:
+    disciplina -- o código da disciplina
+    depto -- o código do departamento que oferece a disciplina
+             (default None)
+    nivel -- nível acadêmico da disciplina
+             (default Nivel.GRADUACAO)
+    verbose -- indicação dos procedimentos sendo adotados
+               (default False)
+    fonte -- origem das informações: o Matrícula Web (None) ou um
+             snapshot.Snapshot
+             (default None)
+    '''
+    fonte = fonte or mwebcrawler
+    return OfertaDisciplina.de_dicionario(fonte.Oferta.oferta(
+        disciplina, depto, nivel, verbose))
+
+
+def oferta_em_lote(disciplinas, depto=None, nivel=Nivel.GRADUACAO,
+                   verbose=False, trabalhadores=8, fonte=None):
+    '''Gera os pares (disciplina, OfertaDisciplina) das disciplinas dadas, à
+    medida que são obtidos (ver Oferta.oferta_em_lote).
+
+    Argumentos:
+    disciplinas -- coleção de códigos de disciplinas (repetições são
+                   ignoradas)
+    depto -- o código do departamento que oferece as disciplinas
+             (default None)
+    nivel -- nível acadêmico das disciplinas
+             (default Nivel.GRADUACAO)
+    verbose -- indicação dos procedimentos sendo adotados
+               (default False)
+    trabalhadores -- quantidade máxima de buscas simultâneas
+                     (default 8)
+    fonte -- origem das informações: o Matrícula Web (None) ou um
+             snapshot.Snapshot
+             (default None)
+    '''
+    def busca(disciplina):
+        return oferta(disciplina, depto, nivel, verbose, fonte)
+
+    return _em_lote(busca, disciplinas, trabalhadores)
+
+
+def oferta_em_processos(disciplinas, depto=None, nivel=Nivel.GRADUACAO,
+                        verbose=False, trabalhadores=8, processos=None,
+                        pendentes=None):
+    '''Gera os pares (disciplina, OfertaDisciplina) das disciplinas dadas, à
+    medida que são obtidos, com as páginas analisadas e convertidas em
+    registros em um pool de processos (ver Oferta.oferta_em_processos).
+
+    Argumentos:
+    disciplinas -- coleção (ou gerador) de códigos de disciplinas
+                   (repetições são ignoradas)
+    depto -- o código do departamento que oferece as disciplinas
+             (default None)
+    nivel -- nível acadêmico das disciplinas
+             (default Nivel.GRADUACAO)
+    verbose -- indicação dos procedimentos sendo adotados
+               (default False)
+    trabalhadores -- quantidade máxima de requisições simultâneas
+                     (default 8)
+    processos -- quantidade de processos de análise
+                 (default None) (a quantidade de CPUs)
+    pendentes -- quantidade máxima de páginas pendentes em cada etapa
+                 (default None) (o dobro de trabalhadores/processos)
+    '''
+    return mwebcrawler.Oferta.oferta_em_processos(
+        disciplinas, depto, nivel, verbose, trabalhadores, processos,
+        pendentes, compacta=OfertaDisciplina.de_dicionario)
+
+
+def informacoes(disciplina, nivel=Nivel.GRADUACAO, verbose=False,
+                fonte=None):
+    '''Retorna o DisciplinaInfo da disciplina dada, ou None caso ela não seja
+    encontrada (ver Disciplina.informacoes).
+
+    Argumentos:
+    disciplina -- o código da disciplina
+    nivel -- nível acadêmico da disciplina
+             (default Nivel.GRADUACAO)
+    verbose -- indicação dos procedimentos sendo adotados
+               (default False)
+    fonte -- origem das informações: o Matrícula Web (None) ou um
+             snapshot.Snapshot
+             (default None)
+    '''
+    fonte = fonte or mwebcrawler
+    return DisciplinaInfo.de_dicionario(fonte.Disciplina.informacoes(
+        disciplina, nivel, verbose))
+
+
+def habilitacoes(curso, nivel=Nivel.GRADUACAO, campus=Campus.DARCY_RIBEIRO,
+                 verbose=False, fonte=None):
+    '''Retorna a lista das Habilitacao do curso dado, ordenadas pelo código
+    (ver Cursos.habilitacoes).
+
+    Argumentos:
+    curso -- o código do curso
+    nivel -- nível acadêmico do curso
+             (default Nivel.GRADUACAO)
+    campus -- o campus onde o curso é oferecido
+              (default Campus.DARCY_RIBEIRO)
+    verbose -- indicação dos procedimentos sendo adotados
+               (default False)
+    fonte -- origem das informações: o Matrícula Web (None) ou um
+             snapshot.Snapshot
+             (default None)
+    '''
+    fonte = fonte or mwebcrawler
+    dados = fonte.Cursos.habilitacoes(curso, nivel, campus, verbose)
+    return [Habilitacao.de_dicionario(codigo, dados[codigo])
+            for codigo in sorted(dados)]
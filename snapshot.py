@@ -0,0 +1,902 @@
+#  -*- coding: utf-8 -*-
+#    @package: snapshot.py
+#
+# Captura completa (snapshot) das informações de um nível/campus do Matrícula
+# Web: departamentos, disciplinas ofertadas, turmas, listas de espera,
+# informações das disciplinas, cursos, habilitações, currículos e fluxos.
+# Um snapshot pode ser atualizado incrementalmente (ver recaptura), buscando
+# apenas as turmas e listas de espera que mudaram.
+#
+# Cada captura gera um arquivo SQLite próprio, com os resultados das buscas
+# (no mesmo formato dos métodos de Cursos, Disciplina e Oferta) compactados.
+# Um Snapshot oferece os mesmos métodos de busca, respondidos a partir do
+# arquivo, de forma que as funções de coordenacao.py podem ser executadas
+# sem acesso à rede, por exemplo:
+#
+#     snapshot = Snapshot('snapshot-graduacao-1-20160301-120000.sqlite')
+#     ocupacao(oferta, cursos, fonte=snapshot)
+#
+# Os resultados de ofertas, listas de espera, currículos, fluxos e informações
+# de disciplinas também são guardados em tabelas normalizadas e indexadas
+# (ver TABELAS), que respondem às consultas de coordenacao.py diretamente em
+# SQL.
+#
+# Uso: python snapshot.py [-h] [--nivel NIVEL] [--campus CAMPUS]
+#                         [--trabalhadores N] [--taxa TAXA]
+#                         [--metricas ARQUIVO] [--registro ARQUIVO]
+#                         [--amostragem FRACAO] [--arquivo ARQUIVO]
+#                         [diretorio]
+#      python snapshot.py [-h] [--trabalhadores N] [--taxa TAXA] [--limite N]
+#                         [--metricas ARQUIVO] [--registro ARQUIVO]
+#                         [--amostragem FRACAO] [--arquivo ARQUIVO]
+#                         --recaptura SNAPSHOT
+#
+# Com --metricas, as métricas da captura (ver mwebcrawler.Metricas) são
+# gravadas no arquivo dado ao final, em JSON ou, caso sua extensão seja .prom,
+# no formato de texto de Prometheus. Com --registro, as mensagens e os trechos
+# de cada busca e análise (ver mwebcrawler.trecho) são registrados em JSON no
+# arquivo dado, com a fração de rastros dada por --amostragem. Com --arquivo,
+# as páginas obtidas são acrescentadas ao arquivo dado (ver mwebarquivo), que
+# pode ser reanalisado depois sem acesso à rede.
+
+
+from mwebcrawler import (Cache, Campus, Cursos, Disciplina, Nivel, Oferta,
+                         _analisador_de, _arquiva, _em_fluxo, _em_lote,
+                         _requisita, _sem_repeticoes,
+                         configura_arquivo, configura_cache,
+                         configura_escalonador, configura_metricas,
+                         configura_registro, desabilita_registro, log)
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+# Versão do formato dos arquivos de snapshot. Snapshots dos formatos 1 (sem
+# as tabelas indexadas), 2 (sem as prioridades das páginas verificadas) e 3
+# (sem a tabela esperas) são convertidos ao serem abertos.
+FORMATO = 4
+
+# Tabelas normalizadas (e seus índices) com os resultados das buscas de
+# ofertas, listas de espera, currículos, fluxos e informações de disciplinas
+# (ver INDEXADOS).
+TABELAS = (
+    'CREATE TABLE IF NOT EXISTS ofertas (disciplina TEXT PRIMARY KEY, '
+    'departamento TEXT, nome TEXT)',
+    'CREATE INDEX IF NOT EXISTS ofertas_departamento '
+    'ON ofertas (departamento)',
+    'CREATE TABLE IF NOT EXISTS turmas (disciplina TEXT, turma TEXT, '
+    'vagas INTEGER, matriculados INTEGER, PRIMARY KEY (disciplina, turma))',
+    'CREATE INDEX IF NOT EXISTS turmas_matriculados ON turmas (matriculados)',
+    'CREATE TABLE IF NOT EXISTS aulas (disciplina TEXT, turma TEXT, '
+    'dia TEXT, inicio TEXT, fim TEXT, local TEXT)',
+    'CREATE INDEX IF NOT EXISTS aulas_turma ON aulas (disciplina, turma)',
+    'CREATE TABLE IF NOT EXISTS reservas (disciplina TEXT, turma TEXT, '
+    'curso TEXT, vagas INTEGER, calouros INTEGER)',
+    'CREATE INDEX IF NOT EXISTS reservas_turma '
+    'ON reservas (disciplina, turma)',
+    'CREATE TABLE IF NOT EXISTS curriculos (habilitacao TEXT, '
+    'disciplina TEXT, tipo TEXT, '
+    'PRIMARY KEY (habilitacao, tipo, disciplina))',
+    'CREATE INDEX IF NOT EXISTS curriculos_disciplina '
+    'ON curriculos (disciplina)',
+    'CREATE TABLE IF NOT EXISTS fluxos (habilitacao TEXT, periodo INTEGER, '
+    'ordem INTEGER, disciplina TEXT, '
+    'PRIMARY KEY (habilitacao, periodo, ordem))',
+    'CREATE INDEX IF NOT EXISTS fluxos_disciplina ON fluxos (disciplina)',
+    'CREATE TABLE IF NOT EXISTS disciplinas (disciplina TEXT PRIMARY KEY, '
+    'sigla TEXT, denominacao TEXT)',
+    'CREATE INDEX IF NOT EXISTS disciplinas_sigla ON disciplinas (sigla)',
+    'CREATE TABLE IF NOT EXISTS esperas (disciplina TEXT, turma TEXT, '
+    'alunos INTEGER, PRIMARY KEY (disciplina, turma))')
+
+# Tipos de disciplina de um currículo (tabela curriculos).
+OBRIGATORIA, OPTATIVA, CADEIA = 'obrigatória', 'optativa', 'cadeia'
+
+# Páginas verificadas pela recaptura, para cada disciplina: método de busca
+# correspondente e página.
+RECAPTURADAS = (('Oferta.oferta', 'oferta_dados'),
+                ('Oferta.lista_de_espera', 'faltavaga_rel'))
+
+# Quantidade de resultados guardados de uma vez durante a captura.
+LOTE = 200
+
+
+def _compacta(dados):
+    '''Retorna os dados dados serializados (JSON) e compactados.'''
+    return sqlite3.Binary(zlib.compress(
+        json.dumps(dados, ensure_ascii=False).encode('utf-8')))
+
+
+def _descompacta(dados):
+    '''Retorna os dados guardados por _compacta.'''
+    return json.loads(zlib.decompress(dados).decode('utf-8'))
+
+
+class Snapshot:
+    '''Resultados das buscas de uma captura, guardados em um arquivo SQLite.
+
+    Os resultados são indexados pelo nome do método de busca (por exemplo,
+    'Oferta.oferta') e pelo código buscado. Os atributos Cursos, Disciplina e
+    Oferta oferecem os métodos de busca de mesmo nome do mwebcrawler,
+    respondidos a partir do arquivo; buscas sem resultado guardado retornam
+    um resultado vazio, como as de páginas inexistentes.
+
+    Os métodos turmas, matriculados, ocupacao, curriculos_com, obrigatorias,
+    periodos e reservas_no_fluxo (e consulta, para SQL arbitrário) respondem
+    às consultas de coordenacao.py a partir das tabelas indexadas, e
+    turmas_detalhadas e aulas às de mwebanalise.py e mwebhorarios.py.
+
+    Um snapshot pode ser usado por várias threads (por exemplo, como fonte
+    das buscas em lote): os acessos à conexão são serializados.
+    '''
+
+    # Indicação, para coordenacao.py, de que as consultas indexadas estão
+    # disponíveis.
+    indexado = True
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._trava = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False)
+        with self._trava, self._conexao:
+            self._conexao.execute('CREATE TABLE IF NOT EXISTS metadados '
+                                  '(chave TEXT PRIMARY KEY, valor TEXT)')
+            self._conexao.execute('CREATE TABLE IF NOT EXISTS resultados '
+                                  '(metodo TEXT, codigo TEXT, dados BLOB, '
+                                  'PRIMARY KEY (metodo, codigo))')
+            self._conexao.execute('CREATE TABLE IF NOT EXISTS paginas '
+                                  '(metodo TEXT, codigo TEXT, resumo TEXT, '
+                                  'etag TEXT, modificada TEXT, '
+                                  'verificada REAL, ocupacao REAL, '
+                                  'espera INTEGER, '
+                                  'PRIMARY KEY (metodo, codigo))')
+            for tabela in TABELAS:
+                self._conexao.execute(tabela)
+            self._conexao.execute('INSERT OR IGNORE INTO metadados '
+                                  'VALUES (?, ?)', ('formato', str(FORMATO)))
+
+        formato = self.metadados()['formato']
+        if formato in ('1', '2', '3'):
+            self._converte(formato)
+        elif formato != str(FORMATO):
+            raise ValueError('Formato de snapshot desconhecido: %s' % formato)
+
+        self.Cursos = _Cursos(self)
+        self.Disciplina = _Disciplina(self)
+        self.Oferta = _Oferta(self)
+
+    def guarda(self, metodo, resultados):
+        '''Guarda os pares (código, resultado) dados do método de busca
+        dado, atualizando as tabelas indexadas (ver INDEXADOS).'''
+        resultados = [(str(codigo), dados) for codigo, dados in resultados]
+        with self._trava, self._conexao:
+            self._conexao.executemany(
+                'INSERT OR REPLACE INTO resultados VALUES (?, ?, ?)',
+                ((metodo, codigo, _compacta(dados))
+                 for codigo, dados in resultados))
+            if metodo in INDEXADOS:
+                for codigo, dados in resultados:
+                    INDEXADOS[metodo](self._conexao, codigo, dados)
+
+    def _converte(self, formato):
+        '''Converte o snapshot do formato dado (anterior) ao atual:
+        reconstrói as tabelas indexadas a partir dos resultados guardados
+        (todas no formato 1, e a tabela esperas nos formatos 2 e 3) e
+        acrescenta às páginas verificadas as informações usadas na prioridade
+        da recaptura (formatos 1 e 2).'''
+        with self._trava, self._conexao:
+            metodos = list(INDEXADOS) if formato == '1' else \
+                ['Oferta.lista_de_espera']
+            for metodo in metodos:
+                for codigo, dados in self._conexao.execute(
+                        'SELECT codigo, dados FROM resultados '
+                        'WHERE metodo = ?', (metodo,)).fetchall():
+                    INDEXADOS[metodo](self._conexao, codigo,
+                                      _descompacta(dados))
+            if formato == '3':
+                self._conexao.execute('UPDATE metadados SET valor = ? '
+                                      'WHERE chave = ?',
+                                      (str(FORMATO), 'formato'))
+                return
+
+            colunas = [linha[1] for linha in self._conexao.execute(
+                'PRAGMA table_info(paginas)')]
+            for coluna, tipo in (('ocupacao', 'REAL'),
+                                 ('espera', 'INTEGER')):
+                if coluna not in colunas:
+                    self._conexao.execute('ALTER TABLE paginas ADD COLUMN '
+                                          '%s %s' % (coluna, tipo))
+            self._conexao.execute(
+                'UPDATE paginas SET ocupacao = (SELECT COALESCE(MAX('
+                'CAST(matriculados AS REAL) / vagas), 0) FROM turmas '
+                'WHERE disciplina = paginas.codigo AND vagas > 0) '
+                'WHERE metodo = ?', ('Oferta.oferta',))
+            self._conexao.executemany(
+                'UPDATE paginas SET espera = ? '
+                'WHERE metodo = ? AND codigo = ?',
+                ((1 if _descompacta(dados) else 0, metodo, codigo)
+                 for metodo, codigo, dados in self._conexao.execute(
+                     'SELECT metodo, codigo, dados FROM resultados '
+                     'WHERE metodo = ?',
+                     ('Oferta.lista_de_espera',)).fetchall()))
+            self._conexao.execute('UPDATE metadados SET valor = ? '
+                                  'WHERE chave = ?', (str(FORMATO), 'formato'))
+
+    def consulta(self, sql, parametros=()):
+        '''Retorna a lista das linhas resultantes da consulta SQL dada às
+        tabelas do snapshot (ver TABELAS).'''
+        with self._trava:
+            return self._conexao.execute(sql, parametros).fetchall()
+
+    def turmas(self, departamento=None, minimo=None):
+        '''Retorna a lista das tuplas (disciplina, turma, vagas, alunos
+        matriculados) das turmas ofertadas, ordenadas.
+
+        Argumentos:
+        departamento -- sigla do departamento (por exemplo, 'CIC') que oferece
+                        as disciplinas, ou None para todos
+                        (default None)
+        minimo -- quantidade mínima de alunos matriculados, ou None
+                  (default None)
+        '''
+        condicoes, parametros = ['1'], []
+        if departamento is not None:
+            condicoes.append('o.departamento = ?')
+            parametros.append(departamento)
+        if minimo is not None:
+            condicoes.append('t.matriculados >= ?')
+            parametros.append(minimo)
+        return self.consulta(
+            'SELECT t.disciplina, t.turma, t.vagas, t.matriculados '
+            'FROM turmas t JOIN ofertas o ON o.disciplina = t.disciplina '
+            'WHERE %s ORDER BY t.disciplina, t.turma'
+            % ' AND '.join(condicoes), parametros)
+
+    def turmas_detalhadas(self):
+        '''Retorna a lista das tuplas (disciplina, turma, sigla do
+        departamento, vagas, alunos matriculados, alunos na lista de espera)
+        de todas as turmas guardadas, ordenadas. A sigla é '' para disciplinas
+        sem departamento informado.'''
+        return self.consulta(
+            'SELECT t.disciplina, t.turma, COALESCE(o.departamento, \'\'), '
+            't.vagas, t.matriculados, COALESCE(e.alunos, 0) FROM turmas t '
+            'LEFT JOIN ofertas o ON o.disciplina = t.disciplina '
+            'LEFT JOIN esperas e '
+            'ON e.disciplina = t.disciplina AND e.turma = t.turma '
+            'ORDER BY t.disciplina, t.turma')
+
+    def aulas(self):
+        '''Retorna a lista das tuplas (disciplina, turma, dia, início, fim,
+        local) das aulas de todas as turmas guardadas, ordenadas por turma (e,
+        em cada turma, na ordem da oferta). Turmas sem aulas aparecem uma
+        única vez, com dia, início, fim e local None.'''
+        return self.consulta(
+            'SELECT t.disciplina, t.turma, a.dia, a.inicio, a.fim, a.local '
+            'FROM turmas t LEFT JOIN aulas a '
+            'ON a.disciplina = t.disciplina AND a.turma = t.turma '
+            'ORDER BY t.disciplina, t.turma, a.rowid')
+
+    def matriculados(self, disciplina):
+        '''Retorna o total de alunos matriculados nas turmas da disciplina
+        dada.'''
+        return self.consulta('SELECT COALESCE(SUM(matriculados), 0) '
+                             'FROM turmas WHERE disciplina = ?',
+                             (str(disciplina),))[0][0]
+
+    def ocupacao(self, habilitacoes, minimo=0):
+        '''Retorna a lista das tuplas (disciplina, turma, alunos matriculados,
+        obrigatória) das turmas das disciplinas obrigatórias e optativas dos
+        currículos das habilitações dadas com ao menos a quantidade mínima de
+        alunos dada. Uma disciplina é obrigatória se for obrigatória em algum
+        dos currículos.'''
+        habilitacoes = [str(h) for h in habilitacoes]
+        return [(disciplina, turma, matriculados, bool(obrigatoria))
+                for disciplina, turma, matriculados, obrigatoria
+                in self.consulta(
+                    'SELECT t.disciplina, t.turma, t.matriculados, '
+                    'MAX(CASE c.tipo WHEN ? THEN 1 ELSE 0 END) '
+                    'FROM curriculos c '
+                    'JOIN turmas t ON t.disciplina = c.disciplina '
+                    'WHERE c.habilitacao IN (%s) AND c.tipo IN (?, ?) '
+                    'AND t.matriculados >= ? '
+                    'GROUP BY t.disciplina, t.turma '
+                    'ORDER BY t.disciplina, t.turma'
+                    % ', '.join('?' * len(habilitacoes)),
+                    [OBRIGATORIA] + habilitacoes +
+                    [OBRIGATORIA, OPTATIVA, minimo])]
+
+    def curriculos_com(self, disciplina):
+        '''Retorna a lista dos pares (habilitação, tipo) dos currículos que
+        incluem a disciplina dada, em que o tipo é OBRIGATORIA, OPTATIVA ou
+        CADEIA.'''
+        return self.consulta('SELECT habilitacao, tipo FROM curriculos '
+                             'WHERE disciplina = ? '
+                             'ORDER BY habilitacao, tipo',
+                             (str(disciplina),))
+
+    def obrigatorias(self, habilitacao, siglas):
+        '''Retorna a lista das tuplas (disciplina, sigla do departamento,
+        denominação) das disciplinas obrigatórias (inclusive as de cadeias)
+        do currículo da habilitação dada, oferecidas pelos departamentos de
+        siglas dadas.'''
+        siglas = list(siglas)
+        return self.consulta(
+            'SELECT DISTINCT c.disciplina, d.sigla, d.denominacao '
+            'FROM curriculos c '
+            'JOIN disciplinas d ON d.disciplina = c.disciplina '
+            'WHERE c.habilitacao = ? AND c.tipo IN (?, ?) '
+            'AND d.sigla IN (%s) ORDER BY c.disciplina'
+            % ', '.join('?' * len(siglas)),
+            [str(habilitacao), OBRIGATORIA, CADEIA] + siglas)
+
+    def periodos(self, habilitacao):
+        '''Retorna a lista ordenada dos períodos do fluxo da habilitação
+        dada.'''
+        return [periodo for (periodo,) in self.consulta(
+            'SELECT DISTINCT periodo FROM fluxos WHERE habilitacao = ? '
+            'ORDER BY periodo', (str(habilitacao),))]
+
+    def reservas_no_fluxo(self, habilitacao, filtro=''):
+        '''Retorna a lista das tuplas (período, disciplina, turma, curso,
+        vagas, calouros) das reservas de vagas em turmas das disciplinas do
+        fluxo da habilitação dada, para cursos cujo nome contém o filtro
+        dado.'''
+        return self.consulta(
+            'SELECT f.periodo, f.disciplina, r.turma, r.curso, r.vagas, '
+            'r.calouros FROM fluxos f '
+            'JOIN reservas r ON r.disciplina = f.disciplina '
+            'WHERE f.habilitacao = ? AND instr(r.curso, ?) > 0 '
+            'ORDER BY f.periodo, f.ordem, r.rowid',
+            (str(habilitacao), filtro))
+
+    def busca(self, metodo, codigo, padrao=None):
+        '''Retorna o resultado guardado do método de busca dado para o código
+        dado, ou o padrão caso não haja.'''
+        with self._trava:
+            linha = self._conexao.execute(
+                'SELECT dados FROM resultados WHERE metodo = ? AND codigo = ?',
+                (metodo, str(codigo))).fetchone()
+        return _descompacta(linha[0]) if linha else padrao
+
+    def codigos(self, metodo):
+        '''Retorna a lista de códigos com resultados guardados do método de
+        busca dado.'''
+        return [codigo for (codigo,) in self.consulta(
+            'SELECT codigo FROM resultados WHERE metodo = ? ORDER BY codigo',
+            (metodo,))]
+
+    def paginas(self, metodo):
+        '''Retorna um dicionário que associa cada código do método de busca
+        dado ao estado de sua página na última verificação (ver recaptura):
+        (resumo do conteúdo, ETag, Last-Modified, instante da verificação,
+        ocupação máxima das turmas, indicação de lista de espera).'''
+        return {linha[0]: linha[1:] for linha in self.consulta(
+            'SELECT codigo, resumo, etag, modificada, verificada, ocupacao, '
+            'espera FROM paginas WHERE metodo = ?', (metodo,))}
+
+    def guarda_paginas(self, estados):
+        '''Guarda os estados dados, tuplas (método, código, resumo, ETag,
+        Last-Modified, instante da verificação, ocupação máxima das turmas,
+        indicação de lista de espera), das páginas verificadas. A ocupação é
+        informada nas páginas de ofertas e a lista de espera nas de listas de
+        espera (e são None nas demais).'''
+        with self._trava, self._conexao:
+            self._conexao.executemany('INSERT OR REPLACE INTO paginas '
+                                      'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                      estados)
+
+    def prioridades(self, agora, validade):
+        '''Retorna a lista dos códigos das disciplinas com ofertas
+        verificadas, em ordem decrescente de prioridade de recaptura: a soma
+        da ocupação máxima das turmas, da indicação de lista de espera e do
+        tempo desde a verificação (em múltiplos da validade dada).'''
+        return [codigo for (codigo,) in self.consulta(
+            'SELECT o.codigo FROM paginas o LEFT JOIN paginas e '
+            'ON e.metodo = ? AND e.codigo = o.codigo WHERE o.metodo = ? '
+            'ORDER BY COALESCE(o.ocupacao, 0) + COALESCE(e.espera, 0) + '
+            '(? - COALESCE(o.verificada, 0)) / ? DESC, o.codigo',
+            ('Oferta.lista_de_espera', 'Oferta.oferta', agora,
+             float(validade)))]
+
+    def metadados(self):
+        '''Retorna um dicionário com as informações da captura.'''
+        return dict(self.consulta('SELECT chave, valor FROM metadados'))
+
+    def define_metadados(self, **metadados):
+        '''Guarda as informações da captura dadas.'''
+        with self._trava, self._conexao:
+            self._conexao.executemany(
+                'INSERT OR REPLACE INTO metadados VALUES (?, ?)',
+                ((chave, str(valor)) for chave, valor in metadados.items()))
+
+    def fecha(self):
+        '''Fecha o arquivo.'''
+        with self._trava:
+            self._conexao.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fecha()
+
+
+def _indexa_oferta(conexao, disciplina, oferta):
+    '''Atualiza as tabelas ofertas, turmas, aulas e reservas com a oferta
+    dada (ver Oferta.oferta).'''
+    for tabela in ('ofertas', 'turmas', 'aulas', 'reservas'):
+        conexao.execute('DELETE FROM %s WHERE disciplina = ?' % tabela,
+                        (disciplina,))
+    if 'Departamento' in oferta:
+        conexao.execute('INSERT INTO ofertas VALUES (?, ?, ?)',
+                        (disciplina, oferta['Departamento'].split(' - ')[0],
+                         oferta['Nome']))
+
+    for turma, dados in oferta.get('Turmas', {}).items():
+        conexao.execute('INSERT INTO turmas VALUES (?, ?, ?, ?)',
+                        (disciplina, turma, dados['Vagas'],
+                         dados['Alunos Matriculados']))
+        conexao.executemany('INSERT INTO aulas VALUES (?, ?, ?, ?, ?, ?)',
+                            ((disciplina, turma, dia, aula['Início'],
+                              aula['Fim'], aula['Local'])
+                             for dia, aulas in dados['Aulas'].items()
+                             for aula in aulas))
+        conexao.executemany('INSERT INTO reservas VALUES (?, ?, ?, ?, ?)',
+                            ((disciplina, turma, curso, reserva['Vagas'],
+                              reserva['Calouros'])
+                             for curso, reserva
+                             in dados.get('Turma Reservada', {}).items()))
+
+
+def _indexa_curriculo(conexao, habilitacao, curriculo):
+    '''Atualiza a tabela curriculos com o currículo dado (ver
+    Cursos.curriculo).'''
+    conexao.execute('DELETE FROM curriculos WHERE habilitacao = ?',
+                    (habilitacao,))
+    disciplinas = [(OBRIGATORIA, d) for d in curriculo.get('obrigatórias',
+                                                            {})]
+    disciplinas.extend((OPTATIVA, d) for d in curriculo.get('optativas', {}))
+    disciplinas.extend((CADEIA, d)
+                       for cadeia in curriculo.get('cadeias', {}).values()
+                       for opcao in cadeia for d in opcao)
+    conexao.executemany('INSERT OR IGNORE INTO curriculos VALUES (?, ?, ?)',
+                        ((habilitacao, disciplina, tipo)
+                         for tipo, disciplina in disciplinas))
+
+
+def _indexa_fluxo(conexao, habilitacao, fluxo):
+    '''Atualiza a tabela fluxos com o fluxo dado (ver Cursos.fluxo).'''
+    conexao.execute('DELETE FROM fluxos WHERE habilitacao = ?',
+                    (habilitacao,))
+    conexao.executemany('INSERT INTO fluxos VALUES (?, ?, ?, ?)',
+                        ((habilitacao, int(periodo), ordem, disciplina)
+                         for periodo, dados in fluxo.items()
+                         for ordem, disciplina
+                         in enumerate(dados['Disciplinas'])))
+
+
+def _indexa_informacoes(conexao, disciplina, informacoes):
+    '''Atualiza a tabela disciplinas com as informações dadas (ver
+    Disciplina.informacoes).'''
+    conexao.execute('DELETE FROM disciplinas WHERE disciplina = ?',
+                    (disciplina,))
+    if informacoes:
+        conexao.execute('INSERT INTO disciplinas VALUES (?, ?, ?)',
+                        (disciplina, informacoes['Sigla do Departamento'],
+                         informacoes['Denominação']))
+
+
+def _indexa_lista_de_espera(conexao, disciplina, lista):
+    '''Atualiza a tabela esperas com a lista de espera dada (ver
+    Oferta.lista_de_espera).'''
+    conexao.execute('DELETE FROM esperas WHERE disciplina = ?', (disciplina,))
+    conexao.executemany('INSERT INTO esperas VALUES (?, ?, ?)',
+                        ((disciplina, turma, alunos)
+                         for turma, alunos in lista.items()))
+
+
+# Métodos de busca cujos resultados são guardados também nas tabelas
+# indexadas, e a função que os guarda.
+INDEXADOS = {'Oferta.oferta': _indexa_oferta,
+             'Oferta.lista_de_espera': _indexa_lista_de_espera,
+             'Cursos.curriculo': _indexa_curriculo,
+             'Cursos.fluxo': _indexa_fluxo,
+             'Disciplina.informacoes': _indexa_informacoes}
+
+
+class _Consultas:
+    '''Base dos métodos de busca respondidos a partir de um Snapshot. Os
+    argumentos que não identificam o resultado (nível, verbose, etc.) são
+    aceitos por compatibilidade e ignorados.'''
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def _busca(self, metodo, codigo, padrao):
+        return self._snapshot.busca(metodo, codigo, padrao)
+
+    def _em_lote(self, metodo, codigos, padrao):
+        for codigo in sorted(set(str(codigo) for codigo in codigos)):
+            yield codigo, self._busca(metodo, codigo, padrao)
+
+
+class _Cursos(_Consultas):
+    def curriculo(self, curso, *args, **kwargs):
+        return self._busca('Cursos.curriculo', curso, {})
+
+    def curriculo_em_lote(self, cursos, *args, **kwargs):
+        return self._em_lote('Cursos.curriculo', cursos, {})
+
+    def fluxo(self, habilitacao, *args, **kwargs):
+        fluxo = self._busca('Cursos.fluxo', habilitacao, {})
+        return {int(periodo): dados for periodo, dados in fluxo.items()}
+
+    def habilitacoes(self, curso, *args, **kwargs):
+        return self._busca('Cursos.habilitacoes', curso, {})
+
+    def relacao(self, *args, **kwargs):
+        return self._busca('Cursos.relacao', '', {})
+
+
+class _Disciplina(_Consultas):
+    def informacoes(self, disciplina, *args, **kwargs):
+        return self._busca('Disciplina.informacoes', disciplina, {})
+
+    def informacoes_em_lote(self, disciplinas, *args, **kwargs):
+        return self._em_lote('Disciplina.informacoes', disciplinas, {})
+
+
+class _Oferta(_Consultas):
+    def departamentos(self, *args, **kwargs):
+        return self._busca('Oferta.departamentos', '', {})
+
+    def disciplinas(self, departamento, *args, **kwargs):
+        return self._busca('Oferta.disciplinas', departamento, {})
+
+    def lista_de_espera(self, disciplina, turma='\w+', *args, **kwargs):
+        lista = self._busca('Oferta.lista_de_espera', disciplina, {})
+        filtro = re.compile('(?:%s)\Z' % turma)
+        return {t: vagas for t, vagas in lista.items() if filtro.match(t)}
+
+    def oferta(self, disciplina, *args, **kwargs):
+        return self._busca('Oferta.oferta', disciplina, {'Turmas': {}})
+
+    def oferta_em_lote(self, disciplinas, *args, **kwargs):
+        return self._em_lote('Oferta.oferta', disciplinas, {'Turmas': {}})
+
+
+def captura(caminho, nivel=Nivel.GRADUACAO, campus=Campus.DARCY_RIBEIRO,
+            trabalhadores=16, verbose=False):
+    '''Acessa o Matrícula Web, captura todas as informações do nível e campus
+    dados e as guarda no arquivo dado. Retorna o Snapshot resultante.
+
+    As buscas de cada etapa (disciplinas de todos os departamentos, turmas de
+    todas as disciplinas, etc.) são feitas concorrentemente, e seus
+    resultados são guardados em lotes (ver LOTE) à medida que são obtidos,
+    sem que os de uma etapa inteira fiquem em memória. Ao final, as
+    quantidades de resultados e o tempo de cada etapa são guardados nos
+    metadados do snapshot. As páginas de turmas e listas de espera (ver
+    RECAPTURADAS) são requisitadas sem passar pelo cache, e seus estados são
+    guardados (ver Snapshot.paginas) para as requisições condicionais e a
+    prioridade da recaptura.
+
+    Argumentos:
+    caminho -- caminho do arquivo do snapshot
+    nivel -- nível acadêmico das informações
+             (default Nivel.GRADUACAO)
+    campus -- o campus das informações
+              (default Campus.DARCY_RIBEIRO)
+    trabalhadores -- quantidade máxima de buscas simultâneas
+                     (default 16)
+    verbose -- indicação dos procedimentos sendo adotados
+               (default False)
+    '''
+    snapshot = Snapshot(caminho)
+    snapshot.define_metadados(nivel=nivel, campus=campus,
+                              inicio=time.strftime('%Y-%m-%d %H:%M:%S'))
+    contagens, inicio = {}, time.time()
+    analisador, estados = _analisador_de(None), []
+
+    def verificada(metodo, pagina):
+        '''Retorna a função de busca das páginas do método dado (ver
+        RECAPTURADAS), que guarda também o estado de cada página, de forma
+        que a recaptura parte desta captura.'''
+        def busca(disciplina):
+            _, estado, dados = _verifica(nivel, metodo, pagina, disciplina,
+                                         departamento[disciplina],
+                                         analisador=analisador)
+            if estado is None:  # falha: resultado de uma página vazia
+                return getattr(analisador, pagina)('')
+            estados.append(estado)
+            return dados
+        return busca
+
+    def etapa(metodo, funcao, codigos, retorna=False):
+        '''Busca os códigos dados concorrentemente e guarda os resultados
+        em lotes. Retorna o dicionário dos resultados caso retorna seja
+        verdadeiro (etapas cujos resultados são usados pelas seguintes).'''
+        def busca(codigo):
+            return codigo, funcao(codigo)
+
+        comeco, resultados, lote = time.time(), {}, []
+        contagens[metodo] = 0
+        for codigo, dados in _em_fluxo(busca, _sem_repeticoes(codigos),
+                                       trabalhadores):
+            lote.append((codigo, dados))
+            if retorna:
+                resultados[codigo] = dados
+            if len(lote) == LOTE:
+                snapshot.guarda(metodo, lote)
+                contagens[metodo] += len(lote)
+                lote = []
+        snapshot.guarda(metodo, lote)
+        contagens[metodo] += len(lote)
+        if verbose:
+            log('%s: %d resultados em %.1fs' % (metodo, contagens[metodo],
+                                                time.time() - comeco))
+        return resultados
+
+    deptos = etapa('Oferta.departamentos',
+                   lambda _: Oferta.departamentos(nivel, campus), [''],
+                   retorna=True)['']
+    ofertadas = etapa('Oferta.disciplinas',
+                      lambda depto: Oferta.disciplinas(depto, nivel), deptos,
+                      retorna=True)
+
+    departamento = {disciplina: depto for depto in ofertadas
+                    for disciplina in ofertadas[depto]}
+    for metodo, pagina in RECAPTURADAS:
+        etapa(metodo, verificada(metodo, pagina), departamento)
+        snapshot.guarda_paginas(estados)
+        del estados[:]
+    etapa('Disciplina.informacoes', lambda disciplina: Disciplina.informacoes(
+        disciplina, nivel), departamento)
+
+    cursos = etapa('Cursos.relacao',
+                   lambda _: Cursos.relacao(nivel, campus), [''],
+                   retorna=True)['']
+    habilitacoes = etapa('Cursos.habilitacoes', lambda curso:
+                         Cursos.habilitacoes(curso, nivel, campus), cursos,
+                         retorna=True)
+    codigos = [h for curso in habilitacoes for h in habilitacoes[curso]]
+    etapa('Cursos.curriculo',
+          lambda habilitacao: Cursos.curriculo(habilitacao, nivel), codigos)
+    etapa('Cursos.fluxo',
+          lambda habilitacao: Cursos.fluxo(habilitacao, nivel), codigos)
+
+    duracao = time.time() - inicio
+    buscas = sum(contagens.values())
+    snapshot.define_metadados(duracao='%.1f' % duracao, buscas=buscas,
+                              contagens=json.dumps(contagens, sort_keys=True))
+    if verbose:
+        log('%d buscas em %.1fs (%.1f páginas/s)' % (buscas, duracao,
+                                                     buscas / duracao))
+    return snapshot
+
+
+def _ocupacao_maxima(oferta):
+    '''Retorna a maior razão entre alunos matriculados e vagas dentre as
+    turmas da oferta dada.'''
+    return max([float(turma['Alunos Matriculados']) / turma['Vagas']
+                for turma in oferta.get('Turmas', {}).values()
+                if turma['Vagas']] or [0])
+
+
+def _diferencas(disciplina, antes, depois):
+    '''Gera as diferenças de vagas e de alunos matriculados entre as turmas
+    das ofertas dadas (ver recaptura).'''
+    turmas_antes = antes.get('Turmas', {})
+    turmas_depois = depois.get('Turmas', {})
+    for turma in sorted(set(turmas_antes) | set(turmas_depois)):
+        diferenca = {}
+        for campo in ('Vagas', 'Alunos Matriculados'):
+            valores = (turmas_antes.get(turma, {}).get(campo),
+                       turmas_depois.get(turma, {}).get(campo))
+            if valores[0] != valores[1]:
+                diferenca[campo] = valores
+        if diferenca:
+            diferenca['Disciplina'], diferenca['Turma'] = disciplina, turma
+            yield diferenca
+
+
+def _verifica(nivel, metodo, pagina, disciplina, departamento=None,
+              anterior=None, analisador=None):
+    '''Requisita a página dada (ver RECAPTURADAS) da disciplina dada e
+    retorna a tupla (situação, estado, resultado): a situação da página
+    ('nao_modificadas', 'iguais', 'analisadas' ou 'falhas'), seu novo estado
+    (ver Snapshot.guarda_paginas), ou None caso a requisição falhe, e o
+    resultado da sua análise, caso ela tenha mudado. A requisição é
+    condicional, de acordo com o estado anterior dado (ver Snapshot.paginas),
+    e o conteúdo de mesmo resumo não é analisado novamente.'''
+    resumo, etag, modificada, _, ocupacao, espera = anterior or (None,) * 6
+    cabecalhos = {}
+    if etag:
+        cabecalhos['If-None-Match'] = etag
+    if modificada:
+        cabecalhos['If-Modified-Since'] = modificada
+    params = {'cod': disciplina}
+    if pagina == 'oferta_dados' and departamento:
+        params['dep'] = departamento
+
+    resposta = _requisita(nivel, pagina, params, cabecalhos)
+    if resposta is None or resposta.status_code not in (200, 304):
+        return 'falhas', None, None
+
+    dados = None
+    if resposta.status_code == 304:
+        situacao = 'nao_modificadas'
+    else:
+        situacao, atual = 'iguais', _resumo(resposta.content)
+        if atual != resumo:
+            situacao, resumo = 'analisadas', atual
+            _arquiva(nivel, pagina, params, resposta.status_code,
+                     resposta.content)
+            dados = getattr(analisador or _analisador_de(None), pagina)(
+                resposta.content)
+            if pagina == 'oferta_dados':
+                ocupacao = _ocupacao_maxima(dados)
+            else:
+                espera = 1 if dados else 0
+    estado = (metodo, disciplina, resumo,
+              resposta.headers.get('ETag') or etag,
+              resposta.headers.get('Last-Modified') or modificada,
+              time.time(), ocupacao, espera)
+    return situacao, estado, dados
+
+
+def recaptura(snapshot, limite=None, trabalhadores=16, verbose=False):
+    '''Atualiza as turmas e listas de espera do snapshot dado, buscando apenas
+    as páginas que mudaram, e retorna a lista das diferenças nas turmas.
+
+    Cada diferença é um dicionário com a disciplina, a turma e, para 'Vagas'
+    e 'Alunos Matriculados' que tenham mudado, o par (antes, depois); turmas
+    novas ou removidas têm None como valor anterior ou posterior.
+
+    As disciplinas são verificadas em ordem de prioridade: as com turmas mais
+    próximas da lotação, as com lista de espera e as verificadas há mais
+    tempo primeiro. As requisições são condicionais (ETag/Last-Modified), e
+    páginas com conteúdo igual ao da verificação anterior (mesmo resumo) não
+    são analisadas nem guardadas novamente.
+
+    Argumentos:
+    snapshot -- o Snapshot a ser atualizado
+    limite -- quantidade máxima de disciplinas verificadas, ou None para
+              verificar todas
+              (default None)
+    trabalhadores -- quantidade máxima de buscas simultâneas
+                     (default 16)
+    verbose -- indicação dos procedimentos sendo adotados
+               (default False)
+    '''
+    nivel = snapshot.metadados().get('nivel', Nivel.GRADUACAO)
+    analisador = _analisador_de(None)
+    estados = {metodo: snapshot.paginas(metodo)
+               for metodo, _ in RECAPTURADAS}
+    departamento = {disciplina: depto
+                    for depto in snapshot.codigos('Oferta.disciplinas')
+                    for disciplina in snapshot.Oferta.disciplinas(depto)}
+    inicio = time.time()
+
+    def verifica(disciplina):
+        return [(metodo,) + _verifica(nivel, metodo, pagina, disciplina,
+                                      departamento.get(disciplina),
+                                      estados[metodo].get(disciplina),
+                                      analisador)
+                for metodo, pagina in RECAPTURADAS]
+
+    # Disciplinas nunca verificadas têm a maior prioridade.
+    ordenadas = [disciplina for disciplina in snapshot.prioridades(
+        inicio, Cache.VALIDADE['oferta_dados']) if disciplina in departamento]
+    disciplinas = sorted(set(departamento).difference(ordenadas)) + ordenadas
+    if limite is not None:
+        disciplinas = disciplinas[:limite]
+
+    contagens = dict.fromkeys(('nao_modificadas', 'iguais', 'analisadas',
+                               'falhas'), 0)
+    diferencas, novos, verificadas = [], [], []
+    for disciplina, resultados in _em_lote(verifica, disciplinas,
+                                           trabalhadores):
+        for metodo, situacao, estado, dados in resultados:
+            contagens[situacao] += 1
+            if estado:
+                verificadas.append(estado)
+            if dados is not None:
+                if metodo == 'Oferta.oferta':
+                    diferencas.extend(_diferencas(
+                        disciplina, snapshot.Oferta.oferta(disciplina),
+                        dados))
+                novos.append((metodo, disciplina, dados))
+
+    for metodo, _ in RECAPTURADAS:
+        snapshot.guarda(metodo, [(disciplina, dados)
+                                 for m, disciplina, dados in novos
+                                 if m == metodo])
+    snapshot.guarda_paginas(verificadas)
+    snapshot.define_metadados(recaptura=time.strftime('%Y-%m-%d %H:%M:%S'),
+                              recaptura_contagens=json.dumps(
+                                  contagens, sort_keys=True))
+    if verbose:
+        log('%d disciplinas verificadas em %.1fs: %s' % (
+            len(disciplinas), time.time() - inicio, contagens))
+    return diferencas
+
+
+def _resumo(conteudo):
+    '''Retorna o resumo (hash) do conteúdo de uma página.'''
+    return hashlib.sha1(conteudo).hexdigest()
+
+
+def nome_do_arquivo(nivel=Nivel.GRADUACAO, campus=Campus.DARCY_RIBEIRO):
+    '''Retorna o nome do arquivo de snapshot de uma captura iniciada agora.'''
+    return 'snapshot-%s-%s-%s.sqlite' % (nivel, campus,
+                                         time.strftime('%Y%m%d-%H%M%S'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Captura todas as '
+                                     'informações do Matrícula Web.')
+    parser.add_argument('diretorio', nargs='?', default='.',
+                        help='diretório onde o snapshot é gravado')
+    parser.add_argument('--nivel', default=Nivel.GRADUACAO)
+    parser.add_argument('--campus', type=int, default=Campus.DARCY_RIBEIRO)
+    parser.add_argument('--trabalhadores', type=int, default=16)
+    parser.add_argument('--taxa', type=float, default=10,
+                        help='quantidade máxima de requisições por segundo')
+    parser.add_argument('--recaptura', metavar='SNAPSHOT',
+                        help='atualiza o snapshot dado, mostrando apenas as '
+                        'diferenças nas turmas')
+    parser.add_argument('--limite', type=int,
+                        help='quantidade máxima de disciplinas verificadas '
+                        'na recaptura')
+    parser.add_argument('--metricas', metavar='ARQUIVO',
+                        help='arquivo onde as métricas são gravadas (.json '
+                        'ou .prom)')
+    parser.add_argument('--registro', metavar='ARQUIVO',
+                        help='arquivo onde o registro estruturado é gravado')
+    parser.add_argument('--amostragem', type=float, default=1.,
+                        help='fração dos rastros registrados')
+    parser.add_argument('--arquivo', metavar='ARQUIVO',
+                        help='arquivo onde as páginas obtidas são '
+                        'acrescentadas')
+    args = parser.parse_args()
+
+    if args.arquivo:
+        configura_arquivo(args.arquivo)
+
+    if args.registro:
+        configura_registro(args.registro, args.amostragem)
+
+    escalonador = configura_escalonador(taxa=args.taxa,
+                                        concorrencia=args.trabalhadores)
+    metricas = configura_metricas(bool(args.metricas))
+
+    if args.recaptura:
+        with Snapshot(args.recaptura) as snapshot:
+            for diferenca in recaptura(snapshot, args.limite,
+                                       args.trabalhadores, verbose=True):
+                log(diferenca)
+        if metricas:
+            metricas.grava(args.metricas)
+        desabilita_registro()
+        raise SystemExit
+
+    # Todas as páginas do cache são tratadas como expiradas, de forma que o
+    # snapshot reflita o estado atual do Matrícula Web: as inalteradas são
+    # apenas revalidadas (requisições condicionais).
+    configura_cache(validade=dict.fromkeys(Cache.VALIDADE, 0))
+
+    caminho = os.path.join(args.diretorio,
+                           nome_do_arquivo(args.nivel, args.campus))
+    with captura(caminho, args.nivel, args.campus, args.trabalhadores,
+                 verbose=True):
+        log('Snapshot gravado em ' + caminho)
+    log('Requisições: %s' % escalonador.estatisticas)
+    if metricas:
+        metricas.grava(args.metricas)
+        log('Métricas gravadas em ' + args.metricas)
+    desabilita_registro()
@@ -0,0 +1,179 @@
+#  -*- coding: utf-8 -*-
+#    @package: test_alunos.py
+#
+# Funções de teste das funções úteis para alunos. Os testes usam páginas
+# locais no lugar do Matrícula Web.
+
+
+from alunos import (GrafoPreRequisitos, creditos, melhores_planos,
+                    planos_de_matricula, pre_requisitos)
+from mwebgravacao import Reprodutor
+from mwebhorarios import Grade
+from test_mwebcrawler import SessaoLocal
+import itertools
+import mwebcrawler
+import random
+import time
+import unittest
+
+
+def disciplina_pop(*opcoes):
+    '''Retorna uma página de pré-requisitos com as opções ('OU') dadas, cada
+    uma sendo uma lista de códigos ('E').'''
+    requisitos = ' OU<br>'.join(' E '.join(opcao) for opcao in opcoes)
+    return ('<td valign=top><b>Pré-req:</b> </td>'
+            '<td class=PadraoMenor>%s</td></tr>' % requisitos)
+
+
+# 116424 depende de 117251 OU (116394 E 113042); ambas as opções dependem,
+# indiretamente, de 113034 (Cálculo 1).
+PAGINAS = {'116424': disciplina_pop(['117251'], ['116394', '113042']),
+           '117251': disciplina_pop(['116394']),
+           '116394': disciplina_pop(['113034']),
+           '113042': disciplina_pop(['113034']),
+           '113034': disciplina_pop()}
+
+
+class TestGrafoPreRequisitos(unittest.TestCase):
+    def setUp(self):
+        self.sessao = SessaoLocal(PAGINAS)
+        mwebcrawler.configura_sessao(self.sessao)
+
+    def tearDown(self):
+        mwebcrawler.configura_sessao()
+
+    def test_cada_disciplina_buscada_uma_vez(self):
+        grafo = GrafoPreRequisitos.constroi([116424])
+
+        self.assertEqual(sorted(PAGINAS), sorted(self.sessao.requisicoes))
+        self.assertEqual([['117251'], ['116394', '113042']],
+                         grafo.requisitos['116424'])
+
+    def test_consultas(self):
+        grafo = GrafoPreRequisitos.constroi([116424])
+
+        self.assertEqual(set(['117251', '116394', '113042', '113034']),
+                         grafo.fecho(116424))
+        self.assertEqual(3, grafo.profundidade(116424))
+        self.assertEqual(0, grafo.profundidade(113034))
+
+        ordem = grafo.ordem_topologica()
+        for codigo in grafo.requisitos:
+            for requisito in grafo.dependencias(codigo):
+                self.assertLess(ordem.index(requisito), ordem.index(codigo))
+
+    def test_ciclos(self):
+        grafo = GrafoPreRequisitos({'1': [['2']], '2': [['3']],
+                                    '3': [['1']], '4': [['1']]})
+
+        self.assertEqual([['1', '2', '3']], grafo.ciclos)
+        self.assertRaises(ValueError, grafo.ordem_topologica)
+        self.assertEqual({'2': {'3': {'1': {}}}}, grafo.arvore('1'))
+
+    def test_pre_requisitos(self):
+        calculo_1 = {'113034': {}}
+        self.assertEqual({'117251': {'116394': calculo_1},
+                          '116394': calculo_1,
+                          '113042': calculo_1},
+                         pre_requisitos(116424))
+
+    def test_liberadas(self):
+        grafo = GrafoPreRequisitos.constroi([116424])
+
+        self.assertEqual(set(['113034']), grafo.liberadas([]))
+        self.assertEqual(set(['116394', '113042']),
+                         grafo.liberadas(['113034']))
+        self.assertEqual(set(['116424', '117251', '999']), grafo.liberadas(
+            ['113034', '116394', '113042'], ['116424', '117251', '999']))
+        self.assertTrue(grafo.satisfeitos('999', frozenset()))
+
+
+def turma(*horarios):
+    '''Retorna uma turma com aulas nos (dia, início) dados, de 1h50.'''
+    aulas = {}
+    for dia, inicio in horarios:
+        aulas.setdefault(dia, []).append({
+            'Início': '%02d:00' % inicio, 'Fim': '%02d:50' % (inicio + 1),
+            'Local': ''})
+    return {'Aulas': aulas}
+
+
+class TestPlanos(unittest.TestCase):
+    def setUp(self):
+        # 1 e 2 só podem ser cursadas juntas nas turmas B e A; 3 conflita
+        # com todas as turmas de 2.
+        self.grade = Grade.de_ofertas([
+            ('1', {'Turmas': {'A': turma(('Segunda', 8)),
+                              'B': turma(('Terça', 8))}}),
+            ('2', {'Turmas': {'A': turma(('Segunda', 8)),
+                              'B': turma(('Segunda', 8))}}),
+            ('3', {'Turmas': {'A': turma(('Segunda', 8), ('Terça', 10))}}),
+            ('4', {'Turmas': {'A': turma(('Quarta', 8))}})])
+        self.creditos = {'1': 4, '2': 6, '3': 2, '4': 4, '5': 4}
+
+    def test_melhores_planos(self):
+        planos = melhores_planos(self.grade, self.creditos, k=3)
+        self.assertEqual([14, 10, 10], [p['Créditos'] for p in planos])
+        self.assertEqual({'1': 'B', '2': 'A', '4': 'A'}, planos[0]['Turmas'])
+        for plano in planos[1:]:
+            self.assertIn(set(plano['Turmas']), [set(['1', '2']),
+                                                 set(['2', '4']),
+                                                 set(['1', '3', '4'])])
+        self.assertNotEqual(planos[1]['Turmas'], planos[2]['Turmas'])
+
+        planos = melhores_planos(self.grade, self.creditos, k=2,
+                                 maximo_de_creditos=8)
+        self.assertEqual([8, 6], [p['Créditos'] for p in planos])
+        self.assertEqual(set(['1', '4']), set(planos[0]['Turmas']))
+        self.assertEqual([], melhores_planos(self.grade, self.creditos, k=0))
+        self.assertEqual([], melhores_planos(Grade(), self.creditos))
+
+    def test_maximo_inatingivel(self):
+        # 60 disciplinas com 5 turmas nos horários usuais (segunda e quarta,
+        # terça e quinta ou sexta): no máximo 15 turmas cabem na semana sem
+        # conflitos, então nenhum plano chega ao máximo de créditos e a
+        # busca precisa provar que os encontrados são os melhores.
+        aleatorio = random.Random(1)
+        ofertas, creditos_ = [], {}
+        for codigo in range(60):
+            turmas = {}
+            for nome in 'ABCDE':
+                inicio = aleatorio.choice(range(8, 20, 2))
+                dias = aleatorio.choice((('Segunda', 'Quarta'),
+                                         ('Terça', 'Quinta'), None))
+                turmas[nome] = (turma(('Sexta', inicio), ('Sexta', inicio + 2))
+                                if dias is None else
+                                turma((dias[0], inicio), (dias[1], inicio)))
+            ofertas.append((str(codigo), {'Turmas': turmas}))
+            creditos_[str(codigo)] = aleatorio.choice((2, 4, 6))
+        grade = Grade.de_ofertas(ofertas)
+
+        inicio = time.time()
+        planos = melhores_planos(grade, creditos_, maximo_de_creditos=200)
+        self.assertLess(time.time() - inicio, 5)
+        self.assertEqual([15 * 6] * 5, [p['Créditos'] for p in planos])
+        for plano in planos:
+            for turma_, outra in itertools.combinations(
+                    plano['Turmas'].items(), 2):
+                self.assertFalse(grade.conflito(turma_, outra))
+
+    def test_planos_de_matricula(self):
+        mwebcrawler.configura_sessao(Reprodutor())
+        try:
+            # Todas as páginas salvas têm as mesmas 4 turmas, em horários
+            # distintos, e os mesmos pré-requisitos (117251 OU ...).
+            planos = planos_de_matricula(['117251'], 6912, k=2)
+            oferta = mwebcrawler.Oferta.oferta(116319)
+            self.assertEqual([], planos_de_matricula([], 6912))
+        finally:
+            mwebcrawler.configura_sessao()
+
+        self.assertEqual(4, creditos(oferta))
+        self.assertEqual([16, 16], [p['Créditos'] for p in planos])
+        self.assertEqual(set(['A', 'B', 'C', 'E']),
+                         set(planos[0]['Turmas'].values()))
+        self.assertNotIn('117251', planos[0]['Turmas'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#  -*- coding: utf-8 -*-
+#    @package: test_mwebanalise.py
+#
+# Funções de teste da análise vetorizada das turmas. Os testes usam as páginas
+# salvas em paginas/ no lugar do Matrícula Web.
+
+
+from mwebgravacao import Reprodutor
+from snapshot import captura
+import coordenacao
+import mwebcrawler
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from mwebanalise import Turmas
+except ImportError:  # numpy não instalado
+    Turmas = None
+
+
+@unittest.skipIf(Turmas is None, 'requer numpy')
+class TestTurmas(unittest.TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        mwebcrawler.configura_sessao(Reprodutor())
+        self.snapshot = captura(os.path.join(self.diretorio, 's.sqlite'),
+                                trabalhadores=4)
+        self.turmas = Turmas.de_snapshot(self.snapshot)
+
+    def tearDown(self):
+        self.snapshot.fecha()
+        mwebcrawler.configura_sessao()
+        shutil.rmtree(self.diretorio)
+
+    def test_totais_iguais_aos_da_coordenacao(self):
+        disciplinas = self.turmas.por_disciplina()
+        demanda = self.turmas.demanda_nao_atendida()
+        for disciplina in self.snapshot.codigos('Oferta.oferta'):
+            self.assertEqual(coordenacao.alunos_matriculados(
+                disciplina, fonte=self.snapshot),
+                disciplinas[disciplina]['Alunos Matriculados'])
+            self.assertEqual(coordenacao.demanda_nao_atendida(
+                disciplina, fonte=self.snapshot), demanda[disciplina])
+
+        departamentos = self.turmas.por_departamento()
+        self.assertEqual(['CIC'], list(departamentos))
+        self.assertEqual(len(self.turmas), departamentos['CIC']['Turmas'])
+
+    def test_quorum(self):
+        oferta = self.snapshot.Oferta.disciplinas(116)
+        obrigatorias = self.snapshot.Cursos.curriculo(6912)['obrigatórias']
+        esperadas, _ = coordenacao.ocupacao_minima(oferta, [6912], 40,
+                                                   fonte=self.snapshot)
+
+        turmas = self.turmas.das_disciplinas(obrigatorias)
+        turmas = turmas.das_disciplinas(oferta).com_quorum(40)
+        self.assertEqual(esperadas, turmas.para_dicionario())
+
+    def test_de_ofertas(self):
+        turmas = Turmas.de_ofertas(
+            [('1', {'Departamento': 'CIC - DEPTO', 'Turmas': {
+                'A': {'Vagas': 40, 'Alunos Matriculados': 30},
+                'B': {'Vagas': 0, 'Alunos Matriculados': 0}}}),
+             ('2', {'Turmas': {}})],
+            {'1': {'B': 3}})
+
+        self.assertEqual([.75, 0], turmas.ocupacao().tolist())
+        self.assertEqual({'1': 3}, turmas.demanda_nao_atendida())
+        self.assertEqual(['1 A', '1 B'], turmas.chaves().tolist())
+        self.assertEqual(0, len(Turmas.de_ofertas([]).com_quorum(1)))
+        self.assertEqual({}, Turmas.de_ofertas([]).por_departamento())
+
+
+if __name__ == '__main__':
+    unittest.main()
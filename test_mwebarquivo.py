@@ -0,0 +1,100 @@
+#  -*- coding: utf-8 -*-
+#    @package: test_mwebarquivo.py
+#
+# Funções de teste do arquivo de páginas brutas. Os testes usam as páginas
+# salvas em paginas/ no lugar do Matrícula Web.
+
+
+from mwebarquivo import Arquivo, SessaoDoArquivo
+from mwebcrawler import Analisador, Cursos, Nivel, Oferta
+from mwebgravacao import Reprodutor
+from test_mwebcrawler import pagina
+import mwebcrawler
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestArquivo(unittest.TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.caminho = os.path.join(self.diretorio, 'paginas.mwa')
+        self.reprodutor = Reprodutor()
+        mwebcrawler.configura_sessao(self.reprodutor)
+
+    def tearDown(self):
+        mwebcrawler.configura_arquivo()
+        mwebcrawler.configura_sessao()
+        shutil.rmtree(self.diretorio)
+
+    def test_paginas_obtidas_sao_arquivadas(self):
+        arquivo = mwebcrawler.configura_arquivo(self.caminho)
+        disciplinas = Oferta.disciplinas(116)
+        ofertas = dict(Oferta.oferta_em_lote(disciplinas, 116))
+        curriculo = Cursos.curriculo(6912)
+        mwebcrawler.configura_arquivo()
+        arquivo.fecha()
+
+        with Arquivo(self.caminho) as arquivo:
+            self.assertEqual(len(disciplinas) + 2, len(arquivo))
+            self.assertLess(arquivo.tamanho(), sum(
+                len(mwebcrawler.mweb(nivel, tipo, params))
+                for nivel, tipo, params in arquivo.paginas()))
+
+            requisicoes = len(self.reprodutor.requisicoes)
+            mwebcrawler.configura_sessao(SessaoDoArquivo(arquivo))
+            self.assertEqual(ofertas, dict(Oferta.oferta_em_lote(
+                disciplinas, 116)))
+            self.assertEqual(curriculo, Cursos.curriculo(6912))
+            self.assertEqual(b'', mwebcrawler.mweb(Nivel.GRADUACAO,
+                                                   'curriculo', {'cod': 1}))
+            self.assertEqual(requisicoes, len(self.reprodutor.requisicoes))
+
+    def test_reanalise(self):
+        with Arquivo(self.caminho) as arquivo:
+            for codigo in ('116319', '116394'):
+                arquivo.guarda(Nivel.GRADUACAO, 'oferta_dados',
+                               {'cod': codigo}, pagina('oferta_dados'))
+            arquivo.guarda(Nivel.GRADUACAO, 'curriculo', {'cod': 6912},
+                           pagina('curriculo'))
+            esperada = Analisador.oferta_dados(pagina('oferta_dados'))
+
+            for processos in (0, 2):
+                resultados = list(arquivo.reanalisa('oferta_dados',
+                                                    processos=processos))
+                self.assertEqual(set(['116319', '116394']),
+                                 set(params['cod'] for _, _, params, _
+                                     in resultados))
+                for _, _, _, oferta in resultados:
+                    self.assertEqual(esperada, oferta)
+            self.assertEqual(3, len(list(arquivo.reanalisa())))
+
+    def test_versao_recente_e_registro_incompleto(self):
+        with Arquivo(self.caminho) as arquivo:
+            arquivo.guarda(Nivel.GRADUACAO, 'disciplina', {'cod': 1}, b'v1')
+            arquivo.guarda(Nivel.GRADUACAO, 'disciplina', {'cod': 2}, b'v1')
+            arquivo.guarda(Nivel.GRADUACAO, 'disciplina', {'cod': 1}, b'v2')
+            self.assertEqual(b'v2', arquivo.busca(Nivel.GRADUACAO,
+                                                  'disciplina', {'cod': 1}))
+            tamanho = arquivo.tamanho()
+
+        # Simula uma gravação interrompida no meio de um registro.
+        with open(self.caminho, 'ab') as arquivo:
+            arquivo.write(b'MWA1\x10\x00')
+
+        with Arquivo(self.caminho) as arquivo:
+            self.assertEqual(2, len(arquivo))
+            self.assertEqual(tamanho, arquivo.tamanho())
+            self.assertEqual(b'v2', arquivo.busca(Nivel.GRADUACAO,
+                                                  'disciplina', {'cod': '1'}))
+            arquivo.guarda(Nivel.GRADUACAO, 'disciplina', {'cod': 3}, b'v1')
+
+        with Arquivo(self.caminho) as arquivo:
+            self.assertEqual(3, len(arquivo))
+            self.assertEqual(b'v1', arquivo.busca(Nivel.GRADUACAO,
+                                                  'disciplina', {'cod': 3}))
+
+
+if __name__ == '__main__':
+    unittest.main()
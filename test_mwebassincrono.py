@@ -0,0 +1,143 @@
+#  -*- coding: utf-8 -*-
+#    @package: test_mwebassincrono.py
+#
+# Funções de teste do CrawlerAssincrono. Os testes usam um servidor local no
+# lugar do Matrícula Web.
+
+
+from mwebcrawler import Nivel, Oferta
+from test_mwebcrawler import ServidorLocal
+import asyncio
+import io
+import json
+import mwebcrawler
+import time
+import unittest
+
+try:
+    import mwebassincrono
+except ImportError:  # aiohttp não instalado
+    mwebassincrono = None
+
+OFERTA_DIS = (b'<a href=oferta_dados.aspx?cod=116394&dep=116>'
+              b'ORGANIZACAO E ARQUITETURA DE COMPUTADORES</a>'
+              b'<a href=oferta_dados.aspx?cod=116319&dep=116>'
+              b'ESTRUTURAS DE DADOS</a>')
+
+
+@unittest.skipIf(mwebassincrono is None, 'requer aiohttp')
+class TestCrawlerAssincrono(unittest.TestCase):
+    def setUp(self):
+        self.url = mwebcrawler.MWEB
+
+    def tearDown(self):
+        mwebcrawler.MWEB = self.url
+        mwebcrawler.desabilita_escalonador()
+
+    def test_resultados_iguais_aos_da_api_sincrona(self):
+        async def busca():
+            async with mwebassincrono.CrawlerAssincrono() as crawler:
+                return await crawler.disciplinas(116, Nivel.GRADUACAO)
+
+        with ServidorLocal(OFERTA_DIS) as servidor:
+            mwebcrawler.MWEB = servidor.url
+            assincrono = asyncio.run(busca())
+            sincrono = Oferta.disciplinas(116, Nivel.GRADUACAO)
+
+        self.assertEqual(sincrono, assincrono)
+        self.assertIn('116394', assincrono)
+
+    def test_limite_de_requisicoes_simultaneas(self):
+        async def busca():
+            async with mwebassincrono.CrawlerAssincrono(
+                    concorrencia=10, por_host=3) as crawler:
+                return await asyncio.gather(*[crawler.oferta(cod)
+                                              for cod in range(12)])
+
+        with ServidorLocal(OFERTA_DIS, atraso=0.05) as servidor:
+            mwebcrawler.MWEB = servidor.url
+            ofertas = asyncio.run(busca())
+
+        self.assertEqual(12, len(ofertas))
+        self.assertEqual(12, servidor.requisicoes)
+        self.assertLessEqual(servidor.simultaneas_max, 3)
+        self.assertGreater(servidor.simultaneas_max, 1)
+
+    def test_buscas_simultaneas_sao_agrupadas(self):
+        async def busca():
+            async with mwebassincrono.CrawlerAssincrono() as crawler:
+                return await asyncio.gather(*[crawler.disciplinas(116)
+                                              for _ in range(5)])
+
+        metricas = mwebcrawler.configura_metricas()
+        try:
+            with ServidorLocal(OFERTA_DIS, atraso=.1) as servidor:
+                mwebcrawler.MWEB = servidor.url
+                resultados = asyncio.run(busca())
+        finally:
+            mwebcrawler.configura_metricas(False)
+
+        self.assertEqual(1, servidor.requisicoes)
+        self.assertEqual([resultados[0]] * 5, resultados)
+        self.assertEqual({'oferta_dis': 1},
+                         metricas.contadores['requisicoes'])
+        self.assertEqual({'oferta_dis': 4}, metricas.contadores['agrupadas'])
+        self.assertEqual(
+            1, metricas.histogramas['analise']['oferta_dis'].total)
+
+    def test_requisicoes_passam_pelo_escalonador(self):
+        async def busca():
+            async with mwebassincrono.CrawlerAssincrono() as crawler:
+                return await crawler.mweb(Nivel.GRADUACAO, 'oferta_dis',
+                                          {'cod': 116})
+
+        escalonador = mwebcrawler.configura_escalonador(
+            taxa=1000, tentativas=2, espera_inicial=.01)
+        with ServidorLocal(OFERTA_DIS, erros=1, retry_after=1) as servidor:
+            mwebcrawler.MWEB = servidor.url
+            inicio = time.time()
+            asyncio.run(busca())
+
+        self.assertEqual(2, servidor.requisicoes)
+        self.assertEqual(2, escalonador.estatisticas['requisicoes'])
+        self.assertEqual(1, escalonador.estatisticas['repeticoes'])
+        self.assertGreaterEqual(time.time() - inicio, 1)
+
+    def test_trechos_das_buscas(self):
+        async def busca():
+            async with mwebassincrono.CrawlerAssincrono() as crawler:
+                return await asyncio.gather(crawler.oferta(116319),
+                                            crawler.oferta(116394))
+
+        saida = io.StringIO()
+        mwebcrawler.configura_registro(saida)
+        try:
+            with ServidorLocal(OFERTA_DIS, atraso=.05) as servidor:
+                mwebcrawler.MWEB = servidor.url
+                with mwebcrawler.trecho('raiz') as raiz:
+                    asyncio.run(busca())
+        finally:
+            mwebcrawler.desabilita_registro()
+
+        eventos = [json.loads(linha) for linha in saida.getvalue().split(
+            '\n') if linha]
+        buscas = [e for e in eventos if e.get('nome') == 'mweb']
+        analises = [e for e in eventos if e.get('nome') == 'analise']
+        self.assertEqual(['116319', '116394'],
+                         sorted(e['cod'] for e in buscas))
+        self.assertEqual(2, len(analises))
+        for evento in buscas + analises:
+            self.assertEqual(raiz.id, evento['pai'])
+        self.assertEqual(['rede'] * 2, [e['origem'] for e in buscas])
+
+    def test_oferta_do_departamento(self):
+        with ServidorLocal(OFERTA_DIS) as servidor:
+            mwebcrawler.MWEB = servidor.url
+            ofertas = mwebassincrono.oferta_do_departamento(116)
+
+        self.assertEqual(['116319', '116394'], sorted(ofertas))
+        self.assertIn('Turmas', ofertas['116319'])
+
+
+if __name__ == '__main__':
+    unittest.main()
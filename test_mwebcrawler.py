@@ -20,8 +20,827 @@
 
 
 from mwebcrawler import Campus, Cursos, Departamento, Disciplina, Nivel, Oferta
+from mwebgravacao import PAGINAS, Reprodutor
+import io
+import itertools
+import json
+import mwebcrawler
+import os
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
 
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class ServidorLocal(ThreadingMixIn, HTTPServer):
+    '''Servidor HTTP local que faz as vezes do Matrícula Web nos testes.
+
+    Responde a qualquer página com o conteúdo dado (após o atraso dado, em
+    segundos) e contabiliza as conexões (TCP), as requisições recebidas e o
+    máximo de requisições atendidas simultaneamente. Para simular falhas, uma
+    fração das requisições (erros) e as que excedem a capacidade (requisições
+    simultâneas) dada são respondidas com status 503 (e, opcionalmente, com o
+    cabeçalho Retry-After dado).
+    '''
+    daemon_threads = True
+
+    def __init__(self, conteudo=b'<html></html>', etag=None, atraso=0,
+                 erros=0, capacidade=None, retry_after=None):
+        class Tratador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # permite keep-alive
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with self.server.trava:
+                    self.server.requisicoes += 1
+                    self.server.simultaneas += 1
+                    self.server.simultaneas_max = max(
+                        self.server.simultaneas, self.server.simultaneas_max)
+                    falha = self.server.aleatorio.random() < erros or \
+                        (capacidade and self.server.simultaneas > capacidade)
+                time.sleep(atraso)
+                with self.server.trava:
+                    self.server.simultaneas -= 1
+
+                if falha:
+                    self.send_response(503)
+                    if retry_after is not None:
+                        self.send_header('Retry-After', str(retry_after))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                if etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(conteudo)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(conteudo)
+
+            def log_message(self, *args):
+                pass
+
+        HTTPServer.__init__(self, ('127.0.0.1', 0), Tratador)
+        self.conexoes, self.requisicoes = 0, 0
+        self.simultaneas, self.simultaneas_max = 0, 0
+        self.trava = threading.Lock()
+        self.aleatorio = random.Random(0)
+        self.url = 'http://127.0.0.1:%d/%%s/%%s.aspx' % self.server_port
+
+    def process_request(self, request, client_address):
+        self.conexoes += 1
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class TestMWeb(unittest.TestCase):
+    def setUp(self):
+        self.url = mwebcrawler.MWEB
+
+    def tearDown(self):
+        mwebcrawler.MWEB = self.url
+        mwebcrawler.configura_sessao()
+        mwebcrawler.configura_cache(None)
+
+    def test_sessao_reaproveita_conexoes(self):
+        with ServidorLocal(b'pagina') as servidor:
+            mwebcrawler.MWEB = servidor.url
+            mwebcrawler.configura_sessao()
+            for cod in range(20):
+                pagina = mwebcrawler.mweb(Nivel.GRADUACAO, 'disciplina',
+                                          {'cod': cod})
+                self.assertEqual(b'pagina', pagina)
+
+        self.assertEqual(20, servidor.requisicoes)
+        self.assertEqual(1, servidor.conexoes)
+
+    def test_sessao_injetada(self):
+        class Sessao:
+            def get(self, url, params, timeout, headers):
+                self.url, self.params = url, params
+                return self
+
+            content, status_code, headers = b'injetada', 200, {}
+
+        sessao = Sessao()
+        mwebcrawler.configura_sessao(sessao)
+        self.assertIs(sessao, mwebcrawler.sessao())
+        self.assertEqual(b'injetada',
+                         mwebcrawler.mweb(Nivel.GRADUACAO, 'fluxo',
+                                          {'cod': '1741'}))
+        self.assertEqual(mwebcrawler.MWEB % (Nivel.GRADUACAO, 'fluxo'),
+                         sessao.url)
+        self.assertEqual({'cod': '1741'}, sessao.params)
+
+
+class TestEscalonador(unittest.TestCase):
+    def setUp(self):
+        self.url = mwebcrawler.MWEB
+        mwebcrawler.configura_sessao()
+
+    def tearDown(self):
+        mwebcrawler.MWEB = self.url
+        mwebcrawler.desabilita_escalonador()
+
+    def busca(self, paginas, trabalhadores=1):
+        def mweb(cod):
+            return mwebcrawler.mweb(Nivel.GRADUACAO, 'disciplina',
+                                    {'cod': cod})
+        return dict(mwebcrawler._em_lote(mweb, range(paginas),
+                                         trabalhadores))
+
+    def test_taxa_de_requisicoes(self):
+        mwebcrawler.configura_escalonador(taxa=50, rajada=5)
+        with ServidorLocal(b'pagina') as servidor:
+            mwebcrawler.MWEB = servidor.url
+            inicio = time.time()
+            self.busca(30, trabalhadores=8)
+
+        self.assertGreaterEqual(time.time() - inicio, (30 - 5) / 50.)
+
+    def test_falhas_sao_repetidas(self):
+        escalonador = mwebcrawler.configura_escalonador(
+            taxa=1000, tentativas=8, espera_inicial=.01)
+        with ServidorLocal(b'pagina', erros=.3) as servidor:
+            mwebcrawler.MWEB = servidor.url
+            paginas = self.busca(40)
+
+        self.assertEqual(set([b'pagina']), set(paginas.values()))
+        self.assertGreater(escalonador.estatisticas['repeticoes'], 0)
+
+    def test_retry_after_e_respeitado(self):
+        escalonador = mwebcrawler.configura_escalonador(
+            taxa=1000, tentativas=2, espera_inicial=.01)
+        with ServidorLocal(b'pagina', erros=1, retry_after=1) as servidor:
+            mwebcrawler.MWEB = servidor.url
+            inicio = time.time()
+            self.busca(1)
+
+        self.assertEqual(2, servidor.requisicoes)
+        self.assertEqual(1, escalonador.estatisticas['repeticoes'])
+        self.assertGreaterEqual(time.time() - inicio, 1)
+
+    def test_concorrencia_se_adapta_a_capacidade_do_servidor(self):
+        escalonador = mwebcrawler.configura_escalonador(
+            taxa=1000, rajada=100, concorrencia=16, tentativas=10,
+            espera_inicial=.01, falhas_para_abrir=100)
+        with ServidorLocal(b'pagina', atraso=.02, capacidade=2) as servidor:
+            mwebcrawler.MWEB = servidor.url
+            paginas = self.busca(60, trabalhadores=16)
+
+        self.assertEqual(set([b'pagina']), set(paginas.values()))
+        self.assertLess(escalonador.limite, 16)
+
+    def test_circuito_aberto_apos_falhas_seguidas(self):
+        escalonador = mwebcrawler.configura_escalonador(
+            tentativas=1, falhas_para_abrir=3, espera_do_circuito=.5)
+        with ServidorLocal(b'pagina', erros=1) as servidor:
+            mwebcrawler.MWEB = servidor.url
+            paginas = self.busca(10)
+
+        self.assertEqual(3, servidor.requisicoes)
+        self.assertEqual(7, escalonador.estatisticas['rejeitadas'])
+        self.assertFalse(any(paginas.values()))
+
+        time.sleep(.5)  # o circuito fecha após uma requisição bem sucedida
+        with ServidorLocal(b'pagina') as servidor:
+            mwebcrawler.MWEB = servidor.url
+            paginas = self.busca(10)
+        self.assertEqual(set([b'pagina']), set(paginas.values()))
+
+    def test_apenas_a_requisicao_de_teste_fecha_o_circuito(self):
+        escalonador = mwebcrawler.Escalonador(falhas_para_abrir=1,
+                                              espera_do_circuito=0)
+        self.assertEqual((True, False), escalonador._circuito_permite())
+        escalonador._registra(True, 0)
+        self.assertEqual((True, True), escalonador._circuito_permite())
+        self.assertEqual((False, False), escalonador._circuito_permite())
+
+        # Uma requisição iniciada antes de o circuito abrir termina.
+        escalonador._registra(False, 0)
+        self.assertEqual('testando', escalonador._circuito)
+        self.assertEqual((False, False), escalonador._circuito_permite())
+
+        escalonador._registra(False, 0, teste=True)
+        self.assertEqual('fechado', escalonador._circuito)
+        self.assertEqual((True, False), escalonador._circuito_permite())
+
+
+class TestAgrupador(unittest.TestCase):
+    def setUp(self):
+        self.url = mwebcrawler.MWEB
+        mwebcrawler.configura_sessao()
+
+    def tearDown(self):
+        mwebcrawler.MWEB = self.url
+
+    def busca_simultanea(self, funcao, vezes):
+        '''Executa a função dada em threads simultâneas e retorna a lista
+        dos resultados.'''
+        largada = threading.Barrier(vezes)
+        resultados = [None] * vezes
+
+        def busca(i):
+            largada.wait()
+            resultados[i] = funcao()
+
+        threads = [threading.Thread(target=busca, args=(i,))
+                   for i in range(vezes)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return resultados
+
+    def test_buscas_simultaneas_sao_agrupadas(self):
+        antes = mwebcrawler.estatisticas_de_agrupamento()
+        with ServidorLocal(pagina('oferta_dados'), atraso=.2) as servidor:
+            mwebcrawler.MWEB = servidor.url
+            ofertas = self.busca_simultanea(lambda: Oferta.oferta(116319), 8)
+        depois = mwebcrawler.estatisticas_de_agrupamento()
+
+        self.assertEqual(1, servidor.requisicoes)
+        self.assertEqual(7, depois['agrupadas'] - antes['agrupadas'])
+        self.assertTrue(all(oferta == ofertas[0] for oferta in ofertas))
+        self.assertEqual(8, len(set(id(oferta) for oferta in ofertas)))
+        self.assertIn('A', ofertas[0]['Turmas'])
+
+    def test_paginas_diferentes_nao_sao_agrupadas(self):
+        with ServidorLocal(b'pagina', atraso=.1) as servidor:
+            mwebcrawler.MWEB = servidor.url
+            contador = iter(range(4))
+            self.busca_simultanea(lambda: mwebcrawler.mweb(
+                Nivel.GRADUACAO, 'disciplina', {'cod': next(contador)}), 4)
+            mwebcrawler.mweb(Nivel.GRADUACAO, 'disciplina', {'cod': 0})
+
+        self.assertEqual(5, servidor.requisicoes)
+
+    def test_excecao_e_repassada_a_todos(self):
+        def falha():
+            time.sleep(.1)
+            raise ValueError('falha')
+
+        agrupador = mwebcrawler.Agrupador()
+
+        def busca():
+            try:
+                return agrupador.executa('chave', falha)
+            except ValueError as erro:
+                return erro
+
+        erros = self.busca_simultanea(busca, 4)
+        self.assertTrue(all(isinstance(erro, ValueError) for erro in erros))
+        self.assertEqual({'buscas': 1, 'agrupadas': 3},
+                         agrupador.estatisticas)
+
+
+class TestMemoria(unittest.TestCase):
+    def setUp(self):
+        self.sessao = SessaoLocal({'116319': pagina('oferta_dados'),
+                                   '6912': pagina('curriculo'),
+                                   '113476': pagina('disciplina')})
+        mwebcrawler.configura_sessao(self.sessao)
+        self.memoria = mwebcrawler.configura_memoria(limite=2)
+
+    def tearDown(self):
+        mwebcrawler.configura_memoria(None)
+        mwebcrawler.configura_sessao()
+
+    def test_resultados_reaproveitados(self):
+        oferta = Oferta.oferta(116319)
+        self.assertEqual(oferta, Oferta.oferta('116319'))
+        self.assertEqual(['116319'], self.sessao.requisicoes)
+        self.assertEqual(1, self.memoria.estatisticas['acertos'])
+
+        self.memoria.invalida('oferta_dados', 116319)
+        self.assertEqual(oferta, Oferta.oferta(116319))
+        self.assertEqual(['116319'] * 2, self.sessao.requisicoes)
+
+    def test_alteracoes_nao_afetam_a_memoria(self):
+        curriculo = Cursos.curriculo(6912)
+        obrigatorias = dict(curriculo['obrigatórias'])
+        for cadeia in curriculo['cadeias'].values():
+            for item in cadeia:
+                curriculo['obrigatórias'].update(item)
+
+        self.assertNotEqual(obrigatorias, curriculo['obrigatórias'])
+        self.assertEqual(obrigatorias,
+                         Cursos.curriculo(6912)['obrigatórias'])
+
+    def test_limite_e_validade(self):
+        Oferta.oferta(116319)
+        Cursos.curriculo(6912)
+        Oferta.oferta(116319)
+        Disciplina.informacoes(113476)  # descarta o currículo
+        self.assertEqual(2, len(self.memoria))
+        Cursos.curriculo(6912)
+        self.assertEqual(['116319', '6912', '113476', '6912'],
+                         self.sessao.requisicoes)
+
+        mwebcrawler.configura_memoria(validade={'oferta_dados': 0})
+        Oferta.oferta(116319)
+        Oferta.oferta(116319)
+        self.assertEqual(['116319'] * 2, self.sessao.requisicoes[-2:])
+
+
+class TestMetricas(unittest.TestCase):
+    def setUp(self):
+        self.sessao = SessaoLocal({'116319': pagina('oferta_dados')})
+        mwebcrawler.configura_sessao(self.sessao)
+        mwebcrawler.configura_memoria()
+        self.metricas = mwebcrawler.configura_metricas()
+
+    def tearDown(self):
+        mwebcrawler.configura_metricas(False)
+        mwebcrawler.configura_memoria(None)
+        mwebcrawler.configura_sessao()
+
+    def test_buscas_medidas_por_pagina(self):
+        Oferta.oferta(116319)
+        Oferta.oferta(116319)
+
+        dados = self.metricas.para_dicionario()
+        contadores = dados['contadores']
+        histogramas = dados['histogramas']
+        self.assertEqual({'oferta_dados': 1}, contadores['requisicoes'])
+        self.assertEqual({'oferta_dados': 1}, contadores['memoria_faltas'])
+        self.assertEqual({'oferta_dados': 1}, contadores['memoria_acertos'])
+        self.assertNotIn('erros', contadores)
+        for nome in ('latencia', 'bytes', 'analise', 'valores'):
+            self.assertEqual(1, histogramas[nome]['oferta_dados']['total'])
+        self.assertEqual(len(pagina('oferta_dados')),
+                         histogramas['bytes']['oferta_dados']['soma'])
+        self.assertGreater(histogramas['valores']['oferta_dados']['soma'],
+                           10)
+
+    def test_erros_e_formatos(self):
+        class SessaoSemResposta(SessaoLocal):
+            def get(self, url, params, timeout, headers):
+                raise mwebcrawler.RequestException()
+
+        mwebcrawler.configura_sessao(SessaoSemResposta())
+        self.assertEqual({'Turmas': {}}, Oferta.oferta(116394))
+        self.assertEqual({'oferta_dados': 1},
+                         self.metricas.contadores['erros'])
+
+        texto = self.metricas.prometheus()
+        self.assertIn('# TYPE mweb_erros_total counter', texto)
+        self.assertIn('mweb_erros_total{pagina="oferta_dados"} 1', texto)
+        self.assertIn('mweb_analise_count{pagina="oferta_dados"} 1', texto)
+        self.assertIn('mweb_valores_bucket{pagina="oferta_dados",le="+Inf"} '
+                      '1', texto)
+        self.assertEqual(self.metricas.para_dicionario()['contadores'],
+                         json.loads(self.metricas.json())['contadores'])
+
+        self.metricas.limpa()
+        self.assertEqual({'contadores': {}, 'histogramas': {}},
+                         self.metricas.para_dicionario())
+
+    def test_desabilitadas(self):
+        mwebcrawler.configura_metricas(False)
+        Oferta.oferta(116319)
+        self.assertEqual({}, self.metricas.contadores)
+
+
+class TestRegistro(unittest.TestCase):
+    def setUp(self):
+        mwebcrawler.configura_sessao(SessaoLocal({
+            '116319': pagina('oferta_dados'),
+            '116394': pagina('oferta_dados')}))
+        self.saida = io.StringIO()
+
+    def tearDown(self):
+        mwebcrawler.desabilita_registro()
+        mwebcrawler.configura_sessao()
+
+    def eventos(self):
+        mwebcrawler.desabilita_registro()
+        return [json.loads(linha) for linha in self.saida.getvalue().split(
+            '\n') if linha]
+
+    def test_trechos_no_rastro_da_chamada(self):
+        @mwebcrawler.rastreado
+        def ofertas():
+            mwebcrawler.log('buscando')
+            return dict(Oferta.oferta_em_lote([116319, 116394]))
+
+        mwebcrawler.configura_registro(self.saida)
+        self.assertEqual(2, len(ofertas()))
+
+        eventos = self.eventos()
+        raiz = [e for e in eventos if e.get('nome') == 'ofertas'][0]
+        self.assertIsNone(raiz['pai'])
+        mensagem = [e for e in eventos if e['mensagem'] == 'buscando'][0]
+        self.assertEqual(raiz['trecho'], mensagem['trecho'])
+
+        buscas = [e for e in eventos if e.get('nome') == 'mweb']
+        analises = [e for e in eventos if e.get('nome') == 'analise']
+        self.assertEqual(['116319', '116394'],
+                         sorted(e['cod'] for e in buscas))
+        self.assertEqual(2, len(analises))
+        for evento in buscas + analises:
+            self.assertEqual(raiz['rastro'], evento['rastro'])
+            self.assertEqual(raiz['trecho'], evento['pai'])
+            self.assertGreaterEqual(evento['duracao'], 0)
+        self.assertEqual(['rede'] * 2, [e['origem'] for e in buscas])
+
+    def test_trecho_de_quem_chama_as_buscas_em_lote(self):
+        mwebcrawler.configura_registro(self.saida)
+        with mwebcrawler.trecho('raiz') as raiz:
+            ofertas = Oferta.oferta_em_lote([116319, 116394])
+        self.assertEqual(2, len(dict(ofertas)))
+
+        buscas = [e for e in self.eventos() if e.get('nome') == 'mweb']
+        self.assertEqual([raiz.id] * 2, [e['pai'] for e in buscas])
+
+    def test_amostragem(self):
+        mwebcrawler.configura_registro(self.saida, amostragem=0)
+        with mwebcrawler.trecho('raiz'):
+            Oferta.oferta(116319)
+            mwebcrawler.log('mensagem')
+        self.assertEqual(['mensagem'],
+                         [e['mensagem'] for e in self.eventos()])
+
+    def test_desabilitado(self):
+        self.assertIs(mwebcrawler.trecho('a'), mwebcrawler.trecho('b'))
+        mwebcrawler.configura_registro(self.saida, rastreia=False)
+        with mwebcrawler.trecho('raiz') as atual:
+            atual.define(ignorado=True)
+        self.assertEqual([], self.eventos())
+
+
+class TestFluxo(unittest.TestCase):
+    def setUp(self):
+        self.reprodutor = Reprodutor()
+        mwebcrawler.configura_sessao(self.reprodutor)
+
+    def tearDown(self):
+        mwebcrawler.configura_sessao()
+
+    def test_geradores_equivalentes_aos_dicionarios(self):
+        self.assertEqual(Oferta.departamentos(),
+                         dict(Oferta.itera_departamentos()))
+        self.assertEqual(list(Oferta.disciplinas(116).items()),
+                         list(Oferta.itera_disciplinas(116)))
+        self.assertEqual(Oferta.oferta(116319)['Turmas'],
+                         dict(Oferta.itera_turmas(116319)))
+        self.assertEqual(Cursos.relacao(), dict(Cursos.itera_relacao()))
+
+    def test_analise_medida_ao_parar_antes_do_fim(self):
+        metricas = mwebcrawler.configura_metricas()
+        try:
+            turmas = Oferta.itera_turmas(116319)
+            next(turmas)
+            turmas.close()
+        finally:
+            mwebcrawler.configura_metricas(False)
+        self.assertEqual(
+            1, metricas.histogramas['analise']['oferta_dados'].total)
+
+    def test_oferta_do_campus(self):
+        esperadas = set()
+        for departamento in Oferta.departamentos():
+            for disciplina in Oferta.disciplinas(departamento):
+                for turma in Oferta.oferta(disciplina,
+                                           departamento)['Turmas']:
+                    esperadas.add((departamento, disciplina, turma))
+
+        turmas = [(departamento, disciplina, turma) for
+                  departamento, disciplina, turma, _ in
+                  Oferta.itera_oferta(trabalhadores=4)]
+        self.assertEqual(len(esperadas), len(turmas))
+        self.assertEqual(esperadas, set(turmas))
+
+    def test_contrapressao(self):
+        consumidas = []
+
+        def entradas():
+            for i in itertools.count():
+                consumidas.append(i)
+                yield i
+
+        itens = mwebcrawler.encadeia(entradas(), [lambda i: [i, -i],
+                                                  lambda i: [i]],
+                                     trabalhadores=2, pendentes=4)
+        primeiros = list(itertools.islice(itens, 10))
+        time.sleep(.1)  # sem consumo, as entradas não são consumidas
+
+        self.assertEqual(10, len(primeiros))
+        self.assertLessEqual(len(consumidas), 5 + 4 + 4)
+
+    def test_etapas_independentes(self):
+        liberada = threading.Event()
+
+        def entradas():
+            yield 1
+            liberada.wait(5)
+            yield 2
+
+        # O resultado da primeira entrada é gerado enquanto a próxima
+        # entrada ainda não foi gerada.
+        inicio = time.time()
+        resultados = mwebcrawler._em_fluxo(lambda i: -i, entradas(), 2)
+        self.assertEqual(-1, next(resultados))
+        self.assertLess(time.time() - inicio, 1)
+        liberada.set()
+        self.assertEqual([-2], list(resultados))
+
+        self.assertNotEqual('fork', mwebcrawler._contexto_de_processos()
+                            .get_start_method())
+
+    def test_analise_em_processos(self):
+        disciplinas = list(Oferta.disciplinas(116)) * 2
+        esperadas = dict(Oferta.oferta_em_lote(disciplinas))
+        ofertas = dict(Oferta.oferta_em_processos(iter(disciplinas),
+                                                  processos=2, pendentes=2))
+        self.assertEqual(esperadas, ofertas)
+        self.assertEqual(dict(Cursos.curriculo_em_lote([6912, 6921])),
+                         dict(Cursos.curriculo_em_processos([6912, 6921],
+                                                            processos=2)))
+
+        memoria = mwebcrawler.configura_memoria()
+        try:
+            dict(Oferta.oferta_em_processos(disciplinas[:1], processos=1))
+            requisicoes = len(self.reprodutor.requisicoes)
+            self.assertEqual(esperadas[disciplinas[0]],
+                             Oferta.oferta(disciplinas[0]))
+            self.assertEqual(requisicoes, len(self.reprodutor.requisicoes))
+        finally:
+            mwebcrawler.configura_memoria(None)
+
+    def test_primeiras_turmas_antes_do_fim(self):
+        turmas = Oferta.itera_oferta(trabalhadores=1, pendentes=1)
+        next(turmas)
+        time.sleep(.1)
+        requisicoes = len(self.reprodutor.requisicoes)
+        list(turmas)
+
+        self.assertLess(requisicoes, len(self.reprodutor.requisicoes) // 2)
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.url = mwebcrawler.MWEB
+        self.diretorio = tempfile.mkdtemp()
+        self.caminho = os.path.join(self.diretorio, 'cache.sqlite')
+
+    def tearDown(self):
+        mwebcrawler.MWEB = self.url
+        mwebcrawler.configura_cache(None)
+        shutil.rmtree(self.diretorio)
+
+    def test_pagina_em_cache_nao_acessa_a_rede(self):
+        mwebcrawler.configura_cache(self.caminho)
+        with ServidorLocal(b'curriculo') as servidor:
+            mwebcrawler.MWEB = servidor.url
+            for _ in range(3):
+                pagina = mwebcrawler.mweb(Nivel.GRADUACAO, 'curriculo',
+                                          {'cod': '6912'})
+                self.assertEqual(b'curriculo', pagina)
+
+        self.assertEqual(1, servidor.requisicoes)
+
+    def test_revalidacao_de_pagina_expirada(self):
+        mwebcrawler.configura_cache(self.caminho,
+                                    validade={'oferta_dados': -1})
+        with ServidorLocal(b'oferta', etag='"v1"') as servidor:
+            mwebcrawler.MWEB = servidor.url
+            for _ in range(2):
+                pagina = mwebcrawler.mweb(Nivel.GRADUACAO, 'oferta_dados',
+                                          {'cod': '116319'})
+                self.assertEqual(b'oferta', pagina)
+
+        self.assertEqual(2, servidor.requisicoes)
+
+    def test_descarta_paginas_acessadas_ha_mais_tempo(self):
+        cache = mwebcrawler.Cache(self.caminho, limite=10)
+        cache.guarda(Nivel.GRADUACAO, 'disciplina', {'cod': 1}, b'12345')
+        cache.guarda(Nivel.GRADUACAO, 'disciplina', {'cod': 2}, b'12345')
+        cache.busca(Nivel.GRADUACAO, 'disciplina', {'cod': 1})
+        cache.guarda(Nivel.GRADUACAO, 'disciplina', {'cod': 3}, b'12345')
+
+        self.assertEqual(10, cache.tamanho())
+        self.assertIsNotNone(cache.busca(Nivel.GRADUACAO, 'disciplina',
+                                         {'cod': 1}))
+        self.assertIsNone(cache.busca(Nivel.GRADUACAO, 'disciplina',
+                                      {'cod': 2}))
+
+    def test_acessos_gravados_em_lote(self):
+        def acessadas():
+            with sqlite3.connect(self.caminho) as bd:
+                return dict(bd.execute('SELECT chave, acessada '
+                                       'FROM paginas').fetchall())
+
+        cache = mwebcrawler.Cache(self.caminho)
+        for cod in range(3):
+            cache.guarda(Nivel.GRADUACAO, 'disciplina', {'cod': cod}, b'1')
+        antes = acessadas()
+        time.sleep(.01)
+        for cod in range(mwebcrawler.Cache.ACESSOS - 1):
+            cache.busca(Nivel.GRADUACAO, 'disciplina', {'cod': cod % 3})
+        self.assertEqual(antes, acessadas())
+
+        cache.busca(Nivel.GRADUACAO, 'disciplina', {'cod': 0})
+        depois = acessadas()
+        for chave in antes:
+            self.assertGreater(depois[chave], antes[chave])
+
+
+class SessaoLocal:
+    '''Sessão HTTP que responde às requisições com as páginas dadas,
+    indexadas pelo código requisitado, sem acessar a rede.'''
+    content, status_code, headers = b'', 200, {}
+
+    def __init__(self, paginas=None, atrasos=None):
+        self.paginas = paginas or {}
+        self.atrasos = atrasos or {}
+        self.requisicoes = []
+        self.trava = threading.Lock()
+
+    def get(self, url, params, timeout, headers):
+        with self.trava:
+            self.requisicoes.append(params['cod'])
+        time.sleep(self.atrasos.get(params['cod'], 0))
+        resposta = SessaoLocal()
+        resposta.content = self.paginas.get(params['cod'], b'')
+        return resposta
+
+
+class TestLote(unittest.TestCase):
+    def tearDown(self):
+        mwebcrawler.configura_sessao()
+
+    def test_codigos_repetidos_sao_buscados_uma_vez(self):
+        sessao = SessaoLocal()
+        mwebcrawler.configura_sessao(sessao)
+        codigos = [116319, '116319', 116394, 113476, '113476']
+        ofertas = dict(Oferta.oferta_em_lote(codigos))
+
+        self.assertEqual(['113476', '116319', '116394'], sorted(ofertas))
+        self.assertEqual(['113476', '116319', '116394'],
+                         sorted(sessao.requisicoes))
+
+    def test_resultados_gerados_a_medida_que_sao_obtidos(self):
+        sessao = SessaoLocal(atrasos={'116319': 0.2})
+        mwebcrawler.configura_sessao(sessao)
+        codigos = [codigo for codigo, _ in
+                   Disciplina.informacoes_em_lote([116319, 116394, 113476],
+                                                  trabalhadores=3)]
+
+        self.assertEqual('116319', codigos[-1])
+
+    def test_analisador_dado(self):
+        class Marcador:
+            curriculo = disciplina = disciplina_pop = oferta_dados = \
+                staticmethod(lambda pagina_html: 'marcador')
+
+        mwebcrawler.configura_sessao(SessaoLocal())
+        mwebcrawler.ANALISADORES['marcador'] = Marcador
+        try:
+            for em_lote in (Cursos.curriculo_em_lote,
+                            Disciplina.informacoes_em_lote,
+                            Disciplina.pre_requisitos_em_lote,
+                            Oferta.oferta_em_lote):
+                resultados = dict(em_lote([116319, 116394],
+                                          analisador='marcador'))
+                self.assertEqual(['marcador'] * 2,
+                                 list(resultados.values()))
+        finally:
+            del mwebcrawler.ANALISADORES['marcador']
+
+
+def pagina(nome):
+    '''Retorna o conteúdo da página salva com o nome dado.'''
+    with open(os.path.join(PAGINAS, nome + '.html'), 'rb') as arquivo:
+        return arquivo.read()
+
+
+def renomeia_turmas(conteudo):
+    '''Renomeia (no próprio conteúdo, um bytearray) as turmas da página de
+    oferta dada para Z, ZZ etc. Usada para verificar que uma turma foi
+    gerada antes que as demais fossem analisadas.'''
+    for turma in re.finditer(br'<font size=4><b>(\w+)</b>', bytes(conteudo)):
+        inicio, fim = turma.span(1)
+        conteudo[inicio:fim] = b'Z' * (fim - inicio)
+
+
+class TestAnalisador(unittest.TestCase):
+    def test_curriculo(self):
+        disciplinas = mwebcrawler.Analisador.curriculo(pagina('curriculo'))
+
+        disciplina = disciplinas['obrigatórias']['167657']
+        self.assertEqual('CONTROLE PARA AUTOMAÇÃO', disciplina['Nome'])
+        self.assertEqual({'Teoria': 3, 'Prática': 1, 'Extensão': 0,
+                          'Estudo': 4}, disciplina['Créditos'])
+        self.assertEqual(['114014'], list(disciplinas['cadeias']['2'][0]))
+        self.assertEqual(['114626', '114634'],
+                         sorted(disciplinas['cadeias']['2'][1]))
+        self.assertIn('113417', disciplinas['optativas'])
+
+    def test_disciplina(self):
+        informacoes = mwebcrawler.Analisador.disciplina(pagina('disciplina'))
+
+        self.assertEqual('CIC', informacoes['Sigla do Departamento'])
+        self.assertEqual('1971/2', informacoes['Vigência'])
+        self.assertIn('Gerenciamento dinâmico', informacoes['Programa'])
+        self.assertIn('Tenenbaum', informacoes['Bibliografia'])
+
+        informacoes = mwebcrawler.Analisador.disciplina(
+            pagina('disciplina-sem-programa'))
+        self.assertNotIn('Programa', informacoes)
+        self.assertIn('Tenenbaum', informacoes['Bibliografia'])
+
+    def test_faltavaga_rel(self):
+        lista = pagina('faltavaga_rel')
+
+        self.assertEqual({'A': 12, 'C': 3},
+                         mwebcrawler.Analisador.faltavaga_rel(lista))
+        self.assertEqual({'C': 3},
+                         mwebcrawler.Analisador.faltavaga_rel(lista, 'B|C'))
+
+    def test_oferta_dados(self):
+        oferta = mwebcrawler.Analisador.oferta_dados(pagina('oferta_dados'))
+
+        self.assertEqual('ESTRUTURAS DE DADOS', oferta['Nome'])
+        self.assertEqual(['A', 'B', 'C', 'E'], sorted(oferta['Turmas']))
+        turma = oferta['Turmas']['A']
+        self.assertEqual(40, turma['Vagas'])
+        self.assertEqual(38, turma['Alunos Matriculados'])
+        self.assertEqual(['JOSE DA SILVA', 'MARIA SOUZA'],
+                         turma['Professores'])
+        self.assertEqual([{'Início': '10:00', 'Fim': '11:50',
+                           'Local': 'PJC BT 073'}], turma['Aulas']['Segunda'])
+        self.assertEqual({'Vagas': 20, 'Calouros': 5},
+                         turma['Turma Reservada']['Ciência da Computação'])
+        self.assertNotIn('Turma Reservada', oferta['Turmas']['B'])
+        self.assertEqual(2, len(oferta['Turmas']['C']['Aulas']['Sexta']))
+
+    def test_bytes_e_texto(self):
+        for nome in ('curriculo', 'disciplina', 'oferta_dados', 'oferta_dis'):
+            conteudo = pagina(nome)
+            analisa = getattr(mwebcrawler.Analisador, nome)
+            esperado = analisa(conteudo.decode('utf-8'))
+            latin1 = b'<meta charset="ISO-8859-1">' + \
+                conteudo.decode('utf-8').encode('latin-1')
+
+            self.assertEqual(esperado, analisa(conteudo))
+            self.assertEqual(esperado, analisa(memoryview(conteudo)))
+            self.assertEqual(esperado, analisa(latin1))
+
+        # Bytes inválidos na codificação da página são substituídos.
+        turmas = mwebcrawler.Analisador.itera_oferta_dados(pagina(
+            'oferta_dados').replace(b'A DESIGNAR', b'A DESIGNAR\xff'))
+        self.assertEqual([['JOSE DA SILVA', 'MARIA SOUZA'], ['ANA PEREIRA'],
+                          ['CARLOS LIMA'], ['A DESIGNAR\ufffd']],
+                         [turma['Professores'] for _, turma in turmas])
+        oferta = mwebcrawler.Analisador.oferta_dados(pagina(
+            'oferta_dados').replace(b'ESTRUTURAS', b'ESTRUTURAS\xff'))
+        self.assertEqual('ESTRUTURAS\ufffd DE DADOS', oferta['Nome'])
+
+
+    def test_geradores(self):
+        for nome in ('curso_rel', 'oferta_dep', 'oferta_dis'):
+            analisa = getattr(mwebcrawler.Analisador, nome)
+            itera = getattr(mwebcrawler.Analisador, 'itera_' + nome)
+            self.assertEqual(list(analisa(pagina(nome)).items()),
+                             list(itera(pagina(nome))))
+        self.assertEqual([], list(mwebcrawler.Analisador.itera_oferta_dis(
+            b'')))
+
+    def test_primeira_turma_antes_do_fim_da_analise(self):
+        conteudo = bytearray(pagina('oferta_dados'))
+        turmas = mwebcrawler.Analisador.itera_oferta_dados(
+            memoryview(conteudo))
+        primeira, _ = next(turmas)
+        renomeia_turmas(conteudo)
+
+        self.assertEqual('A', primeira)
+        self.assertEqual(['Z', 'Z', 'Z'], [turma for turma, _ in turmas])
+
 
 class TestCursos(unittest.TestCase):
     def test_curriculo(self):
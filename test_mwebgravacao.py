@@ -0,0 +1,65 @@
+#  -*- coding: utf-8 -*-
+#    @package: test_mwebgravacao.py
+#
+# Funções de teste da gravação e reprodução de páginas do Matrícula Web.
+
+
+from mwebcrawler import Cursos, Disciplina, Oferta
+from mwebgravacao import Gravador, Reprodutor, nomes_do_arquivo
+from test_mwebcrawler import SessaoLocal, pagina
+import mwebcrawler
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestReprodutor(unittest.TestCase):
+    def setUp(self):
+        self.reprodutor = Reprodutor()
+        mwebcrawler.configura_sessao(self.reprodutor)
+
+    def tearDown(self):
+        mwebcrawler.configura_sessao()
+
+    def test_nomes_do_arquivo(self):
+        url = mwebcrawler.MWEB % ('graduacao', 'oferta_dados')
+        self.assertEqual(['oferta_dados-116319-116.html',
+                          'oferta_dados-116319.html', 'oferta_dados.html'],
+                         nomes_do_arquivo(url, {'dep': 116, 'cod': 116319}))
+
+    def test_buscas_com_paginas_salvas(self):
+        self.assertEqual(mwebcrawler.Analisador.oferta_dados(
+            pagina('oferta_dados')), Oferta.oferta(116319, 116))
+        self.assertIn('167657', Cursos.curriculo(6912)['obrigatórias'])
+        self.assertNotIn('Programa',
+                         Disciplina.informacoes('sem-programa'))
+        self.assertEqual(3, len(self.reprodutor.requisicoes))
+
+    def test_pagina_inexistente(self):
+        self.reprodutor.diretorio = tempfile.gettempdir()
+        self.assertEqual({}, Disciplina.informacoes(116319))
+
+
+class TestGravador(unittest.TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+
+    def tearDown(self):
+        mwebcrawler.configura_sessao()
+        shutil.rmtree(self.diretorio)
+
+    def test_paginas_gravadas_sao_reproduzidas(self):
+        sessao = SessaoLocal({'116': pagina('oferta_dis')})
+        mwebcrawler.configura_sessao(Gravador(sessao, self.diretorio))
+        gravada = Oferta.disciplinas(116)
+        Oferta.disciplinas(117)  # página vazia, não é gravada
+
+        self.assertEqual(['oferta_dis-116.html'],
+                         os.listdir(self.diretorio))
+        mwebcrawler.configura_sessao(Reprodutor(self.diretorio))
+        self.assertEqual(gravada, Oferta.disciplinas(116))
+
+
+if __name__ == '__main__':
+    unittest.main()
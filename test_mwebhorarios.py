@@ -0,0 +1,115 @@
+#  -*- coding: utf-8 -*-
+#    @package: test_mwebhorarios.py
+#
+# Funções de teste dos conflitos de horários das turmas. Os testes usam as
+# páginas salvas em paginas/ no lugar do Matrícula Web.
+
+
+from mwebgravacao import Reprodutor
+from mwebhorarios import Grade, hora, intervalo
+from snapshot import captura
+import mwebcrawler
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def aula(inicio, fim, local='PJC BT 073'):
+    return {'Início': inicio, 'Fim': fim, 'Local': local}
+
+
+class TestGrade(unittest.TestCase):
+    def setUp(self):
+        self.grade = Grade.de_ofertas([
+            ('1', {'Turmas': {
+                'A': {'Aulas': {'Segunda': [aula('08:00', '09:50')]}},
+                'B': {'Aulas': {'Terça': [aula('08:00', '09:50')]}}}}),
+            ('2', {'Turmas': {
+                'A': {'Aulas': {'Segunda': [aula('09:00', '10:50',
+                                                 'ICC AT 022')]}},
+                'B': {'Aulas': {'Segunda': [aula('09:50', '11:30')]}}}}),
+            ('3', {'Turmas': {
+                'A': {'Aulas': {'Terça': [aula('09:00', '10:00', '')],
+                                'Quarta': [aula('', '')]}}}})])
+
+    def test_intervalos(self):
+        self.assertEqual((1440 + 600, 1440 + 710),
+                         intervalo('Terça', '10:00', '11:50'))
+        self.assertIsNone(intervalo('Terça', '11:50', '10:00'))
+        self.assertIsNone(intervalo('Feriado', '10:00', '11:50'))
+        self.assertEqual(('Terça', '10:00'), hora(1440 + 600))
+        self.assertEqual([(1440 + 540, 1440 + 600)],
+                         self.grade.horarios(3, 'A'))
+
+    def test_conflitos(self):
+        self.assertTrue(self.grade.conflito(('1', 'A'), ('2', 'A')))
+        self.assertFalse(self.grade.conflito(('1', 'A'), ('2', 'B')))
+        self.assertEqual([('2', 'A')], self.grade.conflitos(1, 'A'))
+        self.assertEqual([('3', 'A')], self.grade.conflitos(1, 'B'))
+
+        self.grade.adiciona(3, 'A', {'Segunda': [aula('09:55', '10:05')]})
+        self.assertEqual([], self.grade.conflitos(1, 'B'))
+        self.assertEqual([('2', 'A'), ('2', 'B')],
+                         self.grade.conflitos(3, 'A'))
+        self.grade.remove(2, 'A')
+        self.assertEqual([], self.grade.conflitos(1, 'A'))
+
+    def test_locais(self):
+        self.assertEqual([('1', 'A')], self.grade.ocupantes(
+            'PJC BT 073', 'Segunda', '09:00', '09:50'))
+        self.assertEqual([('1', 'A'), ('2', 'B')], self.grade.ocupantes(
+            'PJC BT 073', 'Segunda', '09:00', '10:00'))
+        self.assertTrue(self.grade.livre('ICC AT 022', 'Segunda', '08:00',
+                                         '09:00'))
+        self.assertEqual([], self.grade.locais_em_conflito())
+
+        self.grade.adiciona(3, 'A', {'Segunda': [aula('11:00', '12:00')]})
+        self.assertEqual([('PJC BT 073', ('2', 'B'), ('3', 'A'))],
+                         self.grade.locais_em_conflito())
+        self.grade.remove(3, 'A')
+        self.assertEqual([], self.grade.locais_em_conflito())
+        self.assertNotIn(('3', 'A'), self.grade)
+
+    def test_combinacao(self):
+        self.assertEqual({'1': 'A', '2': 'B', '3': 'A'},
+                         self.grade.combinacao([1, 2, 3]))
+        self.assertIsNone(self.grade.combinacao([1, 2, 3], {'2': 'A'}))
+        self.assertEqual({'1': 'A'}, self.grade.combinacao([1, 4]))
+        self.assertEqual({'1': {'1': 'A', '2': 'B'}, '2': {}},
+                         self.grade.fluxo({'1': {'Disciplinas': ['1', '2']},
+                                           '2': {'Disciplinas': []}}))
+
+
+class TestGradeDaOferta(unittest.TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        mwebcrawler.configura_sessao(Reprodutor())
+
+    def tearDown(self):
+        mwebcrawler.configura_sessao()
+        shutil.rmtree(self.diretorio)
+
+    def test_oferta_e_snapshot(self):
+        oferta = mwebcrawler.Oferta.disciplinas(116)
+        grade = Grade.busca(oferta, trabalhadores=4)
+        # Todas as disciplinas salvas têm as mesmas 4 turmas, em horários
+        # distintos.
+        self.assertIsNone(grade.combinacao(oferta))
+        self.assertEqual(4, len(set(grade.combinacao(
+            sorted(oferta)[:4]).values())))
+
+        snapshot = captura(os.path.join(self.diretorio, 's.sqlite'),
+                           trabalhadores=4)
+        try:
+            copia = Grade.de_snapshot(snapshot)
+        finally:
+            snapshot.fecha()
+        for disciplina in oferta:
+            for turma in grade.turmas(disciplina):
+                self.assertEqual(grade.horarios(disciplina, turma),
+                                 copia.horarios(disciplina, turma))
+
+
+if __name__ == '__main__':
+    unittest.main()
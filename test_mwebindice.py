@@ -0,0 +1,105 @@
+#  -*- coding: utf-8 -*-
+#    @package: test_mwebindice.py
+#
+# Funções de teste do índice reverso dos currículos. Os testes usam as páginas
+# salvas em paginas/ no lugar do Matrícula Web.
+
+
+from mwebcrawler import Cursos
+from mwebgravacao import Reprodutor
+from mwebindice import CADEIA, OBRIGATORIA, IndiceDeCurriculos, Papel
+import coordenacao
+import mwebcrawler
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestIndice(unittest.TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.caminho = os.path.join(self.diretorio, 'indice.sqlite')
+        mwebcrawler.configura_sessao(Reprodutor())
+        self.indice = IndiceDeCurriculos(self.caminho)
+        self.indice.constroi(trabalhadores=4)
+
+    def tearDown(self):
+        self.indice.fecha()
+        mwebcrawler.configura_sessao()
+        shutil.rmtree(self.diretorio)
+
+    def test_papeis(self):
+        self.assertEqual(['6912', '6921'], self.indice.indexadas())
+        self.assertEqual(set(['6912', '6921']),
+                         self.indice.habilitacoes('116319', [OBRIGATORIA]))
+        self.assertIn(Papel('6912', CADEIA, '2', 1, ('114634',)),
+                      self.indice.papeis('114626'))
+        self.assertEqual([], self.indice.papeis('000000'))
+        self.assertNotIn('000000', self.indice)
+
+        curriculo = Cursos.curriculo(6912)
+        for disciplina in curriculo['obrigatórias']:
+            self.assertIn('6912', self.indice.habilitacoes(disciplina))
+
+    def test_persistencia_e_atualizacao(self):
+        self.assertEqual([], self.indice.constroi(trabalhadores=4))
+
+        with IndiceDeCurriculos(self.caminho) as reaberto:
+            self.assertEqual(self.indice.papeis('114626'),
+                             reaberto.papeis('114626'))
+            self.assertTrue(reaberto.atualiza(6912, {'obrigatórias': {
+                '999999': 'NOVA'}}))
+            self.assertEqual(set(['6921']),
+                             reaberto.habilitacoes('116319'))
+        with IndiceDeCurriculos(self.caminho) as reaberto:
+            self.assertEqual(set(['6912']), reaberto.habilitacoes('999999'))
+            self.assertEqual(set(['6921']), reaberto.habilitacoes('116319'))
+
+    def test_remocao(self):
+        self.assertTrue(self.indice.atualiza(1234, {'obrigatórias': {
+            '116319': 'ESTRUTURAS DE DADOS', '999999': 'NOVA'}}))
+        self.assertEqual(set(['1234', '6912', '6921']),
+                         self.indice.habilitacoes('116319'))
+
+        self.assertEqual(['1234'], self.indice.constroi(trabalhadores=4))
+        self.assertFalse(self.indice.remove(1234))
+        self.assertNotIn('999999', self.indice)
+        with IndiceDeCurriculos(self.caminho) as reaberto:
+            self.assertEqual(['6912', '6921'], reaberto.indexadas())
+            self.assertEqual(set(['6912', '6921']),
+                             reaberto.habilitacoes('116319'))
+            self.assertTrue(reaberto.remove(6921))
+        with IndiceDeCurriculos(self.caminho) as reaberto:
+            self.assertEqual(['6912'], reaberto.indexadas())
+            self.assertEqual(set(['6912']), reaberto.habilitacoes('116319'))
+
+    def test_falha_na_busca_de_habilitacoes(self):
+        class Fonte:  # as buscas de habilitações do curso 19 falham
+            class Cursos:
+                relacao = staticmethod(Cursos.relacao)
+                curriculo_em_lote = staticmethod(Cursos.curriculo_em_lote)
+
+                @staticmethod
+                def habilitacoes(curso, *args):
+                    if curso == '19':
+                        return {}
+                    return Cursos.habilitacoes(curso, *args)
+
+        self.indice.atualiza(1234, {'obrigatórias': {'999999': 'NOVA'}})
+        self.indice._associa({'19': ['1234', '6912', '6921']})
+        self.assertEqual([], self.indice.constroi(trabalhadores=4,
+                                                  fonte=Fonte))
+        with IndiceDeCurriculos(self.caminho) as reaberto:
+            self.assertEqual(['1234', '6912', '6921'], reaberto.indexadas())
+            self.assertEqual(['1234'], reaberto.constroi(trabalhadores=4))
+
+    def test_ocupacao(self):
+        oferta = mwebcrawler.Oferta.disciplinas(116)
+        self.assertEqual(coordenacao.ocupacao(oferta, [6912]),
+                         coordenacao.ocupacao(oferta, [6912],
+                                              indice=self.indice))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#  -*- coding: utf-8 -*-
+#    @package: test_mweblxml.py
+#
+# Funções de teste do analisador de páginas baseado em lxml. Os resultados são
+# comparados aos do analisador padrão (expressões regulares), para as páginas
+# salvas em paginas/.
+
+
+from bench_mwebcrawler import amplia_oferta, paginas
+from mwebcrawler import Analisador, Oferta
+from test_mwebcrawler import SessaoLocal, pagina, renomeia_turmas
+import mwebcrawler
+import unittest
+
+try:
+    from mweblxml import AnalisadorLXML
+except ImportError:  # lxml não instalado
+    AnalisadorLXML = None
+
+
+@unittest.skipIf(AnalisadorLXML is None, 'requer lxml')
+class TestAnalisadorLXML(unittest.TestCase):
+    def assertResultadosIguais(self, tipo, pagina_html, *args):
+        self.assertEqual(getattr(Analisador, tipo)(pagina_html, *args),
+                         getattr(AnalisadorLXML, tipo)(pagina_html, *args))
+
+    def test_resultados_iguais_aos_do_analisador_padrao(self):
+        for nome, tipo, pagina_html in paginas():
+            latin1 = b'<meta charset="ISO-8859-1">' + \
+                pagina_html.decode('utf-8').encode('latin-1')
+
+            self.assertResultadosIguais(tipo, pagina_html)
+            self.assertResultadosIguais(tipo, pagina_html.decode('utf-8'))
+            self.assertResultadosIguais(tipo, memoryview(pagina_html))
+            self.assertResultadosIguais(tipo, latin1)
+            self.assertResultadosIguais(tipo, b'')
+            self.assertResultadosIguais(tipo, memoryview(b''))
+
+    def test_geradores_iguais_aos_do_analisador_padrao(self):
+        for nome, tipo, pagina_html in paginas():
+            if not hasattr(Analisador, 'itera_' + tipo):
+                continue
+            for conteudo in (pagina_html, pagina_html.decode('utf-8'),
+                             memoryview(pagina_html), b''):
+                self.assertEqual(
+                    list(getattr(Analisador, 'itera_' + tipo)(conteudo)),
+                    list(getattr(AnalisadorLXML, 'itera_' + tipo)(conteudo)))
+
+    def test_primeira_turma_antes_do_fim_da_leitura(self):
+        # A página é lida em partes: as turmas do fim da página, renomeadas
+        # após a primeira ser gerada, só são lidas depois.
+        conteudo = bytearray(amplia_oferta(pagina('oferta_dados'), 240))
+        turmas = AnalisadorLXML.itera_oferta_dados(memoryview(conteudo))
+        primeira, _ = next(turmas)
+        renomeia_turmas(conteudo)
+        restantes = [turma for turma, _ in turmas]
+
+        self.assertEqual('T0', primeira)
+        self.assertEqual(239, len(restantes))
+        self.assertEqual('ZZZZ', restantes[-1])
+
+    def test_lista_de_espera_de_turmas_dadas(self):
+        self.assertResultadosIguais('faltavaga_rel', pagina('faltavaga_rel'),
+                                    'B|C')
+
+    def test_oferta_com_muitas_turmas(self):
+        oferta = amplia_oferta(pagina('oferta_dados'), 240)
+
+        self.assertResultadosIguais('oferta_dados', oferta)
+        self.assertEqual(240, len(AnalisadorLXML.oferta_dados(oferta)
+                                  ['Turmas']))
+
+    def test_selecao_do_analisador(self):
+        sessao = SessaoLocal({'116': pagina('oferta_dis')})
+        mwebcrawler.configura_sessao(sessao)
+        try:
+            self.assertIs(AnalisadorLXML,
+                          mwebcrawler.configura_analisador('lxml'))
+            self.assertEqual(Oferta.disciplinas(116),
+                             Oferta.disciplinas(116, analisador='regex'))
+        finally:
+            mwebcrawler.configura_analisador()
+            mwebcrawler.configura_sessao()
+
+        self.assertIs(Analisador, mwebcrawler._analisador_de(None))
+        self.assertRaises(ImportError, mwebcrawler._analisador_de, 'xyz')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#  -*- coding: utf-8 -*-
+#    @package: test_mwebregistros.py
+#
+# Funções de teste dos registros tipados das informações do Matrícula Web. Os
+# testes usam as páginas salvas em paginas/ no lugar do Matrícula Web.
+
+
+from mwebcrawler import Analisador, Cursos, Disciplina, Oferta
+from mwebgravacao import Reprodutor
+from test_mwebcrawler import pagina
+import mwebcrawler
+import mwebregistros
+import unittest
+
+
+class TestRegistros(unittest.TestCase):
+    def setUp(self):
+        mwebcrawler.configura_sessao(Reprodutor())
+
+    def tearDown(self):
+        mwebcrawler.configura_sessao()
+
+    def test_oferta(self):
+        oferta = mwebregistros.oferta(116319)
+        turma = oferta.turma('A')
+
+        self.assertEqual('ESTRUTURAS DE DADOS', oferta.nome)
+        self.assertEqual(6, oferta.creditos.pratica + oferta.creditos.estudo)
+        self.assertEqual((40, 38), (turma.vagas, turma.alunos_matriculados))
+        self.assertEqual(set(['Segunda', 'Quarta']),
+                         set(aula.dia for aula in turma.aulas))
+        self.assertEqual(20, [reserva.vagas for reserva in turma.reservas
+                              if reserva.curso == 'Ciência da Computação'][0])
+        self.assertIsNone(oferta.turma('B').reservas)
+        self.assertEqual(Oferta.oferta(116319), oferta.para_dicionario())
+
+    def test_oferta_em_processos(self):
+        ofertas = dict(mwebregistros.oferta_em_processos(
+            [116319, 116394], processos=2))
+        self.assertEqual(mwebregistros.oferta(116394), ofertas['116394'])
+        self.assertEqual(Oferta.oferta(116319),
+                         ofertas['116319'].para_dicionario())
+
+    def test_conversao_para_dicionario(self):
+        informacoes = Disciplina.informacoes(116319)
+        self.assertEqual(informacoes, mwebregistros.informacoes(
+            116319).para_dicionario())
+        sem_programa = mwebregistros.informacoes('sem-programa')
+        self.assertIsNone(sem_programa.programa)
+        self.assertNotIn('Programa', sem_programa.para_dicionario())
+
+        habilitacoes = mwebregistros.habilitacoes(19)
+        self.assertEqual(Cursos.habilitacoes(19),
+                         {h.codigo: h.para_dicionario()
+                          for h in habilitacoes})
+        self.assertEqual(274, habilitacoes[0].creditos_para_formatura)
+
+        vazia = mwebregistros.OfertaDisciplina.de_dicionario({'Turmas': {}})
+        self.assertEqual({'Turmas': {}}, vazia.para_dicionario())
+
+    def test_strings_repetidas_sao_compartilhadas(self):
+        primeira = mwebregistros.OfertaDisciplina.de_dicionario(
+            Analisador.oferta_dados(pagina('oferta_dados')))
+        segunda = mwebregistros.OfertaDisciplina.de_dicionario(
+            Analisador.oferta_dados(pagina('oferta_dados')))
+
+        aula, outra = primeira.turmas[0].aulas[0], segunda.turmas[0].aulas[0]
+        self.assertIsNot(primeira.turmas[0], segunda.turmas[0])
+        self.assertIs(aula.local, outra.local)
+        self.assertIs(aula.inicio, outra.inicio)
+        self.assertIs(primeira.turmas[0].professores[0],
+                      segunda.turmas[0].professores[0])
+
+    def test_registros_sem_dicionario(self):
+        turma = mwebregistros.Turma('A', 40, 38)
+        self.assertFalse(hasattr(turma, '__dict__'))
+        self.assertRaises(AttributeError, setattr, turma, 'sala', 'PJC')
+        self.assertEqual(mwebregistros.Turma('A', 40, 38), turma)
+        self.assertNotEqual(mwebregistros.Turma('A', 40, 39), turma)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,307 @@
+#  -*- coding: utf-8 -*-
+#    @package: test_snapshot.py
+#
+# Funções de teste da captura completa (snapshot) do Matrícula Web. Os testes
+# usam as páginas salvas em paginas/ no lugar do Matrícula Web.
+
+
+from mwebcrawler import Cursos, Nivel, Oferta
+from mwebgravacao import PAGINAS, Reprodutor
+from snapshot import FORMATO, TABELAS, Snapshot, captura, recaptura
+import coordenacao
+import json
+import mwebcrawler
+import os
+import shutil
+import snapshot
+import tempfile
+import threading
+import unittest
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.reprodutor = Reprodutor()
+        mwebcrawler.configura_sessao(self.reprodutor)
+        self.snapshot = captura(os.path.join(self.diretorio, 's.sqlite'),
+                                trabalhadores=4)
+
+    def tearDown(self):
+        self.snapshot.fecha()
+        mwebcrawler.configura_sessao()
+        shutil.rmtree(self.diretorio)
+
+    def test_captura(self):
+        buscas = len(self.reprodutor.requisicoes)
+        deptos = Oferta.departamentos()
+        disciplinas = Oferta.disciplinas(116)
+        metadados = self.snapshot.metadados()
+
+        self.assertEqual(sorted(deptos), self.snapshot.codigos(
+            'Oferta.disciplinas'))
+        self.assertEqual(sorted(disciplinas),
+                         self.snapshot.codigos('Oferta.oferta'))
+        self.assertEqual(sorted(Cursos.habilitacoes(19)),
+                         self.snapshot.codigos('Cursos.curriculo'))
+        self.assertEqual(str(FORMATO), metadados['formato'])
+        self.assertEqual(str(buscas), metadados['buscas'])
+
+    def test_captura_em_lotes(self):
+        lotes, guarda, lote = [], Snapshot.guarda, snapshot.LOTE
+
+        def registra(snapshot_, metodo, resultados):
+            lotes.append((metodo, len(resultados)))
+            guarda(snapshot_, metodo, resultados)
+
+        Snapshot.guarda, snapshot.LOTE = registra, 2
+        try:
+            segundo = captura(os.path.join(self.diretorio, 's2.sqlite'),
+                              trabalhadores=4)
+        finally:
+            Snapshot.guarda, snapshot.LOTE = guarda, lote
+
+        with segundo:
+            for metodo in ('Oferta.oferta', 'Cursos.fluxo'):
+                self.assertEqual(self.snapshot.codigos(metodo),
+                                 segundo.codigos(metodo))
+            self.assertEqual(self.snapshot.metadados()['contagens'],
+                             segundo.metadados()['contagens'])
+        self.assertTrue(all(tamanho <= 2 for _, tamanho in lotes))
+        self.assertGreater(len([metodo for metodo, _ in lotes
+                                if metodo == 'Oferta.oferta']), 1)
+
+    def test_resultados_iguais_aos_das_buscas(self):
+        for metodo, argumentos in [('Oferta.oferta', ('116319',)),
+                                   ('Oferta.lista_de_espera', ('116319',
+                                                               'B|C')),
+                                   ('Cursos.fluxo', ('6912',)),
+                                   ('Cursos.curriculo', ('6912',))]:
+            classe, nome = metodo.split('.')
+            buscado = getattr(getattr(mwebcrawler, classe), nome)(*argumentos)
+            guardado = getattr(getattr(self.snapshot, classe), nome)(
+                *argumentos)
+            self.assertEqual(buscado, guardado)
+
+        self.assertEqual({'Turmas': {}}, self.snapshot.Oferta.oferta('1'))
+
+    def test_coordenacao_sem_acesso_a_rede(self):
+        oferta = Oferta.disciplinas(116)
+        habilitacoes = ['6912']
+        buscado = coordenacao.ocupacao(oferta, habilitacoes)
+        requisicoes = len(self.reprodutor.requisicoes)
+
+        self.assertEqual(buscado, coordenacao.ocupacao(
+            oferta, habilitacoes, fonte=self.snapshot))
+        self.assertEqual(15, coordenacao.demanda_nao_atendida(
+            '116319', fonte=self.snapshot))
+        self.assertEqual(requisicoes, len(self.reprodutor.requisicoes))
+
+    def test_acesso_por_varias_threads(self):
+        oferta = self.snapshot.Oferta.oferta('116319')
+        erros = []
+
+        def usa(indice):
+            try:
+                for i in range(50):
+                    self.snapshot.guarda('Teste', [(indice * 100 + i, [i])])
+                    self.assertEqual(oferta,
+                                     self.snapshot.Oferta.oferta('116319'))
+                    self.snapshot.turmas('CIC')
+            except Exception as erro:
+                erros.append(erro)
+
+        threads = [threading.Thread(target=usa, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], erros)
+        self.assertEqual(400, len(self.snapshot.codigos('Teste')))
+
+    def test_formato_desconhecido(self):
+        self.snapshot.define_metadados(formato=0)
+        self.assertRaises(ValueError, Snapshot, self.snapshot.caminho)
+
+
+class SemIndices:
+    '''Fonte com os métodos de busca de um snapshot, mas sem as consultas
+    indexadas.'''
+    def __init__(self, snapshot):
+        self.Cursos = snapshot.Cursos
+        self.Disciplina = snapshot.Disciplina
+        self.Oferta = snapshot.Oferta
+
+
+class TestIndices(unittest.TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        mwebcrawler.configura_sessao(Reprodutor())
+        self.snapshot = captura(os.path.join(self.diretorio, 's.sqlite'),
+                                trabalhadores=4)
+        self.habilitacoes = self.snapshot.codigos('Cursos.curriculo')
+        self.oferta = self.snapshot.Oferta.disciplinas(116)
+
+    def tearDown(self):
+        self.snapshot.fecha()
+        mwebcrawler.configura_sessao()
+        shutil.rmtree(self.diretorio)
+
+    def test_coordenacao_igual_sem_indices(self):
+        sem_indices = SemIndices(self.snapshot)
+        for funcao, argumentos in [
+                (coordenacao.ocupacao, (self.oferta, self.habilitacoes)),
+                (coordenacao.ocupacao_minima, (self.oferta,
+                                               self.habilitacoes, 40)),
+                (coordenacao.lista_obrigatorias, (self.habilitacoes,
+                                                  ['CIC', 'MAT'])),
+                (coordenacao.alunos_matriculados, ('116319',))]:
+            indexado = funcao(*argumentos, fonte=self.snapshot)
+            self.assertEqual(funcao(*argumentos, fonte=sem_indices),
+                             indexado)
+            self.assertTrue(indexado)
+
+    def test_consultas(self):
+        self.assertEqual([('6912', 'obrigatória'), ('6921', 'obrigatória')],
+                         self.snapshot.curriculos_com('116319'))
+        turmas = self.snapshot.turmas('CIC', minimo=44)
+        self.assertEqual(set(['E']), set(t for _, t, _, _ in turmas))
+        self.assertEqual([], self.snapshot.turmas('MAT'))
+        self.assertIn((2, '116319', 'A', 'Física', 5, 0),
+                      self.snapshot.reservas_no_fluxo(6912, 'Fís'))
+        self.assertEqual([1, 2], self.snapshot.periodos(6912)[:2])
+        self.assertEqual(len(self.snapshot.turmas()),
+                         len(self.snapshot.turmas_detalhadas()))
+
+    def test_nivel_do_snapshot(self):
+        self.assertRaises(ValueError, coordenacao.ocupacao, self.oferta,
+                          self.habilitacoes, Nivel.POS, fonte=self.snapshot)
+
+    def test_conversao_do_formato_1(self):
+        caminho = self.snapshot.caminho
+        turmas = self.snapshot.turmas()
+        self.snapshot.define_metadados(formato=1)
+        for tabela in TABELAS:
+            if tabela.startswith('CREATE TABLE'):
+                self.snapshot.consulta('DROP TABLE %s' % tabela.split()[5])
+        self.snapshot.fecha()
+
+        self.snapshot = Snapshot(caminho)
+        self.assertEqual(turmas, self.snapshot.turmas())
+        self.assertEqual(str(FORMATO), self.snapshot.metadados()['formato'])
+
+    def test_conversao_do_formato_3(self):
+        caminho = self.snapshot.caminho
+        turmas = self.snapshot.turmas_detalhadas()
+        self.assertTrue(any(espera for _, _, _, _, _, espera in turmas))
+        self.snapshot.define_metadados(formato=3)
+        self.snapshot.consulta('DROP TABLE esperas')
+        self.snapshot.fecha()
+
+        self.snapshot = Snapshot(caminho)
+        self.assertEqual(turmas, self.snapshot.turmas_detalhadas())
+        self.assertEqual(str(FORMATO), self.snapshot.metadados()['formato'])
+
+    def test_conversao_do_formato_2(self):
+        caminho = self.snapshot.caminho
+        paginas = [self.snapshot.paginas(metodo)
+                   for metodo in ('Oferta.oferta', 'Oferta.lista_de_espera')]
+        self.snapshot.define_metadados(formato=2)
+        for sql in ('CREATE TABLE antigas AS SELECT metodo, codigo, resumo, '
+                    'etag, modificada, verificada FROM paginas',
+                    'DROP TABLE paginas',
+                    'ALTER TABLE antigas RENAME TO paginas'):
+            self.snapshot.consulta(sql)
+        self.snapshot.fecha()
+
+        self.snapshot = Snapshot(caminho)
+        self.assertEqual(paginas, [self.snapshot.paginas(metodo) for metodo
+                                   in ('Oferta.oferta',
+                                       'Oferta.lista_de_espera')])
+        self.assertEqual(str(FORMATO), self.snapshot.metadados()['formato'])
+
+
+class ReprodutorComETag(Reprodutor):
+    '''Reprodutor que informa ETags (o tamanho da página) e responde às
+    requisições condicionais.'''
+    def get(self, url, params=None, timeout=None, headers=None):
+        resposta = Reprodutor.get(self, url, params, timeout, headers)
+        resposta.headers = {'ETag': str(len(resposta.content))}
+        if (headers or {}).get('If-None-Match') == resposta.headers['ETag']:
+            resposta.status_code, resposta.content = 304, b''
+        return resposta
+
+
+class TestRecaptura(unittest.TestCase):
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.paginas = os.path.join(self.diretorio, 'paginas')
+        shutil.copytree(PAGINAS, self.paginas)
+        mwebcrawler.configura_sessao(Reprodutor(self.paginas))
+        self.snapshot = captura(os.path.join(self.diretorio, 's.sqlite'),
+                                trabalhadores=4)
+        self.disciplinas = self.snapshot.codigos('Oferta.oferta')
+
+    def tearDown(self):
+        self.snapshot.fecha()
+        mwebcrawler.configura_sessao()
+        shutil.rmtree(self.diretorio)
+
+    def contagens(self):
+        return json.loads(self.snapshot.metadados()['recaptura_contagens'])
+
+    def altera_oferta(self, antes, depois):
+        caminho = os.path.join(self.paginas, 'oferta_dados.html')
+        with open(caminho, 'rb') as arquivo:
+            pagina = arquivo.read()
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(pagina.replace(antes, depois))
+        mwebcrawler.configura_sessao(Reprodutor(self.paginas))
+
+    def test_apenas_diferencas(self):
+        self.assertEqual(sorted(self.disciplinas),
+                         sorted(self.snapshot.paginas('Oferta.oferta')))
+        self.assertEqual([], recaptura(self.snapshot))
+        self.assertEqual(0, self.contagens()['analisadas'])
+        self.assertEqual(2 * len(self.disciplinas),
+                         self.contagens()['iguais'])
+
+        self.altera_oferta(b'<font color=green>38</font>',
+                           b'<font color=green>39</font>')
+        diferencas = recaptura(self.snapshot)
+        self.assertEqual([{'Disciplina': disciplina, 'Turma': 'A',
+                           'Alunos Matriculados': (38, 39)}
+                          for disciplina in self.disciplinas],
+                         sorted(diferencas, key=lambda d: d['Disciplina']))
+        self.assertEqual(39, self.snapshot.Oferta.oferta('116319')[
+            'Turmas']['A']['Alunos Matriculados'])
+        self.assertEqual(39, self.snapshot.turmas()[0][3])
+        self.assertEqual(len(self.disciplinas),
+                         self.contagens()['analisadas'])
+
+    def test_requisicoes_condicionais(self):
+        mwebcrawler.configura_sessao(ReprodutorComETag(self.paginas))
+        recaptura(self.snapshot)
+        self.assertEqual(2 * len(self.disciplinas),
+                         self.contagens()['iguais'])
+        recaptura(self.snapshot)
+        self.assertEqual(2 * len(self.disciplinas),
+                         self.contagens()['nao_modificadas'])
+
+    def test_prioridade(self):
+        self.snapshot.guarda_paginas(
+            ('Oferta.lista_de_espera', disciplina) + estado[:-1] +
+            (disciplina == '116424',) for disciplina, estado
+            in self.snapshot.paginas('Oferta.lista_de_espera').items())
+        reprodutor = Reprodutor(self.paginas)
+        mwebcrawler.configura_sessao(reprodutor)
+
+        recaptura(self.snapshot, limite=1)
+        self.assertEqual(['116424', '116424'],
+                         [params['cod'] for _, params
+                          in reprodutor.requisicoes])
+
+
+if __name__ == '__main__':
+    unittest.main()